@@ -1,28 +1,101 @@
 # backend_api.py
-from fastapi import FastAPI
+import hashlib
+import json
+import logging
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
 from pydantic import BaseModel
 from typing import Optional, Any, Dict, List
 from config import Config
+from services.admission import AdmissionController, AdmissionMiddleware
+from services.ingredient_search import IngredientSearchIndex
+from services.dietary_filter import normalize_constraints
+from services.intent_classifier import IntentClassifier, empty_entities
+from services.lazy import LazyService, resolve
+from services.log_pipeline import LogPipeline, RequestIdMiddleware
 from services.ingredient_service import IngredientService
 from services.recipe_service import RecipeService
+from services.recommendation_service import RecommendationService
 from services.openai_service import OpenAIService
+from services.prompt_registry import snapshot as prompt_snapshot
+from services.response_renderer import ResponseRenderer
+from services.response_store import ResponseStore
+from services.prefetcher import Prefetcher
+from services.response_cache import PREFETCHING
+from services.session_store import SessionStore
+from services.warmup import Warmup, load_warmup_queries
 
-app = FastAPI(title="Recipe Chatbot API")
+logger = logging.getLogger(__name__)
 
+
+
+@asynccontextmanager
+async def _lifespan(app: FastAPI):
+    # Installed by the server, not at import, so importing the app (tests, scripts) leaves logging alone
+    log_pipeline.start()
+    # In the background, so /live answers at once; /ready waits for it
+    warmup.start(_warmup_steps())
+    try:
+        yield
+    finally:
+        log_pipeline.stop()
+
+
+app = FastAPI(title="Recipe Chatbot API", lifespan=_lifespan)
+
+config = Config()
+# JSON records through a queue; each request's lines carry its X-Request-ID
+log_pipeline = LogPipeline(config)
+# Per-classification concurrency limits and wait queues; innermost, so 503s still get CORS headers
+admission = AdmissionController(config)
+app.add_middleware(AdmissionMiddleware, controller=admission)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Retry-After", "X-Degraded", "X-Request-ID"],
 )
-
-config = Config()
-ingredient_service = IngredientService(config)
-recipe_service = RecipeService(config)
-openai_service = OpenAIService(config)
-
+# Search pages and recipe lists compress well; small chatbot replies are left alone
+app.add_middleware(GZipMiddleware, minimum_size=1000)
+# Outermost, so admission and CORS log lines carry the request id too
+app.add_middleware(RequestIdMiddleware)
+
+# Services are built on first use (a request, /ready or the warmup), not at import,
+# so a scale-to-zero worker starts fast; see services/lazy.py
+# One OpenAIService shared by every service so routing metrics cover all calls
+openai_service = LazyService("openai_service", lambda: OpenAIService(config))
+# Precomputed substitutes / recipe details, read before calling OpenAI
+response_store = LazyService("response_store", lambda: ResponseStore(config))
+ingredient_service = LazyService("ingredient_service", lambda: IngredientService(
+    config, resolve(openai_service), resolve(response_store)))
+ingredient_search = LazyService("ingredient_search", lambda: IngredientSearchIndex(
+    config, ingredient_service.dataset_service))
+recipe_service = LazyService("recipe_service", lambda: RecipeService(
+    config, resolve(openai_service), dietary_filter=ingredient_service.dietary_filter))
+# Home-page recommendations scored in-process from the recipe snapshot
+recommendation_service = LazyService("recommendation_service", lambda: RecommendationService(
+    config, recipe_service.supabase))
+# Local replacement for the n8n Classify AI Agent; GPT only when it is unsure
+intent_classifier = LazyService("intent_classifier", lambda: IntentClassifier(
+    config, ingredient_service.dataset_service, resolve(openai_service)))
+# Chat-ready markdown for `render` requests, in place of the n8n Formatting AI Agent
+response_renderer = ResponseRenderer()
+# Recent results per chat session (UnifiedRequest.session_id)
+session_store = SessionStore(config)
+# Background warm-up of each session's likely next call
+prefetcher = LazyService("prefetcher", lambda: Prefetcher(
+    config, resolve(openai_service), lambda session_id, recipe: _recipe_details(session_id, recipe)[0]))
+# Built by /ready, in dependency order
+LAZY_SERVICES = (openai_service, response_store, ingredient_service, ingredient_search,
+                 recipe_service, recommendation_service, intent_classifier, prefetcher)
+# Preloads, connections and hot queries run once at startup; gates /ready
+warmup = Warmup(config)
 
 # ---------------------------------------------------------------------------
 # Models
@@ -33,20 +106,34 @@ class UnifiedRequest(BaseModel):
     Unified request body sent by the n8n AI agent.
 
     Entities reference per classification:
-      substitute   : ingredient (req), recipe, include_reasoning, max_results
+      substitute   : ingredient (req), recipe, include_reasoning, max_results, constraints[]
       context      : attributes{taste,texture,color,cooking_method},
-                     natural_description, recipe_title, max_results
-      suggest      : ingredients[] (req), max_results
+                     natural_description, recipe_title, max_results, constraints[]
+      suggest      : ingredients[] (req), max_results, constraints[]
       similar      : recipe (req), max_results
       specific     : required_ingredients[] (req), recipe_context, max_results
       recipe_custom: recipe (req), substitutes[] (req)
       lookup       : recipe (req)
-      rewrite      : recipe (req), ingredient (req), replacement (req),
-                     original_ingredients (optional, auto-fetched if absent)
+      rewrite      : recipe (req), ingredient + replacement or swaps[] (req),
+                     original_ingredients (optional, auto-fetched if absent),
+                     output ("full" or "diff")
+      recommend    : limit (the user comes from the Authorization bearer token)
+
+    session_id (optional) scopes a chat: recipe details, substitutes and parsed
+    descriptions from earlier turns are reused, and a missing recipe on
+    /substitute or /rewrite defaults to the session's last recipe.
+
+    constraints (optional) are dietary or allergen rules such as "vegan",
+    "dairy-free" or "nut-free"; results breaking one are filtered out.
+
+    render (optional) adds `rendered` {"en", "th"} chat markdown to the
+    response, so the reply can skip the Formatting AI Agent.
     """
     classification: str
     entities: Dict[str, Any]
     confidence: float
+    session_id: Optional[str] = None
+    render: bool = False
 
 
 class UnifiedResponse(BaseModel):
@@ -55,6 +142,22 @@ class UnifiedResponse(BaseModel):
     source: Optional[str] = None
     confidence: float
     error: Optional[str] = None
+    rendered: Optional[Dict[str, str]] = None
+
+
+class ClassifyRequest(BaseModel):
+    """A raw chat message, as the n8n Classify AI Agent receives it."""
+    message: str
+    session_id: Optional[str] = None
+
+
+class ClassifyResponse(BaseModel):
+    """The Classify AI Agent's output object, plus where it came from ("local" or "gpt")."""
+    classification: str
+    confidence: float
+    entities: Dict[str, Any]
+    source: Optional[str] = None
+    error: Optional[str] = None
 
 
 # ---------------------------------------------------------------------------
@@ -71,6 +174,79 @@ def _recipe_row(recipe, *, from_db: bool) -> Dict:
     }
 
 
+def _swaps(entities: Dict[str, Any]) -> List[tuple]:
+    """(ingredient, replacement) pairs from swaps[] (objects or pairs) and/or ingredient + replacement."""
+    swaps = []
+    for swap in entities.get("swaps") or []:
+        if isinstance(swap, dict):
+            old, new = swap.get("ingredient"), swap.get("replacement")
+        elif isinstance(swap, (list, tuple)) and len(swap) == 2:
+            old, new = swap
+        else:
+            continue
+        if old and new:
+            swaps.append((str(old), str(new)))
+    old, new = entities.get("ingredient"), entities.get("replacement")
+    if old and new and (old, new) not in swaps:
+        swaps.insert(0, (old, new))
+    return swaps
+
+
+def _constraints(entities: Dict[str, Any]) -> List[str]:
+    """Known dietary constraints from `constraints` (list or comma-separated); unknown ones are logged."""
+    known, unknown = normalize_constraints(entities.get("constraints"))
+    if unknown:
+        logger.warning("Ignoring unsupported constraints: %s", unknown)
+    return known
+
+
+def _with_constraints(data: Dict[str, Any], constraints: List[str]) -> Dict[str, Any]:
+    """Echo the applied constraints in the response data."""
+    if constraints:
+        data["constraints"] = constraints
+    return data
+
+
+def _recipe_details(session_id: Optional[str], recipe: str):
+    """Recipe details from the session, the precomputed store, then GPT; with the source."""
+    details = session_store.get_recipe_details(session_id, recipe)
+    if details:
+        return details, "session"
+    details, source = response_store.get_recipe_details(recipe), "precomputed"
+    if not details:
+        details, source = openai_service.get_recipe_details(recipe), "gpt"
+    # Prefetched details stay in the response cache until the user actually asks
+    if details and not PREFETCHING.get():
+        session_store.put_recipe_details(session_id, recipe, details)
+    return details, source
+
+
+def _etag_json(request: Request, version: str, params: Any, build, max_age: int):
+    """
+    JSON response with a strong ETag of the data version and query params.
+    A matching If-None-Match gets a 304 without running `build`, which may
+    return None (503) or raise ValueError (400).
+    """
+    key = json.dumps([version, params], sort_keys=True, ensure_ascii=False)
+    etag = f'"{hashlib.sha1(key.encode("utf-8")).hexdigest()}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    try:
+        body = build()
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    if body is None:
+        return JSONResponse({"error": "Search index unavailable"}, status_code=503)
+    return JSONResponse(body, headers={"ETag": etag, "Cache-Control": f"public, max-age={max_age}"})
+
+
+def _rendered(req: UnifiedRequest, response: UnifiedResponse) -> UnifiedResponse:
+    """Attach the templated chat reply when the caller asked for one."""
+    if req.render and response.error is None:
+        response.rendered = response_renderer.render(response.classification, response.data, req.entities)
+    return response
+
+
 def _err(classification: str, message: str, confidence: float) -> UnifiedResponse:
     return UnifiedResponse(
         classification=classification,
@@ -84,38 +260,73 @@ def _err(classification: str, message: str, confidence: float) -> UnifiedRespons
 # Endpoints
 # ---------------------------------------------------------------------------
 
+@app.post("/classify")
+def classify(req: ClassifyRequest):
+    """
+    Classify a chat message and extract its entities, in the same schema as the
+    n8n Classify AI Agent, so the workflow can route straight to an endpoint.
+    """
+    try:
+        result = intent_classifier.classify(req.message)
+        return ClassifyResponse(
+            classification=result.classification,
+            confidence=result.confidence,
+            entities=result.entities,
+            source=result.source,
+        )
+    except Exception as e:
+        return ClassifyResponse(classification="clarify", confidence=0.0,
+                                entities=empty_entities(), error=str(e))
+
+
 @app.post("/substitute")
 def substitute(req: UnifiedRequest):
     """
     Find substitute ingredients for a given ingredient.
-    entities: ingredient (required), recipe, include_reasoning, max_results
+    entities: ingredient (required), recipe, include_reasoning, max_results, constraints[]
     """
     try:
         ingredient     = req.entities.get("ingredient")
-        recipe         = req.entities.get("recipe", "General Recipe")
+        recipe         = (req.entities.get("recipe")
+                          or session_store.last_recipe(req.session_id) or "General Recipe")
         include_reason = bool(req.entities.get("include_reasoning", False))
         max_results    = req.entities.get("max_results")
+        constraints    = _constraints(req.entities)
 
         if not ingredient:
             return _err("substitute", "Missing required field: ingredient", req.confidence)
 
-        result = ingredient_service.get_substitutes(
-            ingredient=ingredient,
-            recipe=recipe,
-            max_results=max_results,
-            include_reasoning=include_reason,
-        )
+        # Session results are unconstrained, so constrained requests skip them
+        result = None if constraints else session_store.get_substitutes(
+            req.session_id, ingredient, recipe, max_results, include_reason)
+        if result:
+            result.source = "session"
+        else:
+            result = ingredient_service.get_substitutes(
+                ingredient=ingredient,
+                recipe=recipe,
+                max_results=max_results,
+                include_reasoning=include_reason,
+                constraints=constraints,
+            )
+            if not constraints:
+                session_store.put_substitutes(
+                    req.session_id, ingredient, recipe, max_results, include_reason, result)
+        if req.entities.get("recipe"):
+            session_store.set_last_recipe(req.session_id, recipe)
+        prefetcher.after_substitute(req.session_id, ingredient, recipe, result.items)
 
         data = {"substitutes": result.items}
         if include_reason and result.reasons:
             data["reasons"] = result.reasons
+        _with_constraints(data, constraints)
 
-        return UnifiedResponse(
+        return _rendered(req, UnifiedResponse(
             classification="substitute",
             data=data,
             source=result.source,
             confidence=req.confidence,
-        )
+        ))
     except Exception as e:
         return _err("substitute", str(e), req.confidence)
 
@@ -125,7 +336,7 @@ def context(req: UnifiedRequest):
     """
     Suggest ingredients matching taste / texture / colour / cooking method.
     entities: attributes{taste, texture, color, cooking_method},
-              natural_description, recipe_title, max_results
+              natural_description, recipe_title, max_results, constraints[]
     """
     try:
         # Support both flat entity keys and a nested attributes dict
@@ -138,6 +349,15 @@ def context(req: UnifiedRequest):
         natural_desc   = req.entities.get("natural_description")
         recipe_title   = req.entities.get("recipe_context") or req.entities.get("recipe")
         max_results    = req.entities.get("max_results")
+        constraints    = _constraints(req.entities)
+
+        # Reuse this session's parse of the same description
+        parsed = None
+        if natural_desc and req.session_id:
+            parsed = session_store.get_context(req.session_id, natural_desc)
+            if parsed is None:
+                parsed = ingredient_service.parse_description(natural_desc)
+                session_store.put_context(req.session_id, natural_desc, parsed)
 
         result = ingredient_service.get_context_suggestions(
             taste=taste,
@@ -147,14 +367,16 @@ def context(req: UnifiedRequest):
             recipe_title=recipe_title,
             natural_description=natural_desc,
             max_results=max_results,
+            parsed_context=parsed,
+            constraints=constraints,
         )
 
-        return UnifiedResponse(
+        return _rendered(req, UnifiedResponse(
             classification="context",
-            data={"ingredients": result.items},
+            data=_with_constraints({"ingredients": result.items}, constraints),
             source=result.source,
             confidence=req.confidence,
-        )
+        ))
     except Exception as e:
         return _err("context", str(e), req.confidence)
 
@@ -163,11 +385,12 @@ def context(req: UnifiedRequest):
 def suggest(req: UnifiedRequest):
     """
     Suggest recipes from a list of available ingredients (Supabase-first, GPT fallback).
-    entities: ingredients[] (required), max_results
+    entities: ingredients[] (required), max_results, constraints[]
     """
     try:
         ingredients = req.entities.get("ingredients")
         max_results = req.entities.get("max_results")
+        constraints = _constraints(req.entities)
 
         if not ingredients:
             return _err("suggest", "Missing required field: ingredients", req.confidence)
@@ -175,18 +398,20 @@ def suggest(req: UnifiedRequest):
         recipes, source = recipe_service.get_suggestions(
             ingredients=ingredients,
             max_results=max_results,
+            constraints=constraints,
         )
 
         # FIX: id/image exposed only when the result comes from Supabase
         from_db      = source == "dataset"
         recipes_data = [_recipe_row(r, from_db=from_db) for r in recipes]
+        prefetcher.after_recipes(req.session_id, [r.name for r in recipes])
 
-        return UnifiedResponse(
+        return _rendered(req, UnifiedResponse(
             classification="suggest",
-            data={"recipes": recipes_data},
+            data=_with_constraints({"recipes": recipes_data}, constraints),
             source=source,
             confidence=req.confidence,
-        )
+        ))
     except Exception as e:
         return _err("suggest", str(e), req.confidence)
 
@@ -194,7 +419,7 @@ def suggest(req: UnifiedRequest):
 @app.post("/similar")
 def similar(req: UnifiedRequest):
     """
-    Find recipes similar in style to a given recipe (GPT).
+    Find recipes similar to a given recipe (local recipe index, GPT fallback).
     entities: recipe (required), max_results
     """
     try:
@@ -204,17 +429,16 @@ def similar(req: UnifiedRequest):
         if not recipe:
             return _err("similar", "Missing required field: recipe", req.confidence)
 
-        recipes      = recipe_service.get_similar_recipes(recipe, max_results=max_results)
-        # FIX: was hardcoded "dataset" — this endpoint is GPT-only
-        source       = "gpt" if recipes else "none"
-        recipes_data = [_recipe_row(r, from_db=False) for r in recipes]
+        recipes, source = recipe_service.get_similar_recipes(recipe, max_results=max_results)
+        prefetcher.after_recipes(req.session_id, [r.name for r in recipes])
+        recipes_data = [_recipe_row(r, from_db=source == "dataset") for r in recipes]
 
-        return UnifiedResponse(
+        return _rendered(req, UnifiedResponse(
             classification="similar",
             data={"recipes": recipes_data},
             source=source,
             confidence=req.confidence,
-        )
+        ))
     except Exception as e:
         return _err("similar", str(e), req.confidence)
 
@@ -241,12 +465,12 @@ def specific(req: UnifiedRequest):
         source       = "gpt" if recipes else "none"
         recipes_data = [_recipe_row(r, from_db=False) for r in recipes]
 
-        return UnifiedResponse(
+        return _rendered(req, UnifiedResponse(
             classification="specific",
             data={"recipes": recipes_data},
             source=source,
             confidence=req.confidence,
-        )
+        ))
     except Exception as e:
         return _err("specific", str(e), req.confidence)
 
@@ -263,21 +487,24 @@ def lookup(req: UnifiedRequest):
         if not recipe:
             return _err("lookup", "Missing required field: recipe", req.confidence)
 
-        result = openai_service.get_recipe_details(recipe)
+        result, source = _recipe_details(req.session_id, recipe)
 
         if not result:
             return _err("lookup", f"Could not find details for recipe: {recipe}", req.confidence)
+        # /similar for corpus recipes is answered locally, nothing to prefetch
+        if recipe_service.recipe_index.find(recipe) is None:
+            prefetcher.after_lookup(req.session_id, recipe)
 
-        return UnifiedResponse(
+        return _rendered(req, UnifiedResponse(
             classification="lookup",
             data={
                 "name":           recipe,
                 "ingredients":    result.get("ingredients"),
                 "cooking_method": result.get("cooking_method"),
             },
-            source="gpt",
+            source=source,
             confidence=req.confidence,
-        )
+        ))
     except Exception as e:
         return _err("lookup", str(e), req.confidence)
 
@@ -306,12 +533,12 @@ def recipe_custom(req: UnifiedRequest):
         if not result:
             return _err("recipe_custom", "Could not generate recipe", req.confidence)
 
-        return UnifiedResponse(
+        return _rendered(req, UnifiedResponse(
             classification="recipe_custom",
             data=_recipe_row(result, from_db=False),
             source="gpt",
             confidence=req.confidence,
-        )
+        ))
     except Exception as e:
         return _err("recipe_custom", str(e), req.confidence)
 
@@ -319,18 +546,20 @@ def recipe_custom(req: UnifiedRequest):
 @app.post("/rewrite")
 def rewrite(req: UnifiedRequest):
     """
-    Rewrite a recipe by swapping exactly one ingredient.
-    entities: recipe (required), ingredient (required), replacement (required),
-              original_ingredients (optional — auto-fetched via GPT if absent)
+    Rewrite a recipe with one or more ingredient swaps in a single generation.
+    entities: recipe (required), ingredient + replacement or swaps[] (required),
+              original_ingredients (optional — auto-fetched via GPT if absent),
+              output ("full" or "diff" — only the changed ingredient lines and steps)
     """
     try:
-        recipe         = req.entities.get("recipe")
-        old_ingredient = req.entities.get("ingredient")
-        new_ingredient = req.entities.get("replacement")
+        recipe    = req.entities.get("recipe") or session_store.last_recipe(req.session_id)
+        swaps     = _swaps(req.entities)
+        diff_only = req.entities.get("output") == "diff"
         # Allow the caller to supply original_ingredients to skip an extra GPT call
-        original_str   = req.entities.get("original_ingredients")
+        original_str    = req.entities.get("original_ingredients")
+        original_method = ""
 
-        if not recipe or not old_ingredient or not new_ingredient:
+        if not recipe or not swaps:
             return _err(
                 "rewrite",
                 "Missing required fields: recipe, ingredient (old), and replacement (new)",
@@ -339,44 +568,227 @@ def rewrite(req: UnifiedRequest):
 
         # Auto-fetch original ingredients when not provided by the caller
         if not original_str:
-            recipe_details = openai_service.get_recipe_details(recipe)
+            recipe_details, _ = _recipe_details(req.session_id, recipe)
             if not recipe_details or "ingredients" not in recipe_details:
                 return _err("rewrite", f"Could not fetch ingredients for: {recipe}", req.confidence)
-            ing          = recipe_details["ingredients"]
-            original_str = ", ".join(ing) if isinstance(ing, list) else ing
-
-        result = openai_service.get_updated_recipe_with_substitution(
-            recipe_name=recipe,
-            original_ingredients=original_str,
-            original_ingredient=old_ingredient,
-            substitute_ingredient=new_ingredient,
-        )
+            ing             = recipe_details["ingredients"]
+            original_str    = ", ".join(ing) if isinstance(ing, list) else ing
+            method          = recipe_details.get("cooking_method") or ""
+            original_method = "\n".join(method) if isinstance(method, list) else method
+
+        if len(swaps) == 1 and not diff_only:
+            result = openai_service.get_updated_recipe_with_substitution(
+                recipe_name=recipe,
+                original_ingredients=original_str,
+                original_ingredient=swaps[0][0],
+                substitute_ingredient=swaps[0][1],
+            )
+        else:
+            result = openai_service.get_updated_recipe_with_substitutions(
+                recipe_name=recipe,
+                original_ingredients=original_str,
+                swaps=swaps,
+                diff_only=diff_only,
+                original_method=original_method,
+            )
 
         if not result:
             return _err("rewrite", "Could not rewrite recipe", req.confidence)
+        session_store.set_last_recipe(req.session_id, recipe)
 
-        return UnifiedResponse(
+        data = {"name": recipe, "swaps": [{"ingredient": old, "replacement": new} for old, new in swaps]}
+        if diff_only:
+            data["changed_ingredients"] = result.get("changed_ingredients")
+            data["changed_steps"]       = result.get("changed_steps")
+        else:
+            data["ingredients"]    = result.get("ingredients")
+            data["cooking_method"] = result.get("cooking_method")
+
+        return _rendered(req, UnifiedResponse(
             classification="rewrite",
-            data={
-                "name":           recipe,
-                "ingredients":    result.get("ingredients"),
-                "cooking_method": result.get("cooking_method"),
-            },
+            data=data,
             source="gpt",
             confidence=req.confidence,
-        )
+        ))
     except Exception as e:
         return _err("rewrite", str(e), req.confidence)
 
 
+@app.post("/recommend")
+def recommend(req: UnifiedRequest, request: Request):
+    """
+    Personalized home-page recipes (profile cuisine / skill / avoided ingredients).
+    The user is the one whose Supabase JWT is sent as `Authorization: Bearer`;
+    without one the results are anonymous.
+    entities: limit (1-50, default 6)
+    """
+    try:
+        limit = int(req.entities.get("limit") or 6)
+    except (TypeError, ValueError):
+        return JSONResponse(status_code=400, content=_err(
+            "recommend", "limit must be an integer", req.confidence).model_dump())
+    limit = min(max(limit, 1), 50)
+    try:
+        scheme, _, token = request.headers.get("authorization", "").partition(" ")
+        token = token.strip() if scheme.lower() == "bearer" else ""
+        recipes, source = recommendation_service.recommend(token=token or None, limit=limit)
+
+        return UnifiedResponse(
+            classification="recommend",
+            data={"recipes": recipes},
+            source=source,
+            confidence=req.confidence,
+        )
+    except Exception as e:
+        return _err("recommend", str(e), req.confidence)
+
+
+@app.get("/recipes/search")
+def search_recipes(
+    request: Request,
+    q: str = "",
+    ingredient: List[str] = Query(default=[]),
+    method: List[str] = Query(default=[]),
+    cuisine: List[str] = Query(default=[]),
+    cursor: Optional[str] = None,
+    limit: int = Query(default=20, ge=1, le=100),
+):
+    """
+    Search page backend: filtered, faceted, cursor-paginated recipe search.
+    Pass next_cursor back as `cursor` for the following page. Responses carry
+    a strong ETag of the snapshot version and query; If-None-Match gets a 304.
+    """
+    filters = {"ingredient": ingredient, "method": method, "cuisine": cuisine}
+    return _etag_json(
+        request, recipe_service.search_index.version(),
+        [q.strip().lower(), filters, cursor, limit],
+        lambda: recipe_service.search_recipes(q, filters, cursor, limit),
+        max_age=60,
+    )
+
+
+@app.get("/ingredients/search")
+def search_ingredients(
+    request: Request,
+    q: str = "",
+    category: List[str] = Query(default=[]),
+    flavor: List[str] = Query(default=[]),
+    texture: List[str] = Query(default=[]),
+    color: List[str] = Query(default=[]),
+    can_cook: List[str] = Query(default=[]),
+    offset: int = Query(default=0, ge=0),
+    limit: int = Query(default=50, ge=1, le=200),
+):
+    """
+    Ingredient search page backend: dataset entries filtered by name and facets,
+    with counts for every category / flavor / texture / color / can_cook value.
+    The ETag is keyed on the dataset version, so CDNs can cache it for an hour.
+    """
+    filters = {"category": category, "flavor": flavor, "texture": texture,
+               "color": color, "can_cook": can_cook}
+    return _etag_json(
+        request, ingredient_search.version(),
+        [q.strip().lower(), filters, offset, limit],
+        lambda: ingredient_search.search(q, filters, offset, limit),
+        max_age=3600,
+    )
+
+
+# ---------------------------------------------------------------------------
+# Warmup
+# ---------------------------------------------------------------------------
+
+def _build_services():
+    for service in LAZY_SERVICES:
+        resolve(service)
+
+
+def _replay_hot_queries() -> Dict[str, int]:
+    """Run each warmup query through its endpoint in-process, filling the response caches."""
+    endpoints = {route.path.strip("/"): route.endpoint for route in app.routes
+                 if isinstance(route, APIRoute) and "POST" in route.methods}
+    replayed = failed = 0
+    for body in load_warmup_queries(config.warmup_queries_path):
+        endpoint = endpoints.get(body["classification"])
+        try:
+            response = endpoint(UnifiedRequest(**body))
+            ok = getattr(response, "error", None) is None
+        except Exception as e:
+            logger.warning("Warmup query %s failed: %s", body["classification"], e)
+            ok = False
+        replayed += 1
+        failed += not ok
+    return {"replayed": replayed, "failed": failed}
+
+
+def _warmup_steps():
+    """Startup steps in order: build, parse and index first, then connect, then replay."""
+    return [
+        ("services", _build_services),
+        ("dataset", lambda: len(ingredient_service.dataset_service.entries())),
+        ("context_parser", lambda: (ingredient_service.context_parser.automaton,
+                                    intent_classifier.extractor.context_parser.automaton)),
+        ("entity_extractor", lambda: intent_classifier.extractor.automaton),
+        ("intent_model", lambda: intent_classifier.ensure_loaded()),
+        ("recipe_index", lambda: recipe_service.recipe_index.ensure_loaded()),
+        ("recipe_search", lambda: recipe_service.search_index.ensure_loaded()),
+        ("ingredient_search", lambda: ingredient_search.ensure_loaded()),
+        ("recommendations", lambda: recommendation_service.ensure_loaded()),
+        ("llm_connections", lambda: openai_service.warm_connections()),
+        ("supabase_connection", lambda: recipe_service.supabase.warm() if recipe_service.supabase else None),
+        ("hot_queries", _replay_hot_queries),
+    ]
+
+
 # ---------------------------------------------------------------------------
 # Health Check
 # ---------------------------------------------------------------------------
 
+@app.get("/live")
+def live():
+    """Liveness: the process answers. Builds nothing, so it never restarts a slow-starting worker."""
+    return {"status": "alive"}
+
+
+@app.get("/ready")
+def ready():
+    """Readiness: warmup has finished and every service is built; 503 otherwise."""
+    if not warmup.ready:
+        return JSONResponse(status_code=503, content={"status": "warming_up", "warmup": warmup.snapshot()})
+    try:
+        _build_services()
+    except Exception as e:
+        logger.exception("Service construction failed")
+        return JSONResponse(status_code=503, content={"status": "not_ready", "error": str(e)})
+    return {"status": "ready", "warmup_ms": warmup.duration_ms}
+
+
 @app.get("/health")
 def health():
     return {
         "status":             "ok",
         "openai_available":   openai_service.is_available,
-        "supabase_available": recipe_service._supabase is not None,
+        "supabase_available": recipe_service.supabase is not None,
+        "supabase_breaker":   recipe_service.supabase.breaker.state if recipe_service.supabase else "disabled",
+    }
+
+
+@app.get("/metrics")
+def metrics():
+    """Per-route LLM latency and token usage by A/B variant, cache and precomputed-store hits, admission queues, the Supabase breaker, log drops and warmup steps."""
+    return {
+        "routes": openai_service.router.snapshot(),
+        "providers": openai_service.providers.snapshot(),
+        "prompts": prompt_snapshot(),
+        "cache": openai_service.cache.snapshot(),
+        "precomputed": response_store.snapshot(),
+        "sessions": session_store.snapshot(),
+        "prefetch": prefetcher.snapshot(),
+        "recipe_index": recipe_service.recipe_index.snapshot(),
+        "recommendations": recommendation_service.snapshot(),
+        "intents": intent_classifier.snapshot(),
+        "admission": admission.snapshot(),
+        "supabase": recipe_service.supabase.snapshot() if recipe_service.supabase else None,
+        "logging": log_pipeline.snapshot(),
+        "warmup": warmup.snapshot(),
     }
\ No newline at end of file
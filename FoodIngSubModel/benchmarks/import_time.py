@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Import-time (cold start) benchmark for FoodIngSubModel.
+
+Imports backend_api in fresh interpreters under `python -X importtime` and
+reports the median cumulative import time and the slowest modules. Fails if
+the import got slower than the committed baseline allows, or if a module that
+must stay lazy (the OpenAI SDK, httpx, supabase) is imported at startup.
+
+Usage (from FoodIngSubModel/):
+    python -m benchmarks.import_time                      # report + check baseline
+    python -m benchmarks.import_time --update-baseline    # rewrite import_baseline.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Any, Dict, List, Tuple
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "import_baseline.json")
+# Built on first use by the services; importing them at startup is a regression
+LAZY_MODULES = ("openai", "httpx", "supabase")
+
+
+def parse_importtime(stderr: str) -> Dict[str, Tuple[int, int]]:
+    """Module name -> (self us, cumulative us) from `-X importtime` output."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        if not self_us.strip().isdigit():
+            continue  # the header row
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def measure(module: str = "backend_api", runs: int = 5) -> Dict[str, Any]:
+    """Median cumulative import time of `module` over `runs` fresh interpreters."""
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1", LOG_LEVEL="ERROR")
+    totals, samples = [], []
+    for _ in range(runs):
+        completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                                   cwd=PROJECT_DIR, env=env, capture_output=True, text=True, check=True)
+        modules = parse_importtime(completed.stderr)
+        totals.append(modules[module][1] / 1000)
+        samples.append(modules)
+    last = samples[-1]
+    slowest = sorted(last.items(), key=lambda item: item[1][0], reverse=True)[:10]
+    return {
+        "module": module,
+        "runs": runs,
+        "cumulative_ms": round(statistics.median(totals), 1),
+        "min_ms": round(min(totals), 1),
+        "slowest_self_ms": {name: round(times[0] / 1000, 1) for name, times in slowest},
+        "lazy_modules_imported": [name for name in LAZY_MODULES if name in last],
+    }
+
+
+def compare_to_baseline(result: Dict[str, Any], baseline: Dict[str, Any],
+                        tolerance: float, min_delta_ms: float) -> List[str]:
+    """List regressions: slower cumulative import beyond tolerance, eagerly imported SDKs."""
+    regressions = []
+    base_ms = baseline.get("cumulative_ms")
+    if base_ms is not None:
+        current = result["cumulative_ms"]
+        if current > base_ms * (1 + tolerance) and current - base_ms > min_delta_ms:
+            regressions.append(f"import {result['module']}: {current:.1f}ms > baseline "
+                               f"{base_ms:.1f}ms (+{tolerance:.0%})")
+    for name in result["lazy_modules_imported"]:
+        regressions.append(f"{name} is imported at startup; import it on first use")
+    return regressions
+
+
+def print_report(result: Dict[str, Any]):
+    print(f"import {result['module']}: median {result['cumulative_ms']:.1f}ms, "
+          f"min {result['min_ms']:.1f}ms over {result['runs']} runs")
+    print("Slowest modules (self time):")
+    for name, ms in result["slowest_self_ms"].items():
+        print(f"  {ms:>8.1f}ms  {name}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="backend_api")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=0.3,
+                        help="Allowed relative slowdown before flagging (default: 0.3)")
+    parser.add_argument("--min-delta-ms", type=float, default=30.0,
+                        help="Ignore slowdowns smaller than this (default: 30ms)")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--json", action="store_true", help="Print the result as JSON")
+    args = parser.parse_args(argv)
+
+    result = measure(args.module, args.runs)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_report(result)
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"module": result["module"], "runs": result["runs"],
+                       "cumulative_ms": result["cumulative_ms"]}, f, indent=2)
+            f.write("\n")
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    regressions = compare_to_baseline(result, baseline, args.tolerance, args.min_delta_ms)
+    if regressions:
+        print("\nRegressions against baseline:")
+        for line in regressions:
+            print(f"  - {line}")
+        return 1
+    print("\nNo regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Cassette Replay Clients for the Benchmark Suite
+
+Drop-in stand-ins for the OpenAI client used by OpenAIService and the httpx
+transport under RecipeService's SupabaseClient. They answer from recorded cassette files (optionally sleeping to
+inject latency) so benchmarks exercise the real service code deterministically,
+and can wrap live ones to record new cassettes.
+"""
+
+import json
+import os
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+CASSETTE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cassettes")
+
+
+def load_cassette(name: str) -> Dict[str, Any]:
+    """Load a cassette by file name from the cassettes directory (or a path)."""
+    path = name if os.path.isabs(name) else os.path.join(CASSETTE_DIR, name)
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_cassette(name: str, data: Dict[str, Any]):
+    """Write a cassette to the cassettes directory (or a path)."""
+    path = name if os.path.isabs(name) else os.path.join(CASSETTE_DIR, name)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+
+
+class CassetteMiss(LookupError):
+    """Raised when no recorded interaction matches a request."""
+
+
+class _Latency:
+    """Injected latency: fixed milliseconds, or the recorded value when None."""
+
+    def __init__(self, fixed_ms: Optional[float] = 0.0, scale: float = 1.0):
+        self.fixed_ms = fixed_ms
+        self.scale = scale
+
+    def sleep(self, recorded_ms: Optional[float]):
+        ms = self.fixed_ms if self.fixed_ms is not None else (recorded_ms or 0.0)
+        if ms and ms > 0:
+            time.sleep(ms * self.scale / 1000.0)
+
+
+# ---------------------------------------------------------------------------
+# OpenAI
+# ---------------------------------------------------------------------------
+
+def match_chat_interaction(interactions: List[Dict[str, Any]],
+                           messages: List[Dict[str, str]]) -> Dict[str, Any]:
+    """First interaction whose `match` text appears in the user message
+    (and whose optional `system_contains` text appears in the system message)."""
+    system = next((m["content"] for m in messages if m["role"] == "system"), "")
+    user = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+    for interaction in interactions:
+        if interaction.get("match", "") not in user:
+            continue
+        if interaction.get("system_contains", "") not in system:
+            continue
+        return interaction
+    raise CassetteMiss(f"No recorded completion for user message: {user[:80]!r}")
+
+
+def chat_completion(content: str, model: str, usage: Optional[Dict[str, int]] = None) -> SimpleNamespace:
+    """Build an object shaped like an OpenAI ChatCompletion response."""
+    usage = usage or {}
+    return SimpleNamespace(
+        model=model,
+        choices=[SimpleNamespace(index=0, finish_reason="stop",
+                                 message=SimpleNamespace(role="assistant", content=content))],
+        usage=SimpleNamespace(
+            prompt_tokens=usage.get("prompt_tokens", 0),
+            completion_tokens=usage.get("completion_tokens", 0),
+            total_tokens=usage.get("prompt_tokens", 0) + usage.get("completion_tokens", 0),
+            prompt_tokens_details=SimpleNamespace(cached_tokens=usage.get("cached_tokens", 0)),
+        ),
+    )
+
+
+class ChunkStream:
+    """An OpenAI `Stream` stand-in: a closable iterator of chat.completion.chunk objects."""
+
+    def __init__(self, response: SimpleNamespace):
+        content = response.choices[0].message.content
+        self._chunks = [
+            SimpleNamespace(model=response.model, usage=None,
+                            choices=[SimpleNamespace(index=0, finish_reason="stop",
+                                                     delta=SimpleNamespace(content=content))]),
+            # With stream_options={"include_usage": True} usage comes last, without choices
+            SimpleNamespace(model=response.model, usage=response.usage, choices=[]),
+        ]
+
+    def __iter__(self):
+        return iter(self._chunks)
+
+    def __enter__(self) -> "ChunkStream":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._chunks = []
+
+
+class _ReplayCompletions:
+    def __init__(self, owner: "ReplayOpenAIClient"):
+        self._owner = owner
+
+    def create(self, model: str, messages: List[Dict[str, str]], **kwargs):
+        owner = self._owner
+        interaction = match_chat_interaction(owner.interactions, messages)
+        owner.latency.sleep(interaction.get("latency_ms"))
+        with owner._lock:
+            owner.calls += 1
+        response = chat_completion(interaction["response"], model, interaction.get("usage"))
+        return ChunkStream(response) if kwargs.get("stream") else response
+
+
+class ReplayOpenAIClient:
+    """Answers `chat.completions.create` from an OpenAI cassette."""
+
+    def __init__(self, cassette: Dict[str, Any], latency_ms: Optional[float] = 0.0,
+                 latency_scale: float = 1.0):
+        self.interactions = cassette.get("interactions", [])
+        self.latency = _Latency(latency_ms, latency_scale)
+        self.calls = 0
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=_ReplayCompletions(self))
+
+
+class _RecordingCompletions:
+    def __init__(self, owner: "RecordingOpenAIClient"):
+        self._owner = owner
+
+    def create(self, model: str, messages: List[Dict[str, str]], **kwargs):
+        started = time.perf_counter()
+        stream = kwargs.pop("stream", False)
+        # Recorded unstreamed; a streamed call is replayed to the caller as chunks
+        kwargs.pop("stream_options", None)
+        response = self._owner.client.chat.completions.create(model=model, messages=messages, **kwargs)
+        usage = getattr(response, "usage", None)
+        user = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+        self._owner.interactions.append({
+            "match": user,
+            "response": response.choices[0].message.content,
+            "usage": {
+                "prompt_tokens": getattr(usage, "prompt_tokens", 0),
+                "cached_tokens": getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", 0) or 0,
+                "completion_tokens": getattr(usage, "completion_tokens", 0),
+            },
+            "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+        })
+        return ChunkStream(response) if stream else response
+
+
+class RecordingOpenAIClient:
+    """Wraps a live OpenAI client and captures each completion for a cassette."""
+
+    def __init__(self, client: Any):
+        self.client = client
+        self.interactions: List[Dict[str, Any]] = []
+        self.chat = SimpleNamespace(completions=_RecordingCompletions(self))
+
+    def cassette(self) -> Dict[str, Any]:
+        return {"interactions": self.interactions}
+
+
+# ---------------------------------------------------------------------------
+# Supabase
+# ---------------------------------------------------------------------------
+
+def match_rpc_interaction(interactions: List[Dict[str, Any]], function: str,
+                          params: Dict[str, Any]) -> Dict[str, Any]:
+    """First interaction for `function` whose `params` are a subset of the call's."""
+    for interaction in interactions:
+        if interaction.get("function") != function:
+            continue
+        expected = interaction.get("params") or {}
+        if all(params.get(k) == v for k, v in expected.items()):
+            return interaction
+    raise CassetteMiss(f"No recorded RPC for {function}({params})")
+
+
+def _rpc_call(request: httpx.Request) -> Tuple[str, Dict[str, Any]]:
+    """Function name and JSON params of a PostgREST `/rest/v1/rpc/{function}` request."""
+    function = request.url.path.rsplit("/rpc/", 1)[-1]
+    params = json.loads(request.content or b"{}")
+    return function, params
+
+
+class ReplaySupabaseTransport(httpx.BaseTransport):
+    """httpx transport answering SupabaseClient RPCs from a Supabase cassette."""
+
+    def __init__(self, cassette: Dict[str, Any], latency_ms: Optional[float] = 0.0,
+                 latency_scale: float = 1.0):
+        self.interactions = cassette.get("interactions", [])
+        self.latency = _Latency(latency_ms, latency_scale)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        function, params = _rpc_call(request)
+        interaction = match_rpc_interaction(self.interactions, function, params)
+        self.latency.sleep(interaction.get("latency_ms"))
+        with self._lock:
+            self.calls += 1
+        return httpx.Response(200, json=interaction.get("data", []))
+
+
+class RecordingSupabaseTransport(httpx.BaseTransport):
+    """Wraps a live httpx transport and captures each RPC for a cassette."""
+
+    def __init__(self, transport: Optional[httpx.BaseTransport] = None):
+        self.transport = transport or httpx.HTTPTransport()
+        self.interactions: List[Dict[str, Any]] = []
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        response = self.transport.handle_request(request)
+        response.read()
+        if "/rpc/" in request.url.path and response.status_code < 400:
+            function, params = _rpc_call(request)
+            self.interactions.append({
+                "function": function,
+                "params": params,
+                "data": response.json(),
+                "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+            })
+        return response
+
+    def close(self):
+        self.transport.close()
+
+    def cassette(self) -> Dict[str, Any]:
+        return {"interactions": self.interactions}
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Deterministic endpoint benchmarks for FoodIngSubModel.
+
+Drives every scenario in benchmarks/scenarios.json through the FastAPI app with
+the real OpenAIService / IngredientService / RecipeService, whose OpenAI and
+Supabase clients are replaced by cassette replays. Reports p50/p95/p99 latency,
+throughput and upstream calls per request, and compares against the committed
+baseline so regressions show up in review.
+
+Usage (from FoodIngSubModel/):
+    python -m benchmarks.run_benchmarks                      # report + check baseline
+    python -m benchmarks.run_benchmarks --openai-latency-ms recorded
+    python -m benchmarks.run_benchmarks --update-baseline    # rewrite baseline.json
+    python -m benchmarks.run_benchmarks --record             # re-record cassettes (needs keys)
+"""
+
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+from unittest.mock import patch
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from benchmarks.replay import (  # noqa: E402
+    RecordingOpenAIClient, RecordingSupabaseTransport, ReplayOpenAIClient,
+    ReplaySupabaseTransport, load_cassette, save_cassette,
+)
+
+SCENARIOS_PATH = os.path.join(BENCH_DIR, "scenarios.json")
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Linear-interpolated percentile, q in [0, 100]."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    pos = (len(ordered) - 1) * q / 100.0
+    lower = int(pos)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (pos - lower)
+
+
+def _parse_latency(value: str) -> Optional[float]:
+    """'recorded' -> None (use cassette latency), otherwise milliseconds."""
+    return None if value == "recorded" else float(value)
+
+
+@contextmanager
+def replay_services(openai_latency_ms: Optional[float] = 0.0,
+                    supabase_latency_ms: Optional[float] = 0.0,
+                    latency_scale: float = 1.0, record: bool = False):
+    """Install real services backed by replay (or recording) clients into backend_api."""
+    import backend_api
+    from services.ingredient_service import IngredientService
+    from services.openai_service import OpenAIService
+    from services.recipe_service import RecipeService
+    from services.supabase_client import SupabaseClient
+
+    from services.response_store import ResponseStore
+
+    config = backend_api.config
+    openai_service = OpenAIService(config)
+    recipe_service = RecipeService(config, openai_service)
+    # Benchmarks measure the live path; keep any locally precomputed answers out
+    store_dir = tempfile.TemporaryDirectory()
+    response_store = ResponseStore(config, path=os.path.join(store_dir.name, "responses.jsonl"))
+    ingredient_service = IngredientService(config, openai_service, response_store)
+
+    if record:
+        if not openai_service._client or recipe_service.supabase is None:
+            raise SystemExit("Recording needs OPENAI_API_KEY and VITE_SUPABASE_URL/ANON_KEY")
+        openai_client = RecordingOpenAIClient(openai_service._client)
+        supabase_client = RecordingSupabaseTransport()
+    else:
+        openai_client = ReplayOpenAIClient(load_cassette("openai.json"),
+                                           openai_latency_ms, latency_scale)
+        supabase_client = ReplaySupabaseTransport(load_cassette("supabase.json"),
+                                                  supabase_latency_ms, latency_scale)
+
+    openai_service._client = openai_client
+    # The real SupabaseClient (breaker, timeouts) over a replaying or recording transport
+    recipe_service.supabase = SupabaseClient(config, url=config.supabase_url or "http://supabase.replay",
+                                             key=config.supabase_key or "replay", transport=supabase_client)
+
+    with store_dir, patch.multiple(backend_api, openai_service=openai_service,
+                                   ingredient_service=ingredient_service,
+                                   recipe_service=recipe_service,
+                                   response_store=response_store):
+        yield backend_api.app, openai_client, supabase_client
+
+
+def run_scenario(client, scenario: Dict[str, Any], iterations: int, warmup: int,
+                 openai_client, supabase_client, reset=None) -> Dict[str, Any]:
+    """Run one scenario and summarise its latency and upstream calls.
+
+    `reset` is called before every request (e.g. to clear response caches).
+    """
+    endpoint, payload = scenario["endpoint"], scenario["payload"]
+    reset = reset or (lambda: None)
+    for _ in range(warmup):
+        reset()
+        client.post(endpoint, json=payload)
+
+    calls_before = (getattr(openai_client, "calls", 0), getattr(supabase_client, "calls", 0))
+    latencies, errors = [], 0
+    started = time.perf_counter()
+    for _ in range(iterations):
+        reset()
+        t0 = time.perf_counter()
+        response = client.post(endpoint, json=payload)
+        latencies.append((time.perf_counter() - t0) * 1000.0)
+        if response.status_code != 200 or response.json().get("error"):
+            errors += 1
+    elapsed = time.perf_counter() - started
+
+    return {
+        "endpoint": endpoint,
+        "iterations": iterations,
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "mean_ms": round(statistics.fmean(latencies), 3) if latencies else 0.0,
+        "throughput_rps": round(iterations / elapsed, 1) if elapsed else 0.0,
+        "openai_calls_per_request": round(
+            (getattr(openai_client, "calls", 0) - calls_before[0]) / iterations, 3),
+        "supabase_calls_per_request": round(
+            (getattr(supabase_client, "calls", 0) - calls_before[1]) / iterations, 3),
+    }
+
+
+def run_benchmarks(iterations: int = 50, warmup: int = 3, only: Optional[List[str]] = None,
+                   openai_latency_ms: Optional[float] = 0.0,
+                   supabase_latency_ms: Optional[float] = 0.0,
+                   latency_scale: float = 1.0, record: bool = False,
+                   warm_cache: bool = False) -> Dict[str, Any]:
+    """Run all (or selected) scenarios and return results keyed by scenario name.
+
+    Response caches are cleared before every request unless `warm_cache` is set,
+    so results measure the upstream path the baseline was recorded against.
+    """
+    from fastapi.testclient import TestClient
+
+    with open(SCENARIOS_PATH, "r", encoding="utf-8") as f:
+        scenarios = json.load(f)["scenarios"]
+    if only:
+        scenarios = [s for s in scenarios if s["name"] in only]
+
+    results = {}
+    with replay_services(openai_latency_ms, supabase_latency_ms, latency_scale,
+                         record) as (app, openai_client, supabase_client):
+        client = TestClient(app)
+        import backend_api
+        reset = None if warm_cache else backend_api.openai_service.cache.clear
+        for scenario in scenarios:
+            results[scenario["name"]] = run_scenario(
+                client, scenario, iterations, warmup, openai_client, supabase_client, reset)
+
+        if record:
+            save_cassette("openai.json", openai_client.cassette())
+            save_cassette("supabase.json", supabase_client.cassette())
+    return results
+
+
+def compare_to_baseline(results: Dict[str, Any], baseline: Dict[str, Any],
+                        tolerance: float, min_delta_ms: float) -> List[str]:
+    """List regressions: slower p95 beyond tolerance, more upstream calls, new errors."""
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base:
+            continue
+        allowed = base["p95_ms"] * (1 + tolerance)
+        if current["p95_ms"] > allowed and current["p95_ms"] - base["p95_ms"] > min_delta_ms:
+            regressions.append(f"{name}: p95 {current['p95_ms']:.2f}ms > baseline "
+                               f"{base['p95_ms']:.2f}ms (+{tolerance:.0%})")
+        for key in ("openai_calls_per_request", "supabase_calls_per_request", "errors"):
+            if current[key] > base.get(key, 0):
+                regressions.append(f"{name}: {key} {current[key]} > baseline {base.get(key, 0)}")
+    return regressions
+
+
+def print_report(results: Dict[str, Any]):
+    header = (f"{'scenario':<28}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+              f"{'rps':>9}{'openai':>8}{'supa':>6}{'err':>5}")
+    print(header)
+    print("-" * len(header))
+    for name, r in results.items():
+        print(f"{name:<28}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}{r['p99_ms']:>9.2f}"
+              f"{r['throughput_rps']:>9.1f}{r['openai_calls_per_request']:>8.2f}"
+              f"{r['supabase_calls_per_request']:>6.2f}{r['errors']:>5}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--scenario", action="append", help="Run only the named scenario(s)")
+    parser.add_argument("--openai-latency-ms", default="0",
+                        help="Injected OpenAI latency in ms, or 'recorded' (default: 0)")
+    parser.add_argument("--supabase-latency-ms", default="0",
+                        help="Injected Supabase latency in ms, or 'recorded' (default: 0)")
+    parser.add_argument("--latency-scale", type=float, default=1.0,
+                        help="Multiplier applied to injected latency")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=0.5,
+                        help="Allowed relative p95 slowdown before flagging (default: 0.5)")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0,
+                        help="Ignore p95 slowdowns smaller than this (default: 2ms)")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--record", action="store_true",
+                        help="Call the live APIs and overwrite the cassettes")
+    parser.add_argument("--warm-cache", action="store_true",
+                        help="Keep LLM response caches between requests")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.INFO)
+    if args.record:
+        # Each scenario is captured once; replays are deterministic afterwards
+        args.iterations, args.warmup = 1, 0
+    results = run_benchmarks(
+        iterations=args.iterations, warmup=args.warmup, only=args.scenario,
+        openai_latency_ms=_parse_latency(args.openai_latency_ms),
+        supabase_latency_ms=_parse_latency(args.supabase_latency_ms),
+        latency_scale=args.latency_scale, record=args.record, warm_cache=args.warm_cache,
+    )
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_report(results)
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"iterations": args.iterations, "scenarios": results}, f, indent=2)
+            f.write("\n")
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results, baseline, args.tolerance, args.min_delta_ms)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for line in regressions:
+                print(f"  - {line}")
+            return 1
+        print("\nNo regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,7 +6,8 @@ Centralized configuration handling for the ingredient substitution and recipe su
 """
 
 import os
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Dict, List
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -19,16 +20,186 @@ class Config:
     openai_model: str = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
     gemini_model: str = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
     
+    # Upstream endpoints (point these at loadtest/ fakes for local load testing)
+    openai_base_url: str = os.getenv("OPENAI_BASE_URL") or None
+    supabase_url: str = os.getenv("SUPABASE_URL") or os.getenv("VITE_SUPABASE_URL")
+    supabase_key: str = os.getenv("SUPABASE_KEY") or os.getenv("VITE_SUPABASE_ANON_KEY")
+    gemini_base_url: str = os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com/v1beta/openai/")
+    
+    # Supabase access (services/supabase_client.py): pooled connections, per-call timeouts, breaker
+    supabase_timeout: float = float(os.getenv("SUPABASE_TIMEOUT", "3.0"))
+    supabase_connect_timeout: float = 1.0
+    supabase_max_connections: int = 20
+    supabase_max_keepalive: int = 10
+    supabase_keepalive_expiry: float = 30.0
+    supabase_breaker_failures: int = 5     # consecutive failures before the breaker opens
+    supabase_breaker_reset: float = 30.0   # seconds open before one trial call
+    
+    # LLM providers behind OpenAIService, tried fastest-healthy-first ("fake" answers in-process)
+    llm_providers: List[str] = field(default_factory=lambda: [
+        name.strip() for name in os.getenv("LLM_PROVIDERS", "openai,gemini").split(",") if name.strip()])
+    llm_deadline: float = 30.0             # seconds for one call, failovers included
+    provider_window: int = 50              # recent calls per provider behind its latency/error rate
+    provider_min_samples: int = 5          # calls before a provider can be marked unhealthy
+    provider_max_error_rate: float = 0.5
+    provider_cooldown: float = 30.0        # seconds before an unhealthy provider is retried
+    # Hedged LLM calls: one duplicate once a call outlasts its route's rolling p90
+    hedge_enabled: bool = os.getenv("LLM_HEDGE", "1") != "0"
+    hedge_percentile: float = 0.9
+    hedge_window: int = 200                # recent successful calls per route
+    hedge_min_samples: int = 20            # calls on a route before it is hedged
+    hedge_budget: float = 0.05             # at most this many extra calls per call
+    hedge_burst: float = 5.0               # hedges that can be saved up for a slow spell
+    hedge_max_workers: int = 16            # floor; the pool also fits two calls per admission slot
+    
+    # Admission control: concurrent requests and queued waiters per classification endpoint
+    admission_enabled: bool = os.getenv("ADMISSION", "1") != "0"
+    admission_limits: Dict[str, int] = field(default_factory=lambda: {
+        "substitute": 8,
+        "context": 6,
+        "suggest": 6,
+        "similar": 4,
+        "specific": 3,
+        "lookup": 4,
+        "recipe_custom": 2,
+        "rewrite": 3,
+        "classify": 4,
+        "recommend": 8,
+    })
+    admission_queue_size: int = 32
+    admission_deadline: float = 10.0       # longest queue wait before a request is shed
+    # Answered from the dataset and caches only, instead of shed, while saturated
+    admission_degradable: List[str] = field(default_factory=lambda: ["context", "substitute"])
+    
+    # Startup warmup (services/warmup.py): /ready answers 503 until it has run
+    warmup_enabled: bool = os.getenv("WARMUP", "1") != "0"
+    warmup_timeout: float = 5.0         # seconds per connection-warming call
+    # UnifiedRequest bodies replayed into the caches at startup
+    warmup_queries_path: str = os.getenv(
+        "WARMUP_QUERIES_PATH",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "warmup_queries.json"),
+    )
+    
     # Generation limits
     max_substitutes: int = 5
     max_recipes: int = 5
     max_ingredients: int = 5
     
+    # Retrieval-augmented GPT supplementation: GPT picks dataset candidates by id instead of writing names
+    rag_enabled: bool = os.getenv("RAG_SUPPLEMENT", "1") != "0"
+    rag_candidates: int = 30            # candidates packed into one prompt
+    
+    # Dietary constraints: results fetched per constraint-filtered answer, so one filter pass usually suffices
+    constraint_overfetch: int = 2
+    
+    # Logging (services/log_pipeline.py): queued records written by one thread
+    log_level: str = os.getenv("LOG_LEVEL", "INFO")
+    log_format: str = os.getenv("LOG_FORMAT", "json")   # "json" or "text"
+    log_queue_size: int = 10000         # records waiting for the writer; overflow is dropped
+    log_rate_limit: float = 50.0        # records per second per logger below ERROR
+    log_rate_burst: float = 200.0
+    # httpx logs every request at INFO, which is every Supabase and LLM call
+    log_levels: Dict[str, str] = field(default_factory=lambda: {"httpx": "WARNING", "httpcore": "WARNING"})
+    # Share of DEBUG records kept, per logger name (children included)
+    log_sample_rates: Dict[str, float] = field(default_factory=lambda: {
+        "services.recipe_service": 0.1,
+        "services.prefetcher": 0.1,
+    })
+    
+    # Local natural-description parser: below this confidence the LLM parser is used
+    context_parser_min_confidence: float = 0.6
+    
     # API settings
     temperature: float = 0.3
     top_p: float = 0.9
     repetition_penalty: float = 1.1
     
+    # Per-route model/max_tokens/temperature table (hot-reloaded on change)
+    model_routes_path: str = os.getenv(
+        "MODEL_ROUTES_PATH",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "model_routes.json"),
+    )
+    model_routes_reload_interval: float = 2.0
+    
+    # LLM response cache: exact tier plus semantic near-duplicate tier
+    response_cache_size: int = 2048
+    response_cache_ttl: float = 6 * 3600
+    semantic_cache_enabled: bool = os.getenv("SEMANTIC_CACHE", "1") != "0"
+    semantic_cache_embeddings: bool = os.getenv("SEMANTIC_CACHE_EMBEDDINGS") == "1"
+    semantic_cache_candidates: int = 256
+    semantic_cache_audit_path: str = os.getenv("SEMANTIC_CACHE_AUDIT_PATH") or None
+    embedding_model: str = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+    # Minimum similarity per classification; 1.0 disables the semantic tier
+    semantic_cache_thresholds: Dict[str, float] = field(default_factory=lambda: {
+        "substitute": 0.8,
+        "context": 0.85,
+        "suggest": 0.75,
+        "similar": 0.9,
+        "lookup": 0.9,
+        "specific": 1.0,
+        "recipe_custom": 1.0,
+        "rewrite": 1.0,
+    })
+    
+    # Precomputed answers (precompute/bulk_precompute.py) read before calling OpenAI
+    response_store_path: str = os.getenv(
+        "RESPONSE_STORE_PATH",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "precompute", "responses.jsonl"),
+    )
+    response_store_reload_interval: float = 5.0
+    # Serve recipe-independent substitutes when none were precomputed for the recipe;
+    # off by default, as they ignore the recipe context (egg in a cake vs. an omelette)
+    precomputed_substitutes_any_recipe: bool = os.getenv("PRECOMPUTED_SUBSTITUTES_ANY_RECIPE", "0") == "1"
+    
+    # Per-chat-session memory of recent results (UnifiedRequest.session_id)
+    session_store_size: int = 1000      # sessions kept
+    session_ttl: float = 30 * 60        # seconds of inactivity before eviction
+    session_max_items: int = 32         # results kept per kind per session
+    
+    # Speculative prefetch of the next likely call (session requests only)
+    prefetch_enabled: bool = os.getenv("PREFETCH", "1") != "0"
+    prefetch_background: bool = True   # run on a worker thread (tests drain it manually)
+    prefetch_session_budget: int = 4    # prefetches per session per session_ttl
+    prefetch_max_per_minute: int = 30   # global cap, keeps rate-limit headroom for users
+    prefetch_queue_size: int = 64
+    prefetch_max_age: float = 30.0      # seconds before a queued prefetch is stale
+    prefetch_rate_limit_cooldown: float = 60.0  # pause after an OpenAI 429
+    
+    # Local snapshot of the Supabase recipes table (precompute/recipe_snapshot.py)
+    recipe_snapshot_path: str = os.getenv(
+        "RECIPE_SNAPSHOT_PATH",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "precompute", "recipes.jsonl"),
+    )
+    # MinHash/LSH similar-recipe index: num_perm = bands * rows per band
+    recipe_index_num_perm: int = 64
+    recipe_index_bands: int = 32
+    recipe_index_max_df: float = 0.2    # ingredients in more recipes than this (salt, water) are ignored
+    
+    # Personalized home-page recommendations (/recommend)
+    recommend_pool_size: int = 200      # top-rated candidates kept per cuisine pool and overall
+    recommend_cache_size: int = 5000    # cached result lists (per user, day and limit)
+    recommend_cache_ttl: float = 300.0  # profile edits show up within this many seconds
+
+    # Local intent classifier (/classify): below this confidence the LLM classifier is used
+    intent_min_confidence: float = 0.7
+    intent_num_features: int = 1 << 18  # hashed n-gram feature space
+    intent_seed_path: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dataset", "intent_examples.jsonl")
+    # Trained weights (precompute/train_intent.py); trained from the seed examples if missing
+    intent_model_path: str = os.getenv(
+        "INTENT_MODEL_PATH",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "precompute", "intent_model.json"),
+    )
+    # With INTENT_LOG=1, classified messages (raw user text) are appended here by a
+    # background writer; LLM-labelled lines are training data
+    intent_log_enabled: bool = os.getenv("INTENT_LOG", "0") == "1"
+    intent_log_path: str = os.getenv(
+        "INTENT_LOG_PATH",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "precompute", "intent_log.jsonl"),
+    )
+    intent_log_max_bytes: int = 10 * 1024 * 1024   # rotated to .1, .2, ... past this size
+    intent_log_backups: int = 3
+    intent_log_queue_size: int = 1000              # lines waiting for the writer; more are dropped
+
     # Paths (relative to project root)
     base_dir: str = os.path.dirname(os.path.abspath(__file__))
     dataset_path: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dataset", "ingredients.json")
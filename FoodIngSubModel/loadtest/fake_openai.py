@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Local fake of the OpenAI Chat Completions API.
+
+Serves POST /v1/chat/completions (plain and `stream: true` SSE) with fault
+injection from loadtest/faults.py. Answers come from the benchmark cassette when
+a recorded interaction matches, otherwise from a canned reply in the format the
+system prompt asks for, so every OpenAIService method parses successfully.
+
+Also implements the Batch API subset used by precompute/bulk_precompute.py:
+POST /v1/files, GET /v1/files/{id}/content, POST /v1/batches and
+GET /v1/batches/{id}. A batch completes on its first poll after creation;
+--error-rate fails individual batch items.
+
+Usage (from FoodIngSubModel/):
+    python -m loadtest.fake_openai --port 9001 --latency lognormal:800,0.5 --rate-limit-rate 0.02
+    OPENAI_BASE_URL=http://127.0.0.1:9001/v1 OPENAI_API_KEY=fake uvicorn backend_api:app --port 8080
+"""
+
+import argparse
+import json
+import re
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+from benchmarks.replay import CassetteMiss, load_cassette, match_chat_interaction
+from loadtest.faults import FaultProfile, add_fault_arguments
+from services.llm_providers import canned_reply
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _multipart_fields(body: bytes, content_type: str) -> Dict[str, Tuple[Optional[str], bytes]]:
+    """Minimal multipart/form-data parser: field name -> (filename, data)."""
+    boundary = content_type.split("boundary=", 1)[-1].strip('"').encode()
+    fields = {}
+    for part in body.split(b"--" + boundary):
+        head, sep, data = part.partition(b"\r\n\r\n")
+        if not sep:
+            continue
+        match = re.search(rb'name="([^"]*)"(?:; filename="([^"]*)")?', head)
+        if not match:
+            continue
+        if data.endswith(b"\r\n"):
+            data = data[:-2]
+        filename = match.group(2).decode() if match.group(2) is not None else None
+        fields[match.group(1).decode()] = (filename, data)
+    return fields
+
+
+def create_app(profile: FaultProfile, cassette: Dict[str, Any] = None) -> FastAPI:
+    """Build the fake OpenAI app for a fault profile."""
+    app = FastAPI(title="Fake OpenAI")
+    interactions: List[Dict[str, Any]] = (cassette or {}).get("interactions", [])
+    seen_prefixes = set()
+
+    def _error(status: int) -> JSONResponse:
+        kind = "rate_limit_exceeded" if status == 429 else "server_error"
+        headers = {"retry-after": str(profile.retry_after)} if status == 429 else None
+        return JSONResponse({"error": {"message": f"Injected {kind}", "type": kind, "code": kind}},
+                            status_code=status, headers=headers)
+
+    def _answer(body: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+        messages = body.get("messages", [])
+        system = next((m["content"] for m in messages if m["role"] == "system"), "")
+        user = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+        try:
+            content = match_chat_interaction(interactions, messages)["response"]
+        except CassetteMiss:
+            content = canned_reply(system, user)
+        usage = {"prompt_tokens": _estimate_tokens(system + user),
+                 "completion_tokens": _estimate_tokens(content)}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        # Prefix caching as OpenAI does it: repeated prefixes of 1024+ tokens, in 128-token steps
+        prefix_tokens = _estimate_tokens(system)
+        cached = prefix_tokens // 128 * 128 if system in seen_prefixes and prefix_tokens >= 1024 else 0
+        seen_prefixes.add(system)
+        usage["prompt_tokens_details"] = {"cached_tokens": cached}
+        return content, usage
+
+    def _completion(body: Dict[str, Any], content: str, usage: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake-model"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": usage,
+        }
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        status = await profile.apply()
+        if status:
+            return _error(status)
+
+        content, usage = _answer(body)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+        model = body.get("model", "fake-model")
+
+        if body.get("stream"):
+            def chunk(delta: Dict[str, Any], finish_reason=None) -> str:
+                payload = {"id": completion_id, "object": "chat.completion.chunk",
+                           "created": created, "model": model,
+                           "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+                return f"data: {json.dumps(payload)}\n\n"
+
+            def events():
+                yield chunk({"role": "assistant", "content": ""})
+                for start in range(0, len(content), 16):
+                    yield chunk({"content": content[start:start + 16]})
+                yield chunk({}, finish_reason="stop")
+                if (body.get("stream_options") or {}).get("include_usage"):
+                    payload = {"id": completion_id, "object": "chat.completion.chunk",
+                               "created": created, "model": model, "choices": [], "usage": usage}
+                    yield f"data: {json.dumps(payload)}\n\n"
+                yield "data: [DONE]\n\n"
+
+            return StreamingResponse(events(), media_type="text/event-stream")
+
+        return _completion(body, content, usage)
+
+    # -- Batch API ---------------------------------------------------------
+
+    files: Dict[str, Dict[str, Any]] = {}
+    batches: Dict[str, Dict[str, Any]] = {}
+
+    def _store_file(data: bytes, filename: str, purpose: str) -> Dict[str, Any]:
+        file_id = f"file-{uuid.uuid4().hex[:24]}"
+        files[file_id] = {"id": file_id, "object": "file", "bytes": len(data),
+                          "created_at": int(time.time()), "filename": filename,
+                          "purpose": purpose, "status": "processed", "data": data}
+        return {k: v for k, v in files[file_id].items() if k != "data"}
+
+    @app.post("/v1/files")
+    async def upload_file(request: Request):
+        fields = _multipart_fields(await request.body(), request.headers.get("content-type", ""))
+        filename, data = fields.get("file", ("upload.jsonl", b""))
+        purpose = fields.get("purpose", (None, b"batch"))[1].decode()
+        return _store_file(data, filename or "upload.jsonl", purpose)
+
+    @app.get("/v1/files/{file_id}/content")
+    def file_content(file_id: str):
+        if file_id not in files:
+            return JSONResponse({"error": {"message": "No such file"}}, status_code=404)
+        return Response(files[file_id]["data"], media_type="application/jsonl")
+
+    def _run_batch(batch: Dict[str, Any]):
+        outputs, errors = [], []
+        for line in files[batch["input_file_id"]]["data"].decode().splitlines():
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            record = {"id": f"batch_req_{uuid.uuid4().hex[:24]}", "custom_id": item["custom_id"]}
+            if profile.item_fails():
+                errors.append(dict(record, response={"status_code": 500, "body": {
+                    "error": {"message": "Injected server_error"}}}, error=None))
+                continue
+            content, usage = _answer(item["body"])
+            outputs.append(dict(record, response={
+                "status_code": 200, "request_id": uuid.uuid4().hex,
+                "body": _completion(item["body"], content, usage)}, error=None))
+
+        def jsonl(rows):
+            return "".join(json.dumps(r) + "\n" for r in rows).encode()
+
+        batch["output_file_id"] = _store_file(jsonl(outputs), "output.jsonl", "batch_output")["id"]
+        if errors:
+            batch["error_file_id"] = _store_file(jsonl(errors), "errors.jsonl", "batch_output")["id"]
+        batch["request_counts"] = {"total": len(outputs) + len(errors),
+                                   "completed": len(outputs), "failed": len(errors)}
+        batch["status"] = "completed"
+        batch["completed_at"] = int(time.time())
+
+    @app.post("/v1/batches")
+    async def create_batch(request: Request):
+        body = await request.json()
+        if body.get("input_file_id") not in files:
+            return JSONResponse({"error": {"message": "No such input file"}}, status_code=400)
+        batch_id = f"batch_{uuid.uuid4().hex[:24]}"
+        batches[batch_id] = {
+            "id": batch_id, "object": "batch", "endpoint": body.get("endpoint"),
+            "input_file_id": body["input_file_id"],
+            "completion_window": body.get("completion_window", "24h"),
+            "status": "in_progress", "created_at": int(time.time()),
+            "output_file_id": None, "error_file_id": None, "completed_at": None,
+            "request_counts": {"total": 0, "completed": 0, "failed": 0},
+            "metadata": body.get("metadata"),
+        }
+        return batches[batch_id]
+
+    @app.get("/v1/batches/{batch_id}")
+    def retrieve_batch(batch_id: str):
+        batch = batches.get(batch_id)
+        if batch is None:
+            return JSONResponse({"error": {"message": "No such batch"}}, status_code=404)
+        if batch["status"] == "in_progress":
+            _run_batch(batch)
+        return batch
+
+    @app.get("/stats")
+    def stats():
+        return profile.stats
+
+    return app
+
+
+def main(argv=None):
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=9001)
+    parser.add_argument("--cassette", default="openai.json",
+                        help="Benchmark cassette to answer from ('' for canned replies only)")
+    add_fault_arguments(parser, default_latency="lognormal:800,0.5")
+    args = parser.parse_args(argv)
+
+    cassette = load_cassette(args.cassette) if args.cassette else None
+    uvicorn.run(create_app(FaultProfile.from_args(args), cassette),
+                host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
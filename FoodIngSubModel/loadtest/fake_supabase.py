@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Local fake of the Supabase PostgREST RPC API.
+
+Serves POST /rest/v1/rpc/{function} (and the bare /rpc/{function} form) with
+fault injection from loadtest/faults.py. search_recipes_by_ingredients answers
+from the benchmark cassette when the search terms match, otherwise with
+deterministic synthetic recipes built from the terms.
+
+Usage (from FoodIngSubModel/):
+    python -m loadtest.fake_supabase --port 9002 --latency uniform:20,80
+    SUPABASE_URL=http://127.0.0.1:9002 SUPABASE_KEY=fake uvicorn backend_api:app --port 8080
+"""
+
+import argparse
+import zlib
+from typing import Any, Dict, List
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from benchmarks.replay import CassetteMiss, load_cassette, match_rpc_interaction
+from loadtest.faults import FaultProfile, add_fault_arguments
+
+
+def synthetic_recipes(search_terms: List[str], limit: int) -> List[Dict[str, Any]]:
+    """Deterministic recipe rows for arbitrary search terms."""
+    terms = [t for t in search_terms if t] or ["house"]
+    rows = []
+    for i in range(min(limit, 10)):
+        term = terms[i % len(terms)]
+        recipe_id = zlib.crc32(f"{term}:{i}".encode()) % 100_000
+        rows.append({
+            "id": recipe_id,
+            "recipe_name": f"{term.title()} Recipe {i + 1}",
+            "img_src": f"https://images.example.com/recipes/{recipe_id}.jpg",
+            "match_count": len(terms) - (i % len(terms)),
+        })
+    return rows
+
+
+def create_app(profile: FaultProfile, cassette: Dict[str, Any] = None) -> FastAPI:
+    """Build the fake PostgREST app for a fault profile."""
+    app = FastAPI(title="Fake Supabase")
+    interactions = (cassette or {}).get("interactions", [])
+
+    async def rpc(function: str, request: Request):
+        params = await request.json() if await request.body() else {}
+        status = await profile.apply()
+        if status:
+            headers = {"retry-after": str(profile.retry_after)} if status == 429 else None
+            return JSONResponse({"message": "Injected upstream failure", "code": str(status)},
+                                status_code=status, headers=headers)
+        try:
+            return match_rpc_interaction(interactions, function, params).get("data", [])
+        except CassetteMiss:
+            pass
+        if function == "search_recipes_by_ingredients":
+            return synthetic_recipes(params.get("search_terms") or [],
+                                     int(params.get("result_limit") or 5))
+        return []
+
+    app.add_api_route("/rest/v1/rpc/{function}", rpc, methods=["POST"])
+    app.add_api_route("/rpc/{function}", rpc, methods=["POST"])
+
+    @app.get("/stats")
+    def stats():
+        return profile.stats
+
+    return app
+
+
+def main(argv=None):
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=9002)
+    parser.add_argument("--cassette", default="supabase.json",
+                        help="Benchmark cassette to answer from ('' for synthetic rows only)")
+    add_fault_arguments(parser, default_latency="uniform:20,80")
+    args = parser.parse_args(argv)
+
+    cassette = load_cassette(args.cassette) if args.cassette else None
+    uvicorn.run(create_app(FaultProfile.from_args(args), cassette),
+                host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Fault Injection for the Local Fake Upstream Servers
+
+Latency distributions, error rates, 429 rate limiting and a concurrency
+capacity shared by loadtest/fake_openai.py and loadtest/fake_supabase.py.
+"""
+
+import argparse
+import asyncio
+import math
+import random
+from dataclasses import dataclass, field
+from typing import Optional, Tuple
+
+
+@dataclass
+class LatencyDistribution:
+    """Latency in milliseconds drawn from a named distribution.
+
+    Spec strings: "constant:50", "uniform:100,300", "normal:800,200",
+    "lognormal:800,0.5" (median ms, sigma).
+    """
+    kind: str = "constant"
+    params: Tuple[float, ...] = (0.0,)
+
+    @classmethod
+    def parse(cls, spec: str) -> "LatencyDistribution":
+        kind, _, raw = (spec or "constant:0").partition(":")
+        params = tuple(float(p) for p in raw.split(",") if p.strip()) or (0.0,)
+        if kind not in ("constant", "uniform", "normal", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {kind}")
+        return cls(kind, params)
+
+    def sample_ms(self, rng: random.Random) -> float:
+        p = self.params
+        if self.kind == "uniform":
+            return rng.uniform(p[0], p[1] if len(p) > 1 else p[0])
+        if self.kind == "normal":
+            return max(0.0, rng.gauss(p[0], p[1] if len(p) > 1 else 0.0))
+        if self.kind == "lognormal":
+            return p[0] * math.exp(rng.gauss(0.0, p[1] if len(p) > 1 else 0.5))
+        return p[0]
+
+
+@dataclass
+class FaultProfile:
+    """What a fake upstream does to each request before answering."""
+    latency: LatencyDistribution = field(default_factory=LatencyDistribution)
+    error_rate: float = 0.0          # fraction answered with HTTP 500
+    rate_limit_rate: float = 0.0     # fraction answered with HTTP 429
+    retry_after: float = 1.0         # seconds, sent with 429s
+    capacity: Optional[int] = None   # concurrent requests before forced 429s
+    seed: Optional[int] = None
+
+    def __post_init__(self):
+        self._rng = random.Random(self.seed)
+        self._in_flight = 0
+        self.stats = {"requests": 0, "errors": 0, "rate_limited": 0}
+
+    @classmethod
+    def from_args(cls, args: argparse.Namespace) -> "FaultProfile":
+        return cls(
+            latency=LatencyDistribution.parse(args.latency),
+            error_rate=args.error_rate,
+            rate_limit_rate=args.rate_limit_rate,
+            retry_after=args.retry_after,
+            capacity=args.capacity,
+            seed=args.seed,
+        )
+
+    async def apply(self) -> Optional[int]:
+        """Sleep the sampled latency; return an HTTP error status to inject, or None."""
+        self.stats["requests"] += 1
+        if self.capacity is not None and self._in_flight >= self.capacity:
+            self.stats["rate_limited"] += 1
+            return 429
+        self._in_flight += 1
+        try:
+            await asyncio.sleep(self.latency.sample_ms(self._rng) / 1000.0)
+        finally:
+            self._in_flight -= 1
+
+        roll = self._rng.random()
+        if roll < self.rate_limit_rate:
+            self.stats["rate_limited"] += 1
+            return 429
+        if roll < self.rate_limit_rate + self.error_rate:
+            self.stats["errors"] += 1
+            return 500
+        return None
+
+    def item_fails(self) -> bool:
+        """Whether one item of a bulk job fails (error_rate, no latency)."""
+        if self._rng.random() < self.error_rate:
+            self.stats["errors"] += 1
+            return True
+        return False
+
+
+def add_fault_arguments(parser: argparse.ArgumentParser, default_latency: str):
+    """Register the shared fault-injection CLI flags."""
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--latency", default=default_latency,
+                        help="constant:MS | uniform:LO,HI | normal:MEAN,SD | lognormal:MEDIAN,SIGMA")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--capacity", type=int, default=None,
+                        help="Concurrent requests served before answering 429")
+    parser.add_argument("--seed", type=int, default=None)
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Open-loop load generator for the FastAPI backend.
+
+Replays the n8n classification mix (loadtest/mix.json, or real requests from a
+JSONL log of UnifiedRequest bodies) at a series of target request rates and
+reports, per step, achieved throughput, p50/p95/p99 latency and error rate. The
+first step that breaks the latency SLO, error budget or throughput target is
+reported as the saturation point.
+
+Usage (from FoodIngSubModel/, with the backend pointed at the loadtest fakes):
+    python -m loadtest.load_generator --target http://127.0.0.1:8080 --rps 5,10,20,40 --duration 20
+    python -m loadtest.load_generator --requests-log logs/requests.jsonl --rps 10,20
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.run_benchmarks import percentile  # noqa: E402
+
+MIX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mix.json")
+
+
+@dataclass
+class Sample:
+    classification: str
+    status: int
+    latency_ms: float
+    failed: bool
+    degraded: bool = False  # answered from the dataset/caches only (X-Degraded)
+
+
+def load_mix(path: str) -> List[Tuple[float, Dict[str, Any]]]:
+    """(weight, request body) pairs from a mix file; weight is split across samples."""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    requests = []
+    for classification, spec in data["classifications"].items():
+        samples = spec.get("entities") or [{}]
+        for entities in samples:
+            body = {"classification": classification, "entities": entities, "confidence": 0.9}
+            requests.append((float(spec.get("weight", 1.0)) / len(samples), body))
+    return requests
+
+
+def load_request_log(path: str) -> List[Tuple[float, Dict[str, Any]]]:
+    """Equal-weight request bodies from a JSONL log of UnifiedRequest payloads."""
+    requests = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            body = json.loads(line)
+            body = body.get("request", body)
+            if body.get("classification") and isinstance(body.get("entities"), dict):
+                body.setdefault("confidence", 0.9)
+                requests.append((1.0, body))
+    return requests
+
+
+async def _send(client: httpx.AsyncClient, body: Dict[str, Any], samples: List[Sample]):
+    started = time.perf_counter()
+    classification = body["classification"]
+    try:
+        response = await client.post(f"/{classification}", json=body)
+        failed = response.status_code != 200
+        if not failed:
+            failed = bool(response.json().get("error"))
+        status = response.status_code
+        degraded = response.headers.get("x-degraded") == "1"
+    except httpx.HTTPError:
+        status, failed, degraded = 0, True, False
+    samples.append(Sample(classification, status, (time.perf_counter() - started) * 1000.0,
+                          failed, degraded))
+
+
+async def run_step(target: str, rps: float, duration: float,
+                   requests: List[Tuple[float, Dict[str, Any]]], timeout: float,
+                   poisson: bool, rng: random.Random) -> Dict[str, Any]:
+    """Fire requests at `rps` for `duration` seconds (open loop) and summarise."""
+    weights = [w for w, _ in requests]
+    bodies = [b for _, b in requests]
+    samples: List[Sample] = []
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=200)
+
+    async with httpx.AsyncClient(base_url=target, timeout=timeout, limits=limits) as client:
+        tasks = []
+        started = time.perf_counter()
+        next_at = 0.0
+        while next_at < duration:
+            delay = started + next_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            body = rng.choices(bodies, weights=weights, k=1)[0]
+            tasks.append(asyncio.create_task(_send(client, body, samples)))
+            next_at += rng.expovariate(rps) if poisson else 1.0 / rps
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+    latencies = [s.latency_ms for s in samples]
+    failures = sum(1 for s in samples if s.failed)
+    return {
+        "target_rps": rps,
+        "sent": len(samples),
+        "achieved_rps": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        "completed_rps": round((len(samples) - failures) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p95_ms": round(percentile(latencies, 95), 1),
+        "p99_ms": round(percentile(latencies, 99), 1),
+        "error_rate": round(failures / len(samples), 4) if samples else 0.0,
+        "status_codes": dict(Counter(s.status for s in samples)),
+        "degraded": sum(1 for s in samples if s.degraded),
+        "per_classification_p95_ms": {
+            c: round(percentile([s.latency_ms for s in samples if s.classification == c], 95), 1)
+            for c in sorted({s.classification for s in samples})
+        },
+    }
+
+
+def saturation_reason(step: Dict[str, Any], slo_p95_ms: float,
+                      max_error_rate: float, min_throughput_ratio: float) -> Optional[str]:
+    """Why a step counts as saturated, or None if it is healthy."""
+    if step["p95_ms"] > slo_p95_ms:
+        return f"p95 {step['p95_ms']}ms > SLO {slo_p95_ms}ms"
+    if step["error_rate"] > max_error_rate:
+        return f"error rate {step['error_rate']:.1%} > {max_error_rate:.1%}"
+    if step["completed_rps"] < step["target_rps"] * min_throughput_ratio:
+        return f"completed {step['completed_rps']} rps < {min_throughput_ratio:.0%} of target"
+    return None
+
+
+async def run(args) -> int:
+    requests = load_request_log(args.requests_log) if args.requests_log else load_mix(args.mix)
+    if not requests:
+        print("No requests to replay.")
+        return 1
+    rng = random.Random(args.seed)
+
+    print(f"{'rps':>6}{'sent':>7}{'done/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'err':>8}")
+    steps, saturation = [], None
+    for rps in [float(r) for r in args.rps.split(",")]:
+        step = await run_step(args.target, rps, args.duration, requests, args.timeout,
+                              args.arrivals == "poisson", rng)
+        steps.append(step)
+        print(f"{rps:>6g}{step['sent']:>7}{step['completed_rps']:>8}{step['p50_ms']:>9}"
+              f"{step['p95_ms']:>9}{step['p99_ms']:>9}{step['error_rate']:>8.1%}")
+        reason = saturation_reason(step, args.slo_p95_ms, args.max_error_rate,
+                                   args.min_throughput_ratio)
+        if reason:
+            saturation = {"rps": rps, "reason": reason}
+            if not args.keep_going:
+                break
+
+    if saturation:
+        healthy = [s["target_rps"] for s in steps if s["target_rps"] < saturation["rps"]]
+        print(f"\nSaturated at {saturation['rps']:g} rps ({saturation['reason']}); "
+              f"last healthy step: {max(healthy) if healthy else 'none'} rps")
+    else:
+        print("\nNo saturation within the tested rates.")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"steps": steps, "saturation": saturation}, f, indent=2)
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", default="http://127.0.0.1:8080")
+    parser.add_argument("--rps", default="5,10,20,40", help="Comma-separated target rates")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per step")
+    parser.add_argument("--mix", default=MIX_PATH)
+    parser.add_argument("--requests-log", help="JSONL of logged UnifiedRequest bodies to replay")
+    parser.add_argument("--arrivals", choices=("poisson", "uniform"), default="poisson")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--slo-p95-ms", type=float, default=5000.0)
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--min-throughput-ratio", type=float, default=0.9)
+    parser.add_argument("--keep-going", action="store_true", help="Run every step after saturation")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--output", help="Write step results as JSON")
+    return asyncio.run(run(parser.parse_args(argv)))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,8 +5,8 @@ Data Models for Recipe Suggestion System
 Contains all data classes and model definitions used throughout the system.
 """
 
-from dataclasses import dataclass
-from typing import List, Optional
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
 
 
 @dataclass
@@ -18,6 +18,7 @@ class IngredientEntry:
     textures: List[str]
     colors: List[str]
     cook_methods: List[str]
+    category: str = ""  # top-level dataset group, e.g. "Vegetable"
 
 
 @dataclass
@@ -29,9 +30,62 @@ class RecipeSuggestion:
     image: Optional[str] = None
 
 
+@dataclass
+class RecipeRecord:
+    """A row of the Supabase recipes table, as kept in the local snapshot."""
+    id: int
+    recipe_name: str
+    img_src: Optional[str] = None
+    ingredients: str = ""
+    cuisine_path: Optional[str] = None
+    rating: Optional[float] = None
+    directions: str = ""
+
+
+@dataclass
+class UserPreferences:
+    """Recommendation preferences from a row of the Supabase profiles table."""
+    cuisine_preferences: List[str] = field(default_factory=list)
+    skill_level: str = "beginner"
+    avoid_ingredients: List[str] = field(default_factory=list)
+
+
 @dataclass
 class SuggestionResult:
     """Container for suggestion results with metadata."""
     items: List[str]
     source: str  # "dataset", "gpt", "dataset+gpt", "none"
     reasons: Optional[List[str]] = None
+
+
+@dataclass
+class ParsedContext:
+    """Attributes extracted from a natural-language food description."""
+    attributes: Dict[str, List[str]] = field(default_factory=dict)
+    excluded: Dict[str, List[str]] = field(default_factory=dict)
+    confidence: float = 0.0
+    source: str = "local"  # "local", "gpt"
+
+    def first(self, key: str) -> Optional[str]:
+        """First extracted value for an attribute, or None."""
+        values = self.attributes.get(key)
+        return values[0] if values else None
+
+
+@dataclass
+class IntentResult:
+    """A chat message classified into the n8n Classify AI Agent's output schema."""
+    classification: str
+    confidence: float
+    entities: Dict[str, Any]
+    source: str = "local"  # "local", "gpt"
+
+
+@dataclass
+class RouteSettings:
+    """Model settings resolved for a single LLM call route."""
+    route: str
+    variant: str
+    model: str
+    max_tokens: int
+    temperature: float
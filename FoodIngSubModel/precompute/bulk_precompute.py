@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Offline bulk precompute of ingredient substitutes and recipe lookups.
+
+Enumerates every dataset ingredient (substitutes) and a popular-recipe list
+(/lookup details), submits them through the OpenAI Batch API - or any
+compatible endpoint such as loadtest/fake_openai.py - and writes the parsed
+answers into the response store that IngredientService.get_substitutes and
+/lookup read before calling OpenAI.
+
+Progress is kept in a state file next to the store: an interrupted run first
+collects its in-flight batches, and only jobs missing from the store are
+submitted again.
+
+Usage (from FoodIngSubModel/):
+    python -m precompute.bulk_precompute --substitutes --recipes popular_recipes.txt
+    python -m precompute.bulk_precompute --requests-log logs/requests.jsonl --top 200
+    OPENAI_BASE_URL=http://127.0.0.1:9001/v1 OPENAI_API_KEY=fake \\
+        python -m precompute.bulk_precompute --substitutes --poll-interval 1
+"""
+
+import argparse
+import io
+import json
+import logging
+import os
+import sys
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config  # noqa: E402
+from services.dataset_service import DatasetService  # noqa: E402
+from services.model_router import ModelRouter  # noqa: E402
+from services.openai_service import OpenAIService  # noqa: E402
+from services.response_store import LOOKUP, SUBSTITUTE, ResponseStore  # noqa: E402
+
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+@dataclass(frozen=True)
+class Job:
+    kind: str       # SUBSTITUTE or LOOKUP
+    subject: str    # ingredient or recipe name
+
+    @property
+    def custom_id(self) -> str:
+        return f"{self.kind}:{self.subject}"
+
+    @classmethod
+    def from_custom_id(cls, custom_id: str) -> "Job":
+        kind, _, subject = custom_id.partition(":")
+        return cls(kind, subject)
+
+
+# ---------------------------------------------------------------------------
+# Job sources
+# ---------------------------------------------------------------------------
+
+def dataset_ingredients(config: Config) -> List[str]:
+    """Canonical name of every dataset ingredient, English names first.
+
+    The dataset lists most ingredients under both a Thai and an English entry;
+    both canonicalize to one store key, so ordering decides which is prompted.
+    """
+    names = [entry.canonical_name for entry in DatasetService(config).entries()]
+    return sorted(names, key=lambda name: not name.isascii())
+
+
+def load_recipe_list(path: str) -> List[str]:
+    """Recipe names from a JSON list or a text file with one name per line."""
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    if text.lstrip().startswith("["):
+        return [str(name).strip() for name in json.loads(text) if str(name).strip()]
+    return [line.strip() for line in text.splitlines()
+            if line.strip() and not line.startswith("#")]
+
+
+def top_lookups(path: str, n: int, store: ResponseStore) -> List[str]:
+    """The `n` most requested /lookup recipes in a JSONL log of UnifiedRequest bodies."""
+    counts: Counter = Counter()
+    names: Dict[str, str] = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            body = json.loads(line)
+            body = body.get("request", body)
+            recipe = (body.get("entities") or {}).get("recipe")
+            if body.get("classification") == "lookup" and recipe:
+                key = store.key(recipe)
+                names.setdefault(key, recipe)
+                counts[key] += 1
+    return [names[key] for key, _ in counts.most_common(n)]
+
+
+def pending_jobs(jobs: Iterable[Job], store: ResponseStore, in_flight: Iterable[str]) -> List[Job]:
+    """Jobs with no stored answer and no batch in flight, deduplicated."""
+    done = {SUBSTITUTE: store.keys(SUBSTITUTE), LOOKUP: store.keys(LOOKUP)}
+    seen = set()
+    for custom_id in in_flight:
+        job = Job.from_custom_id(custom_id)
+        seen.add((job.kind, store.key(job.subject)))
+    pending = []
+    for job in jobs:
+        key = (job.kind, store.key(job.subject))
+        if key in seen or key[1] in done[job.kind]:
+            continue
+        seen.add(key)
+        pending.append(job)
+    return pending
+
+
+# ---------------------------------------------------------------------------
+# Requests and results
+# ---------------------------------------------------------------------------
+
+def build_request(job: Job, router: ModelRouter, max_results: int) -> Dict[str, Any]:
+    """One Batch API input line, using the same prompts and route settings as live calls."""
+    if job.kind == SUBSTITUTE:
+        system, user = OpenAIService.substitute_prompt(job.subject, "General Recipe",
+                                                       max_results, include_reasoning=True)
+        settings = router.resolve("get_substitute_ingredients", 200)
+    else:
+        system, user = OpenAIService.recipe_details_prompt(job.subject)
+        settings = router.resolve("get_recipe_details", 500)
+    return {
+        "custom_id": job.custom_id,
+        "method": "POST",
+        "url": "/v1/chat/completions",
+        "body": {
+            "model": settings.model,
+            "messages": [{"role": "system", "content": system},
+                         {"role": "user", "content": user}],
+            "max_tokens": settings.max_tokens,
+            "temperature": settings.temperature,
+        },
+    }
+
+
+def store_result(store: ResponseStore, job: Job, content: Optional[str], max_results: int,
+                 model: Optional[str] = None) -> bool:
+    """Parse a completion the way OpenAIService would and store it; False if unusable."""
+    if job.kind == SUBSTITUTE:
+        result = OpenAIService.parse_substitutes(content, max_results, include_reasoning=True)
+        if not result.items:
+            return False
+        store.put(SUBSTITUTE, job.subject, {"items": result.items, "reasons": result.reasons,
+                                            "model": model})
+        return True
+
+    details = OpenAIService.parse_recipe_details(job.subject, content)
+    if not details:
+        return False
+    store.put(LOOKUP, job.subject, dict(details, model=model))
+    return True
+
+
+# ---------------------------------------------------------------------------
+# Batch runner
+# ---------------------------------------------------------------------------
+
+class BatchPrecompute:
+    """Submits jobs as Batch API batches and collects results into a ResponseStore."""
+
+    def __init__(self, client, store: ResponseStore, config: Config, state_path: str,
+                 batch_size: int = 500, poll_interval: float = 30.0,
+                 max_results: Optional[int] = None):
+        self.client = client
+        self.store = store
+        self.config = config
+        self.state_path = state_path
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_results = max_results or config.max_substitutes
+        self.router = ModelRouter(config)
+        self.state = self._load_state()
+        self.summary = {"submitted": 0, "stored": 0, "failed": 0}
+
+    def _load_state(self) -> Dict[str, Any]:
+        if os.path.exists(self.state_path):
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        return {"batches": {}}
+
+    def _save_state(self):
+        directory = os.path.dirname(self.state_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+    def in_flight(self) -> List[str]:
+        return [cid for batch in self.state["batches"].values() for cid in batch["custom_ids"]]
+
+    def submit(self, jobs: List[Job]) -> str:
+        """Upload one input file and create a batch for `jobs`."""
+        lines = [json.dumps(build_request(job, self.router, self.max_results)) for job in jobs]
+        payload = io.BytesIO(("\n".join(lines) + "\n").encode("utf-8"))
+        upload = self.client.files.create(file=("precompute.jsonl", payload), purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=upload.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+            metadata={"source": "bulk_precompute"},
+        )
+        # Persist before anything else so an interrupted run can resume this batch
+        self.state["batches"][batch.id] = {"custom_ids": [job.custom_id for job in jobs],
+                                           "submitted_at": time.time()}
+        self._save_state()
+        self.summary["submitted"] += len(jobs)
+        logging.info("Submitted batch %s with %d requests", batch.id, len(jobs))
+        return batch.id
+
+    def poll(self, batch_id: str) -> str:
+        """Check a batch; collect and forget it once it reaches a terminal status."""
+        batch = self.client.batches.retrieve(batch_id)
+        if batch.status not in TERMINAL_STATUSES:
+            return batch.status
+        if batch.output_file_id:
+            self._collect(batch.output_file_id)
+        expected = len(self.state["batches"][batch_id]["custom_ids"])
+        counts = getattr(batch, "request_counts", None)
+        failed = getattr(counts, "failed", 0) if counts else 0
+        if batch.status != "completed":
+            failed = expected
+        self.summary["failed"] += failed or 0
+        logging.info("Batch %s %s (%s failed)", batch_id, batch.status, failed)
+        del self.state["batches"][batch_id]
+        self._save_state()
+        return batch.status
+
+    def _collect(self, output_file_id: str):
+        text = self.client.files.content(output_file_id).text
+        for line in text.splitlines():
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            response = item.get("response") or {}
+            if response.get("status_code") != 200:
+                continue
+            body = response.get("body") or {}
+            choices = body.get("choices") or []
+            content = choices[0]["message"]["content"].strip() if choices else None
+            job = Job.from_custom_id(item["custom_id"])
+            if store_result(self.store, job, content, self.max_results, body.get("model")):
+                self.summary["stored"] += 1
+
+    def run(self, jobs: List[Job], wait: bool = True) -> Dict[str, int]:
+        """Resume in-flight batches, submit what is missing, and (optionally) wait."""
+        pending = pending_jobs(jobs, self.store, self.in_flight())
+        for start in range(0, len(pending), self.batch_size):
+            self.submit(pending[start:start + self.batch_size])
+
+        while self.state["batches"]:
+            for batch_id in list(self.state["batches"]):
+                self.poll(batch_id)
+            if not wait or not self.state["batches"]:
+                break
+            time.sleep(self.poll_interval)
+        self.summary["in_flight"] = len(self.in_flight())
+        return self.summary
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--substitutes", action="store_true",
+                        help="Precompute substitutes for every dataset ingredient")
+    parser.add_argument("--recipes", help="Popular recipes to precompute (JSON list or one per line)")
+    parser.add_argument("--requests-log", help="JSONL of UnifiedRequest bodies; use its top /lookup recipes")
+    parser.add_argument("--top", type=int, default=200, help="Recipes taken from --requests-log")
+    parser.add_argument("--store", help="Response store path (default: Config.response_store_path)")
+    parser.add_argument("--state", help="Resume state file (default: <store>.state.json)")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--poll-interval", type=float, default=30.0)
+    parser.add_argument("--no-wait", action="store_true",
+                        help="Submit and collect finished batches, then exit; rerun to resume")
+    parser.add_argument("--limit", type=int, default=None, help="Only the first N jobs (for trials)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    config = Config()
+    store = ResponseStore(config, path=args.store)
+    state_path = args.state or f"{store.path}.state.json"
+
+    jobs = []
+    if args.substitutes:
+        jobs += [Job(SUBSTITUTE, name) for name in dataset_ingredients(config)]
+    recipes = load_recipe_list(args.recipes) if args.recipes else []
+    if args.requests_log:
+        recipes += top_lookups(args.requests_log, args.top, store)
+    jobs += [Job(LOOKUP, name) for name in recipes]
+    if args.limit is not None:
+        jobs = jobs[:args.limit]
+    if not jobs and not os.path.exists(state_path):
+        parser.error("nothing to do: pass --substitutes, --recipes or --requests-log")
+
+    client = OpenAIService(config)._client
+    if client is None:
+        print("OpenAI client unavailable (set OPENAI_API_KEY, and OPENAI_BASE_URL for a local stand-in)")
+        return 1
+
+    runner = BatchPrecompute(client, store, config, state_path, args.batch_size,
+                             args.poll_interval)
+    summary = runner.run(jobs, wait=not args.no_wait)
+    print(json.dumps(summary))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
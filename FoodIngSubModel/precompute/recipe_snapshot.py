@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Snapshot of the Supabase recipes table for the local recipe index.
+
+Pages through `recipes` in id order and writes one JSON row per line
+(id, recipe_name, img_src, ingredients, cuisine_path, rating, directions) to
+Config.recipe_snapshot_path. RecipeIndex and RecommendationService rebuild
+from the new file on their next query, so the snapshot can be refreshed under
+a running server.
+
+Usage (from FoodIngSubModel/):
+    python -m precompute.recipe_snapshot
+    python -m precompute.recipe_snapshot --out /tmp/recipes.jsonl --page-size 500
+
+Pages are read through services.supabase_client.SupabaseClient, with the same
+pool limits and circuit breaker as the server's Supabase calls.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+from typing import Any, Dict, Iterator, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config  # noqa: E402
+from services.supabase_client import SupabaseClient, create_supabase_client  # noqa: E402
+
+SNAPSHOT_COLUMNS = "id, recipe_name, img_src, ingredients, cuisine_path, rating, directions"
+
+
+def fetch_recipes(client: SupabaseClient, page_size: int = 1000,
+                  timeout: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+    """Every recipe row, one limit/offset select per page in id order."""
+    start = 0
+    while True:
+        rows = client.select("recipes", SNAPSHOT_COLUMNS, order="id", limit=page_size,
+                             offset=start, timeout=timeout) or []
+        yield from rows
+        if len(rows) < page_size:
+            return
+        start += page_size
+
+
+def write_snapshot(rows, path: str) -> int:
+    """Write rows as JSONL, replacing the old snapshot only once complete."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    count = 0
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+            count += 1
+    os.replace(tmp_path, path)
+    return count
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", help="Snapshot path (default: Config.recipe_snapshot_path)")
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--timeout", type=float, default=30.0,
+                        help="Seconds per page request (pages are larger than live queries)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    config = Config()
+    client = create_supabase_client(config)
+    if client is None:
+        print("Supabase unavailable (set SUPABASE_URL and SUPABASE_KEY)")
+        return 1
+
+    path = args.out or config.recipe_snapshot_path
+    try:
+        count = write_snapshot(fetch_recipes(client, args.page_size, args.timeout), path)
+    finally:
+        client.close()
+    logging.info("Wrote %d recipes to %s", count, path)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
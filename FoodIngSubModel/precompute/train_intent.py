@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Train the local /classify intent model from the seed examples and request logs.
+
+Reads dataset/intent_examples.jsonl plus the intent log(s) written by
+IntentClassifier (only lines the LLM labelled, or marked "source": "label" by
+hand), reports accuracy on a held-out share of the logged examples, then
+trains on everything and writes the weights to Config.intent_model_path. A
+running server picks up the new file on its next /classify call.
+
+Usage (from FoodIngSubModel/):
+    python -m precompute.train_intent
+    python -m precompute.train_intent --log logs/a.jsonl --log logs/b.jsonl --epochs 30
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config  # noqa: E402
+from services.intent_classifier import LinearIntentModel, load_examples  # noqa: E402
+
+
+def write_model(model: LinearIntentModel, path: str):
+    """Write the weights, replacing the old model only once complete."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(model.to_dict(), f)
+    os.replace(tmp_path, path)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", help="Model path (default: Config.intent_model_path)")
+    parser.add_argument("--log", action="append",
+                        help="Intent log to learn from (default: Config.intent_log_path and its rotated files)")
+    parser.add_argument("--epochs", type=int, default=20)
+    parser.add_argument("--learning-rate", type=float, default=1.0)
+    parser.add_argument("--holdout", type=float, default=0.2, help="Share of logged examples held out for evaluation")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    config = Config()
+    seed = load_examples([config.intent_seed_path])
+    logs = args.log or [config.intent_log_path] + [f"{config.intent_log_path}.{n}"
+                                                   for n in range(1, config.intent_log_backups + 1)]
+    logged = load_examples(logs, sources=("gpt", "label"))
+    if not seed and not logged:
+        print("No training examples found")
+        return 1
+    logging.info("Training on %d seed and %d logged examples %s", len(seed), len(logged),
+                 dict(Counter(label for _, label in seed + logged)))
+
+    if logged and args.holdout > 0:
+        shuffled = list(logged)
+        random.Random(0).shuffle(shuffled)
+        cut = max(1, int(len(shuffled) * args.holdout))
+        held_out, train = shuffled[:cut], shuffled[cut:]
+        model = LinearIntentModel(num_features=config.intent_num_features).fit(
+            seed + train, epochs=args.epochs, learning_rate=args.learning_rate)
+        correct = sum(model.predict(text)[0] == label for text, label in held_out)
+        logging.info("Held-out accuracy on logged examples: %.3f (%d/%d)",
+                     correct / len(held_out), correct, len(held_out))
+
+    model = LinearIntentModel(num_features=config.intent_num_features).fit(
+        seed + logged, epochs=args.epochs, learning_rate=args.learning_rate)
+    path = args.out or config.intent_model_path
+    write_model(model, path)
+    logging.info("Wrote intent model (%d features) to %s", len(model.weights), path)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Admission Control for Recipe Suggestion System
+
+Bounds how many requests of each classification run at once, so a burst is
+answered quickly instead of piling up in the threadpool until every request
+times out together. Each classification has a lane with a concurrency limit
+and a bounded wait queue:
+
+- a request runs at once while its lane has a free slot;
+- otherwise it waits in the queue, unless the queue is full or the expected
+  wait (queue position x recent service time) would exceed the deadline;
+- a request that is not admitted gets a fast 503 with Retry-After, except
+  on degradable lanes (/context, /substitute), which instead answer from the
+  dataset and caches only (CACHE_ONLY), without an LLM call.
+"""
+
+import asyncio
+import json
+import math
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+from config import Config
+from services.response_cache import CACHE_ONLY
+
+ADMITTED, DEGRADED, SHED = "admitted", "degraded", "shed"
+
+
+class Lane:
+    """Concurrency limit plus bounded FIFO wait queue for one classification (event-loop only)."""
+
+    def __init__(self, name: str, limit: int, queue_size: int, deadline: float,
+                 degradable: bool = False, initial_service_time: float = 1.0):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.deadline = deadline
+        self.degradable = degradable
+        self.active = 0
+        self._waiters: deque = deque()
+        # Exponentially weighted mean of recent request durations
+        self.service_time = initial_service_time
+        self.stats = {"admitted": 0, "queued": 0, "shed": 0, "degraded": 0,
+                      "timed_out": 0, "max_queue_depth": 0}
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def expected_wait(self, position: int) -> float:
+        """Seconds until the request at queue `position` (1-based) would get a slot."""
+        return math.ceil(position / max(self.limit, 1)) * self.service_time
+
+    def retry_after(self) -> int:
+        """Whole seconds a rejected client should wait before retrying."""
+        return max(1, math.ceil(self.expected_wait(self.queue_depth + 1)))
+
+    def _rejected(self, timed_out: bool = False) -> str:
+        if timed_out:
+            self.stats["timed_out"] += 1
+        outcome = DEGRADED if self.degradable else SHED
+        self.stats[outcome] += 1
+        return outcome
+
+    async def acquire(self) -> str:
+        """ADMITTED (caller must release()), DEGRADED or SHED."""
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            self.stats["admitted"] += 1
+            return ADMITTED
+        position = len(self._waiters) + 1
+        if position > self.queue_size or self.expected_wait(position) > self.deadline:
+            return self._rejected()
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.stats["queued"] += 1
+        self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], len(self._waiters))
+        try:
+            await asyncio.wait_for(waiter, timeout=self.deadline)
+        except asyncio.TimeoutError:
+            self._return_handoff(waiter)
+            return self._rejected(timed_out=True)
+        except asyncio.CancelledError:
+            self._return_handoff(waiter)
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+        # release() handed its slot over, so `active` is unchanged
+        self.stats["admitted"] += 1
+        return ADMITTED
+
+    def _return_handoff(self, waiter: asyncio.Future):
+        """Pass on a slot that release() handed to a waiter just as it gave up."""
+        if waiter.done() and not waiter.cancelled():
+            self.release(self.service_time)
+
+    def release(self, duration: float):
+        """Free a slot, handing it straight to the oldest live waiter."""
+        self.service_time += 0.2 * (duration - self.service_time)
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "queue_depth": self.queue_depth,
+            "queue_size": self.queue_size,
+            "degradable": self.degradable,
+            "service_time_ms": round(self.service_time * 1000, 1),
+            **self.stats,
+        }
+
+
+class AdmissionController:
+    """One lane per configured classification, keyed by its endpoint path."""
+
+    def __init__(self, config: Config):
+        self.config = config
+        self.enabled = config.admission_enabled
+        self.lanes: Dict[str, Lane] = {
+            name: Lane(name, limit, config.admission_queue_size, config.admission_deadline,
+                       degradable=name in config.admission_degradable)
+            for name, limit in config.admission_limits.items()
+        }
+
+    def lane_for(self, path: str) -> Optional[Lane]:
+        return self.lanes.get(path.strip("/")) if self.enabled else None
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "deadline_s": self.config.admission_deadline,
+            "lanes": {name: lane.snapshot() for name, lane in self.lanes.items()},
+        }
+
+
+class AdmissionMiddleware:
+    """ASGI middleware putting each POST to a classification endpoint through its lane."""
+
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        lane = None
+        if scope["type"] == "http" and scope["method"] == "POST":
+            lane = self.controller.lane_for(scope["path"])
+        if lane is None:
+            await self.app(scope, receive, send)
+            return
+
+        outcome = await lane.acquire()
+        if outcome == SHED:
+            await _busy(lane, send)
+            return
+        if outcome == DEGRADED:
+            await self._degraded(scope, receive, send)
+            return
+
+        started = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            lane.release(time.monotonic() - started)
+
+    async def _degraded(self, scope, receive, send):
+        """Run the endpoint without LLM calls, marking the response with X-Degraded."""
+        async def send_marked(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-degraded", b"1")]
+            await send(message)
+
+        token = CACHE_ONLY.set(True)
+        try:
+            await self.app(scope, receive, send_marked)
+        finally:
+            CACHE_ONLY.reset(token)
+
+
+async def _busy(lane: Lane, send):
+    """503 in the UnifiedResponse shape, with Retry-After."""
+    body = json.dumps({
+        "classification": lane.name,
+        "data": None,
+        "source": None,
+        "confidence": 0.0,
+        "error": "Server busy, please retry shortly",
+        "rendered": None,
+    }).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": 503,
+        "headers": [(b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(lane.retry_after()).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
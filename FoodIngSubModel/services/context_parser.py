@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Context Parser for Recipe Suggestion System
+
+Extracts taste/texture/color/cooking-method values from a natural-language
+description locally, using an Aho-Corasick automaton built from the dataset
+vocabulary plus a synonym table. Handles negation ("not spicy") and returns
+every matched value, so the LLM parser is only needed for low-confidence input.
+"""
+
+import logging
+import re
+from collections import deque
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from models import ParsedContext
+from services.dataset_service import DatasetService
+from utils import normalize_text
+
+logger = logging.getLogger(__name__)
+
+
+ATTRIBUTES = ("taste", "texture", "color", "cooking_method")
+
+# Surface form -> (attribute, dataset value). Dataset values are added automatically.
+SYNONYMS: Dict[str, Tuple[str, str]] = {
+    # taste
+    "hot": ("taste", "Spicy"),
+    "heat": ("taste", "Spicy"),
+    "spice": ("taste", "Spicy"),
+    "chili": ("taste", "Spicy"),
+    "peppery": ("taste", "Pungent"),
+    "tangy": ("taste", "Sour"),
+    "tart": ("taste", "Sour"),
+    "zesty": ("taste", "Citrus"),
+    "citrusy": ("taste", "Citrus"),
+    "lemony": ("taste", "Citrus"),
+    "savory": ("taste", "Umami"),
+    "savoury": ("taste", "Umami"),
+    "meaty": ("taste", "Umami"),
+    "sugary": ("taste", "Sweet"),
+    "sweetness": ("taste", "Sweet"),
+    "fruity": ("taste", "Estery"),
+    "minty": ("taste", "Cooling"),
+    "fresh tasting": ("taste", "Green"),
+    "grassy": ("taste", "Green"),
+    "herbal": ("taste", "Green"),
+    "salt": ("taste", "Salty"),
+    "acid": ("taste", "Acidic"),
+    # texture
+    "crunch": ("texture", "Crunchy"),
+    "crisp": ("texture", "Crispy"),
+    "crispy": ("texture", "Crispy"),
+    "cream": ("texture", "Creamy"),
+    "chewiness": ("texture", "Chewy"),
+    "juice": ("texture", "Juicy"),
+    "succulent": ("texture", "Juicy"),
+    "silken": ("texture", "Silky"),
+    "mushy": ("texture", "Soft"),
+    "tough": ("texture", "Tougher"),
+    "sticky": ("texture", "Sticky"),
+    "jelly": ("texture", "Gelatinous"),
+    # color
+    "grey": ("color", "Gray"),
+    "golden brown": ("color", "Golden"),
+    "violet": ("color", "Purple"),
+    # cooking method
+    "fry": ("cooking_method", "Fried"),
+    "deep fried": ("cooking_method", "Fried"),
+    "deep fry": ("cooking_method", "Fried"),
+    "stir fry": ("cooking_method", "Stir-Fried"),
+    "pan fry": ("cooking_method", "Pan-Fried"),
+    "grill": ("cooking_method", "Grilled"),
+    "bbq": ("cooking_method", "Grilled"),
+    "barbecue": ("cooking_method", "Grilled"),
+    "barbecued": ("cooking_method", "Grilled"),
+    "bake": ("cooking_method", "Baked"),
+    "boil": ("cooking_method", "Boiled"),
+    "steam": ("cooking_method", "Steamed"),
+    "roast": ("cooking_method", "Roasted"),
+    "saute": ("cooking_method", "Sauteed"),
+    "sauté": ("cooking_method", "Sauteed"),
+    "sautéed": ("cooking_method", "Sauteed"),
+    "stew": ("cooking_method", "Stewed"),
+    "braise": ("cooking_method", "Braised"),
+    "simmer": ("cooking_method", "Simmered"),
+    "pickle": ("cooking_method", "Pickled"),
+    "blanch": ("cooking_method", "Blanched"),
+    "poach": ("cooking_method", "Poached"),
+    "uncooked": ("cooking_method", "Raw"),
+    "toast": ("cooking_method", "Toasted"),
+}
+
+NEGATION_CUES = {"not", "no", "non", "without", "never", "avoid", "isn", "aren",
+                 "don", "doesn", "nor", "neither", "less", "free"}
+# Tokens that end the scope of a preceding negation cue
+SCOPE_BREAKS = {"but", "and", "with", "yet", "though", "although", "instead"}
+NEGATION_WINDOW = 3
+
+# Words that carry no attribute information and should not lower confidence
+STOPWORDS = {
+    "a", "an", "the", "i", "im", "me", "my", "we", "our", "you", "it", "its", "is",
+    "are", "be", "to", "of", "in", "on", "for", "with", "and", "or", "but", "that",
+    "this", "some", "something", "anything", "thing", "things", "want", "need",
+    "looking", "like", "would", "could", "please", "give", "find", "suggest",
+    "ingredient", "ingredients", "food", "foods", "dish", "dishes", "taste",
+    "tastes", "tasting", "texture", "color", "colour", "cooked", "cook", "very",
+    "really", "bit", "little", "more", "quite", "kind", "sort", "which", "what",
+    "have", "has", "t", "s", "m", "can", "good", "nice", "also", "too", "so",
+}
+
+
+def _normalize(text: str) -> str:
+    """Lowercase, turn hyphens into spaces and collapse whitespace."""
+    return normalize_text(re.sub(r"[-_/]", " ", text or ""))
+
+
+def _continues_word(ch: str) -> bool:
+    """True for letters/digits; Thai is written without spaces, so any Thai boundary counts."""
+    return ch.isalnum() and not "\u0e00" <= ch <= "\u0e7f"
+
+
+class AhoCorasick:
+    """Multi-pattern matcher over characters, reporting whole-word matches."""
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[int, object]]] = [[]]
+        self._built = False
+
+    def add(self, pattern: str, payload: object):
+        """Add a pattern; payload is returned with every match of it."""
+        state = 0
+        for ch in pattern:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = nxt
+        self._out[state].append((len(pattern), payload))
+        self._built = False
+
+    def build(self):
+        """Compute failure links (breadth-first)."""
+        queue = deque(self._goto[0].values())
+        for state in queue:
+            self._fail[state] = 0
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+        self._built = True
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int, object]]:
+        """Yield (start, end, payload) for every whole-word pattern occurrence."""
+        if not self._built:
+            self.build()
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(ch, 0)
+            for length, payload in self._out[state]:
+                start, end = i - length + 1, i + 1
+                if start > 0 and _continues_word(text[start - 1]):
+                    continue
+                if end < len(text) and _continues_word(text[end]):
+                    continue
+                yield start, end, payload
+
+
+class ContextParser:
+    """Local extractor for taste/texture/color/cooking-method descriptions."""
+
+    def __init__(self, dataset_service: DatasetService):
+        self.dataset_service = dataset_service
+        self._automaton: Optional[AhoCorasick] = None
+
+    def _build(self) -> AhoCorasick:
+        counts = self.dataset_service.attribute_counts()
+
+        # A surface form used by several attributes ("green", "brown", "mild")
+        # goes to the attribute where the dataset uses it most often.
+        surfaces: Dict[str, Tuple[str, str, int]] = {}
+        for attribute in ATTRIBUTES:
+            for value, count in counts[attribute].items():
+                surface = _normalize(value)
+                if surface and (surface not in surfaces or count > surfaces[surface][2]):
+                    surfaces[surface] = (attribute, value, count)
+
+        for surface, (attribute, value) in SYNONYMS.items():
+            surfaces.setdefault(_normalize(surface), (attribute, value, 0))
+
+        automaton = AhoCorasick()
+        for surface, (attribute, value, _) in surfaces.items():
+            automaton.add(surface, (attribute, value))
+        automaton.build()
+        logger.info("Built context parser with %s surface forms", len(surfaces))
+        return automaton
+
+    @property
+    def automaton(self) -> AhoCorasick:
+        if self._automaton is None:
+            self._automaton = self._build()
+        return self._automaton
+
+    def parse(self, description: str) -> ParsedContext:
+        """Extract every attribute value mentioned in the description."""
+        text = _normalize(description)
+        if not text:
+            return ParsedContext()
+
+        # Leftmost-longest, non-overlapping matches ("stir fried" beats "fried")
+        matches = sorted(self.automaton.iter_matches(text), key=lambda m: (m[0], m[0] - m[1]))
+        chosen, last_end = [], -1
+        for start, end, payload in matches:
+            if start >= last_end:
+                chosen.append((start, end, payload))
+                last_end = end
+
+        tokens = [(m.start(), m.end(), m.group()) for m in re.finditer(r"\w+", text)]
+        result = ParsedContext()
+        covered = set()
+
+        for start, end, (attribute, value) in chosen:
+            covered.update(i for i, tok in enumerate(tokens) if tok[0] >= start and tok[1] <= end)
+            target = result.excluded if self._is_negated(tokens, start, end, text) else result.attributes
+            values = target.setdefault(attribute, [])
+            if value not in values:
+                values.append(value)
+
+        content = [i for i, (_, _, word) in enumerate(tokens)
+                   if word not in STOPWORDS and word not in NEGATION_CUES]
+        if chosen:
+            coverage = len(covered & set(content)) / len(content) if content else 1.0
+            result.confidence = round(0.5 + 0.5 * coverage, 3)
+        return result
+
+    @staticmethod
+    def _is_negated(tokens: List[Tuple[int, int, str]], start: int, end: int,
+                    text: str) -> bool:
+        """True if a negation cue precedes the match within the same clause."""
+        # "spice free" / "spice-free" style suffix negation
+        following = [tok for tok in tokens if tok[0] >= end]
+        if following and following[0][2] == "free":
+            return True
+
+        preceding = [tok for tok in tokens if tok[1] <= start][-NEGATION_WINDOW:]
+        for tok_start, tok_end, word in reversed(preceding):
+            if word in SCOPE_BREAKS or re.search(r"[,.;!?]", text[tok_end:start]):
+                return False
+            if word in NEGATION_CUES and word != "free":
+                return True
+        return False
@@ -5,14 +5,19 @@ Dataset Service for Recipe Suggestion System
 Handles ingredient dataset operations and local ingredient data management.
 """
 
+import logging
 import os
 import json
+import hashlib
+from collections import Counter
 from functools import lru_cache
-from typing import List, Optional
+from typing import Collection, Dict, List, Optional, Sequence, Union
 
 from config import Config
 from models import IngredientEntry, SuggestionResult
-from utils import to_casefold_set, logger
+from utils import normalize_text, stem_word, to_casefold_set
+
+logger = logging.getLogger(__name__)
 
 
 class DatasetService:
@@ -20,88 +25,231 @@ class DatasetService:
     
     def __init__(self, config: Config):
         self.config = config
-        self._entries = None
     
-    @lru_cache(maxsize=1)
-    def _load_entries(self) -> List[IngredientEntry]:
-        """Load ingredient entries from the dataset."""
-        entries = []
+    def entries(self) -> List[IngredientEntry]:
+        """The dataset's ingredient entries, parsed once per file version; [] if unreadable."""
+        path = self.config.dataset_path
+        mtime = _mtime(path)
+        if mtime is None:
+            logger.warning("Dataset file not found: %s", path)
+            return []
         try:
-            if not os.path.exists(self.config.dataset_path):
-                logger.warning(f"Dataset file not found: {self.config.dataset_path}")
-                return entries
-            
-            with open(self.config.dataset_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            
-            if not isinstance(data, dict):
-                logger.error("Invalid dataset format")
-                return entries
-            
-            for category, submap in data.items():
-                if not isinstance(submap, dict):
-                    continue
-                
-                for name, props in submap.items():
-                    if not isinstance(props, dict):
-                        continue
-                    
-                    entries.append(IngredientEntry(
-                        canonical_name=str(name).strip(),
-                        other_names=[str(n).strip() for n in props.get("hasOtherNames", [])],
-                        flavors=[str(v).strip() for v in props.get("hasFlavor", [])],
-                        textures=[str(v).strip() for v in props.get("hasTexture", [])],
-                        colors=[str(v).strip() for v in props.get("hasColor", [])],
-                        cook_methods=[str(v).strip() for v in props.get("canCook", [])]
-                    ))
-            
-            logger.info(f"Loaded {len(entries)} ingredient entries from dataset")
-            return entries
-            
-        except Exception as e:
-            logger.error(f"Error loading dataset: {e}")
-            return entries
+            return _read_entries(path, mtime)
+        except (OSError, ValueError) as e:
+            # Not cached, so a fixed file is picked up on the next call
+            logger.error("Error loading dataset %s: %s", path, e)
+            return []
     
-    def get_context_based_ingredients(self, taste: Optional[str] = None,
-                                    texture: Optional[str] = None,
-                                    color: Optional[str] = None,
-                                    cooking_method: Optional[str] = None,
-                                    max_results: int = 10) -> SuggestionResult:
-        """Get ingredients from dataset based on context."""
-        entries = self._load_entries()
-        if not entries:
-            return SuggestionResult([], "none")
+    def version(self) -> str:
+        """Content hash of the dataset file; changes whenever the dataset does."""
+        mtime = _mtime(self.config.dataset_path)
+        if mtime is None:
+            return "missing"
+        return _file_version(self.config.dataset_path, mtime)
+    
+    def alias_index(self) -> Dict[str, str]:
+        """Map every normalized name and other-name to the entry's canonical name."""
+        index = {}
+        for entry in self.entries():
+            for name in [entry.canonical_name] + entry.other_names:
+                key = normalize_text(name)
+                if key:
+                    index.setdefault(key, entry.canonical_name)
+        return index
+    
+    def attribute_counts(self) -> Dict[str, Counter]:
+        """Count each distinct flavor/texture/color/cook-method value in the dataset."""
+        counts = {"taste": Counter(), "texture": Counter(),
+                  "color": Counter(), "cooking_method": Counter()}
+        for entry in self.entries():
+            counts["taste"].update(entry.flavors)
+            counts["texture"].update(entry.textures)
+            counts["color"].update(entry.colors)
+            counts["cooking_method"].update(entry.cook_methods)
+        return counts
+    
+    def find_entry(self, name: str) -> Optional[IngredientEntry]:
+        """The entry whose canonical or other name matches `name` (plurals folded), if any."""
+        if not self.entries():
+            return None
+        index = _entry_index(self.config.dataset_path, _mtime(self.config.dataset_path))
+        key = normalize_text(name)
+        return index.get(key) or index.get(" ".join(stem_word(w) for w in key.split()))
+    
+    def similar_entries(self, entry: IngredientEntry, limit: int = 30,
+                        skip: Optional[Collection[str]] = None) -> List[IngredientEntry]:
+        """Entries sharing the most flavors, textures and cook methods with `entry`.
+        
+        Entries of the same category get a bonus, so the pool leans towards
+        like-for-like swaps while still allowing cross-category ones. Entries
+        whose normalized name is in `skip` are left out.
+        """
+        flavors = set(to_casefold_set(entry.flavors))
+        textures = set(to_casefold_set(entry.textures))
+        methods = set(to_casefold_set(entry.cook_methods))
         
-        # Normalize query parameters
-        taste_q = taste.strip().casefold() if taste else None
-        texture_q = texture.strip().casefold() if texture else None
-        color_q = color.strip().casefold() if color else None
-        method_q = cooking_method.strip().casefold() if cooking_method else None
+        scored = []
+        for other in self.entries():
+            if other.canonical_name == entry.canonical_name:
+                continue
+            if skip and normalize_text(other.canonical_name) in skip:
+                continue
+            score = (len(flavors & set(to_casefold_set(other.flavors)))
+                     + len(textures & set(to_casefold_set(other.textures)))
+                     + len(methods & set(to_casefold_set(other.cook_methods))))
+            if score == 0:
+                continue
+            if other.category == entry.category:
+                score += 2
+            scored.append((score, other.canonical_name, other))
+        
+        scored.sort(key=lambda t: (-t[0], t[1]))
+        return [other for _, _, other in scored[:limit]]
+    
+    def context_candidates(self, taste: Union[str, Sequence[str], None] = None,
+                           texture: Union[str, Sequence[str], None] = None,
+                           color: Union[str, Sequence[str], None] = None,
+                           cooking_method: Union[str, Sequence[str], None] = None,
+                           limit: int = 30,
+                           excluded: Optional[Dict[str, List[str]]] = None,
+                           skip: Optional[Collection[str]] = None) -> List[IngredientEntry]:
+        """Best-matching entries for a context, for GPT to pick from.
+        
+        Like `get_context_based_ingredients`, but a query value also counts
+        half when it only partly matches an attribute ("crisp" vs "crispy"),
+        so the pool reaches beyond the exact matches.
+        """
+        return [entry for _, entry in self._score_context(
+            taste, texture, color, cooking_method, excluded, skip, partial=True)[:limit]]
+    
+    def _score_context(self, taste, texture, color, cooking_method, excluded, skip=None,
+                       partial: bool = False) -> List[tuple]:
+        """(score, entry) pairs for every entry matching the context, best first."""
+        queries = [set(to_casefold_set(taste)), set(to_casefold_set(texture)),
+                   set(to_casefold_set(color)), set(to_casefold_set(cooking_method))]
+        excluded = excluded or {}
+        excluded_q = {key: set(to_casefold_set(values)) for key, values in excluded.items()}
         
         scored = []
         seen = set()
         
-        for entry in entries:
+        for entry in self.entries():
+            if skip and normalize_text(entry.canonical_name) in skip:
+                continue
+            flavors = set(to_casefold_set(entry.flavors))
+            textures = set(to_casefold_set(entry.textures))
+            colors = set(to_casefold_set(entry.colors))
+            methods = set(to_casefold_set(entry.cook_methods))
+            
+            if (flavors & excluded_q.get("taste", set())
+                    or textures & excluded_q.get("texture", set())
+                    or colors & excluded_q.get("color", set())
+                    or methods & excluded_q.get("cooking_method", set())):
+                continue
+            
             score = 0
-            if taste_q and taste_q in to_casefold_set(entry.flavors):
-                score += 1
-            if texture_q and texture_q in to_casefold_set(entry.textures):
-                score += 1
-            if color_q and color_q in to_casefold_set(entry.colors):
-                score += 1
-            if method_q and method_q in to_casefold_set(entry.cook_methods):
-                score += 1
+            for query, values in zip(queries, (flavors, textures, colors, methods)):
+                if query & values:
+                    score += 1
+                elif partial and _partial_match(query, values):
+                    score += 0.5
             
             if score == 0:
                 continue
             
             name = entry.canonical_name.strip()
             if name and name not in seen:
-                scored.append((score, name))
+                scored.append((score, entry))
                 seen.add(name)
         
         # Sort by score (desc) then name (asc) for stability
-        scored.sort(key=lambda t: (-t[0], t[1]))
-        items = [name for _, name in scored[:max_results]]
+        scored.sort(key=lambda t: (-t[0], t[1].canonical_name.strip()))
+        return scored
+    
+    def get_context_based_ingredients(self, taste: Union[str, Sequence[str], None] = None,
+                                    texture: Union[str, Sequence[str], None] = None,
+                                    color: Union[str, Sequence[str], None] = None,
+                                    cooking_method: Union[str, Sequence[str], None] = None,
+                                    max_results: int = 10,
+                                    excluded: Optional[Dict[str, List[str]]] = None,
+                                    skip: Optional[Collection[str]] = None) -> SuggestionResult:
+        """Get ingredients from dataset based on context.
+        
+        Each attribute may be a single value or a list of acceptable values;
+        entries carrying any value listed in `excluded`, or whose normalized
+        name is in `skip`, are skipped.
+        """
+        if not self.entries():
+            return SuggestionResult([], "none")
+        
+        scored = self._score_context(taste, texture, color, cooking_method, excluded, skip)
+        items = [entry.canonical_name.strip() for _, entry in scored[:max_results]]
         
         return SuggestionResult(items, "dataset" if items else "none")
+
+
+def _partial_match(query: set, values: set) -> bool:
+    """True if a query value of 4+ characters is part of a value, or the other way round."""
+    return any(len(q) >= 4 and len(v) >= 4 and (q in v or v in q) for q in query for v in values)
+
+
+def _mtime(path: str) -> Optional[float]:
+    try:
+        return os.path.getmtime(path)
+    except (OSError, TypeError):
+        return None
+
+
+@lru_cache(maxsize=4)
+def _entry_index(dataset_path: str, mtime: float) -> Dict[str, IngredientEntry]:
+    """Map every normalized (and plural-folded) name and other-name to its entry."""
+    index = {}
+    for entry in _read_entries(dataset_path, mtime):
+        for name in [entry.canonical_name] + entry.other_names:
+            key = normalize_text(name)
+            if key:
+                index.setdefault(key, entry)
+                index.setdefault(" ".join(stem_word(w) for w in key.split()), entry)
+    return index
+
+
+@lru_cache(maxsize=4)
+def _file_version(path: str, mtime: float) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+@lru_cache(maxsize=4)
+def _read_entries(dataset_path: str, mtime: float) -> List[IngredientEntry]:
+    """
+    Parse the ingredient dataset at `dataset_path` into entries. Keyed on the
+    file's mtime, so an edited dataset is re-read; errors raise, and so are
+    never cached.
+    """
+    with open(dataset_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    
+    if not isinstance(data, dict):
+        raise ValueError("invalid dataset format: expected an object of categories")
+    
+    entries = []
+    for category, submap in data.items():
+        if not isinstance(submap, dict):
+            continue
+        
+        for name, props in submap.items():
+            if not isinstance(props, dict):
+                continue
+            
+            entries.append(IngredientEntry(
+                canonical_name=str(name).strip(),
+                other_names=[str(n).strip() for n in props.get("hasOtherNames", [])],
+                flavors=[str(v).strip() for v in props.get("hasFlavor", [])],
+                textures=[str(v).strip() for v in props.get("hasTexture", [])],
+                colors=[str(v).strip() for v in props.get("hasColor", [])],
+                cook_methods=[str(v).strip() for v in props.get("canCook", [])],
+                category=str(category)
+            ))
+    
+    logger.info("Loaded %s ingredient entries from dataset", len(entries))
+    return entries
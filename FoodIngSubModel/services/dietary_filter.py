@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Dietary Filter for Recipe Suggestion System
+
+Applies dietary and allergen constraints ("vegan", "dairy-free", "nut-free", ...)
+to ingredient and recipe results locally. Each constraint is a set of dataset
+categories plus keywords. The dataset part is precomputed into a mask of every
+excluded name and alias. Keywords catch names the dataset does not know,
+such as GPT answers.
+"""
+
+import logging
+import re
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Tuple
+
+from models import RecipeSuggestion
+from services.dataset_service import DatasetService
+from utils import normalize_text, stem_word
+
+logger = logging.getLogger(__name__)
+
+
+class Constraint(NamedTuple):
+    """Dataset categories and name keywords (singular, lowercase) a constraint rules out."""
+    categories: FrozenSet[str]
+    keywords: FrozenSet[str]
+
+
+_MEAT = {"meat", "beef", "pork", "chicken", "duck", "lamb", "mutton", "goat", "veal", "turkey",
+         "bacon", "ham", "sausage", "salami", "pepperoni", "chorizo", "prosciutto", "gelatin",
+         "lard", "venison", "quail", "goose", "liver", "mince", "steak", "rib", "broth", "stock"}
+_SHELLFISH = {"shellfish", "shrimp", "prawn", "crab", "lobster", "crayfish", "oyster", "mussel",
+              "clam", "scallop", "cockle", "squid", "octopus", "calamari"}
+_FISH = {"fish", "anchovy", "tuna", "salmon", "cod", "sardine", "mackerel", "tilapia", "catfish",
+         "trout", "snapper", "bonito", "seafood", "caviar", "roe"}
+_DAIRY = {"milk", "butter", "buttermilk", "cream", "cheese", "yogurt", "yoghurt", "ghee", "whey",
+          "casein", "lactose", "parmesan", "mozzarella", "cheddar", "ricotta", "mascarpone",
+          "feta", "paneer", "custard", "kefir"}
+_EGG = {"egg", "mayonnaise", "mayo", "meringue", "albumen", "aioli"}
+_NUT = {"nut", "peanut", "almond", "cashew", "walnut", "pecan", "pistachio", "hazelnut",
+        "macadamia", "praline", "marzipan", "nutella"}
+_GLUTEN = {"wheat", "flour", "barley", "rye", "spelt", "semolina", "couscous", "bulgur", "seitan",
+           "bread", "breadcrumb", "panko", "pasta", "spaghetti", "noodle", "cracker", "malt"}
+_INSECT = {"insect", "cricket", "locust", "grasshopper", "silkworm", "larva", "larvae", "pupa", "pupae", "ant",
+           "beetle", "scorpion", "caterpillar", "worm"}
+
+CONSTRAINTS: Dict[str, Constraint] = {
+    "vegan": Constraint(frozenset({"Egg", "Milk", "Shellfish", "Meat_Poultry", "Insect"}),
+                        frozenset(_MEAT | _SHELLFISH | _FISH | _DAIRY | _EGG | _INSECT | {"honey"})),
+    "vegetarian": Constraint(frozenset({"Shellfish", "Meat_Poultry", "Insect"}),
+                             frozenset(_MEAT | _SHELLFISH | _FISH | _INSECT)),
+    "pescatarian": Constraint(frozenset({"Meat_Poultry", "Insect"}), frozenset(_MEAT | _INSECT)),
+    "dairy-free": Constraint(frozenset({"Milk"}), frozenset(_DAIRY)),
+    "egg-free": Constraint(frozenset({"Egg"}), frozenset(_EGG)),
+    # The dataset's Shellfish category holds all seafood, so shellfish-free goes by keyword
+    "shellfish-free": Constraint(frozenset(), frozenset(_SHELLFISH)),
+    "seafood-free": Constraint(frozenset({"Shellfish"}), frozenset(_SHELLFISH | _FISH)),
+    # Pulse_Seed_Nut is mostly beans and seeds, so nut-free goes by keyword too
+    "nut-free": Constraint(frozenset(), frozenset(_NUT)),
+    "gluten-free": Constraint(frozenset(), frozenset(_GLUTEN)),
+    "insect-free": Constraint(frozenset({"Insect"}), frozenset(_INSECT)),
+}
+
+# Other spellings of the constraint names above
+_CONSTRAINT_ALIASES = {
+    "plant-based": "vegan",
+    "veggie": "vegetarian",
+    "lactose-free": "dairy-free",
+    "milk-free": "dairy-free",
+    "eggless": "egg-free",
+    "fish-free": "seafood-free",
+    "peanut-free": "nut-free",
+    "tree-nut-free": "nut-free",
+    "wheat-free": "gluten-free",
+    "coeliac": "gluten-free",
+    "celiac": "gluten-free",
+}
+
+# Plant-based look-alikes that would otherwise trip a keyword ("coconut milk" is not dairy)
+_SAFE_PHRASES: Dict[str, Tuple[str, ...]] = {
+    "milk": ("coconut milk", "almond milk", "soy milk", "oat milk", "rice milk", "cashew milk"),
+    "butter": ("peanut butter", "almond butter", "cashew butter", "nut butter", "cocoa butter",
+               "apple butter", "shea butter"),
+    "cream": ("coconut cream", "cream of tartar"),
+    "egg": ("flax egg", "chia egg", "egg replacer"),
+    "flour": ("rice flour", "cassava flour", "tapioca flour", "corn flour", "coconut flour",
+              "chickpea flour", "almond flour"),
+    "noodle": ("rice noodle", "glass noodle", "mung bean noodle"),
+    "meat": ("coconut meat",),
+    "stock": ("vegetable stock", "mushroom stock"),
+    "broth": ("vegetable broth", "mushroom broth"),
+}
+# "vegan cheese", "plant-based burger": the next word is a look-alike too
+_PLANT_BASED = re.compile(r"\b(?:vegan|plant based)\s+[a-z]+")
+
+
+def normalize_constraints(constraints) -> Tuple[List[str], List[str]]:
+    """Known constraint names (deduplicated, in order) and the unrecognised rest.
+
+    Accepts a list or a comma-separated string; "no dairy", "dairy free" and
+    "Dairy_Free" all become "dairy-free".
+    """
+    if not constraints:
+        return [], []
+    if isinstance(constraints, str):
+        constraints = constraints.split(",")
+    known, unknown = [], []
+    for raw in constraints:
+        name = re.sub(r"[\s_]+", "-", normalize_text(str(raw)))
+        if not name:
+            continue
+        if name.startswith("no-"):
+            name = f"{name[3:]}-free"
+        name = _CONSTRAINT_ALIASES.get(name, name)
+        if name in CONSTRAINTS:
+            if name not in known:
+                known.append(name)
+        else:
+            unknown.append(str(raw))
+    return known, unknown
+
+
+class DietaryFilter:
+    """Category and alias exclusion masks per constraint, applied to result lists."""
+
+    def __init__(self, dataset_service: DatasetService):
+        self.dataset_service = dataset_service
+        self._masks: Dict[Tuple[str, str], FrozenSet[str]] = {}
+
+    def mask(self, constraint: str) -> FrozenSet[str]:
+        """Every normalized dataset name and alias the constraint excludes (built once per dataset version)."""
+        key = (constraint, self.dataset_service.version())
+        mask = self._masks.get(key)
+        if mask is None:
+            rule = CONSTRAINTS[constraint]
+            names = set()
+            for entry in self.dataset_service.entries():
+                aliases = [entry.canonical_name] + entry.other_names
+                if entry.category in rule.categories or any(
+                        _keyword_hit(normalize_text(name), rule.keywords) for name in aliases):
+                    names.update(normalize_text(name) for name in aliases)
+            mask = self._masks[key] = frozenset(names)
+            logger.debug("Dietary mask '%s': %s names", constraint, len(mask))
+        return mask
+
+    def excluded(self, constraints: Iterable[str]) -> FrozenSet[str]:
+        """Union of the masks of several constraints."""
+        masks = [self.mask(constraint) for constraint in constraints]
+        return frozenset().union(*masks) if masks else frozenset()
+
+    def allows(self, name: str, constraints: Iterable[str]) -> bool:
+        """True if the ingredient `name` satisfies every constraint."""
+        key = normalize_text(name)
+        if not key:
+            return True
+        entry = self.dataset_service.find_entry(name)
+        for constraint in constraints:
+            rule = CONSTRAINTS[constraint]
+            if key in self.mask(constraint) or _keyword_hit(key, rule.keywords):
+                return False
+            if entry is not None and normalize_text(entry.canonical_name) in self.mask(constraint):
+                return False
+        return True
+
+    def filter_items(self, items: List[str], constraints: Iterable[str],
+                     reasons: Optional[List[str]] = None) -> Tuple[List[str], Optional[List[str]]]:
+        """The allowed items, with their reasons kept alongside."""
+        constraints = list(constraints)
+        if not constraints:
+            return items, reasons
+        kept = [i for i, item in enumerate(items) if self.allows(item, constraints)]
+        return [items[i] for i in kept], [reasons[i] for i in kept] if reasons is not None else None
+
+    def allows_recipe(self, recipe: RecipeSuggestion, constraints: Iterable[str],
+                      ingredients: str = "") -> bool:
+        """True if the recipe name and every listed ingredient satisfy the constraints."""
+        constraints = list(constraints)
+        names = [recipe.name] + re.split(r"[,;|\n]", ingredients or recipe.ingredients or "")
+        return all(self.allows(_strip_quantity(name), constraints) for name in names if name.strip())
+
+
+def _keyword_hit(key: str, keywords: FrozenSet[str]) -> bool:
+    """True if any word of `key` (plurals folded), outside a safe phrase, is a keyword."""
+    key = _PLANT_BASED.sub(" ", key.replace("-", " "))
+    for keyword in {stem_word(word) for word in re.findall(r"[a-z]+", key)} & keywords:
+        rest = key
+        for phrase in _SAFE_PHRASES.get(keyword, ()):
+            rest = re.sub(rf"\b{phrase}s?\b", " ", rest)
+        if keyword in {stem_word(word) for word in re.findall(r"[a-z]+", rest)}:
+            return True
+    return False
+
+
+def _strip_quantity(text: str) -> str:
+    """'2 cups coconut milk' -> 'cups coconut milk'; units never match a keyword."""
+    return re.sub(r"^[\d\s./½¼¾-]+", "", text.strip())
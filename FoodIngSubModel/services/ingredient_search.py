@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Ingredient Search for Recipe Suggestion System
+
+Filter and facet API over the ingredient dataset, replacing the ingredient
+search page's `select("*")` of the whole table and its in-browser filtering.
+
+Every value of every facet (category, flavor, texture, color, canCook) is an
+int bitset over the dataset entries, built once per dataset version. A
+search ANDs the selected values' bitsets, counts each facet value with a
+popcount of its bitset against the matches, and pages through the set bits.
+"""
+
+import logging
+import threading
+import unicodedata
+from collections import defaultdict
+from dataclasses import asdict
+from typing import Any, Dict, List, Optional
+
+from config import Config
+from models import IngredientEntry
+from services.dataset_service import DatasetService
+from utils import bits_from_flags, set_bit_positions
+
+logger = logging.getLogger(__name__)
+
+# Query parameter -> IngredientEntry field
+INGREDIENT_FACETS = {
+    "category": "category",
+    "flavor": "flavors",
+    "texture": "textures",
+    "color": "colors",
+    "can_cook": "cook_methods",
+}
+
+
+def _fold(text: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", (text or "").strip().lower())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+class _IngredientFacets:
+    """Entries in name order with one bitset per facet value."""
+
+    def __init__(self, entries: List[IngredientEntry], version: str):
+        self.entries = sorted(entries, key=lambda e: (_fold(e.canonical_name), e.category))
+        self.version = version
+        self.all_bits = (1 << len(self.entries)) - 1
+        self.names = [" | ".join(_fold(n) for n in [e.canonical_name] + e.other_names) for e in self.entries]
+        # facet -> folded value -> (display value, bitset)
+        self.values: Dict[str, Dict[str, Any]] = {}
+        for facet, field in INGREDIENT_FACETS.items():
+            members = defaultdict(list)
+            display = {}
+            for i, entry in enumerate(self.entries):
+                values = getattr(entry, field)
+                for value in ([values] if isinstance(values, str) else values):
+                    if value:
+                        members[_fold(value)].append(i)
+                        display.setdefault(_fold(value), value)
+            self.values[facet] = {}
+            for key, positions in members.items():
+                flags = [False] * len(self.entries)
+                for i in positions:
+                    flags[i] = True
+                self.values[facet][key] = (display[key], bits_from_flags(flags))
+
+
+class IngredientSearchIndex:
+    """Faceted, paginated search over DatasetService entries."""
+
+    def __init__(self, config: Config, dataset_service: Optional[DatasetService] = None):
+        self.config = config
+        self.dataset_service = dataset_service or DatasetService(config)
+        self._lock = threading.Lock()
+        self._facets: Optional[_IngredientFacets] = None
+
+    def ensure_loaded(self) -> _IngredientFacets:
+        """Facet bitsets for the current dataset version (rebuilt when it changes)."""
+        version = self.dataset_service.version()
+        with self._lock:
+            if self._facets is None or self._facets.version != version:
+                self._facets = _IngredientFacets(self.dataset_service.entries(), version)
+                logger.info("Built ingredient facets over %s entries", len(self._facets.entries))
+            return self._facets
+
+    def version(self) -> str:
+        return self.ensure_loaded().version
+
+    def search(self, query: str = "", filters: Optional[Dict[str, List[str]]] = None,
+               offset: int = 0, limit: int = 50) -> Dict[str, Any]:
+        """One page of matching entries, the total, and counts for every facet value.
+
+        `query` matches canonical or other names. Selected values must all
+        apply (as on the search page), except categories, where an entry has
+        only one and the selected ones are alternatives.
+        """
+        facets = self.ensure_loaded()
+        matched = facets.all_bits
+        term = _fold(query)
+        if term:
+            matched &= bits_from_flags([term in names for names in facets.names])
+
+        for facet, values in (filters or {}).items():
+            if facet not in INGREDIENT_FACETS:
+                raise ValueError(f"Unknown filter: {facet}")
+            values = [_fold(v) for v in values if v and v.strip()]
+            if not values:
+                continue
+            lookup = facets.values[facet]
+            if facet == "category":
+                bits = 0
+                for value in values:
+                    bits |= lookup.get(value, ("", 0))[1]
+                matched &= bits
+            else:
+                for value in values:
+                    matched &= lookup.get(value, ("", 0))[1]
+
+        counts = {}
+        for facet, lookup in facets.values.items():
+            counts[facet] = {display: (matched & bits).bit_count()
+                             for display, bits in sorted(lookup.values())}
+
+        total = matched.bit_count()
+        positions = set_bit_positions(matched, 0, offset + limit)[offset:]
+        return {
+            "ingredients": [asdict(facets.entries[i]) for i in positions],
+            "total": total,
+            "facets": counts,
+            "offset": offset,
+            "next_offset": offset + limit if offset + limit < total else None,
+        }
@@ -5,69 +5,157 @@ Ingredient Service for Recipe Suggestion System
 Main service for ingredient-related operations, combining OpenAI and dataset services.
 """
 
-from typing import Optional
+from typing import Optional, Sequence
 
 from config import Config
-from models import SuggestionResult
+from models import ParsedContext, SuggestionResult
 from services.openai_service import OpenAIService
 from services.dataset_service import DatasetService
+from services.context_parser import ContextParser
+from services.dietary_filter import DietaryFilter
+from services.response_cache import CACHE_ONLY
+from services.response_store import ResponseStore
 
 
 class IngredientService:
     """Main service for ingredient-related operations."""
     
-    def __init__(self, config: Config):
+    def __init__(self, config: Config, openai_service: Optional[OpenAIService] = None,
+                 response_store: Optional[ResponseStore] = None):
         self.config = config
-        self.openai_service = OpenAIService(config)
+        self.openai_service = openai_service or OpenAIService(config)
         self.dataset_service = DatasetService(config)
+        self.context_parser = ContextParser(self.dataset_service)
+        self.dietary_filter = DietaryFilter(self.dataset_service)
+        self.response_store = response_store or ResponseStore(
+            config, alias_index=self.dataset_service.alias_index())
     
     def get_substitutes(self, ingredient: str, recipe: str = "General Recipe",
                        max_results: Optional[int] = None,
-                       include_reasoning: bool = False) -> SuggestionResult:
-        """Get ingredient substitutes with fallback strategy."""
+                       include_reasoning: bool = False,
+                       constraints: Sequence[str] = ()) -> SuggestionResult:
+        """Get ingredient substitutes with fallback strategy.
+        
+        `constraints` (normalized names such as "dairy-free") are applied to
+        every source's answer, each over-fetched once to leave enough behind.
+        """
         max_results = max_results or self.config.max_substitutes
+        fetch = max_results * self.config.constraint_overfetch if constraints else max_results
+        
+        # Precomputed answers first (precompute/bulk_precompute.py)
+        stored = self.response_store.get_substitutes(ingredient, recipe, fetch, include_reasoning)
+        if stored:
+            stored = self._constrain(stored, constraints, max_results)
+            if stored.items:
+                return stored
         
-        # Try OpenAI first
+        # Then OpenAI: picking among similar dataset entries, else naming its own
         if self.openai_service.is_available:
+            result = self._pick_substitutes(ingredient, recipe, max_results, include_reasoning, constraints)
+            if result.items:
+                return result
             result = self.openai_service.get_substitute_ingredients(
-                ingredient, recipe, max_results, include_reasoning
+                ingredient, recipe, fetch, include_reasoning
             )
+            result = self._constrain(result, constraints, max_results)
             if result.items:
                 return result
         
         # Fallback to context-based suggestions
         if self.openai_service.is_available:
             result = self.openai_service.get_context_based_ingredients(
-                recipe_title=recipe, max_results=max_results
+                recipe_title=recipe, max_results=fetch
             )
+            result = self._constrain(result, constraints, max_results)
             if result.items:
                 result.source = "gpt_context"
                 return result
         
+        # Degraded (no LLM capacity): the dataset entries closest to the ingredient
+        if CACHE_ONLY.get():
+            return self._similar_substitutes(ingredient, max_results, constraints)
+        
         return SuggestionResult([], "none")
     
+    def _similar_substitutes(self, ingredient: str, max_results: int,
+                             constraints: Sequence[str] = ()) -> SuggestionResult:
+        """The dataset entries sharing the most attributes with a known ingredient."""
+        entry = self.dataset_service.find_entry(ingredient)
+        if entry is None:
+            return SuggestionResult([], "none")
+        similar = self.dataset_service.similar_entries(
+            entry, max_results, skip=self.dietary_filter.excluded(constraints))
+        items = [other.canonical_name for other in similar]
+        return SuggestionResult(items, "dataset" if items else "none")
+    
+    def _pick_substitutes(self, ingredient: str, recipe: str, max_results: int,
+                          include_reasoning: bool, constraints: Sequence[str] = ()) -> SuggestionResult:
+        """GPT's picks among the dataset entries closest to a known ingredient."""
+        entry = self.dataset_service.find_entry(ingredient) if self.config.rag_enabled else None
+        if entry is None:
+            return SuggestionResult([], "none")
+        candidates = self.dataset_service.similar_entries(
+            entry, self.config.rag_candidates, skip=self.dietary_filter.excluded(constraints))
+        if not candidates:
+            return SuggestionResult([], "none")
+        result = self.openai_service.pick_substitutes(
+            ingredient, recipe, candidates, max_results, include_reasoning)
+        return self._constrain(result, constraints, max_results)
+    
+    def _constrain(self, result: SuggestionResult, constraints: Sequence[str],
+                   max_results: int) -> SuggestionResult:
+        """`result` without items breaking a constraint, cut to `max_results`."""
+        items, reasons = self.dietary_filter.filter_items(result.items, constraints, result.reasons)
+        return SuggestionResult(items[:max_results], result.source,
+                                reasons[:max_results] if reasons is not None else None)
+    
+    def parse_description(self, description: str) -> ParsedContext:
+        """Parse a description locally, asking the LLM only when confidence is low."""
+        parsed = self.context_parser.parse(description)
+        if parsed.confidence >= self.config.context_parser_min_confidence:
+            return parsed
+        if not self.openai_service.is_available:
+            return parsed
+        
+        llm_context = self.openai_service.parse_natural_language_context(description)
+        attributes = {key: [value] for key, value in llm_context.items() if value}
+        if not attributes:
+            return parsed
+        return ParsedContext(attributes=attributes, excluded=parsed.excluded,
+                             confidence=1.0, source="gpt")
+    
     def get_context_suggestions(self, taste: Optional[str] = None,
                               texture: Optional[str] = None,
                               color: Optional[str] = None,
                               cooking_method: Optional[str] = None,
                               recipe_title: Optional[str] = None,
                               natural_description: Optional[str] = None,
-                              max_results: Optional[int] = None) -> SuggestionResult:
-        """Get ingredients based on context with hybrid approach."""
+                              max_results: Optional[int] = None,
+                              parsed_context: Optional[ParsedContext] = None,
+                              constraints: Sequence[str] = ()) -> SuggestionResult:
+        """Get ingredients based on context with hybrid approach.
+        
+        `parsed_context` is an already parsed `natural_description` (e.g. from the session store).
+        Dataset entries excluded by `constraints` are masked out up front; GPT answers are
+        over-fetched once and filtered.
+        """
         max_results = max_results or self.config.max_ingredients
+        skip = self.dietary_filter.excluded(constraints)
         
         # Parse natural language description if provided
-        if natural_description and self.openai_service.is_available:
-            parsed_context = self.openai_service.parse_natural_language_context(natural_description)
+        excluded = {}
+        if natural_description or parsed_context:
+            parsed_context = parsed_context or self.parse_description(natural_description)
             # Use parsed values if individual attributes not provided
-            taste = taste or parsed_context.get("taste")
-            texture = texture or parsed_context.get("texture")
-            color = color or parsed_context.get("color")
-            cooking_method = cooking_method or parsed_context.get("cooking_method")
+            taste = taste or parsed_context.attributes.get("taste")
+            texture = texture or parsed_context.attributes.get("texture")
+            color = color or parsed_context.attributes.get("color")
+            cooking_method = cooking_method or parsed_context.attributes.get("cooking_method")
+            excluded = parsed_context.excluded
         
         # Try dataset first
         dataset_result = self.dataset_service.get_context_based_ingredients(
-            taste, texture, color, cooking_method, max_results
+            taste, texture, color, cooking_method, max_results, excluded=excluded, skip=skip
         )
         
         if len(dataset_result.items) >= max_results:
@@ -77,9 +165,33 @@ class IngredientService:
         if not self.openai_service.is_available:
             return dataset_result
         
+        # Preferably by letting GPT pick among looser dataset matches
+        if self.config.rag_enabled:
+            candidates = self.dataset_service.context_candidates(
+                taste, texture, color, cooking_method, self.config.rag_candidates,
+                excluded=excluded, skip=skip
+            )
+            if len(candidates) > len(dataset_result.items):
+                picked = self.openai_service.pick_context_ingredients(
+                    candidates, _join(taste), _join(texture), _join(color), _join(cooking_method),
+                    recipe_title, max_results
+                )
+                if picked.items:
+                    # Exact matches lead; GPT's picks from the looser pool fill the rest
+                    items = list(dataset_result.items)
+                    seen = {item.strip().casefold() for item in items}
+                    for item in picked.items:
+                        if item.strip().casefold() not in seen:
+                            items.append(item)
+                            seen.add(item.strip().casefold())
+                    return SuggestionResult(items[:max_results], "dataset+gpt")
+        
+        fetch = max_results * self.config.constraint_overfetch if constraints else max_results
         gpt_result = self.openai_service.get_context_based_ingredients(
-            taste, texture, color, cooking_method, recipe_title, max_results
+            _join(taste), _join(texture), _join(color), _join(cooking_method),
+            recipe_title, fetch, excluded=excluded
         )
+        gpt_result = self._constrain(gpt_result, constraints, fetch)
         
         if not gpt_result.items:
             return dataset_result
@@ -110,3 +222,10 @@ class IngredientService:
             source = "none"
         
         return SuggestionResult(merged_items[:max_results], source)
+
+
+def _join(value) -> Optional[str]:
+    """Render a single value or list of values as one prompt string."""
+    if isinstance(value, (list, tuple)):
+        return ", ".join(value) or None
+    return value
@@ -0,0 +1,613 @@
+#!/usr/bin/env python3
+"""
+Intent Classifier for Recipe Suggestion System
+
+Local replacement for the n8n Classify AI Agent: classifies a chat message
+into one of its ten intents and extracts the same entity object, in a few
+milliseconds instead of an LLM round trip.
+
+The classifier is a softmax linear model over hashed features (word unigrams
+and bigrams, plus character trigrams of Thai runs, which have no spaces). It
+is trained from dataset/intent_examples.jsonl and from logged requests that
+the LLM labelled (precompute/train_intent.py). Entities come from per-intent
+phrase patterns, the ingredient alias index (which also maps Thai names to
+English) and the local ContextParser. When the model is unsure, a required
+entity is missing, or an entity could not be put into English, the message
+goes to the LLM classifier instead. With `Config.intent_log_enabled`, its
+answer is logged for retraining.
+"""
+
+import atexit
+import json
+import logging
+import math
+import os
+import queue
+import random
+import re
+import threading
+import time
+import zlib
+from logging.handlers import QueueListener, RotatingFileHandler
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from config import Config
+from models import IntentResult
+from services.context_parser import ATTRIBUTES, AhoCorasick, ContextParser, _normalize
+from services.dataset_service import DatasetService
+
+logger = logging.getLogger(__name__)
+
+INTENT_CLASSES = ("substitute", "context", "suggest", "similar", "specific",
+                  "recipe_custom", "lookup", "rewrite", "clarify", "out_of_scope")
+
+ENTITY_FIELDS = ("ingredient", "recipe", "ingredients", "substitutes", "required_ingredients",
+                 "replacement", "original_ingredients", "recipe_context", "attributes",
+                 "natural_description", "recipe_title", "include_reasoning", "max_results")
+
+# Entities each classification populates (the agent's "entity rules by classification")
+CLASS_ENTITIES = {
+    "substitute": ("ingredient", "recipe", "include_reasoning", "max_results"),
+    "context": ("attributes", "natural_description", "recipe_title", "max_results"),
+    "suggest": ("ingredients", "max_results"),
+    "similar": ("recipe", "max_results"),
+    "specific": ("required_ingredients", "recipe_context", "max_results"),
+    "recipe_custom": ("recipe", "substitutes", "max_results"),
+    "lookup": ("recipe",),
+    "rewrite": ("recipe", "ingredient", "replacement", "original_ingredients"),
+    "clarify": (),
+    "out_of_scope": (),
+}
+
+# Entities the backend endpoint cannot do without
+REQUIRED_ENTITIES = {
+    "substitute": ("ingredient",),
+    "context": ("attributes",),
+    "suggest": ("ingredients",),
+    "similar": ("recipe",),
+    "specific": ("required_ingredients",),
+    "recipe_custom": ("recipe", "substitutes"),
+    "lookup": ("recipe",),
+    "rewrite": ("recipe", "ingredient", "replacement"),
+}
+
+# Confidence reported when a required entity is missing or not in English
+_UNRESOLVED_CONFIDENCE = 0.5
+
+_TOKEN = re.compile(r"[a-z0-9']+|[฀-๿]+")
+_THAI = re.compile(r"[฀-๿]")
+
+
+def empty_entities() -> Dict[str, Any]:
+    """Every entity field, unset."""
+    entities = dict.fromkeys(ENTITY_FIELDS)
+    entities["include_reasoning"] = False
+    return entities
+
+
+def normalize_entities(classification: str, entities: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Keep only the fields `classification` populates; every field present."""
+    result = empty_entities()
+    for name in CLASS_ENTITIES.get(classification, ()):
+        value = (entities or {}).get(name)
+        if name == "include_reasoning":
+            result[name] = bool(value)
+        elif name == "attributes" and isinstance(value, dict):
+            result[name] = {key: value.get(key) for key in ATTRIBUTES}
+        elif value not in ("", [], {}):
+            result[name] = value
+    return result
+
+
+# ---------------------------------------------------------------------------
+# Features and model
+# ---------------------------------------------------------------------------
+
+def hashed_features(text: str, num_features: int) -> Dict[int, float]:
+    """L2-normalized hashed n-gram counts of a message."""
+    tokens = _TOKEN.findall((text or "").lower())
+    grams = []
+    words = []
+    for token in tokens:
+        padded = f"^{token}$"
+        grams.extend(f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2))
+        if not _THAI.match(token):
+            words.append(token)
+            grams.append(f"w:{token}")
+    grams.extend(f"b:{a} {b}" for a, b in zip(words, words[1:]))
+    if words:
+        grams.append(f"s:{words[0]}")
+
+    counts: Dict[int, float] = {}
+    for gram in grams:
+        index = zlib.crc32(gram.encode("utf-8")) % num_features
+        counts[index] = counts.get(index, 0.0) + 1.0
+    norm = math.sqrt(sum(v * v for v in counts.values())) or 1.0
+    return {index: value / norm for index, value in counts.items()}
+
+
+class LinearIntentModel:
+    """Multinomial logistic regression over sparse hashed features."""
+
+    def __init__(self, classes: Sequence[str] = INTENT_CLASSES, num_features: int = 1 << 18):
+        self.classes = list(classes)
+        self.num_features = num_features
+        self.bias = [0.0] * len(self.classes)
+        self.weights: Dict[int, List[float]] = {}
+
+    def features(self, text: str) -> Dict[int, float]:
+        return hashed_features(text, self.num_features)
+
+    def predict_proba(self, text: str) -> List[float]:
+        scores = list(self.bias)
+        for index, value in self.features(text).items():
+            row = self.weights.get(index)
+            if row is not None:
+                for k, weight in enumerate(row):
+                    scores[k] += weight * value
+        top = max(scores)
+        exps = [math.exp(s - top) for s in scores]
+        total = sum(exps)
+        return [e / total for e in exps]
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        """Most likely class and its probability."""
+        probabilities = self.predict_proba(text)
+        best = max(range(len(probabilities)), key=probabilities.__getitem__)
+        return self.classes[best], probabilities[best]
+
+    def fit(self, examples: Sequence[Tuple[str, str]], epochs: int = 20,
+            learning_rate: float = 1.0, seed: int = 0) -> "LinearIntentModel":
+        """Train with plain SGD on (text, classification) pairs."""
+        labels = {name: k for k, name in enumerate(self.classes)}
+        data = [(self.features(text), labels[label]) for text, label in examples if label in labels]
+        rng = random.Random(seed)
+        n = len(self.classes)
+        for epoch in range(epochs):
+            rng.shuffle(data)
+            rate = learning_rate / (1 + 0.1 * epoch)
+            for features, label in data:
+                scores = list(self.bias)
+                rows = []
+                for index, value in features.items():
+                    row = self.weights.get(index)
+                    if row is None:
+                        row = self.weights[index] = [0.0] * n
+                    rows.append((row, value))
+                    for k in range(n):
+                        scores[k] += row[k] * value
+                top = max(scores)
+                exps = [math.exp(s - top) for s in scores]
+                total = sum(exps)
+                for k in range(n):
+                    gradient = exps[k] / total - (1.0 if k == label else 0.0)
+                    if abs(gradient) < 1e-4:
+                        continue
+                    self.bias[k] -= rate * gradient
+                    for row, value in rows:
+                        row[k] -= rate * gradient * value
+        return self
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "classes": self.classes,
+            "num_features": self.num_features,
+            "bias": self.bias,
+            "weights": {str(index): [round(w, 6) for w in row] for index, row in self.weights.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "LinearIntentModel":
+        model = cls(data["classes"], int(data["num_features"]))
+        model.bias = [float(b) for b in data["bias"]]
+        model.weights = {int(index): [float(w) for w in row] for index, row in data["weights"].items()}
+        return model
+
+
+def load_examples(paths: Iterable[Optional[str]], sources: Sequence[str] = ("seed", "gpt", "label")
+                  ) -> List[Tuple[str, str]]:
+    """(text, classification) pairs from seed files and request logs.
+
+    Log lines carry a `source`; only labels from the LLM or a human are used,
+    never the local model's own predictions.
+    """
+    examples = []
+    for path in paths:
+        if not path or not os.path.exists(path):
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    logger.warning("Skipping malformed intent example in %s", path)
+                    continue
+                if row.get("source", "seed") in sources and row.get("classification") in INTENT_CLASSES \
+                        and row.get("text"):
+                    examples.append((row["text"], row["classification"]))
+    return examples
+
+
+# ---------------------------------------------------------------------------
+# Entity extraction
+# ---------------------------------------------------------------------------
+
+# Lookaheads that end a phrase: punctuation, a conjunction or a trailing clause.
+# _END_LIST lets comma-separated lists through; _END_NAME also stops before "in my pie".
+_CLAUSE = (r"\s+(?:and why|and explain|why|because|please|instead|as substitutes?|as the substitutes?"
+           r"|at home|any|what|is that|made|cooked|prepared|but|give|got|and (?:update|rewrite|show|tell))\b"
+           r"|\s+-\s|$")
+_END = r"(?=\s*[?.!,;:]|" + _CLAUSE + ")"
+_END_LIST = r"(?=\s*[?.!;:]|,\s*(?:any|what|give|please|got|dinner|lunch|recipes?|ideas?)\b|" + _CLAUSE + ")"
+_END_NAME = r"(?=\s+(?:in|for|on|to|with|from)\b|\s*[?.!,;:]|" + _CLAUSE + ")"
+_DETERMINERS = re.compile(r"^(?:the|my|a|an|some|this|that|our|your|leftover|any)\s+", re.I)
+# Spans that refer back to something instead of naming it
+_NON_NAMES = {"it", "them", "that", "this", "something", "anything", "one", "recipe", "dish"}
+_REASONING = re.compile(r"\b(?:why|explain|reasons?|because)\b|ทำไม|เพราะ|เหตุผล", re.I)
+_NUMBER_WORDS = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+                 "seven": 7, "eight": 8, "nine": 9, "ten": 10}
+_MAX_RESULTS = re.compile(
+    r"\b(?:top\s+(\d{1,2}|" + "|".join(_NUMBER_WORDS) + r")\b|(\d{1,2}|" + "|".join(_NUMBER_WORDS) +
+    r")\s+(?:\w+\s+)?(?:recipes?|ideas?|options?|substitutes?|alternatives?|dishes|ingredients?"
+    r"|results?|suggestions?|ways|things|choices))", re.I)
+_RECIPE_CONTEXTS = {
+    "vegetarian": "vegetarian", "vegan": "vegan", "gluten free": "gluten-free",
+    "gluten-free": "gluten-free", "dairy free": "dairy-free", "dairy-free": "dairy-free",
+    "keto": "keto", "halal": "halal", "low carb": "low-carb", "healthy": "healthy",
+    "thai": "Thai", "italian": "Italian", "chinese": "Chinese", "japanese": "Japanese",
+    "indian": "Indian", "mexican": "Mexican", "french": "French", "korean": "Korean",
+    "มังสวิรัติ": "vegetarian", "เจ": "vegan", "อาหารไทย": "Thai",
+}
+
+_SUBSTITUTE_PATTERNS = [
+    r"(?:instead of|in place of|replacements? for|substitutes? for|alternatives? to|sub for"
+    r"|swap for|replace|ran out of|out of|don'?t have|do not have|no|substitute)\s+(?P<ingredient>.+?)" + _END_NAME,
+    r"^\s*(?P<ingredient>[\w' -]+?)\s+(?:substitutes?|alternatives?|replacements?)\b",
+    r"(?:แทน|ไม่มี)(?P<ingredient>\S+?)(?:ใน|ได้|ใช้|\s|$)",
+]
+_REWRITE_PATTERNS = [
+    r"uses\s+(?P<ingredient>[\w' -]+?),?\s+(?:change|swap|replace)\s+(?:it|them)\s+(?:to|with|for)\s+"
+    r"(?P<replacement>.+?)" + _END,
+    r"(?:replace|swap|change|substitute)\s+(?P<ingredient>.+?)\s+(?:with|for|to|by)\s+(?P<replacement>.+?)" + _END,
+    r"(?:use|using|with)\s+(?P<replacement>[\w' -]+?)\s+(?:instead of|in place of)\s+(?P<ingredient>.+?)" + _END,
+    r"(?P<replacement>[\w'-]+(?:\s+[\w'-]+)?)\s+(?:instead of|in place of)\s+(?P<ingredient>.+?)" + _END,
+    r"เปลี่ยน(?P<ingredient>\S+?)(?:ใน(?P<recipe>\S+?))?เป็น(?P<replacement>\S+)",
+    r"ใช้(?P<replacement>\S+?)แทน(?P<ingredient>\S+)",
+]
+_REWRITE_RECIPE_PATTERNS = [
+    r"^\s*in\s+(?P<recipe>[^,?]+),",
+    r"^\s*in\s+(?P<recipe>[\w' -]+?)\s+(?:replace|swap|change|substitute|use)\b",
+    r"\b(?:my|the)\s+(?P<recipe>[\w' -]+?)\s+recipe\b",
+    r"\b(?:rewrite|update|redo|edit)\s+(?P<recipe>[\w' -]+?)\s+(?:with|using|to)\b",
+    r"\bin\s+(?!place of)(?P<recipe>.+?)" + _END,
+    r"(?:สูตร|ใน)(?P<recipe>[^\s,]+?)(?:โดย|เปลี่ยน|แบบ|\s|$)",
+]
+_SUGGEST_PATTERNS = [
+    r"(?:i have|i've got|i got|got some|got|i only have|only have|have|ingredients i have|fridge has"
+    r"|using|with|from|make with|cook with)\s*:?\s+(?P<ingredients>.+?)" + _END_LIST,
+    r"^(?P<ingredients>[^?.!]+?,[^?.!]+?)\s+-\s",
+    r"มี(?P<ingredients>.+?)\s*(?:ทำ|แนะนำ|$)",
+]
+_SPECIFIC_PATTERNS = [
+    r"(?:must|has to|have to|needs? to|should)\s+(?:include|have|contain|use)\s+(?:both\s+)?"
+    r"(?P<required_ingredients>.+?)" + _END_LIST,
+    r"(?:recipes?|dish(?:es)?)\s+where\s+(?P<required_ingredients>.+?)\s+(?:are|is)\s+required",
+    r"ต้อง(?:มี|ใส่|ใช้)(?P<required_ingredients>.+?)(?:ในสูตร|\s|$)",
+]
+_SIMILAR_PATTERNS = [
+    r"(?:similar to|resembling|comparable to|same style as|alternatives to|like)\s+(?P<recipe>.+?)" + _END,
+    r"^\s*i\s+(?:love|loved|like|liked|enjoy|enjoyed)\s+(?P<recipe>[^,.!?]+)",
+    r"(?:คล้าย|เหมือน)(?:กับ)?ๆ?(?P<recipe>\S+)",
+]
+_LOOKUP_PATTERNS = [
+    r"(?:how (?:do|can|should) (?:i|you|we) (?:make|cook|prepare)|how to (?:make|cook|prepare)"
+    r"|recipe (?:for|of)|steps (?:to|for) (?:make|making|cook|cooking)?|teach me (?:to|how to) (?:make|cook)"
+    r"|what do i need to make|cooking method for|show me how to (?:cook|make)|how is"
+    r"|(?:ingredients|instructions|steps|method)(?:\s+and\s+(?:steps|instructions|method))?\s+"
+    r"(?:for|of|to make)(?: making)?)\s+(?P<recipe>.+?)" + _END,
+    r"(?:วิธีทำ|สูตร|ทำ)(?P<recipe>\S+?)(?:หน่อย|ยังไง|อย่างไร|\s|$)",
+]
+_RECIPE_CUSTOM_PATTERNS = [
+    r"(?:rebuild|remake|recreate|rework|redo|adapt|customi[sz]e|make a version of|make)\s+"
+    r"(?P<recipe>.+?)\s+(?:using|with)\s+(?P<substitutes>.+?)" + _END_LIST,
+    r"(?:ปรับสูตร|ดัดแปลง|ทำ)(?P<recipe>\S+?)โดยใช้(?P<substitutes>\S+)",
+]
+_CONTEXT_TITLE = re.compile(r"\b(?:for|to go with|in)\s+(?:my|a|an|the|some)\s+(?P<title>.+?)" + _END, re.I)
+_CONTEXT_LEAD = re.compile(r"^\s*(?:i(?:'m| am)? (?:want|need|looking for|would like)|looking for|give me"
+                           r"|suggest|show me|what(?:'s| is| are)?)\s+", re.I)
+
+
+def _is_english(value: Any) -> bool:
+    if isinstance(value, list):
+        return all(_is_english(v) for v in value)
+    return not isinstance(value, str) or not _THAI.search(value)
+
+
+class EntityExtractor:
+    """Dataset- and pattern-driven entity extraction for each intent."""
+
+    def __init__(self, dataset_service: DatasetService, context_parser: Optional[ContextParser] = None):
+        self.dataset_service = dataset_service
+        self.context_parser = context_parser or ContextParser(dataset_service)
+        self._automaton: Optional[AhoCorasick] = None
+        self._lock = threading.Lock()
+
+    @property
+    def automaton(self) -> AhoCorasick:
+        """Every dataset name and alias -> the entry's English name."""
+        with self._lock:
+            if self._automaton is None:
+                automaton = AhoCorasick()
+                for entry in self.dataset_service.entries():
+                    names = [entry.canonical_name] + entry.other_names
+                    english = next((n for n in names if n and _is_english(n)), None)
+                    if english is None:
+                        continue
+                    for name in names:
+                        surface = _normalize(name)
+                        if surface:
+                            automaton.add(surface, english.lower())
+                automaton.build()
+                self._automaton = automaton
+            return self._automaton
+
+    def ingredients_in(self, text: str) -> List[str]:
+        """English names of the dataset ingredients mentioned, leftmost-longest."""
+        text = _normalize(text)
+        matches = sorted(self.automaton.iter_matches(text), key=lambda m: (m[0], m[0] - m[1]))
+        names, last_end = [], -1
+        for start, end, name in matches:
+            if start >= last_end and name not in names:
+                names.append(name)
+                last_end = end
+        return names
+
+    def _clean(self, span: Optional[str], *, ingredient: bool = False) -> Optional[str]:
+        """Trim determiners and punctuation; Thai ingredient names become English."""
+        if not span:
+            return None
+        span = re.sub(r"\s+", " ", span).strip(" \t'\"?.!,;:-ๆ")
+        span = re.sub(r"\s+recipe$", "", _DETERMINERS.sub("", _DETERMINERS.sub("", span)), flags=re.I)
+        if not span or span.lower() in _NON_NAMES:
+            return None
+        if ingredient and not _is_english(span):
+            found = self.ingredients_in(span)
+            if found:
+                return found[0]
+        return span
+
+    def _clean_list(self, span: Optional[str]) -> Optional[List[str]]:
+        if not span:
+            return None
+        items = []
+        for part in re.split(r"\s*(?:,|\band\b|&|\+|/|\s-\s|และ|กับ)\s*|\s+(?=[฀-๿])", span):
+            part = re.sub(r"\s+as\s+substitutes?$", "", part.strip(), flags=re.I)
+            name = self._clean(part, ingredient=True)
+            if name and name not in items:
+                items.append(name)
+        return items or None
+
+    @staticmethod
+    def _match(patterns: Sequence[str], text: str) -> Optional[re.Match]:
+        for pattern in patterns:
+            match = re.search(pattern, text, re.I)
+            if match:
+                return match
+        return None
+
+    @staticmethod
+    def max_results(text: str) -> Optional[int]:
+        match = _MAX_RESULTS.search(text)
+        if not match:
+            return None
+        value = (match.group(1) or match.group(2)).lower()
+        return _NUMBER_WORDS.get(value) or int(value)
+
+    def extract(self, classification: str, message: str) -> Dict[str, Any]:
+        """The entity object for `message` under `classification`."""
+        text = (message or "").strip()
+        entities: Dict[str, Any] = {"max_results": self.max_results(text)}
+
+        if classification == "substitute":
+            match = self._match(_SUBSTITUTE_PATTERNS, text)
+            ingredient = self._clean(match.group("ingredient"), ingredient=True) if match else None
+            if ingredient is None:
+                found = self.ingredients_in(text)
+                ingredient = found[0] if found else None
+            rest = text[match.end():] if match else text
+            recipe = re.search(r"\b(?:in|for|on)\s+(?P<recipe>.+?)" + _END, rest, re.I)
+            entities.update(ingredient=ingredient,
+                            recipe=self._clean(recipe.group("recipe")) if recipe else None,
+                            include_reasoning=bool(_REASONING.search(text)))
+
+        elif classification == "rewrite":
+            match = self._match(_REWRITE_PATTERNS, text)
+            ingredient = replacement = recipe = None
+            if match:
+                ingredient, replacement = match.group("ingredient"), match.group("replacement")
+                recipe = match.groupdict().get("recipe")
+                inner = re.split(r"\s+in\s+|ใน", ingredient, maxsplit=1)
+                if len(inner) == 2:
+                    ingredient, recipe = inner
+                replacement = re.split(r"\s+in\s+", replacement, maxsplit=1)[0]
+                replacement = re.split(r"\b(?:with|use|using)\s+", replacement)[-1]
+            if recipe is None:
+                found = self._match(_REWRITE_RECIPE_PATTERNS, text)
+                recipe = found.group("recipe") if found else None
+            original = re.search(r"(?:ingredients?|recipe)\s*:\s*(?P<original>[^,]+,.+)$", text, re.I)
+            entities.update(ingredient=self._clean(ingredient, ingredient=True),
+                            replacement=self._clean(replacement, ingredient=True),
+                            recipe=self._clean(recipe),
+                            original_ingredients=original.group("original").strip() if original else None)
+
+        elif classification == "suggest":
+            match = self._match(_SUGGEST_PATTERNS, text)
+            ingredients = self._clean_list(match.group("ingredients")) if match else None
+            entities["ingredients"] = ingredients or self.ingredients_in(text) or None
+
+        elif classification == "specific":
+            match = self._match(_SPECIFIC_PATTERNS, text)
+            required = self._clean_list(match.group("required_ingredients")) if match else None
+            lowered = text.lower()
+            context = next((value for key, value in _RECIPE_CONTEXTS.items()
+                            if re.search(rf"(?<![\w-]){re.escape(key)}(?![\w-])", lowered) or
+                            (_THAI.match(key) and key in lowered)), None)
+            entities.update(required_ingredients=required or self.ingredients_in(text) or None,
+                            recipe_context=context)
+
+        elif classification in ("similar", "lookup"):
+            match = self._match(_SIMILAR_PATTERNS if classification == "similar" else _LOOKUP_PATTERNS, text)
+            entities["recipe"] = self._clean(match.group("recipe")) if match else None
+
+        elif classification == "recipe_custom":
+            match = self._match(_RECIPE_CUSTOM_PATTERNS, text)
+            if match:
+                entities.update(recipe=self._clean(match.group("recipe")),
+                                substitutes=self._clean_list(match.group("substitutes")))
+
+        elif classification == "context":
+            parsed = self.context_parser.parse(text)
+            attributes = {key: (parsed.first(key) or "").lower() or None for key in ATTRIBUTES}
+            title = _CONTEXT_TITLE.search(text)
+            entities.update(
+                attributes=attributes if any(attributes.values()) else None,
+                natural_description=_CONTEXT_LEAD.sub("", text).rstrip(" ?.!") or None,
+                recipe_title=self._clean(title.group("title")) if title else None,
+            )
+
+        return normalize_entities(classification, entities)
+
+
+# ---------------------------------------------------------------------------
+# Request log
+# ---------------------------------------------------------------------------
+
+class IntentLog:
+    """Appends classified messages as JSON lines on a writer thread, rotating the file by size."""
+
+    def __init__(self, config: Config):
+        self.path = config.intent_log_path
+        self.queue: queue.Queue = queue.Queue(maxsize=config.intent_log_queue_size)
+        self.dropped = 0
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        handler = RotatingFileHandler(self.path, maxBytes=config.intent_log_max_bytes,
+                                      backupCount=config.intent_log_backups, encoding="utf-8", delay=True)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        self.listener = QueueListener(self.queue, handler)
+        self.listener.start()
+        self._closed = False
+        atexit.register(self.close)
+
+    def write(self, row: Dict[str, Any]):
+        """Queue one line; dropped (and counted) if the writer is behind."""
+        record = logging.makeLogRecord({"msg": json.dumps(row, ensure_ascii=False)})
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self):
+        """Block until every queued line is written."""
+        self.queue.join()
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self.listener.stop()
+            for handler in self.listener.handlers:
+                handler.close()
+
+
+# ---------------------------------------------------------------------------
+# Classifier
+# ---------------------------------------------------------------------------
+
+class IntentClassifier:
+    """Local intent classification with an LLM fallback below the confidence threshold."""
+
+    def __init__(self, config: Config, dataset_service: Optional[DatasetService] = None,
+                 openai_service=None):
+        self.config = config
+        self.dataset_service = dataset_service or DatasetService(config)
+        self.openai_service = openai_service
+        self.extractor = EntityExtractor(self.dataset_service)
+        self._lock = threading.Lock()
+        self.intent_log = IntentLog(config) if config.intent_log_enabled and config.intent_log_path else None
+        self._model: Optional[LinearIntentModel] = None
+        self._model_key: Optional[Tuple[str, float]] = None
+        self.stats = {"local": 0, "gpt": 0, "gpt_failed": 0}
+
+    def ensure_loaded(self) -> LinearIntentModel:
+        """The trained model file if there is one (reloaded when it changes), else train from the seed."""
+        path = self.config.intent_model_path
+        try:
+            key = (path, os.path.getmtime(path))
+        except (OSError, TypeError):
+            key = ("seed", 0.0)
+        with self._lock:
+            if self._model is None or key != self._model_key:
+                self._model = self._load(key)
+                self._model_key = key
+            return self._model
+
+    def _load(self, key: Tuple[str, float]) -> LinearIntentModel:
+        if key[0] != "seed":
+            try:
+                with open(key[0], "r", encoding="utf-8") as f:
+                    model = LinearIntentModel.from_dict(json.load(f))
+                logger.info("Loaded intent model from %s", key[0])
+                return model
+            except (OSError, ValueError, KeyError) as e:
+                logger.error("Failed to load intent model %s: %s", key[0], e)
+        examples = load_examples([self.config.intent_seed_path])
+        model = LinearIntentModel(num_features=self.config.intent_num_features).fit(examples)
+        logger.info("Trained intent model on %s seed examples", len(examples))
+        return model
+
+    def classify_local(self, message: str) -> IntentResult:
+        classification, probability = self.ensure_loaded().predict(message)
+        entities = self.extractor.extract(classification, message)
+        confidence = probability
+        required = REQUIRED_ENTITIES.get(classification, ())
+        if any(entities.get(name) in (None, []) for name in required) or \
+                not all(_is_english(value) for value in entities.values()):
+            confidence = min(confidence, _UNRESOLVED_CONFIDENCE)
+        return IntentResult(classification, round(confidence, 3), entities, "local")
+
+    def classify(self, message: str) -> IntentResult:
+        """Classify a chat message; the LLM is only asked below `intent_min_confidence`."""
+        result = self.classify_local(message)
+        if result.confidence < self.config.intent_min_confidence and self.openai_service is not None:
+            answer = self.openai_service.classify_message(message)
+            if answer and answer.get("classification") in INTENT_CLASSES:
+                classification = answer["classification"]
+                try:
+                    confidence = float(answer.get("confidence"))
+                except (TypeError, ValueError):
+                    confidence = self.config.intent_min_confidence
+                result = IntentResult(classification, confidence,
+                                      normalize_entities(classification, answer.get("entities")), "gpt")
+            else:
+                self.stats["gpt_failed"] += 1
+        self.stats[result.source] += 1
+        self.log(message, result)
+        return result
+
+    def log(self, message: str, result: IntentResult):
+        """Queue the request for the intent log (training data when labelled by the LLM), if enabled."""
+        if self.intent_log is None:
+            return
+        self.intent_log.write({"ts": round(time.time(), 3), "text": message,
+                               "classification": result.classification, "confidence": result.confidence,
+                               "entities": result.entities, "source": result.source})
+
+    def snapshot(self) -> Dict[str, Any]:
+        snapshot = dict(self.stats)
+        if self.intent_log is not None:
+            snapshot["log_dropped"] = self.intent_log.dropped
+        return snapshot
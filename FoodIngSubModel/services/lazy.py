@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Lazy Service Proxy for Recipe Suggestion System
+
+backend_api's module globals (openai_service, recipe_service, ...) are
+LazyService proxies, so importing the app builds nothing: each service, and
+the SDK clients and files it loads, is built on first use by a request, a
+/ready probe or the warmup. The proxy forwards attribute reads, writes and
+deletes to the built service, so `backend_api.recipe_service.search_index`
+and `patch("backend_api.recipe_service", mock)` work as before.
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class LazyService:
+    """Builds `factory()` once, on first attribute access, and forwards to it."""
+
+    def __init__(self, name: str, factory: Callable[[], Any]):
+        object.__setattr__(self, "_name", name)
+        object.__setattr__(self, "_factory", factory)
+        object.__setattr__(self, "_instance", None)
+        object.__setattr__(self, "_lock", threading.Lock())
+
+    def _resolve(self) -> Any:
+        instance = self._instance
+        if instance is None:
+            with self._lock:
+                instance = self._instance
+                if instance is None:
+                    started = time.perf_counter()
+                    instance = self._factory()
+                    object.__setattr__(self, "_instance", instance)
+                    logger.info("Built %s in %.0fms", self._name, (time.perf_counter() - started) * 1000)
+        return instance
+
+    @property
+    def built(self) -> bool:
+        return self._instance is not None
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._resolve(), name)
+
+    def __setattr__(self, name: str, value: Any):
+        setattr(self._resolve(), name, value)
+
+    def __delattr__(self, name: str):
+        delattr(self._resolve(), name)
+
+    def __repr__(self) -> str:
+        state = repr(self._instance) if self.built else "not built"
+        return f"<LazyService {self._name}: {state}>"
+
+
+def resolve(service: Any) -> Any:
+    """The built service behind a LazyService (building it if needed); anything else as-is."""
+    return service._resolve() if isinstance(service, LazyService) else service
@@ -0,0 +1,485 @@
+#!/usr/bin/env python3
+"""
+LLM Providers for Recipe Suggestion System
+
+Chat completion backends behind OpenAIService._make_request: OpenAI, Gemini
+(through its OpenAI-compatible endpoint, so prompts and parsing are shared)
+and an in-process fake for local runs. ProviderRouter keeps a rolling window
+of latency and errors per provider, sends each call to the fastest healthy
+one and fails over to the next within a single deadline. Calls still running
+at their route's rolling p90 are hedged with one duplicate request, within a
+global budget of extra calls; whichever of the two loses is hung up on.
+"""
+
+import json
+import logging
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+class ProviderError(Exception):
+    """A provider call failed; status_code is the HTTP status when known."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class CallCancelled(Exception):
+    """A call was abandoned through its `cancel` event (a hedge twin answered first)."""
+
+
+class LLMProvider:
+    """One chat completion backend."""
+
+    name = "provider"
+
+    @property
+    def is_available(self) -> bool:
+        return True
+
+    def model_for(self, model: str) -> str:
+        """The provider's model for a route's (OpenAI) model name."""
+        return model
+
+    def warm(self, timeout: float):
+        """Open a keep-alive connection ahead of the first call (no-op by default)."""
+
+    def complete(self, model: str, system_message: str, user_message: str,
+                 max_tokens: int, temperature: float, timeout: float,
+                 cancel: Optional[threading.Event] = None) -> Tuple[str, Any]:
+        """
+        Reply text and usage object (or None) for one chat call. Once `cancel`
+        is set the call should stop early and raise CallCancelled.
+        """
+        raise NotImplementedError
+
+
+class OpenAIProvider(LLMProvider):
+    """OpenAI Chat Completions through an `openai.OpenAI` client."""
+
+    name = "openai"
+
+    def __init__(self, client: Any = None):
+        self.client = client
+
+    @property
+    def is_available(self) -> bool:
+        return self.client is not None
+
+    def complete(self, model, system_message, user_message, max_tokens, temperature, timeout,
+                 cancel=None):
+        request = dict(
+            model=model,
+            messages=[
+                {"role": "system", "content": system_message},
+                {"role": "user", "content": user_message}
+            ],
+            max_tokens=max_tokens,
+            temperature=temperature,
+            timeout=timeout,
+        )
+        if cancel is None:
+            response = self.client.chat.completions.create(**request)
+            return (response.choices[0].message.content or "").strip(), getattr(response, "usage", None)
+
+        # Streamed, so a cancelled call closes its connection at the next chunk
+        # instead of holding it until the whole reply is generated
+        if cancel.is_set():
+            raise CallCancelled(f"{self.name} call cancelled")
+        parts, usage = [], None
+        with self.client.chat.completions.create(**request, stream=True,
+                                                 stream_options={"include_usage": True}) as stream:
+            for chunk in stream:
+                if cancel.is_set():
+                    raise CallCancelled(f"{self.name} call cancelled")
+                if chunk.choices:
+                    parts.append(chunk.choices[0].delta.content or "")
+                usage = getattr(chunk, "usage", None) or usage
+        return "".join(parts).strip(), usage
+
+    def warm(self, timeout: float):
+        # Listing models is free and leaves a pooled TLS connection behind
+        self.client.models.list(timeout=timeout)
+
+
+class GeminiProvider(OpenAIProvider):
+    """Gemini through its OpenAI-compatible endpoint, with the same request shape."""
+
+    name = "gemini"
+
+    def __init__(self, config: Config, client: Any = None):
+        super().__init__(client)
+        self.config = config
+
+    def model_for(self, model: str) -> str:
+        return model if model.startswith("gemini") else self.config.gemini_model
+
+
+def canned_reply(system: str, user: str) -> str:
+    """A reply in whichever output format the system prompt requests."""
+    if "routing agent" in system:
+        return json.dumps({"classification": "clarify", "confidence": 0.9, "entities": {}})
+    if "Changed Ingredients" in system:
+        return ("Changed Ingredients:\n- 2 cups main ingredient => 2 cups replacement ingredient\n"
+                "Changed Steps:\n2. Cook the replacement until done.")
+    if "JSON object" in system:
+        return json.dumps({"taste": "sweet", "texture": "creamy", "color": None, "cooking_method": None})
+    if "Updated Ingredients" in system:
+        return ("Updated Ingredients: 2 cups replacement ingredient, 1 onion, 2 cloves garlic | "
+                "Updated Cooking Method: 1. Prepare the ingredients. 2. Cook until done.")
+    if "Cooking Method" in system:
+        return ("Ingredients: 2 cups main ingredient, 1 onion, 2 cloves garlic | "
+                "Cooking Method: 1. Prepare the ingredients. 2. Cook until done.")
+    if "Recipe: <name>" in system:
+        # Include the required ingredients so /specific's containment check passes
+        required = user.splitlines()[0].split(":", 1)[-1].strip() if "MUST" in user else "rice, garlic"
+        return "\n".join(f"{i}. Recipe: Fake Recipe {i} | Ingredients: {required}, onion, oil"
+                         for i in range(1, 4))
+    if "'id - reason'" in system:
+        return "\n".join(f"{i} - similar role in the recipe" for i in range(1, 6))
+    if "chosen ids" in system:
+        return "1,2,3,4,5"
+    if "reason" in system:
+        return "\n".join(f"{i}. Substitute {i} - similar role in the recipe" for i in range(1, 6))
+    return "\n".join(f"{i}. Ingredient {i}" for i in range(1, 6))
+
+
+class FakeProvider(LLMProvider):
+    """In-process provider answering `reply(system, user)` after `latency` seconds."""
+
+    name = "fake"
+
+    def __init__(self, reply: Optional[Callable[[str, str], str]] = None, latency: float = 0.0,
+                 error: Optional[int] = None, name: str = "fake"):
+        self.name = name
+        self.reply = reply or canned_reply
+        self.latency = latency
+        self.error = error  # HTTP status to fail every call with, or None
+
+    def complete(self, model, system_message, user_message, max_tokens, temperature, timeout,
+                 cancel=None):
+        if self.latency:
+            if (cancel or threading.Event()).wait(min(self.latency, timeout)):
+                raise CallCancelled(f"{self.name} call cancelled")
+            if self.latency > timeout:
+                raise ProviderError("Request timed out")
+        if self.error is not None:
+            raise ProviderError(f"Fake provider error {self.error}", status_code=self.error)
+        return self.reply(system_message, user_message), None
+
+
+def build_providers(config: Config, api_keys: Dict[str, Optional[str]]) -> List[LLMProvider]:
+    """Providers named in Config.llm_providers, in order; those without a key stay unavailable."""
+    providers: List[LLMProvider] = []
+    for name in config.llm_providers:
+        if name == "fake":
+            providers.append(FakeProvider())
+            continue
+        if name not in ("openai", "gemini"):
+            logger.warning("Unknown LLM provider: %s", name)
+            continue
+        provider = OpenAIProvider() if name == "openai" else GeminiProvider(config)
+        providers.append(provider)
+        api_key = api_keys.get(name)
+        if not api_key:
+            logger.warning("%s API key not found", name)
+            continue
+        base_url = config.openai_base_url if name == "openai" else config.gemini_base_url
+        try:
+            from openai import OpenAI
+            # No SDK retries: ProviderRouter retries and fails over within one deadline
+            provider.client = OpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+            logger.info("%s client initialized successfully", name)
+        except ImportError:
+            logger.error("OpenAI package not installed")
+        except Exception as e:
+            logger.error("Failed to initialize %s client: %s", name, e)
+    return providers
+
+
+class _ProviderStats:
+    """Rolling window of (ok, latency) outcomes for one provider."""
+
+    def __init__(self, window: int):
+        self.outcomes: deque = deque(maxlen=window)
+        self.calls = 0
+        self.errors = 0
+        self.failed_at: Optional[float] = None
+
+    def latency(self) -> float:
+        """
+        Mean latency of the successful calls in the window: 0 before any call, so
+        new providers get probed, and infinite while every recent call failed.
+        """
+        latencies = [latency for ok, latency in self.outcomes if ok]
+        if latencies:
+            return sum(latencies) / len(latencies)
+        return math.inf if self.outcomes else 0.0
+
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return sum(1 for ok, _ in self.outcomes if not ok) / len(self.outcomes)
+
+
+class ProviderRouter:
+    """Routes each chat call to the fastest healthy provider, failing over within one deadline."""
+
+    def __init__(self, config: Config, providers: List[LLMProvider]):
+        self.config = config
+        self.providers = providers
+        self._lock = threading.Lock()
+        self._stats = {p.name: _ProviderStats(config.provider_window) for p in providers}
+        self.failovers = 0
+        # Latencies of successful calls per route, for the hedging threshold
+        self._route_latencies: Dict[str, deque] = {}
+        self._hedge_tokens = config.hedge_burst
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.hedge_stats = {"calls": 0, "hedges": 0, "wins": 0, "denied": 0}
+
+    def provider(self, name: str) -> Optional[LLMProvider]:
+        return next((p for p in self.providers if p.name == name), None)
+
+    @property
+    def is_available(self) -> bool:
+        return any(p.is_available for p in self.providers)
+
+    def _healthy(self, stats: _ProviderStats, now: float) -> bool:
+        if len(stats.outcomes) < self.config.provider_min_samples:
+            return True
+        if stats.error_rate() <= self.config.provider_max_error_rate:
+            return True
+        # Half-open: let one call through after the cooldown to re-measure it
+        return stats.failed_at is not None and now - stats.failed_at >= self.config.provider_cooldown
+
+    def order(self) -> List[LLMProvider]:
+        """Available providers, healthy ones fastest first, then unhealthy ones as a last resort."""
+        now = time.monotonic()
+        with self._lock:
+            ranked = []
+            for index, provider in enumerate(self.providers):
+                if not provider.is_available:
+                    continue
+                stats = self._stats[provider.name]
+                ranked.append((not self._healthy(stats, now), stats.latency(), index, provider))
+        return [provider for *_, provider in sorted(ranked, key=lambda r: r[:3])]
+
+    def record(self, name: str, latency: float, ok: bool):
+        with self._lock:
+            stats = self._stats[name]
+            stats.outcomes.append((ok, latency))
+            stats.calls += 1
+            if not ok:
+                stats.errors += 1
+                stats.failed_at = time.monotonic()
+
+    def _call(self, provider: LLMProvider, route: str, model: str, system_message: str,
+              user_message: str, max_tokens: int, temperature: float, timeout: float,
+              on_result: Optional[Callable[..., None]], cancel: Optional[threading.Event] = None) -> str:
+        """
+        One attempt on one provider, recorded in the provider and route windows.
+        A cancelled attempt is not recorded: it was only slower than its twin.
+        """
+        provider_model = provider.model_for(model)
+        started = time.perf_counter()
+        try:
+            text, usage = provider.complete(provider_model, system_message, user_message,
+                                            max_tokens, temperature, timeout, cancel)
+        except CallCancelled:
+            raise
+        except Exception as e:
+            latency = time.perf_counter() - started
+            self.record(provider.name, latency, ok=False)
+            if on_result:
+                on_result(provider, provider_model, latency, None, e)
+            logger.error("%s request failed: %s", provider.name, e)
+            raise
+        latency = time.perf_counter() - started
+        self.record(provider.name, latency, ok=True)
+        with self._lock:
+            window = self._route_latencies.get(route)
+            if window is None:
+                window = self._route_latencies[route] = deque(maxlen=self.config.hedge_window)
+            window.append(latency)
+        if on_result:
+            on_result(provider, provider_model, latency, usage, None)
+        return text
+
+    def hedge_delay(self, route: str) -> Optional[float]:
+        """Rolling Config.hedge_percentile latency of `route`, or None until it has enough samples."""
+        with self._lock:
+            window = self._route_latencies.get(route)
+            if window is None or len(window) < self.config.hedge_min_samples:
+                return None
+            ordered = sorted(window)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * self.config.hedge_percentile))]
+
+    def _take_hedge(self) -> bool:
+        """Spend one hedge from the budget; each call earns Config.hedge_budget of one."""
+        with self._lock:
+            if self._hedge_tokens < 1.0:
+                self.hedge_stats["denied"] += 1
+                return False
+            self._hedge_tokens -= 1.0
+            self.hedge_stats["hedges"] += 1
+            return True
+
+    def _hedge_pool_size(self) -> int:
+        """A primary and a hedge per admitted request, so the pool never queues an LLM call."""
+        admitted = sum(self.config.admission_limits.values()) if self.config.admission_enabled else 0
+        return max(self.config.hedge_max_workers, 2 * admitted)
+
+    def _hedged(self, primary: LLMProvider, backup: LLMProvider, delay: float, deadline: float,
+                sent: List[LLMProvider], call: Callable[..., str]) -> str:
+        """
+        Run `primary`; if it has not answered `delay` after it started and the
+        budget allows, also run `backup` and return whichever succeeds first.
+        The loser is cancelled: it hangs up at its next streamed chunk, and in
+        any case its timeout ends at the shared deadline.
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._hedge_pool_size(),
+                                                    thread_name_prefix="llm-hedge")
+            executor = self._executor
+        started = threading.Event()
+
+        def run(provider: LLMProvider, cancel: threading.Event,
+                flag: Optional[threading.Event] = None) -> str:
+            if flag is not None:
+                flag.set()
+            # The timeout is taken when the call starts, not when it was queued
+            return call(provider, deadline - time.monotonic(), cancel)
+
+        cancels: Dict[Future, threading.Event] = {}
+        first_cancel = threading.Event()
+        first = executor.submit(run, primary, first_cancel, started)
+        cancels[first] = first_cancel
+        try:
+            # Time spent waiting for a pool thread does not count towards the hedge delay
+            started.wait(timeout=max(0.0, deadline - time.monotonic()))
+            done, _ = wait([first], timeout=delay)
+            if done or not self._take_hedge():
+                return first.result(timeout=max(0.0, deadline - time.monotonic()))
+            sent.append(backup)
+            logger.debug("Hedging %s with %s after %.0fms", primary.name, backup.name, delay * 1000)
+            backup_cancel = threading.Event()
+            cancels[executor.submit(run, backup, backup_cancel)] = backup_cancel
+            pending = set(cancels)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()),
+                                     return_when=FIRST_COMPLETED)
+                if not done:
+                    raise TimeoutError("LLM deadline exceeded")
+                for future in done:
+                    if future.exception() is None:
+                        if future is not first:
+                            with self._lock:
+                                self.hedge_stats["wins"] += 1
+                        return future.result()
+                    error = future.exception()
+            raise error
+        finally:
+            # Hang up on whatever is still running: an answer is in, or the deadline passed
+            for future, cancel in cancels.items():
+                future.cancel()
+                cancel.set()
+
+    def complete(self, model: str, system_message: str, user_message: str, max_tokens: int,
+                 temperature: float, on_result: Optional[Callable[..., None]] = None,
+                 route: str = "default", hedge: bool = True) -> Optional[str]:
+        """
+        Reply text from the first provider that answers before Config.llm_deadline,
+        or None. With `hedge`, a first attempt still running at the route's rolling
+        p90 is duplicated on the next provider (or the same one), within the hedge
+        budget. `on_result(provider, model, latency, usage, error)` is called per
+        attempt; the last exception is re-raised if every provider failed.
+        """
+        deadline = time.monotonic() + self.config.llm_deadline
+        with self._lock:
+            self.hedge_stats["calls"] += 1
+            self._hedge_tokens = min(self.config.hedge_burst,
+                                     self._hedge_tokens + self.config.hedge_budget)
+
+        def call(provider: LLMProvider, timeout: float, cancel: Optional[threading.Event] = None) -> str:
+            return self._call(provider, route, model, system_message, user_message,
+                              max_tokens, temperature, timeout, on_result, cancel)
+
+        remaining_providers = deque(self.order())
+        delay = self.hedge_delay(route) if hedge and self.config.hedge_enabled else None
+        last_error: Optional[BaseException] = None
+        attempt = 0
+        while remaining_providers:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            provider = remaining_providers.popleft()
+            if attempt:
+                with self._lock:
+                    self.failovers += 1
+                logger.warning("Failing over to %s (%.1fs left)", provider.name, remaining)
+            attempt += 1
+            try:
+                if attempt == 1 and delay is not None and delay < remaining:
+                    backup = remaining_providers[0] if remaining_providers else provider
+                    sent: List[LLMProvider] = []
+                    try:
+                        return self._hedged(provider, backup, delay, deadline, sent, call)
+                    finally:
+                        if sent and remaining_providers and remaining_providers[0] is backup:
+                            remaining_providers.popleft()
+                return call(provider, remaining)
+            except Exception as e:
+                last_error = e
+        if last_error is not None:
+            raise last_error
+        return None
+
+    def warm(self, timeout: float) -> Dict[str, bool]:
+        """Warm every available provider's connection; name -> success."""
+        warmed = {}
+        for provider in self.providers:
+            if not provider.is_available:
+                continue
+            try:
+                provider.warm(timeout)
+                warmed[provider.name] = True
+            except Exception as e:
+                logger.warning("Could not warm %s connection: %s", provider.name, e)
+                warmed[provider.name] = False
+        return warmed
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Rolling latency, error rate and health per provider, failovers, and hedge rate / win rate."""
+        now = time.monotonic()
+        with self._lock:
+            providers = {}
+            for provider in self.providers:
+                stats = self._stats[provider.name]
+                latency = stats.latency()
+                providers[provider.name] = {
+                    "available": provider.is_available,
+                    "healthy": self._healthy(stats, now),
+                    "calls": stats.calls,
+                    "errors": stats.errors,
+                    "rolling_latency_ms": round(latency * 1000, 1) if math.isfinite(latency) else None,
+                    "rolling_error_rate": round(stats.error_rate(), 3),
+                }
+            stats = dict(self.hedge_stats)
+            hedge_after = {route: len(window) for route, window in self._route_latencies.items()}
+        stats["hedge_rate"] = round(stats["hedges"] / stats["calls"], 4) if stats["calls"] else 0.0
+        stats["win_rate"] = round(stats["wins"] / stats["hedges"], 4) if stats["hedges"] else 0.0
+        stats["hedge_after_ms"] = {}
+        for route in sorted(hedge_after):
+            delay = self.hedge_delay(route)
+            stats["hedge_after_ms"][route] = round(delay * 1000, 1) if delay is not None else None
+        return {"providers": providers, "failovers": self.failovers, "hedging": stats}
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Log Pipeline for Recipe Suggestion System
+
+Keeps logging off the request path. Every logger propagates to one root
+QueueHandler, and a QueueListener thread formats and writes the records:
+
+- records stay unformatted (msg plus args) until the writer thread renders
+  them, so `logger.debug("... %s", x)` below the level costs one level check
+  and a sampled-out record is never formatted at all;
+- DEBUG records are sampled per logger (`Config.log_sample_rates`, matched
+  on the dotted logger name and its parents), so LOG_LEVEL=DEBUG stays
+  affordable in production while INFO lines (startup, index builds) are kept;
+- below ERROR, each logger has a token-bucket rate limit, and the next record
+  that gets through carries a `suppressed` count of the ones that did not;
+- each record carries the request id of the HTTP request that produced it
+  (RequestIdMiddleware, X-Request-ID), so one request's lines can be grepped;
+- a full queue drops records and counts them instead of blocking the caller.
+"""
+
+import json
+import logging
+import queue
+import random
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+
+from config import Config
+
+REQUEST_ID: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+_TEXT_FORMAT = "%(asctime)s - %(levelname)s - %(name)s [%(request_id)s] - %(message)s"
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg, request_id, suppressed, exc."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            payload["request_id"] = record.request_id
+        if getattr(record, "suppressed", 0):
+            payload["suppressed"] = record.suppressed
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """The human-readable format, with the request id ('-' outside a request)."""
+
+    def __init__(self):
+        super().__init__(_TEXT_FORMAT)
+
+    def format(self, record: logging.LogRecord) -> str:
+        if getattr(record, "request_id", None) is None:
+            record.request_id = "-"
+        return super().format(record)
+
+
+class SamplingFilter(logging.Filter):
+    """Per-logger sampling of DEBUG records and a per-logger rate limit below ERROR."""
+
+    def __init__(self, sample_rates: Optional[Dict[str, float]] = None, rate: float = 50.0,
+                 burst: float = 200.0, seed: Optional[int] = None):
+        super().__init__()
+        self.sample_rates = dict(sample_rates or {})
+        self.rate = rate
+        self.burst = burst
+        self._random = random.Random(seed)
+        self._buckets: Dict[str, list] = {}       # logger name -> [tokens, last refill]
+        self._suppressed: Dict[str, int] = {}
+        self._rates: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.stats = {"sampled_out": 0, "rate_limited": 0}
+
+    def sample_rate(self, name: str) -> float:
+        """The rate configured for `name` or its nearest dotted parent (1.0 if none)."""
+        rate = self._rates.get(name)
+        if rate is None:
+            key = name
+            while key not in self.sample_rates and "." in key:
+                key = key.rsplit(".", 1)[0]
+            rate = self._rates[name] = self.sample_rates.get(key, 1.0)
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        name = record.name
+        with self._lock:
+            if record.levelno < logging.INFO:
+                rate = self.sample_rate(name)
+                if rate < 1.0 and self._random.random() >= rate:
+                    self.stats["sampled_out"] += 1
+                    return False
+            if record.levelno < logging.ERROR and not self._take(name):
+                self._suppressed[name] = self._suppressed.get(name, 0) + 1
+                self.stats["rate_limited"] += 1
+                return False
+            record.suppressed = self._suppressed.pop(name, 0)
+        return True
+
+    def _take(self, name: str) -> bool:
+        now = time.monotonic()
+        bucket = self._buckets.get(name)
+        if bucket is None:
+            bucket = self._buckets[name] = [self.burst, now]
+        bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        if bucket[0] < 1.0:
+            return False
+        bucket[0] -= 1.0
+        return True
+
+
+class LazyQueueHandler(QueueHandler):
+    """Enqueues records without formatting them; drops (and counts) when the queue is full."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # QueueHandler.prepare would render the message here, on the caller's
+        # thread; the listener's formatter does it instead. Args must therefore
+        # not be mutated after the call, which holds for the values we log.
+        record.request_id = REQUEST_ID.get()
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogPipeline:
+    """The installed root queue handler, its filter and the writer thread."""
+
+    def __init__(self, config: Config, stream=None):
+        self.config = config
+        self.queue: queue.Queue = queue.Queue(maxsize=config.log_queue_size)
+        self.filter = SamplingFilter(config.log_sample_rates, config.log_rate_limit, config.log_rate_burst)
+        self.handler = LazyQueueHandler(self.queue)
+        self.handler.addFilter(self.filter)
+        output = logging.StreamHandler(stream)
+        output.setFormatter(JsonFormatter() if config.log_format == "json" else TextFormatter())
+        self.listener = QueueListener(self.queue, output, respect_handler_level=True)
+
+    @property
+    def started(self) -> bool:
+        return self.handler in logging.getLogger().handlers
+
+    def start(self):
+        """Install the queue handler on the root logger and start the writer (once)."""
+        if self.started:
+            return
+        root = logging.getLogger()
+        root.addHandler(self.handler)
+        root.setLevel(self.config.log_level.upper())
+        for name, level in self.config.log_levels.items():
+            logging.getLogger(name).setLevel(level.upper())
+        self.listener.start()
+
+    def stop(self):
+        """Remove the handler and write out whatever is still queued."""
+        if not self.started:
+            return
+        logging.getLogger().removeHandler(self.handler)
+        self.listener.stop()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "installed": self.started,
+            "level": self.config.log_level.upper(),
+            "format": self.config.log_format,
+            "queue_depth": self.queue.qsize(),
+            "dropped": self.handler.dropped,
+            **self.filter.stats,
+        }
+
+
+class RequestIdMiddleware:
+    """ASGI middleware binding each request's X-Request-ID (or a new one) to its log records."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_id = dict(scope["headers"]).get(b"x-request-id", b"").decode("latin-1")[:64] \
+            or uuid.uuid4().hex[:16]
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + \
+                    [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        token = REQUEST_ID.set(request_id)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            REQUEST_ID.reset(token)
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Model Router for Recipe Suggestion System
+
+Maps each OpenAIService method (or its classification) to a model, max_tokens
+and temperature, with weighted A/B variants and per-route latency/token metrics.
+The routing table is read from a JSON file and reloaded when it changes on disk.
+"""
+
+import logging
+import os
+import json
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from config import Config
+from models import RouteSettings
+
+logger = logging.getLogger(__name__)
+
+
+# OpenAIService method -> classification it serves (used as a fallback key)
+ROUTE_CLASSIFICATIONS: Dict[str, str] = {
+    "get_substitute_ingredients": "substitute",
+    "pick_substitutes": "substitute",
+    "get_context_based_ingredients": "context",
+    "pick_context_ingredients": "context",
+    "parse_natural_language_context": "context",
+    "get_recipe_suggestions": "suggest",
+    "get_similar_recipes": "similar",
+    "get_recipes_with_specific_ingredients": "specific",
+    "get_recipe_with_ingredients": "recipe_custom",
+    "get_recipe_details": "lookup",
+    "get_updated_recipe_with_substitution": "rewrite",
+    "get_updated_recipe_with_substitutions": "rewrite",
+    "classify_message": "classify",
+}
+
+
+class _RouteStats:
+    """Running counters for one (route, variant) pair."""
+
+    __slots__ = ("calls", "errors", "latency_total", "latency_max",
+                 "prompt_tokens", "cached_tokens", "completion_tokens")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.completion_tokens = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        ok_calls = self.calls - self.errors
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "avg_latency_ms": round(self.latency_total / self.calls * 1000, 1) if self.calls else 0.0,
+            "max_latency_ms": round(self.latency_max * 1000, 1),
+            "prompt_tokens": self.prompt_tokens,
+            # Prompt tokens the provider served from its prefix cache
+            "cached_tokens": self.cached_tokens,
+            "cached_share": round(self.cached_tokens / self.prompt_tokens, 3) if self.prompt_tokens else 0.0,
+            "completion_tokens": self.completion_tokens,
+            "avg_completion_tokens": round(self.completion_tokens / ok_calls, 1) if ok_calls else 0.0,
+        }
+
+
+class ModelRouter:
+    """Resolves per-route model settings and records per-route metrics."""
+
+    def __init__(self, config: Config):
+        self.config = config
+        self._lock = threading.Lock()
+        self._default: Dict[str, Any] = {}
+        self._routes: Dict[str, List[Dict[str, Any]]] = {}
+        self._mtime: Optional[float] = None
+        self._last_check = 0.0
+        self._stats: Dict[tuple, _RouteStats] = {}
+        self.reload(force=True)
+
+    # ------------------------------------------------------------------
+    # Routing table
+    # ------------------------------------------------------------------
+
+    def reload(self, force: bool = False) -> bool:
+        """Reload the routing table if the file changed. Returns True on reload."""
+        path = self.config.model_routes_path
+        try:
+            mtime = os.path.getmtime(path) if path else None
+        except OSError:
+            mtime = None
+
+        if not force and mtime == self._mtime:
+            return False
+
+        default, routes = {}, {}
+        if mtime is not None:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                default = data.get("default") or {}
+                for name, spec in (data.get("routes") or {}).items():
+                    variants = spec.get("variants") or [dict(spec, name="default")]
+                    routes[name] = [v for v in variants if float(v.get("weight", 1.0)) > 0]
+            except Exception as e:
+                # Keep serving the previous table on a bad edit
+                logger.error("Failed to load model routes from %s: %s", path, e)
+                return False
+
+        with self._lock:
+            self._default, self._routes, self._mtime = default, routes, mtime
+        logger.info("Loaded %s model routes from %s", len(routes), path)
+        return True
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._last_check < self.config.model_routes_reload_interval:
+            return
+        self._last_check = now
+        self.reload()
+
+    def resolve(self, route: str, default_max_tokens: int) -> RouteSettings:
+        """Pick the settings (and A/B variant) for a call on the given route."""
+        self._maybe_reload()
+        with self._lock:
+            default = self._default
+            variants = (self._routes.get(route)
+                        or self._routes.get(ROUTE_CLASSIFICATIONS.get(route, ""))
+                        or [])
+
+        variant: Dict[str, Any] = {}
+        if len(variants) == 1:
+            variant = variants[0]
+        elif variants:
+            weights = [float(v.get("weight", 1.0)) for v in variants]
+            variant = random.choices(variants, weights=weights, k=1)[0]
+
+        def pick(key, fallback):
+            value = variant.get(key)
+            if value is None:
+                value = default.get(key)
+            return fallback if value is None else value
+
+        return RouteSettings(
+            route=route,
+            variant=str(variant.get("name", "default")),
+            model=pick("model", self.config.openai_model),
+            max_tokens=int(pick("max_tokens", default_max_tokens)),
+            temperature=float(pick("temperature", self.config.temperature)),
+        )
+
+    # ------------------------------------------------------------------
+    # Metrics
+    # ------------------------------------------------------------------
+
+    def record(self, settings: RouteSettings, latency: float, usage: Any = None,
+               error: bool = False):
+        """Record latency and token usage for a completed call."""
+        key = (settings.route, settings.variant, settings.model)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = _RouteStats()
+            stats.calls += 1
+            stats.errors += int(error)
+            stats.latency_total += latency
+            stats.latency_max = max(stats.latency_max, latency)
+            if usage is not None:
+                stats.prompt_tokens += int(getattr(usage, "prompt_tokens", 0) or 0)
+                details = getattr(usage, "prompt_tokens_details", None)
+                stats.cached_tokens += int(getattr(details, "cached_tokens", 0) or 0)
+                stats.completion_tokens += int(getattr(usage, "completion_tokens", 0) or 0)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Metrics keyed as route -> variant -> model, so a reload that moves a
+        variant to another model keeps the old model's numbers beside the new.
+        """
+        result: Dict[str, Any] = {}
+        with self._lock:
+            for (route, variant, model), stats in sorted(self._stats.items()):
+                result.setdefault(route, {}).setdefault(variant, {})[model] = stats.as_dict()
+        return result
@@ -5,39 +5,69 @@ OpenAI Service for Recipe Suggestion System
 Handles all OpenAI API interactions for ingredient substitution and recipe suggestions.
 """
 
+import logging
 import os
 import re
 import json
-from typing import Dict, List, Optional
+import threading
+import time
+from dataclasses import replace
+from typing import Dict, List, Optional, Tuple
 
 from config import Config
-from models import SuggestionResult, RecipeSuggestion
-from utils import parse_numbered_list, logger
+from models import IngredientEntry, SuggestionResult, RecipeSuggestion
+from services.dataset_service import DatasetService
+from services.llm_providers import OpenAIProvider, ProviderRouter, build_providers
+from services.model_router import ModelRouter
+from services.prompt_registry import get_prompt
+from services.response_cache import CACHE_ONLY, PREFETCHING, ResponseCache, cached_llm_call
+from utils import parse_numbered_list
+
+logger = logging.getLogger(__name__)
+
+
+def _candidate_names(candidates: List[IngredientEntry]) -> List[str]:
+    """Cache key of a *_picks candidate list: picks come back as names, so order does not matter."""
+    return sorted(entry.canonical_name for entry in candidates)
 
 
 class OpenAIService:
     """Handles all OpenAI API interactions."""
     
-    def __init__(self, config: Config):
+    def __init__(self, config: Config, router: Optional[ModelRouter] = None,
+                 cache: Optional[ResponseCache] = None):
         self.config = config
-        self._client = None
+        self.router = router or ModelRouter(config)
+        self.providers: Optional[ProviderRouter] = None
+        # Interactive (non-prefetch) calls in flight and the last 429, read by the prefetcher
+        self._in_flight = 0
+        self._in_flight_lock = threading.Lock()
+        self.rate_limited_at: Optional[float] = None
         self._initialize_client()
+        self.cache = cache or ResponseCache(config, DatasetService(config).alias_index(),
+                                            embedder=self._embed)
     
     def _initialize_client(self):
-        """Initialize the OpenAI client."""
-        api_key = self._resolve_api_key()
-        if not api_key:
-            logger.warning("OpenAI API key not found")
-            return
-        
-        try:
-            from openai import OpenAI
-            self._client = OpenAI(api_key=api_key)
-            logger.info("OpenAI client initialized successfully")
-        except ImportError:
-            logger.error("OpenAI package not installed")
-        except Exception as e:
-            logger.error(f"Failed to initialize OpenAI client: {e}")
+        """Initialize the configured LLM providers (OpenAI also serves embeddings)."""
+        api_keys = {
+            "openai": self._resolve_api_key(),
+            "gemini": os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY"),
+        }
+        self.providers = ProviderRouter(self.config, build_providers(self.config, api_keys))
+    
+    @property
+    def _client(self):
+        """The OpenAI client (None when unavailable); replay and recording clients are swapped in here."""
+        provider = self.providers.provider("openai")
+        return provider.client if provider else None
+    
+    @_client.setter
+    def _client(self, client):
+        provider = self.providers.provider("openai")
+        if provider is None:
+            provider = OpenAIProvider()
+            self.providers = ProviderRouter(self.config, [provider] + self.providers.providers)
+        provider.client = client
     
     def _resolve_api_key(self) -> Optional[str]:
         """Resolve API key from environment or .env files."""
@@ -63,55 +93,76 @@ class OpenAIService:
                                     if val:
                                         return val
             except Exception as e:
-                logger.debug(f"Error reading {env_path}: {e}")
+                logger.debug("Error reading %s: %s", env_path, e)
         
         return None
     
     @property
     def is_available(self) -> bool:
-        """Check if OpenAI client is available."""
-        return self._client is not None
+        """Check if any LLM provider is available."""
+        return self.providers.is_available
     
-    def _make_request(self, system_message: str, user_message: str, 
-                     max_tokens: int = 200) -> Optional[str]:
-        """Make a standardized OpenAI API request."""
-        if not self.is_available:
+    @property
+    def interactive_in_flight(self) -> int:
+        """Number of user-facing requests currently waiting on OpenAI."""
+        return self._in_flight
+    
+    def warm_connections(self) -> Dict[str, bool]:
+        """Open keep-alive connections to every available provider (startup warmup)."""
+        return self.providers.warm(self.config.warmup_timeout)
+    
+    def _embed(self, text: str) -> Optional[List[float]]:
+        """Embedding vector for the semantic cache, or None if unavailable."""
+        if self._client is None:
             return None
-        
         try:
-            response = self._client.chat.completions.create(
-                model=self.config.openai_model,
-                messages=[
-                    {"role": "system", "content": system_message},
-                    {"role": "user", "content": user_message}
-                ],
-                max_tokens=max_tokens,
-                temperature=self.config.temperature
-            )
-            return response.choices[0].message.content.strip()
+            response = self._client.embeddings.create(model=self.config.embedding_model, input=text)
+            return response.data[0].embedding
         except Exception as e:
-            logger.error(f"OpenAI API request failed: {e}")
+            logger.debug("Embedding request failed: %s", e)
             return None
     
-    def get_substitute_ingredients(self, ingredient: str, recipe: str, 
-                                 max_results: int, include_reasoning: bool = False) -> SuggestionResult:
-        """Get ingredient substitutes from OpenAI."""
-        if include_reasoning:
-            system = (
-                f"You are a culinary expert. Provide up to {max_results} substitutes "
-                f"for the ingredient with brief reasons. Format each line as: "
-                f"'Ingredient - reason'. No extra text."
-            )
-        else:
-            system = (
-                f"You are a culinary expert. Provide up to {max_results} substitute "
-                f"ingredients for the target ingredient in the given recipe. "
-                f"Respond as a numbered list with only ingredient names."
-            )
+    def _make_request(self, system_message: str, user_message: str, 
+                     max_tokens: int = 200, route: str = "default") -> Optional[str]:
+        """Make a standardized LLM request using the settings for `route`, on the fastest healthy provider."""
+        if not self.is_available or CACHE_ONLY.get():
+            return None
+        
+        settings = self.router.resolve(route, max_tokens)
+        interactive = not PREFETCHING.get()
+        if interactive:
+            with self._in_flight_lock:
+                self._in_flight += 1
         
-        user = f"Ingredient: {ingredient}\nRecipe: {recipe}"
-        response_text = self._make_request(system, user, max_tokens=200)
+        def on_result(provider, model, latency, usage, error):
+            self.router.record(replace(settings, model=model), latency, usage, error=error is not None)
+            if getattr(error, "status_code", None) == 429:
+                self.rate_limited_at = time.monotonic()
         
+        try:
+            # Prefetches are never hedged; they only warm the cache
+            return self.providers.complete(settings.model, system_message, user_message,
+                                           settings.max_tokens, settings.temperature, on_result,
+                                           route=route, hedge=interactive)
+        except Exception as e:
+            logger.error("LLM request failed on every provider: %s", e)
+            return None
+        finally:
+            if interactive:
+                with self._in_flight_lock:
+                    self._in_flight -= 1
+    
+    @staticmethod
+    def substitute_prompt(ingredient: str, recipe: str, max_results: int,
+                          include_reasoning: bool = False) -> Tuple[str, str]:
+        """System and user messages for a substitute request."""
+        template = get_prompt("substitutes_with_reasons" if include_reasoning else "substitutes")
+        return template.render(ingredient=ingredient, recipe=recipe, max_results=max_results)
+    
+    @staticmethod
+    def parse_substitutes(response_text: Optional[str], max_results: int,
+                          include_reasoning: bool = False) -> SuggestionResult:
+        """Parse a substitute response into a SuggestionResult."""
         if not response_text:
             return SuggestionResult([], "none")
         
@@ -128,17 +179,81 @@ class OpenAIService:
             items = parse_numbered_list(response_text)
             return SuggestionResult(items[:max_results], "gpt")
     
+    @cached_llm_call(fuzzy=("ingredient", "recipe"), exact=("max_results", "include_reasoning"))
+    def get_substitute_ingredients(self, ingredient: str, recipe: str, 
+                                 max_results: int, include_reasoning: bool = False) -> SuggestionResult:
+        """Get ingredient substitutes from OpenAI."""
+        system, user = self.substitute_prompt(ingredient, recipe, max_results, include_reasoning)
+        response_text = self._make_request(system, user, max_tokens=200,
+                                            route="get_substitute_ingredients")
+        return self.parse_substitutes(response_text, max_results, include_reasoning)
+    
+    @staticmethod
+    def candidate_list(candidates: List[IngredientEntry]) -> str:
+        """One short numbered line per dataset candidate, for the *_picks prompts."""
+        lines = []
+        for i, entry in enumerate(candidates, 1):
+            attributes = [",".join(values[:3]) for values in (entry.flavors, entry.textures, entry.colors)]
+            lines.append(f"{i}: {entry.canonical_name} | " + " | ".join(attributes))
+        return "\n".join(lines)
+    
+    @staticmethod
+    def parse_picks(response_text: Optional[str], candidates: List[IngredientEntry],
+                    max_results: int, include_reasoning: bool = False) -> SuggestionResult:
+        """Map the ids in a *_picks reply back to candidate names (unknown ids are dropped)."""
+        if not response_text:
+            return SuggestionResult([], "none")
+        
+        picks = []
+        if include_reasoning:
+            for line in response_text.splitlines():
+                match = re.match(r"\W*(\d+)\W*(.*)", line.strip())
+                if match:
+                    picks.append((int(match.group(1)), match.group(2).strip()))
+        else:
+            # Only whole "4,1,9" tokens count; numbers inside stray prose do not
+            for token in re.split(r"[,\n]", response_text):
+                match = re.fullmatch(r"\s*#?(\d+)\.?\s*", token)
+                if match:
+                    picks.append((int(match.group(1)), ""))
+        
+        items, reasons, seen = [], [], set()
+        for number, reason in picks:
+            if not 1 <= number <= len(candidates) or number in seen:
+                continue
+            seen.add(number)
+            name = candidates[number - 1].canonical_name
+            if name in items:
+                continue
+            items.append(name)
+            reasons.append(reason)
+            if len(items) >= max_results:
+                break
+        
+        return SuggestionResult(items, "dataset+gpt" if items else "none",
+                                reasons if include_reasoning else None)
+    
+    @cached_llm_call(fuzzy=("ingredient", "recipe"), exact=("candidates", "max_results", "include_reasoning"),
+                     key_by={"candidates": _candidate_names})
+    def pick_substitutes(self, ingredient: str, recipe: str, candidates: List[IngredientEntry],
+                         max_results: int, include_reasoning: bool = False) -> SuggestionResult:
+        """Have GPT pick substitutes from dataset candidates, by id."""
+        template = get_prompt("substitute_picks_with_reasons" if include_reasoning else "substitute_picks")
+        system, user = template.render(ingredient=ingredient, recipe=recipe, max_results=max_results,
+                                       candidates=self.candidate_list(candidates))
+        response_text = self._make_request(system, user, max_tokens=120 if include_reasoning else 30,
+                                            route="pick_substitutes")
+        return self.parse_picks(response_text, candidates, max_results, include_reasoning)
+    
+    @cached_llm_call(fuzzy=("ingredients",), exact=("max_results",))
     def get_recipe_suggestions(self, ingredients: List[str], 
                              max_results: int) -> List[RecipeSuggestion]:
         """Get recipe suggestions based on ingredients."""
-        system = (
-            f"You are a concise culinary assistant. Suggest up to {max_results} "
-            f"recipes as a numbered list. Each item must be in the form: "
-            f"Recipe: <name> | Ingredients: <comma-separated list>. No extra commentary."
-        )
-        user = f"Available ingredients: {', '.join(ingredients)}"
+        system, user = get_prompt("recipe_suggestions").render(
+            ingredients=", ".join(ingredients), max_results=max_results)
         
-        response_text = self._make_request(system, user, max_tokens=400)
+        response_text = self._make_request(system, user, max_tokens=400,
+                                            route="get_recipe_suggestions")
         if not response_text:
             return []
         
@@ -158,16 +273,14 @@ class OpenAIService:
         
         return results[:max_results]
     
+    @cached_llm_call(fuzzy=("original_recipe",), exact=("max_results",))
     def get_similar_recipes(self, original_recipe: str, max_results: int = 4) -> List[RecipeSuggestion]:
         """Get recipes similar to the original recipe."""
-        system = (
-            f"You are a concise culinary assistant. Suggest up to {max_results} "
-            f"recipes that are similar to the given recipe. Each item must be in the form: "
-            f"Recipe: <name> | Ingredients: <comma-separated list>. No extra commentary."
-        )
-        user = f"Original recipe: {original_recipe}"
+        system, user = get_prompt("similar_recipes").render(
+            recipe=original_recipe, max_results=max_results)
         
-        response_text = self._make_request(system, user, max_tokens=400)
+        response_text = self._make_request(system, user, max_tokens=400,
+                                            route="get_similar_recipes")
         if not response_text:
             return []
         
@@ -187,22 +300,18 @@ class OpenAIService:
         
         return results[:max_results]
     
+    @cached_llm_call(fuzzy=("required_ingredients", "recipe_context"), exact=("max_results",))
     def get_recipes_with_specific_ingredients(self, required_ingredients: List[str], 
                                             recipe_context: str = "", max_results: int = 5) -> List[RecipeSuggestion]:
         """Get recipe suggestions that MUST include the specified ingredients."""
         required_text = ", ".join(required_ingredients)
         context_text = f" similar to {recipe_context}" if recipe_context else ""
         
-        system = (
-            f"You are a concise culinary assistant. Suggest up to {max_results} "
-            f"recipes that MUST include ALL of these ingredients: {required_text}. "
-            f"Each recipe suggestion must be in the form: "
-            f"Recipe: <name> | Ingredients: <comma-separated list>. "
-            f"Ensure every suggested recipe includes all the required ingredients. No extra commentary."
-        )
-        user = f"Required ingredients that MUST be in every recipe: {required_text}{context_text}"
+        system, user = get_prompt("specific_recipes").render(
+            required=required_text, context=context_text, max_results=max_results)
         
-        response_text = self._make_request(system, user, max_tokens=500)
+        response_text = self._make_request(system, user, max_tokens=500,
+                                            route="get_recipes_with_specific_ingredients")
         if not response_text:
             return []
         
@@ -234,18 +343,16 @@ class OpenAIService:
         
         return results[:max_results]
 
+    @cached_llm_call(fuzzy=("recipe_name", "substitute_ingredients"))
     def get_recipe_with_ingredients(self, recipe_name: str, substitute_ingredients: List[str]) -> Optional[RecipeSuggestion]:
         """Get the original recipe with detailed ingredients, incorporating substitutes."""
         substitutes_text = ", ".join(substitute_ingredients) if substitute_ingredients else "none"
         
-        system = (
-            f"You are a culinary expert. Provide the detailed recipe with complete ingredient list. "
-            f"If substitute ingredients are provided, incorporate them into the recipe. "
-            f"Format as: Recipe: <name> | Ingredients: <comma-separated list>. No extra commentary."
-        )
-        user = f"Recipe: {recipe_name}\nSubstitute ingredients to include: {substitutes_text}"
+        system, user = get_prompt("recipe_with_ingredients").render(
+            recipe=recipe_name, substitutes=substitutes_text)
         
-        response_text = self._make_request(system, user, max_tokens=300)
+        response_text = self._make_request(system, user, max_tokens=300,
+                                            route="get_recipe_with_ingredients")
         if not response_text:
             return None
         
@@ -266,16 +373,14 @@ class OpenAIService:
             ingredients=f"Recipe details for {recipe_name} with substitutes: {substitutes_text}"
         )
     
-    def get_recipe_details(self, recipe_name: str) -> Optional[Dict[str, str]]:
-        """Get detailed recipe information including ingredients and cooking method."""
-        system = (
-            "You are a culinary expert. Provide a detailed recipe with specific ingredients list (including quantities) and cooking method. "
-            "Format your response as: 'Ingredients: <ingredient list with quantities> | Cooking Method: <detailed steps>'. "
-            "Be comprehensive but concise. Use standard measurements and be specific about quantities."
-        )
-        user = f"Recipe name: {recipe_name}"
-        
-        response_text = self._make_request(system, user, max_tokens=500)
+    @staticmethod
+    def recipe_details_prompt(recipe_name: str) -> Tuple[str, str]:
+        """System and user messages for a recipe details request."""
+        return get_prompt("recipe_details").render(recipe=recipe_name)
+    
+    @staticmethod
+    def parse_recipe_details(recipe_name: str, response_text: Optional[str]) -> Optional[Dict[str, str]]:
+        """Parse a recipe details response into ingredients and cooking method."""
         if not response_text:
             return None
         
@@ -294,24 +399,28 @@ class OpenAIService:
             "cooking_method": response_text.strip()
         }
     
+    @cached_llm_call(fuzzy=("recipe_name",))
+    def get_recipe_details(self, recipe_name: str) -> Optional[Dict[str, str]]:
+        """Get detailed recipe information including ingredients and cooking method."""
+        system, user = self.recipe_details_prompt(recipe_name)
+        response_text = self._make_request(system, user, max_tokens=500,
+                                            route="get_recipe_details")
+        return self.parse_recipe_details(recipe_name, response_text)
+    
+    @cached_llm_call(fuzzy=("recipe_name", "original_ingredient", "substitute_ingredient"),
+                     exact=("original_ingredients",))
     def get_updated_recipe_with_substitution(self, recipe_name: str, original_ingredients: str, 
                                            original_ingredient: str, substitute_ingredient: str) -> Optional[Dict[str, str]]:
         """Get updated recipe with substituted ingredient and modified cooking method."""
-        system = (
-            "You are a culinary expert. Update the given recipe by making MINIMAL changes - ONLY substitute the specified ingredient. "
-            "Keep ALL other ingredients exactly the same with same quantities and descriptions. "
-            "IMPORTANT: Provide the COMPLETE updated ingredients list and COMPLETE cooking method, but only change the specific ingredient being substituted. "
-            "Only modify cooking instructions if the substitute ingredient requires different handling (different cooking time, temperature, or preparation). "
-            "Format your response as: 'Updated Ingredients: <COMPLETE updated ingredient list with all original ingredients except the substituted one> | Updated Cooking Method: <COMPLETE detailed cooking steps>'. "
-            "Show the full recipe details, not just a brief summary."
-        )
-        user = (
-            f"Recipe: {recipe_name}\n"
-            f"Original ingredients: {original_ingredients}\n"
-            f"Replace ONLY '{original_ingredient}' with '{substitute_ingredient}' - keep everything else identical but show the complete updated recipe"
+        system, user = get_prompt("recipe_substitution").render(
+            recipe=recipe_name,
+            original_ingredients=original_ingredients,
+            original_ingredient=original_ingredient,
+            substitute_ingredient=substitute_ingredient,
         )
         
-        response_text = self._make_request(system, user, max_tokens=800)
+        response_text = self._make_request(system, user, max_tokens=800,
+                                            route="get_updated_recipe_with_substitution")
         if not response_text:
             return None
         
@@ -330,50 +439,134 @@ class OpenAIService:
             "cooking_method": f"Please refer to the updated ingredients section above for the complete recipe details with {substitute_ingredient} substituted for {original_ingredient}."
         }
     
-    def get_context_based_ingredients(self, taste: Optional[str] = None,
-                                    texture: Optional[str] = None,
-                                    color: Optional[str] = None,
-                                    cooking_method: Optional[str] = None,
-                                    recipe_title: Optional[str] = None,
-                                    max_results: int = 10) -> SuggestionResult:
-        """Get ingredients based on context attributes."""
+    @staticmethod
+    def parse_recipe_diff(response_text: Optional[str]) -> Optional[Dict[str, List[Dict]]]:
+        """Parse a diff-only rewrite into changed ingredient lines and changed steps."""
+        if not response_text:
+            return None
+        changed_ingredients, changed_steps, section = [], [], None
+        for line in response_text.splitlines():
+            line = line.strip()
+            header = re.match(r"(?:\*\*)?changed (ingredients|steps):?(?:\*\*)?\s*(.*)$", line, flags=re.IGNORECASE)
+            if header:
+                section = header.group(1).lower()
+                line = header.group(2).strip()
+            if not line or line.lower() == "none" or section is None:
+                continue
+            if section == "ingredients":
+                line = re.sub(r"^\s*(?:[-•*]|\d+\.)\s*", "", line)
+                parts = re.split(r"\s*(?:=>|->|→)\s*", line, maxsplit=1)
+                changed_ingredients.append({"from": parts[0] if len(parts) > 1 else None,
+                                            "to": parts[-1]})
+            else:
+                match = re.match(r"(?:step\s*)?(\d+)[.):]\s*(.+)$", line, flags=re.IGNORECASE)
+                changed_steps.append({"step": int(match.group(1)) if match else None,
+                                      "text": (match.group(2) if match else line).strip()})
+        if not changed_ingredients and not changed_steps:
+            return None
+        return {"changed_ingredients": changed_ingredients, "changed_steps": changed_steps}
+    
+    @cached_llm_call(fuzzy=("recipe_name",),
+                     exact=("original_ingredients", "swaps", "diff_only", "original_method"))
+    def get_updated_recipe_with_substitutions(self, recipe_name: str, original_ingredients: str,
+                                              swaps: List[Tuple[str, str]], diff_only: bool = False,
+                                              original_method: str = "") -> Optional[Dict]:
+        """
+        Apply several (ingredient, replacement) swaps in one generation. With
+        `diff_only`, only the changed ingredient lines and steps come back.
+        """
+        system, user = get_prompt("recipe_substitutions_diff" if diff_only else "recipe_substitutions").render(
+            recipe=recipe_name,
+            original_ingredients=original_ingredients,
+            original_method=f"Original cooking method: {original_method}\n" if original_method else "",
+            swaps="\n".join(f"- Replace '{old}' with '{new}'" for old, new in swaps),
+        )
+        
+        response_text = self._make_request(system, user, max_tokens=300 if diff_only else 800,
+                                            route="get_updated_recipe_with_substitutions")
+        if diff_only:
+            return self.parse_recipe_diff(response_text)
+        if not response_text:
+            return None
+        
+        match = re.match(r"Updated Ingredients:\s*(.+?)\s*\|\s*Updated Cooking Method:\s*(.+)$",
+                         response_text.strip(), flags=re.IGNORECASE | re.DOTALL)
+        if match:
+            return {
+                "ingredients": match.group(1).strip(),
+                "cooking_method": match.group(2).strip()
+            }
+        return {
+            "ingredients": f"Updated ingredients for {recipe_name}\n{response_text.strip()}",
+            "cooking_method": "Please refer to the updated ingredients section above for the complete recipe details."
+        }
+    
+    @staticmethod
+    def context_constraints(taste: Optional[str] = None, texture: Optional[str] = None,
+                            color: Optional[str] = None, cooking_method: Optional[str] = None,
+                            recipe_title: Optional[str] = None,
+                            excluded: Optional[Dict[str, List[str]]] = None) -> str:
+        """The 'Context:' line shared by the context prompts."""
         constraints = []
         if taste: constraints.append(f"Taste: {taste}")
         if texture: constraints.append(f"Texture: {texture}")
         if color: constraints.append(f"Color: {color}")
         if cooking_method: constraints.append(f"Cooking method: {cooking_method}")
         if recipe_title: constraints.append(f"Recipe: {recipe_title}")
+        avoided = [value for values in (excluded or {}).values() for value in values]
+        if avoided: constraints.append(f"Avoid: {', '.join(avoided)}")
+        return " | ".join(constraints) if constraints else "No constraints"
+    
+    @cached_llm_call(fuzzy=("taste", "texture", "color", "cooking_method", "recipe_title"),
+                     exact=("candidates", "max_results"), key_by={"candidates": _candidate_names})
+    def pick_context_ingredients(self, candidates: List[IngredientEntry],
+                                 taste: Optional[str] = None,
+                                 texture: Optional[str] = None,
+                                 color: Optional[str] = None,
+                                 cooking_method: Optional[str] = None,
+                                 recipe_title: Optional[str] = None,
+                                 max_results: int = 10) -> SuggestionResult:
+        """Have GPT pick the context ingredients from dataset candidates, by id."""
+        system, user = get_prompt("context_picks").render(
+            constraints=self.context_constraints(taste, texture, color, cooking_method, recipe_title),
+            candidates=self.candidate_list(candidates), max_results=max_results)
+        response_text = self._make_request(system, user, max_tokens=30,
+                                            route="pick_context_ingredients")
+        return self.parse_picks(response_text, candidates, max_results)
+    
+    @cached_llm_call(fuzzy=("taste", "texture", "color", "cooking_method", "recipe_title"),
+                     exact=("max_results", "excluded"))
+    def get_context_based_ingredients(self, taste: Optional[str] = None,
+                                    texture: Optional[str] = None,
+                                    color: Optional[str] = None,
+                                    cooking_method: Optional[str] = None,
+                                    recipe_title: Optional[str] = None,
+                                    max_results: int = 10,
+                                    excluded: Optional[Dict[str, List[str]]] = None) -> SuggestionResult:
+        """Get ingredients based on context attributes."""
+        system, user = get_prompt("context_ingredients").render(
+            constraints=self.context_constraints(taste, texture, color, cooking_method,
+                                                 recipe_title, excluded),
+            max_results=max_results)
         
-        constraint_text = " | ".join(constraints) if constraints else "No constraints"
-        
-        system = (
-            f"You are a concise culinary assistant. Suggest up to {max_results} "
-            f"ingredient names that match the given context and optionally the recipe. "
-            f"Return a numbered list of ingredient names only."
-        )
-        user = f"Context: {constraint_text}"
-        
-        response_text = self._make_request(system, user, max_tokens=300)
+        response_text = self._make_request(system, user, max_tokens=300,
+                                            route="get_context_based_ingredients")
         if not response_text:
             return SuggestionResult([], "none")
         
         items = parse_numbered_list(response_text)
         return SuggestionResult(items[:max_results], "gpt")
     
+    @cached_llm_call(fuzzy=("description",))
     def parse_natural_language_context(self, description: str) -> Dict[str, Optional[str]]:
         """Parse natural language description into context categories."""
         if not description or not description.strip():
             return {"taste": None, "texture": None, "color": None, "cooking_method": None}
         
-        system = (
-            "You are a culinary expert that analyzes food descriptions. "
-            "Parse the given description and extract taste/flavor, texture, color, and cooking method. "
-            "Return ONLY a JSON object with keys: taste, texture, color, cooking_method. "
-            "Use null for missing information. Be concise with single words or short phrases."
-        )
-        user = f"Description: {description}"
+        system, user = get_prompt("parse_context").render(description=description)
         
-        response_text = self._make_request(system, user, max_tokens=150)
+        response_text = self._make_request(system, user, max_tokens=150,
+                                            route="parse_natural_language_context")
         if not response_text:
             return {"taste": None, "texture": None, "color": None, "cooking_method": None}
         
@@ -395,7 +588,7 @@ class OpenAIService:
                 "cooking_method": parsed.get("cooking_method")
             }
         except (json.JSONDecodeError, Exception) as e:
-            logger.debug(f"Failed to parse JSON response: {e}")
+            logger.debug("Failed to parse JSON response: %s", e)
             # Fallback: try to extract manually
             response_lower = response_text.lower()
             return {
@@ -405,6 +598,29 @@ class OpenAIService:
                 "cooking_method": self._extract_attribute(response_lower, ["fried", "boiled", "grilled", "baked", "raw", "steamed", "roasted"])
             }
     
+    @cached_llm_call(exact=("message",))
+    def classify_message(self, message: str) -> Optional[Dict]:
+        """Classify a chat message into {classification, confidence, entities}, like the n8n agent."""
+        if not message or not message.strip():
+            return None
+        
+        system, user = get_prompt("classify").render(message=message)
+        response_text = self._make_request(system, user, max_tokens=300, route="classify_message")
+        if not response_text:
+            return None
+        
+        response_text = response_text.strip()
+        if response_text.startswith("```"):
+            response_text = response_text.strip("`")
+            if response_text.startswith("json"):
+                response_text = response_text[4:]
+        try:
+            parsed = json.loads(response_text)
+        except json.JSONDecodeError as e:
+            logger.debug("Failed to parse classification: %s", e)
+            return None
+        return parsed if isinstance(parsed, dict) else None
+    
     def _extract_attribute(self, text: str, keywords: List[str]) -> Optional[str]:
         """Extract attribute from text based on keywords."""
         for keyword in keywords:
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Prefetcher for Recipe Suggestion System
+
+Speculatively warms the response cache for the call a chat session is likely
+to make next:
+
+- after /substitute on a recipe: /rewrite with the top substitute
+- after /lookup: /similar for the same recipe
+- after /suggest or /similar: /lookup of the first recipe
+
+Prefetches run on one background thread, only for requests with a session_id
+and within a per-session budget. They yield to interactive traffic: a task
+waits while any user-facing OpenAI call is in flight, is skipped for a
+cooldown after a 429, is rate-limited globally and is dropped once stale.
+Nothing is queued from a degraded (cache-only) answer. Results land in the
+response cache, which counts the interactive hits.
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from cachetools import TTLCache
+
+from config import Config
+from services.openai_service import OpenAIService
+from services.response_cache import CACHE_ONLY, PREFETCHING
+
+logger = logging.getLogger(__name__)
+
+# Lower runs first
+PRIORITY_REWRITE = 0
+PRIORITY_LOOKUP = 1
+PRIORITY_SIMILAR = 2
+
+
+class Prefetcher:
+    """Low-priority background queue of speculative OpenAIService calls."""
+
+    def __init__(self, config: Config, openai_service: OpenAIService,
+                 recipe_details: Callable[[Optional[str], str], Optional[Dict[str, Any]]]):
+        self.config = config
+        self.openai_service = openai_service
+        # (session_id, recipe) -> details, resolved the same way /rewrite does
+        self._recipe_details = recipe_details
+        self._queue: List[Tuple[int, int, float, str, Callable[[], Any]]] = []
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+        self._budgets = TTLCache(maxsize=config.session_store_size, ttl=config.session_ttl)
+        self._recent_starts: List[float] = []
+        self._worker: Optional[threading.Thread] = None
+        self.stats = {"queued": 0, "completed": 0, "dropped_budget": 0, "dropped_queue_full": 0,
+                      "dropped_stale": 0, "dropped_degraded": 0, "skipped_rate_limited": 0, "failed": 0}
+
+    # ------------------------------------------------------------------
+    # Triggers (called by endpoints after answering)
+    # ------------------------------------------------------------------
+
+    def after_substitute(self, session_id: Optional[str], ingredient: str, recipe: str,
+                         substitutes: List[str]):
+        if not substitutes or not recipe or recipe == "General Recipe":
+            return
+
+        def rewrite():
+            details = self._recipe_details(session_id, recipe)
+            if not details or not details.get("ingredients"):
+                return
+            ingredients = details["ingredients"]
+            original = ", ".join(ingredients) if isinstance(ingredients, list) else ingredients
+            self.openai_service.get_updated_recipe_with_substitution(
+                recipe, original, ingredient, substitutes[0])
+
+        self.submit(session_id, f"rewrite:{recipe}:{ingredient}", rewrite, PRIORITY_REWRITE)
+
+    def after_lookup(self, session_id: Optional[str], recipe: str):
+        self.submit(session_id, f"similar:{recipe}",
+                    lambda: self.openai_service.get_similar_recipes(recipe, 4), PRIORITY_SIMILAR)
+
+    def after_recipes(self, session_id: Optional[str], recipe_names: List[str]):
+        """After /suggest or /similar: details for the first recipe."""
+        if not recipe_names:
+            return
+        first = recipe_names[0]
+        self.submit(session_id, f"lookup:{first}",
+                    lambda: self._recipe_details(session_id, first), PRIORITY_LOOKUP)
+
+    # ------------------------------------------------------------------
+    # Queue
+    # ------------------------------------------------------------------
+
+    def submit(self, session_id: Optional[str], name: str, task: Callable[[], Any],
+               priority: int = PRIORITY_SIMILAR) -> bool:
+        """Queue a speculative call; False if prefetching is off, degraded, over budget or full."""
+        if not self.config.prefetch_enabled or not session_id or not self.openai_service.is_available:
+            return False
+        if CACHE_ONLY.get():
+            # Saturated, and the trigger was a degraded answer: nothing worth warming
+            with self._cond:
+                self.stats["dropped_degraded"] += 1
+            return False
+        with self._cond:
+            used = self._budgets.get(session_id, 0)
+            if used >= self.config.prefetch_session_budget:
+                self.stats["dropped_budget"] += 1
+                return False
+            if len(self._queue) >= self.config.prefetch_queue_size:
+                self.stats["dropped_queue_full"] += 1
+                return False
+            self._budgets[session_id] = used + 1
+            heapq.heappush(self._queue, (priority, next(self._sequence), time.monotonic(), name, task))
+            self.stats["queued"] += 1
+            if self.config.prefetch_background:
+                self._ensure_worker()
+            self._cond.notify()
+        return True
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._work, name="prefetcher", daemon=True)
+            self._worker.start()
+
+    def _blocked(self) -> bool:
+        """Whether a prefetch would compete with interactive traffic right now."""
+        if self.openai_service.interactive_in_flight > 0:
+            return True
+        now = time.monotonic()
+        self._recent_starts = [t for t in self._recent_starts if now - t < 60.0]
+        return len(self._recent_starts) >= self.config.prefetch_max_per_minute
+
+    def _next_task(self, block: bool) -> Optional[Tuple[str, Callable[[], Any]]]:
+        with self._cond:
+            while True:
+                if not self._queue:
+                    if not block:
+                        return None
+                    self._cond.wait(timeout=1.0)
+                    continue
+                _, _, queued_at, name, task = self._queue[0]
+                now = time.monotonic()
+                if now - queued_at > self.config.prefetch_max_age:
+                    heapq.heappop(self._queue)
+                    self.stats["dropped_stale"] += 1
+                    continue
+                rate_limited_at = self.openai_service.rate_limited_at
+                if rate_limited_at and now - rate_limited_at < self.config.prefetch_rate_limit_cooldown:
+                    heapq.heappop(self._queue)
+                    self.stats["skipped_rate_limited"] += 1
+                    continue
+                if self._blocked():
+                    if not block:
+                        return None
+                    self._cond.wait(timeout=0.05)
+                    continue
+                heapq.heappop(self._queue)
+                self._recent_starts.append(now)
+                return name, task
+
+    def _run(self, name: str, task: Callable[[], Any]):
+        token = PREFETCHING.set(True)
+        try:
+            task()
+            self.stats["completed"] += 1
+        except Exception as e:
+            self.stats["failed"] += 1
+            logger.debug("Prefetch %s failed: %s", name, e)
+        finally:
+            PREFETCHING.reset(token)
+
+    def _work(self):
+        while True:
+            item = self._next_task(block=True)
+            if item:
+                self._run(*item)
+
+    def run_pending(self) -> int:
+        """Run queued tasks that may run now on the calling thread (for tests/tools)."""
+        ran = 0
+        while True:
+            item = self._next_task(block=False)
+            if not item:
+                return ran
+            self._run(*item)
+            ran += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Queue counters plus interactive cache hits on prefetched entries."""
+        routes = self.openai_service.cache.snapshot()["routes"]
+        hits = sum(stats.get("prefetch_hits", 0) for stats in routes.values())
+        with self._cond:
+            completed = self.stats["completed"]
+            return {
+                "queue_depth": len(self._queue),
+                **self.stats,
+                "hits": hits,
+                "hit_rate": round(hits / completed, 3) if completed else 0.0,
+            }
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Prompt Registry for Recipe Suggestion System
+
+Every prompt OpenAIService sends, as a versioned template. The system message
+is fully static and everything that varies per call (ingredients, recipe
+names, how many results) sits at the end of the user message, so repeated
+calls share the longest possible prefix and providers can serve it from their
+prompt cache. Bump a template's version whenever its wording changes.
+"""
+
+import math
+import string
+from typing import Any, Dict, Tuple
+
+# Providers only cache prompt prefixes of at least this many tokens (OpenAI: 1024)
+PROMPT_CACHE_MIN_TOKENS = 1024
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for English)."""
+    return max(1, math.ceil(len(text or "") / 4))
+
+
+class PromptTemplate:
+    """A static system message plus a user message template filled per call."""
+
+    _formatter = string.Formatter()
+
+    def __init__(self, name: str, version: int, system: str, user: str):
+        self.name = name
+        self.version = version
+        self.system = system
+        self.user = user
+        self.fields = [field for _, field, _, _ in self._formatter.parse(user) if field]
+        # Everything before the first user field is identical on every call
+        self.static_user_prefix = user.split("{", 1)[0]
+
+    def render(self, **values: Any) -> Tuple[str, str]:
+        """System and user messages for one call."""
+        return self.system, self.user.format(**values)
+
+    @property
+    def prefix_tokens(self) -> int:
+        """Estimated tokens of the static prefix shared by every call."""
+        return estimate_tokens(self.system + self.static_user_prefix)
+
+    def describe(self) -> Dict[str, Any]:
+        prefix_tokens = self.prefix_tokens
+        return {
+            "version": self.version,
+            "prefix_tokens": prefix_tokens,
+            "user_template_tokens": estimate_tokens(self.user),
+            "variables": self.fields,
+            "cacheable": prefix_tokens >= PROMPT_CACHE_MIN_TOKENS,
+        }
+
+
+# System message of the n8n Classify AI Agent, used when the local intent classifier is unsure
+CLASSIFY_SYSTEM_PROMPT = """You are a routing agent for a recipe and ingredient substitution chatbot. Read the user's message, classify the intent, extract all relevant entities, and output a single JSON object with exactly three fields: "classification", "confidence" and "entities". Output only the JSON object: no markdown, no code fences, no other text.
+
+The user may write in Thai or any other language. Always output entity values in ENGLISH.
+
+CLASSIFICATION (exactly one):
+- "substitute": a replacement for a specific ingredient, with or without a recipe.
+- "context": ingredient ideas from a description or attributes (taste, texture, colour, cooking method).
+- "suggest": the user lists ingredients they have and wants recipes.
+- "similar": recipes similar to a named recipe.
+- "specific": recipes that must include certain ingredients.
+- "recipe_custom": rebuild a named recipe using substitute ingredients the user provides.
+- "lookup": full ingredients and steps of a named recipe.
+- "rewrite": swap one ingredient for another inside an existing recipe.
+- "clarify": too vague or missing information needed for any of the above.
+- "out_of_scope": nothing to do with food, cooking, recipes or ingredients (greetings, small talk).
+
+CONFIDENCE: a number from 0.0 to 1.0; close to 1.0 when the intent is obvious, 0.6-0.85 for a reasonable guess, below 0.6 when genuinely unsure.
+
+ENTITIES: always an object with every field below; null when not mentioned.
+"ingredient" (string; substitute, rewrite), "recipe" (string; substitute, similar, lookup, rewrite, recipe_custom), "ingredients" (array; suggest), "substitutes" (array; recipe_custom), "required_ingredients" (array; specific), "replacement" (string; rewrite), "original_ingredients" (string; rewrite, only when the user writes the ingredient list out), "recipe_context" (string such as a cuisine or diet; specific), "attributes" (object with "taste", "texture", "color", "cooking_method"; context only, otherwise null), "natural_description" (the user's descriptive phrase; context only), "recipe_title" (a dish the context ingredients are for; context only), "include_reasoning" (boolean; true only for substitute when the user asks why or for an explanation), "max_results" (integer, only when the user asks for a number of results).
+For "clarify" and "out_of_scope" every entity is null and include_reasoning is false.
+
+EXAMPLE
+User message: "What can I use instead of butter in my banana bread and why?"
+{"classification":"substitute","confidence":0.98,"entities":{"ingredient":"butter","recipe":"banana bread","ingredients":null,"substitutes":null,"required_ingredients":null,"replacement":null,"original_ingredients":null,"recipe_context":null,"attributes":null,"natural_description":null,"recipe_title":null,"include_reasoning":true,"max_results":null}}"""
+
+
+_RECIPE_LINE_FORMAT = "Recipe: <name> | Ingredients: <comma-separated list>"
+
+_CANDIDATE_FORMAT = "Each candidate is listed as 'id: name | flavors | textures | colors'."
+
+PROMPTS: Dict[str, PromptTemplate] = {t.name: t for t in [
+    PromptTemplate(
+        "substitutes", 2,
+        "You are a culinary expert. Suggest substitute ingredients for the target ingredient in "
+        "the given recipe, giving no more than the number of substitutes requested. "
+        "Respond as a numbered list with only ingredient names.",
+        "Ingredient: {ingredient}\nRecipe: {recipe}\nNumber of substitutes: up to {max_results}",
+    ),
+    PromptTemplate(
+        "substitutes_with_reasons", 2,
+        "You are a culinary expert. Suggest substitutes for the ingredient with brief reasons, "
+        "giving no more than the number of substitutes requested. "
+        "Format each line as: 'Ingredient - reason'. No extra text.",
+        "Ingredient: {ingredient}\nRecipe: {recipe}\nNumber of substitutes: up to {max_results}",
+    ),
+    PromptTemplate(
+        "substitute_picks", 1,
+        "You are a culinary expert. Pick the candidate ingredients that can replace the target "
+        "ingredient in the given recipe, best first, giving no more than the number of substitutes "
+        f"requested and skipping unsuitable candidates. {_CANDIDATE_FORMAT} "
+        "Reply with the chosen ids only, comma-separated (e.g. 4,1,9). No other text.",
+        "Ingredient: {ingredient}\nRecipe: {recipe}\nCandidates:\n{candidates}\n"
+        "Number of substitutes: up to {max_results}",
+    ),
+    PromptTemplate(
+        "substitute_picks_with_reasons", 1,
+        "You are a culinary expert. Pick the candidate ingredients that can replace the target "
+        "ingredient in the given recipe, best first, giving no more than the number of substitutes "
+        f"requested and skipping unsuitable candidates. {_CANDIDATE_FORMAT} "
+        "Format each line as: 'id - reason', the reason under ten words. No extra text.",
+        "Ingredient: {ingredient}\nRecipe: {recipe}\nCandidates:\n{candidates}\n"
+        "Number of substitutes: up to {max_results}",
+    ),
+    PromptTemplate(
+        "recipe_suggestions", 2,
+        "You are a concise culinary assistant. Suggest recipes that can be made with the available "
+        "ingredients as a numbered list, giving no more than the number of recipes requested. "
+        f"Each item must be in the form: {_RECIPE_LINE_FORMAT}. No extra commentary.",
+        "Available ingredients: {ingredients}\nNumber of recipes: up to {max_results}",
+    ),
+    PromptTemplate(
+        "similar_recipes", 2,
+        "You are a concise culinary assistant. Suggest recipes that are similar to the given "
+        "recipe, giving no more than the number of recipes requested. "
+        f"Each item must be in the form: {_RECIPE_LINE_FORMAT}. No extra commentary.",
+        "Original recipe: {recipe}\nNumber of recipes: up to {max_results}",
+    ),
+    PromptTemplate(
+        "specific_recipes", 2,
+        "You are a concise culinary assistant. Suggest recipes that MUST include ALL of the "
+        "required ingredients, giving no more than the number of recipes requested. "
+        f"Each recipe suggestion must be in the form: {_RECIPE_LINE_FORMAT}. "
+        "Ensure every suggested recipe includes all the required ingredients. No extra commentary.",
+        "Required ingredients that MUST be in every recipe: {required}{context}\n"
+        "Number of recipes: up to {max_results}",
+    ),
+    PromptTemplate(
+        "recipe_with_ingredients", 1,
+        "You are a culinary expert. Provide the detailed recipe with complete ingredient list. "
+        "If substitute ingredients are provided, incorporate them into the recipe. "
+        f"Format as: {_RECIPE_LINE_FORMAT}. No extra commentary.",
+        "Recipe: {recipe}\nSubstitute ingredients to include: {substitutes}",
+    ),
+    PromptTemplate(
+        "recipe_details", 1,
+        "You are a culinary expert. Provide a detailed recipe with specific ingredients list (including quantities) and cooking method. "
+        "Format your response as: 'Ingredients: <ingredient list with quantities> | Cooking Method: <detailed steps>'. "
+        "Be comprehensive but concise. Use standard measurements and be specific about quantities.",
+        "Recipe name: {recipe}",
+    ),
+    PromptTemplate(
+        "recipe_substitution", 1,
+        "You are a culinary expert. Update the given recipe by making MINIMAL changes - ONLY substitute the specified ingredient. "
+        "Keep ALL other ingredients exactly the same with same quantities and descriptions. "
+        "IMPORTANT: Provide the COMPLETE updated ingredients list and COMPLETE cooking method, but only change the specific ingredient being substituted. "
+        "Only modify cooking instructions if the substitute ingredient requires different handling (different cooking time, temperature, or preparation). "
+        "Format your response as: 'Updated Ingredients: <COMPLETE updated ingredient list with all original ingredients except the substituted one> | Updated Cooking Method: <COMPLETE detailed cooking steps>'. "
+        "Show the full recipe details, not just a brief summary.",
+        "Recipe: {recipe}\n"
+        "Original ingredients: {original_ingredients}\n"
+        "Replace ONLY '{original_ingredient}' with '{substitute_ingredient}' - keep everything else identical but show the complete updated recipe",
+    ),
+    PromptTemplate(
+        "recipe_substitutions", 1,
+        "You are a culinary expert. Update the given recipe by applying EVERY listed ingredient swap with MINIMAL changes. "
+        "Keep ALL other ingredients exactly the same with same quantities and descriptions. "
+        "Only modify cooking instructions where a substitute requires different handling (different cooking time, temperature, or preparation). "
+        "Format your response as: 'Updated Ingredients: <COMPLETE updated ingredient list> | Updated Cooking Method: <COMPLETE detailed cooking steps>'.",
+        "Recipe: {recipe}\nOriginal ingredients: {original_ingredients}\n{original_method}Swaps:\n{swaps}",
+    ),
+    PromptTemplate(
+        "recipe_substitutions_diff", 1,
+        "You are a culinary expert. Apply EVERY listed ingredient swap to the given recipe with MINIMAL changes "
+        "and return ONLY what changes, in exactly this format:\n"
+        "Changed Ingredients:\n- <original ingredient line> => <updated ingredient line>\n"
+        "Changed Steps:\n<step number>. <complete updated step>\n"
+        "List only ingredient lines and steps that differ from the original recipe; "
+        "write 'Changed Steps: none' when no step needs to change. No extra text.",
+        "Recipe: {recipe}\nOriginal ingredients: {original_ingredients}\n{original_method}Swaps:\n{swaps}",
+    ),
+    PromptTemplate(
+        "context_ingredients", 2,
+        "You are a concise culinary assistant. Suggest ingredient names that match the given "
+        "context and optionally the recipe, giving no more than the number of ingredients "
+        "requested. Return a numbered list of ingredient names only.",
+        "Context: {constraints}\nNumber of ingredients: up to {max_results}",
+    ),
+    PromptTemplate(
+        "context_picks", 1,
+        "You are a concise culinary assistant. Pick the candidate ingredients that best match the "
+        "given context and optionally the recipe, best first, giving no more than the number of "
+        f"ingredients requested. {_CANDIDATE_FORMAT} "
+        "Reply with the chosen ids only, comma-separated (e.g. 4,1,9). No other text.",
+        "Context: {constraints}\nCandidates:\n{candidates}\nNumber of ingredients: up to {max_results}",
+    ),
+    PromptTemplate(
+        "parse_context", 1,
+        "You are a culinary expert that analyzes food descriptions. "
+        "Parse the given description and extract taste/flavor, texture, color, and cooking method. "
+        "Return ONLY a JSON object with keys: taste, texture, color, cooking_method. "
+        "Use null for missing information. Be concise with single words or short phrases.",
+        "Description: {description}",
+    ),
+    PromptTemplate("classify", 1, CLASSIFY_SYSTEM_PROMPT, "User message: {message}"),
+]}
+
+
+def get_prompt(name: str) -> PromptTemplate:
+    return PROMPTS[name]
+
+
+def snapshot() -> Dict[str, Any]:
+    """Version and token estimates of every template."""
+    return {name: template.describe() for name, template in sorted(PROMPTS.items())}
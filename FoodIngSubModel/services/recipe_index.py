@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Recipe Index for Recipe Suggestion System
+
+MinHash/LSH index over the ingredient sets of a local snapshot of the
+Supabase recipes table (precompute/recipe_snapshot.py). /similar answers
+from it with real recipe ids and images; GPT is only needed for recipes
+that are not in the corpus.
+
+Each recipe's comma-separated ingredient text is reduced to canonical
+ingredient names (quantities, units and preparation notes dropped, plurals
+and aliases folded by the response-cache Canonicalizer). Names found in more
+than `recipe_index_max_df` of the corpus (salt, water, ...) carry no signal and
+are ignored. Signatures are split into bands; recipes sharing any band bucket
+are candidates and are ranked by exact Jaccard similarity.
+"""
+
+import json
+import logging
+import os
+import random
+import re
+import threading
+import zlib
+from collections import Counter, defaultdict
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from config import Config
+from models import RecipeRecord
+from services.dataset_service import DatasetService
+from services.response_cache import Canonicalizer, jaccard
+
+logger = logging.getLogger(__name__)
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+# Measures and preparation notes that do not identify an ingredient
+_MEASURE_WORDS = {
+    "cup", "cups", "tablespoon", "tablespoons", "tbsp", "teaspoon", "teaspoons", "tsp",
+    "ounce", "ounces", "oz", "pound", "pounds", "lb", "lbs", "g", "gram", "grams", "kg",
+    "ml", "l", "liter", "liters", "quart", "quarts", "pint", "pints", "pinch", "dash",
+    "clove", "cloves", "can", "cans", "package", "packages", "jar", "stick", "sticks",
+    "slice", "slices", "large", "medium", "small", "whole", "of",
+}
+_PREPARATION_WORDS = {
+    "chopped", "diced", "minced", "sliced", "softened", "melted", "divided", "beaten",
+    "grated", "shredded", "crushed", "cubed", "peeled", "halved", "drained", "rinsed",
+    "fresh", "freshly", "finely", "thinly", "roughly", "coarsely", "optional", "taste",
+    "needed", "more", "or", "to", "as", "and", "for", "garnish", "room", "temperature",
+}
+
+
+def parse_ingredient_names(ingredients: Any, canonicalizer: Canonicalizer) -> FrozenSet[str]:
+    """Canonical ingredient names in a comma-separated ingredient string (or list)."""
+    parts = ingredients if isinstance(ingredients, list) else str(ingredients or "").split(",")
+    names = set()
+    for part in parts:
+        text = re.sub(r"\([^)]*\)", " ", str(part).lower())
+        words = [w for w in re.findall(r"[^\W\d_]+", text)
+                 if w not in _MEASURE_WORDS and w not in _PREPARATION_WORDS]
+        if words:
+            name = canonicalizer.text(" ".join(words))
+            if name:
+                names.add(name)
+    return frozenset(names)
+
+
+@lru_cache(maxsize=4)
+def _read_snapshot(path: str, mtime: float) -> Tuple[RecipeRecord, ...]:
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+                records.append(RecipeRecord(
+                    id=row["id"],
+                    recipe_name=row.get("recipe_name") or "",
+                    img_src=row.get("img_src"),
+                    ingredients=row.get("ingredients") or "",
+                    cuisine_path=row.get("cuisine_path"),
+                    rating=row.get("rating"),
+                    directions=row.get("directions") or "",
+                ))
+            except (ValueError, KeyError):
+                logger.warning("Skipping malformed recipe snapshot line in %s", path)
+    return tuple(records)
+
+
+def load_recipe_snapshot(path: str) -> Tuple[RecipeRecord, ...]:
+    """Recipes in a JSONL snapshot; empty if there is none. Re-read when the file changes."""
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return ()
+    return _read_snapshot(path, mtime)
+
+
+class RecipeIndex:
+    """Similar-recipe lookup over a recipe snapshot, built on first use."""
+
+    def __init__(self, config: Config, path: Optional[str] = None,
+                 alias_index: Optional[Dict[str, str]] = None):
+        self.config = config
+        self.path = path or config.recipe_snapshot_path
+        if alias_index is None:
+            alias_index = DatasetService(config).alias_index()
+        self.canonicalizer = Canonicalizer(alias_index)
+        self.rows_per_band = max(1, config.recipe_index_num_perm // config.recipe_index_bands)
+        rng = random.Random(1)
+        self._permutations = [(rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+                              for _ in range(self.rows_per_band * config.recipe_index_bands)]
+        self._lock = threading.Lock()
+        self._built_from: Optional[Tuple[RecipeRecord, ...]] = None
+        self._recipes: List[RecipeRecord] = []
+        self._names: List[FrozenSet[str]] = []
+        self._signatures: List[Tuple[int, ...]] = []
+        self._buckets: Dict[Tuple[int, Tuple[int, ...]], List[int]] = defaultdict(list)
+        self._by_name: Dict[str, int] = {}
+        self.stats = {"queries": 0, "hits": 0}
+
+    # ------------------------------------------------------------------
+    # Building
+    # ------------------------------------------------------------------
+
+    def signature(self, names: FrozenSet[str]) -> Tuple[int, ...]:
+        hashes = [zlib.crc32(name.encode("utf-8")) for name in names]
+        if not hashes:
+            return ()
+        return tuple(min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+                     for a, b in self._permutations)
+
+    def _band_keys(self, signature: Tuple[int, ...]):
+        rows = self.rows_per_band
+        for band in range(len(signature) // rows):
+            yield band, signature[band * rows:(band + 1) * rows]
+
+    def ensure_loaded(self) -> int:
+        """Build (or rebuild, if the snapshot changed) the index; returns the recipe count."""
+        recipes = load_recipe_snapshot(self.path)
+        with self._lock:
+            if recipes is self._built_from:
+                return len(self._recipes)
+            parsed = [parse_ingredient_names(r.ingredients, self.canonicalizer) for r in recipes]
+            counts = Counter(name for names in parsed for name in names)
+            # Tiny corpora keep everything; otherwise drop near-universal ingredients
+            limit = max(self.config.recipe_index_max_df * len(recipes), 5)
+            common = {name for name, n in counts.items() if n > limit}
+
+            self._recipes = list(recipes)
+            self._names = [names - common for names in parsed]
+            self._signatures = [self.signature(names) for names in self._names]
+            self._buckets = defaultdict(list)
+            self._by_name = {}
+            for i, (recipe, signature) in enumerate(zip(self._recipes, self._signatures)):
+                for key in self._band_keys(signature):
+                    self._buckets[key].append(i)
+                name_key = self.canonicalizer.text(recipe.recipe_name)
+                best = self._by_name.get(name_key)
+                if best is None or (recipe.rating or 0) > (self._recipes[best].rating or 0):
+                    self._by_name[name_key] = i
+            self._built_from = recipes
+        if recipes:
+            logger.info("Indexed %s recipes from %s (%s common ingredients ignored)",
+                        len(recipes), self.path, len(common))
+        return len(recipes)
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def find(self, recipe_name: str) -> Optional[RecipeRecord]:
+        """The corpus recipe with this (canonicalized) name, if any."""
+        self.ensure_loaded()
+        i = self._by_name.get(self.canonicalizer.text(recipe_name))
+        return self._recipes[i] if i is not None else None
+
+    def similar(self, recipe_name: str, max_results: int = 4) -> Optional[List[RecipeRecord]]:
+        """Recipes sharing the most ingredients with `recipe_name`; None if it is not in the corpus."""
+        self.ensure_loaded()
+        self.stats["queries"] += 1
+        i = self._by_name.get(self.canonicalizer.text(recipe_name))
+        if i is None:
+            return None
+        self.stats["hits"] += 1
+
+        names = self._names[i]
+        candidates = {j for key in self._band_keys(self._signatures[i]) for j in self._buckets.get(key, ())}
+        query_key = self.canonicalizer.text(self._recipes[i].recipe_name)
+        scored = []
+        for j in candidates:
+            recipe = self._recipes[j]
+            if j == i or self.canonicalizer.text(recipe.recipe_name) == query_key:
+                continue
+            scored.append((jaccard(names, self._names[j]), recipe.rating or 0, recipe))
+        scored.sort(key=lambda item: item[:2], reverse=True)
+        return [recipe for score, _, recipe in scored[:max_results] if score > 0]
+
+    def __len__(self) -> int:
+        return len(self._recipes)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"recipes": len(self._recipes), "buckets": len(self._buckets), **self.stats}
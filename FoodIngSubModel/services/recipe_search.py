@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Recipe Search for Recipe Suggestion System
+
+Server-side recipe search over the local recipe snapshot, replacing the
+search page's `search_recipes` RPC call with `result_limit: 5000` and its
+client-side filtering.
+
+Recipes are kept in one fixed order (rating descending, then id) and every
+search term or facet value maps to a Python int bitset over that order, so
+filters are bitwise AND/OR, facet counts are popcounts, and a page is the
+next set bits after the cursor. Cursors are keyset positions (the last
+recipe's sort key), so they stay valid when the snapshot is rebuilt.
+"""
+
+import base64
+import bisect
+import json
+import logging
+import os
+import re
+import threading
+import unicodedata
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from cachetools import LRUCache
+
+from config import Config
+from models import RecipeRecord
+from services.recipe_index import load_recipe_snapshot
+from utils import bits_from_flags, set_bit_positions
+
+logger = logging.getLogger(__name__)
+
+# Facet values shown by the search page sidebar (AltEat/src/data/recipeFilter.ts)
+SEARCH_FACETS = {
+    "ingredient": ["Basil", "Beef", "Bell Pepper", "Broccoli", "Butter", "Carrot", "Cheese",
+                   "Chicken", "Cilantro", "Egg", "Fish", "Garlic", "Ginger", "Milk", "Mushroom",
+                   "Oil", "Onion", "Pork", "Potato", "Shallots", "Shrimp", "Spinach", "Sugar",
+                   "Tomato"],
+    "method": ["Bake", "Boil", "Fry", "Grill", "Roast", "Sauté", "Simmer", "Steam", "Stir-fry"],
+    "cuisine": ["American", "Chinese", "French", "Indian", "Italian", "Japanese", "Korean",
+                "Mexican", "Thai"],
+}
+
+# Recipe fields each facet (and free-text terms) are matched against
+FACET_FIELDS = {
+    "ingredient": ("ingredients",),
+    "method": ("recipe_name", "directions"),
+    "cuisine": ("cuisine_path",),
+}
+TEXT_FIELDS = ("recipe_name", "ingredients", "cuisine_path")
+
+# Same separators the search page splits its query on
+_TERM_SPLIT = re.compile(r"[\s,，。.!?;:/\\|_-]+")
+
+
+def _fold(text: Optional[str]) -> str:
+    """Lower-case and strip accents, so "Saute" finds "sauté"."""
+    decomposed = unicodedata.normalize("NFKD", (text or "").lower())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def query_terms(query: str) -> List[str]:
+    return [term for term in _TERM_SPLIT.split(_fold(query)) if term]
+
+
+def encode_cursor(key: Tuple[float, Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[float, Any]:
+    """Sort key encoded by encode_cursor; ValueError if malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        neg_rating, recipe_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return float(neg_rating), recipe_id
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def _sort_key(recipe: RecipeRecord) -> Tuple[float, Any]:
+    try:
+        rating = float(recipe.rating)
+    except (TypeError, ValueError):
+        rating = 0.0
+    return -rating, recipe.id
+
+
+def search_row(recipe: RecipeRecord) -> Dict[str, Any]:
+    """The `search_recipes` RPC row shape the search page already renders."""
+    return {
+        "id": recipe.id,
+        "recipe_name": recipe.recipe_name,
+        "img_src": recipe.img_src,
+        "cuisine_path": recipe.cuisine_path,
+        "rating": recipe.rating,
+    }
+
+
+class _SearchCorpus:
+    """Recipes in sort order, folded search fields and memoized term bitsets."""
+
+    def __init__(self, recipes: Sequence[RecipeRecord], version: str):
+        self.recipes = sorted(recipes, key=_sort_key)
+        self.keys = [_sort_key(r) for r in self.recipes]
+        self.version = version
+        self.all_bits = (1 << len(self.recipes)) - 1
+        self.fields = {field: [_fold(getattr(r, field)) for r in self.recipes]
+                       for field in ("recipe_name", "ingredients", "cuisine_path", "directions")}
+        self._bits: LRUCache = LRUCache(maxsize=4096)
+        self._lock = threading.Lock()
+
+    def bits(self, fields: Tuple[str, ...], term: str) -> int:
+        """Bitset of recipes whose `fields` contain `term`."""
+        term = _fold(term).strip()
+        key = (fields, term)
+        with self._lock:
+            cached = self._bits.get(key)
+        if cached is not None:
+            return cached
+        columns = [self.fields[field] for field in fields]
+        bits = bits_from_flags([any(term in column[i] for column in columns)
+                                for i in range(len(self.recipes))])
+        with self._lock:
+            self._bits[key] = bits
+        return bits
+
+
+class RecipeSearchIndex:
+    """Filtered, faceted, keyset-paginated search over the recipe snapshot."""
+
+    def __init__(self, config: Config, path: Optional[str] = None):
+        self.config = config
+        self.path = path or config.recipe_snapshot_path
+        self._lock = threading.Lock()
+        self._built_from: Optional[Tuple[RecipeRecord, ...]] = None
+        self._corpus: Optional[_SearchCorpus] = None
+
+    def ensure_loaded(self) -> _SearchCorpus:
+        recipes = load_recipe_snapshot(self.path)
+        with self._lock:
+            if self._corpus is None or recipes is not self._built_from:
+                try:
+                    mtime = os.path.getmtime(self.path)
+                except OSError:
+                    mtime = 0
+                self._corpus = _SearchCorpus(recipes, f"{int(mtime)}-{len(recipes)}")
+                # Warm the sidebar facets, which every search counts
+                for facet, values in SEARCH_FACETS.items():
+                    for value in values:
+                        self._corpus.bits(FACET_FIELDS[facet], value)
+                self._built_from = recipes
+                if recipes:
+                    logger.info("Built recipe search index over %s recipes", len(recipes))
+            return self._corpus
+
+    def version(self) -> str:
+        """Changes whenever the snapshot does; part of the search ETag."""
+        return self.ensure_loaded().version
+
+    def search(self, query: str = "", filters: Optional[Dict[str, List[str]]] = None,
+               cursor: Optional[str] = None, limit: int = 20) -> Dict[str, Any]:
+        """One page of matching recipes plus the total and facet counts.
+
+        Free-text terms must all match; facet categories are ANDed and the
+        values selected within a category are ORed. Each category's counts
+        ignore that category's own selection, so the sidebar shows what
+        picking another value would return.
+        """
+        corpus = self.ensure_loaded()
+        text_bits = corpus.all_bits
+        for term in query_terms(query):
+            text_bits &= corpus.bits(TEXT_FIELDS, term)
+
+        selected: Dict[str, int] = {}
+        for facet, values in (filters or {}).items():
+            if facet not in FACET_FIELDS:
+                raise ValueError(f"Unknown filter: {facet}")
+            values = [v for v in values if v and v.strip()]
+            if values:
+                bits = 0
+                for value in values:
+                    bits |= corpus.bits(FACET_FIELDS[facet], value)
+                selected[facet] = bits
+
+        matched = text_bits
+        for bits in selected.values():
+            matched &= bits
+
+        facets = {}
+        for facet, values in SEARCH_FACETS.items():
+            base = text_bits
+            for other, bits in selected.items():
+                if other != facet:
+                    base &= bits
+            facets[facet] = {value: (base & corpus.bits(FACET_FIELDS[facet], value)).bit_count()
+                             for value in values}
+
+        start = bisect.bisect_right(corpus.keys, decode_cursor(cursor)) if cursor else 0
+        positions = set_bit_positions(matched, start, limit + 1)
+
+        next_cursor = encode_cursor(corpus.keys[positions[limit - 1]]) if len(positions) > limit else None
+        return {
+            "recipes": [search_row(corpus.recipes[i]) for i in positions[:limit]],
+            "total": matched.bit_count(),
+            "facets": facets,
+            "next_cursor": next_cursor,
+        }
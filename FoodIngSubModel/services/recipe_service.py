@@ -5,41 +5,35 @@ Recipe Service for Recipe Suggestion System
 Service for recipe-related operations, delegating to OpenAI service for recipe suggestions.
 """
 
-import os
-from typing import List, Optional, Tuple
-from urllib import response
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 from config import Config
 from models import RecipeSuggestion
+from services.dataset_service import DatasetService
+from services.dietary_filter import DietaryFilter
 from services.openai_service import OpenAIService
-from utils import logger
+from services.recipe_index import RecipeIndex
+from services.recipe_search import RecipeSearchIndex
+from services.supabase_client import CircuitOpenError, SupabaseError, create_supabase_client
+
+logger = logging.getLogger(__name__)
 
 
 class RecipeService:
     """Service for recipe-related operations."""
     
-    def __init__(self, config: Config):
+    def __init__(self, config: Config, openai_service: Optional[OpenAIService] = None,
+                 recipe_index: Optional[RecipeIndex] = None,
+                 dietary_filter: Optional[DietaryFilter] = None):
         self.config = config
-        self.openai_service = OpenAIService(config)
-        self._supabase = None
-        self._initialize_supabase()
-    
-    def _initialize_supabase(self):
-        """Initialize the Supabase client."""
-        url = os.getenv("VITE_SUPABASE_URL")
-        key = os.getenv("VITE_SUPABASE_ANON_KEY")
-        
-        if not url or not key:
-            return
-            
-        try:
-            from supabase import create_client
-            self._supabase = create_client(url, key)
+        self.openai_service = openai_service or OpenAIService(config)
+        self.recipe_index = recipe_index if recipe_index is not None else RecipeIndex(config)
+        self.dietary_filter = dietary_filter or DietaryFilter(DatasetService(config))
+        self.search_index = RecipeSearchIndex(config, self.recipe_index.path)
+        self.supabase = create_supabase_client(config)
+        if self.supabase:
             logger.info("Supabase client initialized successfully")
-        except ImportError:
-            logger.warning("Supabase package not installed. Run `pip install supabase`.")
-        except Exception as e:
-            logger.error(f"Failed to initialize Supabase client: {e}")
 
     def _stem_ingredient(self, ingredient: str) -> str:
         """Strip common plural suffixes to get a searchable stem."""
@@ -57,11 +51,11 @@ class RecipeService:
         else:
             stem = ing
     
-        logger.info(f"Stemming '{ingredient}' → '{stem}'")
+        logger.debug("Stemming '%s' → '%s'", ingredient, stem)
         return stem
 
     def _get_supabase_suggestions(self, ingredients: List[str], limit: int) -> List[RecipeSuggestion]:
-        if not self._supabase or not ingredients:
+        if not self.supabase or not ingredients:
             return []
             
         try:
@@ -69,25 +63,33 @@ class RecipeService:
             if not search_ingredients:
                 return []
 
-            logger.info(f"Searching for recipes with ingredients: {search_ingredients}")
+            logger.debug("Searching for recipes with ingredients: %s", search_ingredients)
 
-            response = self._supabase.rpc(
+            rows = self.supabase.rpc(
                 "search_recipes_by_ingredients",
                 {"search_terms": search_ingredients, "result_limit": limit}
-            ).execute()
+            ) or []
+            # A changed RPC or a proxy error page must fall back to GPT, not raise
+            if not isinstance(rows, list):
+                logger.warning("Supabase RPC returned %s instead of a list; ignoring it", type(rows).__name__)
+                return []
 
-            logger.info(f"Supabase RPC returned {len(response.data)} recipes")
+            logger.debug("Supabase RPC returned %s recipes", len(rows))
             
             seen_ids = set()
             results = []
-            for record in response.data:
+            for record in rows:
+                if not isinstance(record, dict):
+                    logger.warning("Skipping malformed Supabase recipe row: %r", record)
+                    continue
                 recipe_id = record.get("id")
                 if recipe_id in seen_ids:
                     continue
                 seen_ids.add(recipe_id)
                 recipe_name = record.get("recipe_name") or "Unknown Recipe"
                 match_count = record.get("match_count", 0)
-                logger.info(f"Recipe '{recipe_name}' matches {match_count}/{len(search_ingredients)} ingredients")
+                logger.debug("Recipe '%s' matches %s/%s ingredients", recipe_name, match_count,
+                             len(search_ingredients))
 
                 results.append(RecipeSuggestion(
                     name=recipe_name,
@@ -98,34 +100,76 @@ class RecipeService:
 
             return results
 
-        except Exception as e:
-            logger.error(f"Error querying Supabase: {e}")
+        except CircuitOpenError:
+            logger.debug("Supabase circuit open; skipping recipe search")
+            return []
+        except SupabaseError as e:
+            logger.error("Error querying Supabase: %s", e)
             return []
     
     def get_suggestions(self, ingredients: List[str],
-                       max_results: Optional[int] = None) -> Tuple[List[RecipeSuggestion], str]:
-        """Get recipe suggestions based on available ingredients."""
+                       max_results: Optional[int] = None,
+                       constraints: Sequence[str] = ()) -> Tuple[List[RecipeSuggestion], str]:
+        """Get recipe suggestions based on available ingredients.
+        
+        With `constraints`, each source is over-fetched once and recipes whose name or
+        ingredients break a constraint are dropped.
+        """
         max_results = max_results or self.config.max_recipes
+        fetch = max_results * self.config.constraint_overfetch if constraints else max_results
         
         # Try Supabase first
-        if self._supabase:
-            db_results = self._get_supabase_suggestions(ingredients, max_results)
+        if self.supabase:
+            db_results = self._constrain(self._get_supabase_suggestions(ingredients, fetch), constraints)
             if db_results:
-                print(f"Returning {len(db_results)} recipes from Supabase.")
-                print(db_results)
-                return db_results, "dataset"
+                logger.debug("Returning %s recipes from Supabase", len(db_results))
+                return db_results[:max_results], "dataset"
         
         if not self.openai_service.is_available:
             return [], "none"
         
-        return self.openai_service.get_recipe_suggestions(ingredients, max_results), "gpt"
+        gpt_results = self.openai_service.get_recipe_suggestions(ingredients, fetch)
+        return self._constrain(gpt_results, constraints)[:max_results], "gpt"
+    
+    def _constrain(self, recipes: List[RecipeSuggestion],
+                   constraints: Sequence[str]) -> List[RecipeSuggestion]:
+        """Recipes whose name and ingredients satisfy every constraint.
+        
+        Supabase rows carry no ingredients, so theirs come from the recipe snapshot.
+        A recipe whose ingredients cannot be found is dropped: its name alone
+        ("Chicken Alfredo") says too little to pass a constraint.
+        """
+        if not constraints:
+            return recipes
+        kept = []
+        for recipe in recipes:
+            ingredients = recipe.ingredients
+            if not ingredients:
+                record = self.recipe_index.find(recipe.name)
+                ingredients = record.ingredients if record else ""
+            if ingredients and self.dietary_filter.allows_recipe(recipe, constraints, ingredients):
+                kept.append(recipe)
+        return kept
     
-    def get_similar_recipes(self, original_recipe: str, max_results: int = 4) -> List[RecipeSuggestion]:
-        """Get recipes similar to the original recipe."""
+    def get_similar_recipes(self, original_recipe: str,
+                            max_results: int = 4) -> Tuple[List[RecipeSuggestion], str]:
+        """Get recipes similar to the original recipe (local index first, GPT fallback)."""
+        similar = self.recipe_index.similar(original_recipe, max_results)
+        if similar:
+            return [RecipeSuggestion(name=r.recipe_name, ingredients=r.ingredients, id=r.id, image=r.img_src)
+                    for r in similar], "dataset"
+        
         if not self.openai_service.is_available:
-            return []
+            return [], "none"
         
-        return self.openai_service.get_similar_recipes(original_recipe, max_results)
+        return self.openai_service.get_similar_recipes(original_recipe, max_results), "gpt"
+    
+    def search_recipes(self, query: str = "", filters: Optional[Dict[str, List[str]]] = None,
+                       cursor: Optional[str] = None, limit: int = 20) -> Optional[Dict[str, Any]]:
+        """One page of snapshot recipes matching the query and filters; None without a snapshot."""
+        if not self.search_index.ensure_loaded().recipes:
+            return None
+        return self.search_index.search(query, filters, cursor, limit)
     
     def get_recipe_with_ingredients(self, recipe_name: str, substitute_ingredients: List[str]) -> Optional[RecipeSuggestion]:
         """Get the original recipe with detailed ingredients, incorporating substitutes."""
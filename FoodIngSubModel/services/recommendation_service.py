@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Recommendation Service for Recipe Suggestion System
+
+Server-side version of the home page's usePersonalizedRecommendations hook:
+the same scoring (cuisine, skill keywords, rating, avoided ingredients and a
+deterministic daily jitter), computed in the API process instead of the
+browser after three Supabase round trips.
+
+Everything that does not depend on the user is precomputed once per recipe
+snapshot: normalized rating scores, a skill-keyword bitmask per recipe,
+lower-cased search fields, a general pool of the top-rated recipes and one
+pool per cuisine (built for every cuisine_path segment, and on first use for
+any other preference). A request only unions the pools it needs and adds up
+the precomputed components. Results are cached per caller token and day.
+
+The profile is read with the caller's own Supabase JWT, so PostgREST checks
+the token and row-level security limits the read to that user's profile.
+"""
+
+import hashlib
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from cachetools import TTLCache
+
+from config import Config
+from models import RecipeRecord, UserPreferences
+from services.recipe_index import load_recipe_snapshot
+from services.supabase_client import SupabaseError, jwt_subject
+
+logger = logging.getLogger(__name__)
+
+# Must match SCORE_WEIGHTS in AltEat/src/hooks/usePersonalizedRecommendations.tsx
+SCORE_WEIGHTS = {
+    "cuisine": 300,
+    "skill": 100,
+    "rating": 100,
+    "jitter": 20,
+}
+
+SKILL_KEYWORDS = {
+    "beginner": ["easy", "simple", "quick", "basic"],
+    "intermediate": ["medium", "moderate"],
+    "advanced": ["hard", "complex", "challenging"],
+    "expert": ["gourmet", "professional", "advanced"],
+}
+SKILL_LEVELS = list(SKILL_KEYWORDS)
+DEFAULT_SKILL_LEVEL = "beginner"
+
+PROFILE_COLUMNS = "cuisine_preferences, skill_level, avoid_ingredients"
+
+
+def fnv1a32(text: str) -> int:
+    """32-bit FNV-1a over UTF-16 code units, like the hook's fnv1aHash."""
+    h = 0x811C9DC5
+    data = text.encode("utf-16-le")
+    for i in range(0, len(data), 2):
+        h ^= data[i] | (data[i + 1] << 8)
+        h = (h * 0x01000193) & 0xFFFFFFFF
+    return h
+
+
+def day_bucket(now: Optional[float] = None) -> int:
+    """Days since the epoch; the jitter changes once a day."""
+    return int((time.time() if now is None else now) * 1000 // 86_400_000)
+
+
+def deterministic_jitter(seed_base: str, recipe_id: Any, max_jitter: float) -> float:
+    return fnv1a32(f"{seed_base}:{recipe_id}") / 0xFFFFFFFF * max_jitter
+
+
+def _parse_rating(value: Any) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def normalize_rating(value: Any) -> float:
+    """Rating on a 0..1 scale (rating / 5, clamped); 0 when missing."""
+    rating = _parse_rating(value)
+    return 0.0 if rating is None else max(0.0, min(1.0, rating / 5.0))
+
+
+def recommendation_row(recipe: RecipeRecord) -> Dict[str, Any]:
+    """A recipe in the hook's frontend format."""
+    path = recipe.cuisine_path or ""
+    return {
+        "id": recipe.id,
+        "title": recipe.recipe_name or "Untitled recipe",
+        "image": recipe.img_src or "/placeholder.svg",
+        "tags": [part for part in path.split("/") if part][:3],
+        "rating": _parse_rating(recipe.rating),
+    }
+
+
+class _Pools:
+    """User-independent scoring components and candidate pools for one snapshot."""
+
+    def __init__(self, recipes: Sequence[RecipeRecord], pool_size: int):
+        self.recipes = list(recipes)
+        self.pool_size = pool_size
+        self.rating_scores = [normalize_rating(r.rating) * SCORE_WEIGHTS["rating"] for r in self.recipes]
+        self.cuisines = [(r.cuisine_path or "").lower() for r in self.recipes]
+        self.ingredients = [(r.ingredients or "").lower() for r in self.recipes]
+        self.skill_masks = []
+        for recipe in self.recipes:
+            text = f"{(recipe.recipe_name or '').lower()}\n{(recipe.directions or '').lower()}"
+            mask = 0
+            for bit, level in enumerate(SKILL_LEVELS):
+                if any(keyword in text for keyword in SKILL_KEYWORDS[level]):
+                    mask |= 1 << bit
+            self.skill_masks.append(mask)
+        self.by_rating = sorted(range(len(self.recipes)), key=lambda i: -self.rating_scores[i])
+        self.general = self.by_rating[:pool_size]
+        # preference -> (every matching recipe, top-rated pool)
+        self._cuisine: Dict[str, Tuple[Set[int], List[int]]] = {}
+        self._lock = threading.Lock()
+        for path in set(self.cuisines):
+            for segment in path.split("/"):
+                if segment:
+                    self.cuisine(segment)
+
+    def cuisine(self, preference: str) -> Tuple[Set[int], List[int]]:
+        """Recipes whose cuisine_path contains `preference` (case-insensitive)."""
+        key = preference.lower()
+        with self._lock:
+            cached = self._cuisine.get(key)
+        if cached is None:
+            members = [i for i in self.by_rating if key in self.cuisines[i]]
+            cached = (set(members), members[:self.pool_size])
+            with self._lock:
+                self._cuisine[key] = cached
+        return cached
+
+
+class RecommendationService:
+    """Personalized recipe recommendations from the recipe snapshot."""
+
+    def __init__(self, config: Config, supabase=None, path: Optional[str] = None):
+        self.config = config
+        self._supabase = supabase
+        self.path = path or config.recipe_snapshot_path
+        self._lock = threading.Lock()
+        self._built_from: Optional[Tuple[RecipeRecord, ...]] = None
+        self._pools: Optional[_Pools] = None
+        self._cache = TTLCache(maxsize=config.recommend_cache_size, ttl=config.recommend_cache_ttl)
+        self.stats = {"hits": 0, "misses": 0}
+
+    def ensure_loaded(self) -> _Pools:
+        """Precompute pools for the current snapshot (rebuilt when it changes)."""
+        recipes = load_recipe_snapshot(self.path)
+        with self._lock:
+            if self._pools is None or recipes is not self._built_from:
+                self._pools = _Pools(recipes, self.config.recommend_pool_size)
+                self._built_from = recipes
+                self._cache.clear()
+            return self._pools
+
+    def get_preferences(self, user_id: Optional[str], token: Optional[str] = None) -> Optional[UserPreferences]:
+        """
+        The user's profile preferences, or None (anonymous, no profile, a
+        rejected token, or Supabase down). `token` is forwarded to PostgREST.
+        """
+        if not user_id or not self._supabase:
+            return None
+        try:
+            rows = self._supabase.select("profiles", PROFILE_COLUMNS, eq={"user_id": user_id}, limit=1,
+                                         token=token)
+        except SupabaseError as e:
+            logger.error("Error fetching profile for recommendations: %s", e)
+            return None
+        if not rows:
+            return None
+        row = rows[0]
+        return UserPreferences(
+            cuisine_preferences=row.get("cuisine_preferences") or [],
+            skill_level=row.get("skill_level") or DEFAULT_SKILL_LEVEL,
+            avoid_ingredients=row.get("avoid_ingredients") or [],
+        )
+
+    def recommend(self, token: Optional[str] = None, limit: int = 6,
+                  now: Optional[float] = None) -> Tuple[List[Dict[str, Any]], str]:
+        """
+        Top `limit` recipes in frontend format, with the source, for the user
+        the Supabase JWT `token` belongs to (anonymous without one).
+        """
+        pools = self.ensure_loaded()
+        bucket = day_bucket(now)
+        user_id = jwt_subject(token)
+        # Keyed on the token itself, not its unverified subject: a forged token
+        # naming another user must never be served that user's cached rows
+        caller = hashlib.sha256(token.encode()).hexdigest() if user_id else "anonymous"
+        key = (caller, bucket, limit)
+        with self._lock:
+            cached = self._cache.get(key)
+            self.stats["hits" if cached is not None else "misses"] += 1
+        if cached is not None:
+            return list(cached), "cache"
+        if not pools.recipes:
+            return [], "none"
+
+        preferences = self.get_preferences(user_id, token)
+        rows = [recommendation_row(pools.recipes[i]) for i in self._rank(pools, preferences, user_id, bucket, limit)]
+        with self._lock:
+            self._cache[key] = rows
+        return list(rows), "dataset"
+
+    def _rank(self, pools: _Pools, preferences: Optional[UserPreferences], user_id: Optional[str],
+              bucket: int, limit: int) -> List[int]:
+        candidates = set(pools.general)
+        matched: Set[int] = set()
+        skill_bit = 0
+        if preferences:
+            for preference in preferences.cuisine_preferences:
+                if not preference:
+                    continue
+                members, pool = pools.cuisine(preference)
+                matched |= members
+                candidates.update(pool)
+            if preferences.skill_level in SKILL_KEYWORDS:
+                skill_bit = 1 << SKILL_LEVELS.index(preferences.skill_level)
+            avoid = [a.lower() for a in preferences.avoid_ingredients if a]
+            if avoid:
+                candidates = {i for i in candidates
+                              if not any(a in pools.ingredients[i] for a in avoid)}
+
+        seed_base = f"{user_id or 'anonymous'}:{bucket}"
+        cuisine_weight, skill_weight = SCORE_WEIGHTS["cuisine"], SCORE_WEIGHTS["skill"]
+        scored = []
+        for i in candidates:
+            score = pools.rating_scores[i]
+            if i in matched:
+                score += cuisine_weight
+            if pools.skill_masks[i] & skill_bit:
+                score += skill_weight
+            score += deterministic_jitter(seed_base, pools.recipes[i].id, SCORE_WEIGHTS["jitter"])
+            scored.append((score, i))
+        scored.sort(reverse=True)
+        return [i for _, i in scored[:limit]]
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"recipes": len(self._pools.recipes) if self._pools else 0,
+                    "cached": len(self._cache), **self.stats}
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+Response Cache for Recipe Suggestion System
+
+Two cache tiers in front of OpenAIService:
+
+1. Exact tier - keyed on the route plus canonicalized request entities
+   (normalize_text, plural stemming, filler-word removal and dataset/culinary
+   aliases), so "eggs"/"egg" and "Chocolate Cake"/"chocolate cake recipe"
+   share an entry.
+2. Semantic tier - near-duplicate lookup by token Jaccard (and optionally
+   embedding cosine) similarity against a per-classification threshold.
+   Every near-hit is written to an audit log.
+"""
+
+import contextvars
+import copy
+import functools
+import inspect
+import json
+import logging
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+from cachetools import LRUCache, TTLCache
+
+from config import Config
+from services.model_router import ROUTE_CLASSIFICATIONS
+from utils import normalize_text, stem_word
+
+logger = logging.getLogger(__name__)
+audit_logger = logging.getLogger("semantic_cache.audit")
+
+# Set while services/prefetcher.py runs a speculative call: entries it stores are
+# tagged, and the first interactive hit on one counts as a prefetch hit
+PREFETCHING: contextvars.ContextVar = contextvars.ContextVar("prefetching", default=False)
+
+# Set by services/admission.py while LLM capacity is saturated: cached answers are
+# still returned, but misses make no LLM call
+CACHE_ONLY: contextvars.ContextVar = contextvars.ContextVar("cache_only", default=False)
+
+# Words that do not change what is being asked for
+FILLER_WORDS = {
+    "a", "an", "the", "recipe", "recipes", "dish", "style", "homemade", "easy",
+    "simple", "classic", "traditional", "authentic", "best", "quick", "my", "some",
+}
+
+# Culinary equivalents the dataset does not list as aliases
+CULINARY_ALIASES = {
+    "whipping cream": "heavy cream",
+    "heavy whipping cream": "heavy cream",
+    "double cream": "heavy cream",
+    "coriander leaf": "cilantro",
+    "coriander leaves": "cilantro",
+    "scallion": "green onion",
+    "spring onion": "green onion",
+    "aubergine": "eggplant",
+    "courgette": "zucchini",
+    "capsicum": "bell pepper",
+    "garbanzo bean": "chickpea",
+    "icing sugar": "powdered sugar",
+    "confectioners sugar": "powdered sugar",
+    "caster sugar": "superfine sugar",
+    "plain flour": "all purpose flour",
+    "all-purpose flour": "all purpose flour",
+    "bicarbonate of soda": "baking soda",
+    "prawn": "shrimp",
+    "minced meat": "ground meat",
+}
+
+
+class Canonicalizer:
+    """Turns request entity values into canonical strings and token sets."""
+
+    def __init__(self, alias_index: Optional[Dict[str, str]] = None):
+        self._aliases = {normalize_text(k): normalize_text(v) for k, v in CULINARY_ALIASES.items()}
+        for alias, canonical in (alias_index or {}).items():
+            self._aliases.setdefault(alias, normalize_text(canonical))
+
+    def text(self, value: Any) -> str:
+        """Canonical string form of a value (lists are sorted and joined)."""
+        if value is None:
+            return ""
+        if isinstance(value, (list, tuple, set)):
+            return " | ".join(sorted(filter(None, (self.text(v) for v in value))))
+        if isinstance(value, dict):
+            return json.dumps({k: self.text(v) for k, v in sorted(value.items())}, ensure_ascii=False)
+        text = normalize_text(str(value))
+        text = self._aliases.get(text, text)
+        words = [stem_word(w) for w in text.replace("-", " ").split() if w not in FILLER_WORDS]
+        phrase = " ".join(words)
+        return self._aliases.get(phrase, phrase)
+
+    def tokens(self, value: Any) -> FrozenSet[str]:
+        return frozenset(self.text(value).replace("|", " ").split())
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a and not b:
+        return 1.0
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def cosine(a: Sequence[float], b: Sequence[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class _SemanticEntry:
+    __slots__ = ("exact_key", "fuzzy_tokens", "fuzzy_texts", "embeddings", "expires_at")
+
+    def __init__(self, exact_key, fuzzy_tokens, fuzzy_texts, embeddings, expires_at):
+        self.exact_key = exact_key
+        self.fuzzy_tokens = fuzzy_tokens
+        self.fuzzy_texts = fuzzy_texts
+        self.embeddings = embeddings
+        self.expires_at = expires_at
+
+
+class ResponseCache:
+    """Exact + semantic cache of parsed OpenAIService results."""
+
+    def __init__(self, config: Config, alias_index: Optional[Dict[str, str]] = None,
+                 embedder: Optional[Callable[[str], Optional[List[float]]]] = None):
+        self.config = config
+        self.canonicalizer = Canonicalizer(alias_index)
+        self._embedder = embedder if config.semantic_cache_embeddings else None
+        self._lock = threading.Lock()
+        self._exact = TTLCache(maxsize=config.response_cache_size, ttl=config.response_cache_ttl)
+        # route -> exact-part key -> recent semantic entries
+        self._semantic: Dict[str, Dict[str, deque]] = {}
+        self._embeddings = LRUCache(maxsize=4096)
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self.near_hits: deque = deque(maxlen=200)
+        # exact key -> route, for entries stored by the prefetcher and not yet used
+        self._prefetched = TTLCache(maxsize=config.response_cache_size, ttl=config.response_cache_ttl)
+
+    # ------------------------------------------------------------------
+    # Keys
+    # ------------------------------------------------------------------
+
+    def _keys(self, route: str, fuzzy: Dict[str, Any], exact: Dict[str, Any]) -> Tuple[str, str, Dict[str, str]]:
+        exact_part = json.dumps(exact, sort_keys=True, default=str)
+        fuzzy_texts = {k: self.canonicalizer.text(v) for k, v in sorted(fuzzy.items())}
+        key = f"{route}|{exact_part}|{json.dumps(fuzzy_texts, sort_keys=True, ensure_ascii=False)}"
+        return key, exact_part, fuzzy_texts
+
+    def _threshold(self, route: str) -> float:
+        classification = ROUTE_CLASSIFICATIONS.get(route, route)
+        return self.config.semantic_cache_thresholds.get(classification, 1.0)
+
+    def _embed(self, text: str) -> Optional[List[float]]:
+        if not self._embedder or not text:
+            return None
+        with self._lock:
+            cached = self._embeddings.get(text)
+        if cached is not None:
+            return cached
+        vector = self._embedder(text)
+        if vector is not None:
+            with self._lock:
+                self._embeddings[text] = vector
+        return vector
+
+    def _count(self, route: str, outcome: str):
+        with self._lock:
+            stats = self._stats.setdefault(
+                route, {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "prefetch_hits": 0})
+            stats[outcome] += 1
+
+    def _note_prefetch_use(self, route: str, key: str):
+        if PREFETCHING.get():
+            return
+        with self._lock:
+            used = self._prefetched.pop(key, None) is not None
+        if used:
+            self._count(route, "prefetch_hits")
+
+    # ------------------------------------------------------------------
+    # Lookup / store
+    # ------------------------------------------------------------------
+
+    def get(self, route: str, fuzzy: Dict[str, Any], exact: Dict[str, Any]) -> Tuple[bool, Any]:
+        """Return (hit, value). Values are deep copies so callers may mutate them."""
+        key, exact_part, fuzzy_texts = self._keys(route, fuzzy, exact)
+        with self._lock:
+            if key in self._exact:
+                value = self._exact[key]
+                found = True
+            else:
+                found = False
+        if found:
+            self._count(route, "exact_hits")
+            self._note_prefetch_use(route, key)
+            return True, copy.deepcopy(value)
+
+        threshold = self._threshold(route)
+        if self.config.semantic_cache_enabled and threshold < 1.0 and fuzzy_texts:
+            match = self._semantic_lookup(route, exact_part, fuzzy_texts, threshold)
+            if match is not None:
+                entry, similarity = match
+                with self._lock:
+                    value = self._exact.get(entry.exact_key)
+                if value is not None:
+                    self._record_near_hit(route, fuzzy_texts, entry.fuzzy_texts, similarity)
+                    self._count(route, "semantic_hits")
+                    self._note_prefetch_use(route, entry.exact_key)
+                    return True, copy.deepcopy(value)
+
+        self._count(route, "misses")
+        return False, None
+
+    def _semantic_lookup(self, route: str, exact_part: str, fuzzy_texts: Dict[str, str],
+                         threshold: float) -> Optional[Tuple[_SemanticEntry, float]]:
+        with self._lock:
+            candidates = list(self._semantic.get(route, {}).get(exact_part, ()))
+        if not candidates:
+            return None
+
+        now = time.monotonic()
+        tokens = {k: frozenset(v.replace("|", " ").split()) for k, v in fuzzy_texts.items()}
+        best, best_score = None, 0.0
+        for entry in candidates:
+            if entry.expires_at < now or entry.fuzzy_tokens.keys() != tokens.keys():
+                continue
+            # Every field must be similar: score is the weakest field
+            score = 1.0
+            for field_name, field_tokens in tokens.items():
+                sim = jaccard(field_tokens, entry.fuzzy_tokens[field_name])
+                if sim < threshold and self._embedder:
+                    vec_a = self._embed(fuzzy_texts[field_name])
+                    vec_b = entry.embeddings.get(field_name)
+                    if vec_a is not None and vec_b is not None:
+                        sim = max(sim, cosine(vec_a, vec_b))
+                score = min(score, sim)
+                if score < threshold:
+                    break
+            if score >= threshold and score > best_score:
+                best, best_score = entry, score
+        return (best, best_score) if best else None
+
+    def put(self, route: str, fuzzy: Dict[str, Any], exact: Dict[str, Any], value: Any):
+        """Store a result under both tiers."""
+        key, exact_part, fuzzy_texts = self._keys(route, fuzzy, exact)
+        with self._lock:
+            self._exact[key] = copy.deepcopy(value)
+            if PREFETCHING.get():
+                self._prefetched[key] = route
+
+        if not self.config.semantic_cache_enabled or self._threshold(route) >= 1.0 or not fuzzy_texts:
+            return
+        embeddings = {}
+        if self._embedder:
+            embeddings = {k: self._embed(v) for k, v in fuzzy_texts.items()}
+        entry = _SemanticEntry(
+            exact_key=key,
+            fuzzy_tokens={k: frozenset(v.replace("|", " ").split()) for k, v in fuzzy_texts.items()},
+            fuzzy_texts=fuzzy_texts,
+            embeddings=embeddings,
+            expires_at=time.monotonic() + self.config.response_cache_ttl,
+        )
+        with self._lock:
+            bucket = self._semantic.setdefault(route, {}).setdefault(
+                exact_part, deque(maxlen=self.config.semantic_cache_candidates))
+            bucket.append(entry)
+
+    def _record_near_hit(self, route: str, query: Dict[str, str], cached: Dict[str, str],
+                         similarity: float):
+        record = {
+            "ts": time.time(),
+            "route": route,
+            "query": query,
+            "cached": cached,
+            "similarity": round(similarity, 4),
+        }
+        self.near_hits.append(record)
+        audit_logger.info(json.dumps(record, ensure_ascii=False))
+        path = self.config.semantic_cache_audit_path
+        if path:
+            try:
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            except OSError as e:
+                logger.warning("Could not write semantic cache audit log: %s", e)
+
+    def clear(self):
+        with self._lock:
+            self._exact.clear()
+            self._semantic.clear()
+            self._prefetched.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": len(self._exact),
+                "routes": copy.deepcopy(self._stats),
+                "recent_near_hits": list(self.near_hits)[-20:],
+            }
+
+
+def cached_llm_call(fuzzy: Sequence[str] = (), exact: Sequence[str] = (),
+                    key_by: Optional[Dict[str, Callable[[Any], Any]]] = None):
+    """Cache an OpenAIService method's parsed result in `self.cache`.
+
+    `fuzzy` arguments are canonicalized and may match semantically; `exact`
+    arguments must be identical. `key_by` maps an argument to the function
+    giving its key (default: the value itself). Empty results are never cached.
+    """
+    key_by = key_by or {}
+
+    def decorator(method):
+        signature = inspect.signature(method)
+        route = method.__name__
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            cache = getattr(self, "cache", None)
+            if cache is None:
+                return method(self, *args, **kwargs)
+            bound = signature.bind(self, *args, **kwargs)
+            bound.apply_defaults()
+            fuzzy_args = {name: bound.arguments[name] for name in fuzzy}
+            exact_args = {name: key_by[name](bound.arguments[name]) if name in key_by
+                          else bound.arguments[name] for name in exact}
+
+            hit, value = cache.get(route, fuzzy_args, exact_args)
+            if hit:
+                return value
+            value = method(self, *args, **kwargs)
+            if _cacheable(value):
+                cache.put(route, fuzzy_args, exact_args, value)
+            return value
+
+        return wrapper
+    return decorator
+
+
+def _cacheable(value: Any) -> bool:
+    if value is None:
+        return False
+    items = getattr(value, "items", None)
+    if isinstance(items, list):  # SuggestionResult
+        return bool(items)
+    if isinstance(value, (list, dict)):
+        return bool(value) and not (isinstance(value, dict) and not any(value.values()))
+    return True
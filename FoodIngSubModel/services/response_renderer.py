@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Response Renderer for Recipe Suggestion System
+
+Turns a UnifiedResponse's `data` into the chat-ready markdown the n8n
+Formatting AI Agent would write, in English and Thai, so simple results
+(substitute lists, recipe suggestions, recipe details) skip that second LLM
+call. Each classification has a header, item and footer template per
+language; templates are parsed once at import into literal/field parts and
+filled from `data` plus the request entities.
+"""
+
+import re
+import string
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+LANGUAGES = ("en", "th")
+
+
+class Template:
+    """A str.format template split into (literal, field) parts once, up front."""
+
+    _formatter = string.Formatter()
+
+    def __init__(self, text: str):
+        self.text = text
+        self.parts: List[Tuple[str, Optional[str]]] = [
+            (literal, field) for literal, field, _, _ in self._formatter.parse(text)
+        ]
+
+    def render(self, values: Dict[str, Any]) -> str:
+        out = []
+        for literal, field in self.parts:
+            out.append(literal)
+            if field:
+                out.append(str(values.get(field, "")))
+        return "".join(out)
+
+
+def _compile(templates: Dict[str, Dict[str, Dict[str, str]]]) -> Dict[str, Dict[str, Dict[str, Template]]]:
+    return {classification: {lang: {part: Template(text) for part, text in parts.items()}
+                             for lang, parts in by_lang.items()}
+            for classification, by_lang in templates.items()}
+
+
+# classification -> language -> part -> template. "header" is filled from the
+# request entities and `data`, "item" once per list entry.
+_TEMPLATES = _compile({
+    "substitute": {
+        "en": {"header": "Here are some substitutes for **{ingredient}**{for_recipe}:",
+               "item": "{n}. **{item}**{reason}",
+               "footer": "Would you like me to rewrite a recipe with one of these?"},
+        "th": {"header": "วัตถุดิบที่ใช้แทน **{ingredient}**{for_recipe} ได้มีดังนี้:",
+               "item": "{n}. **{item}**{reason}",
+               "footer": "ต้องการให้ปรับสูตรอาหารโดยใช้วัตถุดิบเหล่านี้ไหมคะ?"},
+    },
+    "context": {
+        "en": {"header": "These ingredients match what you're looking for{for_recipe}:",
+               "item": "{n}. **{item}**",
+               "footer": "Want substitutes or recipe ideas for any of them?"},
+        "th": {"header": "วัตถุดิบที่ตรงกับที่คุณต้องการ{for_recipe}:",
+               "item": "{n}. **{item}**",
+               "footer": "ต้องการวัตถุดิบทดแทนหรือไอเดียเมนูจากวัตถุดิบเหล่านี้ไหมคะ?"},
+    },
+    "suggest": {
+        "en": {"header": "Here are some recipes you can make with {ingredients}:",
+               "item": "{n}. **{name}**{uses}",
+               "footer": "Tell me which one you'd like and I'll share the full recipe."},
+        "th": {"header": "เมนูที่ทำได้จาก {ingredients}:",
+               "item": "{n}. **{name}**{uses}",
+               "footer": "สนใจเมนูไหน บอกได้เลยนะคะ จะส่งสูตรเต็มให้"},
+    },
+    "similar": {
+        "en": {"header": "Here are some recipes similar to **{recipe}**:",
+               "item": "{n}. **{name}**{uses}",
+               "footer": "Tell me which one you'd like and I'll share the full recipe."},
+        "th": {"header": "เมนูที่คล้ายกับ **{recipe}**:",
+               "item": "{n}. **{name}**{uses}",
+               "footer": "สนใจเมนูไหน บอกได้เลยนะคะ จะส่งสูตรเต็มให้"},
+    },
+    "specific": {
+        "en": {"header": "Here are some recipes that use {required_ingredients}:",
+               "item": "{n}. **{name}**{uses}",
+               "footer": "Tell me which one you'd like and I'll share the full recipe."},
+        "th": {"header": "เมนูที่ใช้ {required_ingredients}:",
+               "item": "{n}. **{name}**{uses}",
+               "footer": "สนใจเมนูไหน บอกได้เลยนะคะ จะส่งสูตรเต็มให้"},
+    },
+    "lookup": {
+        "en": {"header": "Here's how to make **{name}**.",
+               "ingredients": "**Ingredients**", "method": "**Method**",
+               "footer": "Need a substitute for any of these ingredients?"},
+        "th": {"header": "วิธีทำ **{name}**",
+               "ingredients": "**วัตถุดิบ**", "method": "**วิธีทำ**",
+               "footer": "ต้องการวัตถุดิบทดแทนสำหรับรายการไหนไหมคะ?"},
+    },
+    "rewrite": {
+        "en": {"header": "Here's **{name}** with {swaps}.",
+               "ingredients": "**Updated ingredients**", "method": "**Updated method**",
+               "changed_ingredients": "**Changed ingredients**", "changed_steps": "**Changed steps**",
+               "footer": "Let me know if you'd like to swap anything else."},
+        "th": {"header": "สูตร **{name}** ที่ใช้ {swaps}",
+               "ingredients": "**วัตถุดิบที่ปรับแล้ว**", "method": "**วิธีทำที่ปรับแล้ว**",
+               "changed_ingredients": "**วัตถุดิบที่เปลี่ยน**", "changed_steps": "**ขั้นตอนที่เปลี่ยน**",
+               "footer": "ต้องการเปลี่ยนวัตถุดิบอื่นอีกไหมคะ?"},
+    },
+    "recipe_custom": {
+        "en": {"header": "Here's **{name}** made with {substitutes}.",
+               "ingredients": "**Ingredients**",
+               "footer": "Would you like the full cooking steps?"},
+        "th": {"header": "สูตร **{name}** ที่ใช้ {substitutes}",
+               "ingredients": "**วัตถุดิบ**",
+               "footer": "ต้องการวิธีทำแบบละเอียดไหมคะ?"},
+    },
+    # Empty results, in place of the agent's polite clarification
+    "empty": {
+        "en": {"header": "Sorry, I couldn't find anything for that. "
+                         "Could you tell me a bit more, like the ingredient or dish you have in mind?"},
+        "th": {"header": "ขออภัยค่ะ ไม่พบข้อมูลที่ตรงกัน "
+                         "ช่วยบอกรายละเอียดเพิ่มเติม เช่น วัตถุดิบหรือเมนูที่ต้องการได้ไหมคะ?"},
+    },
+})
+
+# Joining words for inline lists and clauses, per language
+_GLUE = {
+    "en": {"and": " and ", "for_recipe": " in **{}**", "uses": " — {}", "reason": " — {}",
+           "swap": "**{1}** instead of **{0}**"},
+    "th": {"and": " และ ", "for_recipe": " ในเมนู **{}**", "uses": " — {}", "reason": " — {}",
+           "swap": "**{1}** แทน **{0}**"},
+}
+
+_MAX_INLINE_INGREDIENTS = 6
+_LIST_CLASSES = {"substitute": "substitutes", "context": "ingredients",
+                 "suggest": "recipes", "similar": "recipes", "specific": "recipes"}
+# Splits "1. Boil ... 2. Add ..." into steps
+_STEP = re.compile(r"(?:^|\s)(?:step\s*)?\d+[.)]\s+", re.I)
+_GENERIC_RECIPES = {"general recipe", ""}
+
+
+def _join(values: Sequence[str], lang: str) -> str:
+    values = [str(v).strip() for v in values if v and str(v).strip()]
+    if len(values) <= 1:
+        return "".join(values)
+    return ", ".join(values[:-1]) + _GLUE[lang]["and"] + values[-1]
+
+
+def _as_list(value: Any) -> List[str]:
+    if isinstance(value, (list, tuple)):
+        return [str(v) for v in value if v]
+    return [value] if isinstance(value, str) and value.strip() else []
+
+
+def _split_ingredients(value: Any) -> List[str]:
+    """Ingredient lines from a list, or a newline/comma separated string (commas in parentheses kept)."""
+    if isinstance(value, (list, tuple)):
+        return [str(v).strip() for v in value if str(v).strip()]
+    text = str(value or "").strip()
+    if not text:
+        return []
+    if "\n" in text:
+        parts = text.splitlines()
+    else:
+        parts, depth, current = [], 0, []
+        for ch in text:
+            depth += ch == "("
+            depth -= ch == ")" and depth > 0
+            if ch in ",;" and depth == 0:
+                parts.append("".join(current))
+                current = []
+            else:
+                current.append(ch)
+        parts.append("".join(current))
+    return [re.sub(r"^\s*(?:[-•*]|\d+[.)])\s*", "", p).strip() for p in parts if p.strip()]
+
+
+def _split_steps(value: Any) -> List[str]:
+    if isinstance(value, (list, tuple)):
+        return [str(v).strip() for v in value if str(v).strip()]
+    text = str(value or "").strip()
+    steps = [s.strip() for s in _STEP.split(text) if s.strip()]
+    if len(steps) <= 1:
+        steps = [ln.strip() for ln in text.splitlines() if ln.strip()]
+    return steps
+
+
+def _short_ingredients(value: Any) -> str:
+    items = _split_ingredients(value)
+    if not items:
+        return ""
+    shown = ", ".join(items[:_MAX_INLINE_INGREDIENTS])
+    return shown + (", …" if len(items) > _MAX_INLINE_INGREDIENTS else "")
+
+
+class ResponseRenderer:
+    """Chat markdown for UnifiedResponse data, one string per language."""
+
+    def render(self, classification: str, data: Any, entities: Optional[Dict[str, Any]] = None,
+               languages: Sequence[str] = LANGUAGES) -> Optional[Dict[str, str]]:
+        """{"en": ..., "th": ...} markdown, or None for a classification without templates."""
+        if classification not in _TEMPLATES:
+            return None
+        entities = entities or {}
+        return {lang: self._render_one(classification, data, entities, lang) for lang in languages}
+
+    def _render_one(self, classification: str, data: Any, entities: Dict[str, Any], lang: str) -> str:
+        data = data if isinstance(data, dict) else {}
+        if classification in _LIST_CLASSES:
+            items = data.get(_LIST_CLASSES[classification]) or []
+            if not items:
+                return self._empty(lang)
+            return self._render_list(classification, items, data, entities, lang)
+        if not (data.get("ingredients") or data.get("cooking_method")
+                or data.get("changed_ingredients") or data.get("changed_steps")):
+            return self._empty(lang)
+        return self._render_details(classification, data, entities, lang)
+
+    def _empty(self, lang: str) -> str:
+        return _TEMPLATES["empty"][lang]["header"].render({})
+
+    def _values(self, data: Dict[str, Any], entities: Dict[str, Any], lang: str) -> Dict[str, Any]:
+        glue = _GLUE[lang]
+        recipe = entities.get("recipe_context") or entities.get("recipe_title") or entities.get("recipe")
+        for_recipe = "" if str(recipe or "").strip().lower() in _GENERIC_RECIPES else glue["for_recipe"].format(recipe)
+        return {
+            "ingredient": entities.get("ingredient") or "",
+            "recipe": entities.get("recipe") or data.get("name") or "",
+            "name": data.get("name") or entities.get("recipe") or "",
+            "for_recipe": for_recipe,
+            "ingredients": _join(_as_list(entities.get("ingredients")), lang),
+            "required_ingredients": _join(_as_list(entities.get("required_ingredients")), lang),
+            "substitutes": _join(_as_list(entities.get("substitutes")), lang),
+            "swaps": _join([glue["swap"].format(s.get("ingredient"), s.get("replacement"))
+                            for s in self._swaps(data, entities)], lang),
+        }
+
+    @staticmethod
+    def _swaps(data: Dict[str, Any], entities: Dict[str, Any]) -> List[Dict[str, Any]]:
+        if data.get("swaps"):
+            return [s for s in data["swaps"] if isinstance(s, dict)]
+        if entities.get("ingredient") and entities.get("replacement"):
+            return [{"ingredient": entities["ingredient"], "replacement": entities["replacement"]}]
+        return []
+
+    def _render_list(self, classification: str, items: List[Any], data: Dict[str, Any],
+                     entities: Dict[str, Any], lang: str) -> str:
+        templates = _TEMPLATES[classification][lang]
+        values = self._values(data, entities, lang)
+        reasons = data.get("reasons") or []
+        lines = [templates["header"].render(values), ""]
+        for n, item in enumerate(items, 1):
+            if isinstance(item, dict):
+                uses = _short_ingredients(item.get("ingredients"))
+                row = {"n": n, "name": item.get("name") or "",
+                       "uses": _GLUE[lang]["uses"].format(uses) if uses else ""}
+            else:
+                reason = reasons[n - 1] if n <= len(reasons) else ""
+                row = {"n": n, "item": item,
+                       "reason": _GLUE[lang]["reason"].format(reason) if reason else ""}
+            lines.append(templates["item"].render(row))
+        lines += ["", templates["footer"].render(values)]
+        return "\n".join(lines)
+
+    def _render_details(self, classification: str, data: Dict[str, Any],
+                        entities: Dict[str, Any], lang: str) -> str:
+        templates = _TEMPLATES[classification][lang]
+        lines = [templates["header"].render(self._values(data, entities, lang))]
+        ingredients = _split_ingredients(data.get("ingredients"))
+        if ingredients:
+            lines += ["", templates["ingredients"].render({})]
+            lines += [f"- {item}" for item in ingredients]
+        steps = _split_steps(data.get("cooking_method")) if "method" in templates else []
+        if steps:
+            lines += ["", templates["method"].render({})]
+            lines += [f"{n}. {step}" for n, step in enumerate(steps, 1)]
+        # Diff-only rewrites: just the lines and steps that changed
+        changed = [c for c in data.get("changed_ingredients") or [] if isinstance(c, dict)]
+        if changed:
+            lines += ["", templates["changed_ingredients"].render({})]
+            lines += [f"- ~~{c['from']}~~ → {c.get('to') or ''}" if c.get("from") else f"- {c.get('to') or ''}"
+                      for c in changed]
+        changed_steps = [c for c in data.get("changed_steps") or [] if isinstance(c, dict)]
+        if changed_steps:
+            lines += ["", templates["changed_steps"].render({})]
+            lines += [f"{c['step']}. {c.get('text') or ''}" if c.get("step") else f"- {c.get('text') or ''}"
+                      for c in changed_steps]
+        lines += ["", templates["footer"].render({})]
+        return "\n".join(lines)
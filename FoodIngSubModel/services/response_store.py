@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Response Store for Recipe Suggestion System
+
+Persistent store of precomputed LLM answers (ingredient substitutes and recipe
+details) written by precompute/bulk_precompute.py. Services read it before
+calling OpenAI, so live calls are only needed for requests nobody precomputed.
+
+The store is an append-only JSONL file; the last record for a key wins. It is
+re-read when the file changes, so a running server picks up new results.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Set, Tuple
+
+from config import Config
+from models import SuggestionResult
+from services.dataset_service import DatasetService
+from services.response_cache import Canonicalizer
+
+logger = logging.getLogger(__name__)
+
+SUBSTITUTE = "substitute"
+LOOKUP = "lookup"
+
+# Recipe key used for substitutes computed without a specific recipe
+GENERIC_RECIPE = ""
+# Canonical recipe keys that mean "no particular recipe" ("General Recipe" is the service default)
+_GENERIC_RECIPE_KEYS = {"", "general", "any"}
+
+
+class ResponseStore:
+    """Precomputed substitutes and recipe details keyed by canonical names."""
+
+    def __init__(self, config: Config, path: Optional[str] = None,
+                 alias_index: Optional[Dict[str, str]] = None):
+        self.config = config
+        self.path = path or config.response_store_path
+        if alias_index is None:
+            alias_index = DatasetService(config).alias_index()
+        self.canonicalizer = Canonicalizer(alias_index)
+        self._lock = threading.Lock()
+        self._records: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+        self._mtime: Optional[float] = None
+        self._checked_at = float("-inf")  # so the first lookup loads the file
+        self.hits = {SUBSTITUTE: 0, LOOKUP: 0}
+
+    # ------------------------------------------------------------------
+    # Loading
+    # ------------------------------------------------------------------
+
+    def _maybe_reload(self):
+        # At most one stat per interval, whether or not the file exists yet
+        now = time.monotonic()
+        if now - self._checked_at < self.config.response_store_reload_interval:
+            return
+        self._checked_at = now
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+
+        records = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        record = json.loads(line)
+                        records[(record["kind"], record["key"], record.get("recipe", GENERIC_RECIPE))] = record
+                    except (ValueError, KeyError):
+                        logger.warning("Skipping malformed response store line in %s", self.path)
+        except OSError as e:
+            logger.error("Could not read response store %s: %s", self.path, e)
+            return
+
+        with self._lock:
+            self._records = records
+            self._mtime = mtime
+        logger.info("Loaded %s precomputed responses from %s", len(records), self.path)
+
+    def key(self, text: str) -> str:
+        return self.canonicalizer.text(text)
+
+    def _recipe_key(self, recipe: Optional[str]) -> str:
+        key = self.key(recipe) if recipe else GENERIC_RECIPE
+        return GENERIC_RECIPE if key in _GENERIC_RECIPE_KEYS else key
+
+    def get(self, kind: str, subject: str, recipe: str = GENERIC_RECIPE) -> Optional[Dict[str, Any]]:
+        self._maybe_reload()
+        with self._lock:
+            return self._records.get((kind, self.key(subject), self._recipe_key(recipe)))
+
+    def put(self, kind: str, subject: str, value: Dict[str, Any], recipe: str = GENERIC_RECIPE):
+        """Append a record and make it visible immediately."""
+        self._maybe_reload()
+        record = dict(value, kind=kind, key=self.key(subject), subject=subject,
+                      recipe=self._recipe_key(recipe), created=time.time())
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._records[(kind, record["key"], record["recipe"])] = record
+            # Our own append needs no reload
+            self._mtime = os.path.getmtime(self.path)
+
+    def keys(self, kind: str) -> Set[str]:
+        """Canonical subjects already stored for `kind` (any recipe)."""
+        self._maybe_reload()
+        with self._lock:
+            return {key for (k, key, _) in self._records if k == kind}
+
+    def __len__(self) -> int:
+        self._maybe_reload()
+        return len(self._records)
+
+    # ------------------------------------------------------------------
+    # Typed readers
+    # ------------------------------------------------------------------
+
+    def get_substitutes(self, ingredient: str, recipe: str = GENERIC_RECIPE,
+                        max_results: Optional[int] = None,
+                        include_reasoning: bool = False) -> Optional[SuggestionResult]:
+        """Precomputed substitutes for this recipe, else the recipe-independent ones."""
+        record = self.get(SUBSTITUTE, ingredient, recipe)
+        if record is None and self._recipe_key(recipe) and self.config.precomputed_substitutes_any_recipe:
+            record = self.get(SUBSTITUTE, ingredient)
+        if not record or not record.get("items"):
+            return None
+
+        with self._lock:
+            self.hits[SUBSTITUTE] += 1
+        max_results = max_results or len(record["items"])
+        items = list(record["items"][:max_results])
+        if include_reasoning:
+            reasons = list(record.get("reasons", [])[:max_results])
+            return SuggestionResult(items, "precomputed", reasons + [""] * (len(items) - len(reasons)))
+        return SuggestionResult(items, "precomputed")
+
+    def get_recipe_details(self, recipe_name: str) -> Optional[Dict[str, str]]:
+        record = self.get(LOOKUP, recipe_name)
+        if not record or not record.get("cooking_method"):
+            return None
+        with self._lock:
+            self.hits[LOOKUP] += 1
+        return {"ingredients": record.get("ingredients"), "cooking_method": record["cooking_method"]}
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"records": len(self), "hits": dict(self.hits)}
+
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Session Store for Recipe Suggestion System
+
+Keeps the results of recent calls per chat session (recipe details,
+substitutes and parsed natural-language contexts) so follow-up turns such as
+/lookup -> /substitute -> /rewrite on the same recipe skip LLM round trips.
+Sessions expire after a period of inactivity and both the number of sessions
+and the items per session are bounded. Results computed in degraded,
+cache-only mode (CACHE_ONLY) are not kept, so the next turn recomputes them.
+"""
+
+import copy
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+from cachetools import LRUCache, TTLCache
+
+from config import Config
+from models import ParsedContext, SuggestionResult
+from services.response_cache import CACHE_ONLY
+from utils import normalize_text
+
+
+class Session:
+    """Recent results of one chat session, each kind in its own small LRU."""
+
+    def __init__(self, max_items: int):
+        self.recipe_details: LRUCache = LRUCache(maxsize=max_items)
+        self.substitutes: LRUCache = LRUCache(maxsize=max_items)
+        self.contexts: LRUCache = LRUCache(maxsize=max_items)
+        self.last_recipe: Optional[str] = None
+
+
+class SessionStore:
+    """Bounded, TTL-evicted map of session_id -> Session."""
+
+    def __init__(self, config: Config):
+        self.config = config
+        self._lock = threading.Lock()
+        self._sessions: TTLCache = TTLCache(maxsize=config.session_store_size,
+                                            ttl=config.session_ttl)
+        self.stats = {"hits": 0, "misses": 0}
+
+    def _session(self, session_id: Optional[str], create: bool) -> Optional[Session]:
+        if not session_id:
+            return None
+        session = self._sessions.get(session_id)
+        if session is None and create:
+            session = Session(self.config.session_max_items)
+        if session is not None:
+            # Re-inserting refreshes the TTL, so active sessions stay alive
+            self._sessions[session_id] = session
+        return session
+
+    def _get(self, session_id: Optional[str], kind: str, key: Any) -> Any:
+        if not session_id:
+            return None
+        with self._lock:
+            session = self._session(session_id, create=False)
+            value = getattr(session, kind).get(key) if session else None
+            self.stats["hits" if value is not None else "misses"] += 1
+        return copy.deepcopy(value)
+
+    def _put(self, session_id: Optional[str], kind: str, key: Any, value: Any):
+        if not session_id or value is None or CACHE_ONLY.get():
+            return
+        with self._lock:
+            session = self._session(session_id, create=True)
+            getattr(session, kind)[key] = copy.deepcopy(value)
+
+    # ------------------------------------------------------------------
+    # Recipe details (/lookup, /rewrite)
+    # ------------------------------------------------------------------
+
+    def get_recipe_details(self, session_id: Optional[str], recipe: str) -> Optional[Dict[str, Any]]:
+        return self._get(session_id, "recipe_details", normalize_text(recipe))
+
+    def put_recipe_details(self, session_id: Optional[str], recipe: str, details: Dict[str, Any]):
+        self._put(session_id, "recipe_details", normalize_text(recipe), details)
+        self.set_last_recipe(session_id, recipe)
+
+    # ------------------------------------------------------------------
+    # Substitutes (/substitute)
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _substitute_key(ingredient: str, recipe: str, max_results: Optional[int],
+                        include_reasoning: bool) -> Tuple:
+        return (normalize_text(ingredient), normalize_text(recipe or ""), max_results, include_reasoning)
+
+    def get_substitutes(self, session_id: Optional[str], ingredient: str, recipe: str,
+                        max_results: Optional[int], include_reasoning: bool) -> Optional[SuggestionResult]:
+        key = self._substitute_key(ingredient, recipe, max_results, include_reasoning)
+        return self._get(session_id, "substitutes", key)
+
+    def put_substitutes(self, session_id: Optional[str], ingredient: str, recipe: str,
+                        max_results: Optional[int], include_reasoning: bool, result: SuggestionResult):
+        if not result.items:
+            return
+        key = self._substitute_key(ingredient, recipe, max_results, include_reasoning)
+        self._put(session_id, "substitutes", key, result)
+
+    # ------------------------------------------------------------------
+    # Parsed natural-language contexts (/context)
+    # ------------------------------------------------------------------
+
+    def get_context(self, session_id: Optional[str], description: str) -> Optional[ParsedContext]:
+        return self._get(session_id, "contexts", normalize_text(description))
+
+    def put_context(self, session_id: Optional[str], description: str, parsed: ParsedContext):
+        self._put(session_id, "contexts", normalize_text(description), parsed)
+
+    # ------------------------------------------------------------------
+    # Conversation state
+    # ------------------------------------------------------------------
+
+    def set_last_recipe(self, session_id: Optional[str], recipe: str):
+        if not session_id or not recipe:
+            return
+        with self._lock:
+            self._session(session_id, create=True).last_recipe = recipe
+
+    def last_recipe(self, session_id: Optional[str]) -> Optional[str]:
+        if not session_id:
+            return None
+        with self._lock:
+            session = self._session(session_id, create=False)
+            return session.last_recipe if session else None
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"active": len(self._sessions), **self.stats}
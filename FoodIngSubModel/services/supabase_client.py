@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Supabase Client for Recipe Suggestion System
+
+PostgREST access over one pooled httpx client (plus an async twin), with
+per-call timeouts and a circuit breaker. After repeated failures the breaker
+opens and calls fail at once with CircuitOpenError, so callers fall back
+(e.g. /suggest to GPT) without waiting out a hanging database. After
+`supabase_breaker_reset` seconds one trial call is let through: success closes
+the breaker again, failure re-opens it.
+"""
+
+import base64
+import json
+import logging
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from config import Config
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(__name__)
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class SupabaseError(Exception):
+    """A Supabase call failed (timeout, connection error or error response)."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class CircuitOpenError(SupabaseError):
+    """The call was skipped because the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with a single half-open trial call."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+        self.stats = {"successes": 0, "failures": 0, "rejected": 0, "opened": 0}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        """True if a call may go ahead now (at most one at a time while half-open)."""
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = HALF_OPEN
+            if self._state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self.stats["rejected"] += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.stats["successes"] += 1
+            self._failures = 0
+            self._trial_in_flight = False
+            if self._state != CLOSED:
+                logger.info("Supabase circuit breaker closed")
+            self._state = CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self.stats["failures"] += 1
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    self.stats["opened"] += 1
+                    logger.warning("Supabase circuit breaker opened after %s failures", self._failures)
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+
+    def snapshot(self) -> Dict[str, Any]:
+        state = self.state
+        with self._lock:
+            return {"state": state, "consecutive_failures": self._failures, **self.stats}
+
+
+class SupabaseClient:
+    """PostgREST RPCs and selects over a pooled, timeout-bounded httpx client."""
+
+    def __init__(self, config: Config, url: Optional[str] = None, key: Optional[str] = None,
+                 transport: Optional["httpx.BaseTransport"] = None):
+        import httpx  # ~80 ms; deferred until Supabase is actually configured
+
+        self.config = config
+        url = url or config.supabase_url
+        key = key or config.supabase_key
+        self.base_url = f"{url.rstrip('/')}/rest/v1"
+        self._headers = {"apikey": key, "Authorization": f"Bearer {key}"}
+        self._limits = httpx.Limits(max_connections=config.supabase_max_connections,
+                                    max_keepalive_connections=config.supabase_max_keepalive,
+                                    keepalive_expiry=config.supabase_keepalive_expiry)
+        self._timeout = httpx.Timeout(config.supabase_timeout, connect=config.supabase_connect_timeout)
+        self._transport = transport
+        self._http = httpx.Client(base_url=self.base_url, headers=self._headers, limits=self._limits,
+                                  timeout=self._timeout, transport=transport)
+        self._async_http: Optional["httpx.AsyncClient"] = None
+        self.breaker = CircuitBreaker(config.supabase_breaker_failures, config.supabase_breaker_reset)
+
+    # ------------------------------------------------------------------
+    # Sync
+    # ------------------------------------------------------------------
+
+    def rpc(self, function: str, params: Optional[Dict[str, Any]] = None,
+            timeout: Optional[float] = None, token: Optional[str] = None) -> Any:
+        """Call a Postgres function and return its decoded result."""
+        return self._send("POST", f"/rpc/{function}", json=params or {}, timeout=timeout, token=token)
+
+    def select(self, table: str, columns: str = "*", eq: Optional[Dict[str, Any]] = None,
+               limit: Optional[int] = None, timeout: Optional[float] = None,
+               token: Optional[str] = None, order: Optional[str] = None,
+               offset: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Rows of `table` whose columns equal the `eq` values, optionally sorted
+        by `order` and paged with `limit`/`offset`. With a user's `token`
+        (their Supabase JWT) the query runs as that user, under RLS.
+        """
+        return self._send("GET", f"/{table}", params=_select_params(columns, eq, limit, order, offset),
+                          timeout=timeout, token=token)
+
+    def _send(self, method: str, path: str, timeout: Optional[float] = None,
+              token: Optional[str] = None, **kwargs) -> Any:
+        import httpx
+
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Supabase circuit open; skipped {method} {path}")
+        if token:
+            kwargs["headers"] = {"Authorization": f"Bearer {token}"}
+        healthy = False
+        try:
+            response = self._http.request(method, path, timeout=self._call_timeout(timeout), **kwargs)
+            healthy = _healthy(response)
+        except httpx.HTTPError as e:
+            raise SupabaseError(f"{method} {path} failed: {e!r}") from e
+        finally:
+            # Any way out of the call settles the breaker, so a half-open trial never sticks
+            self._settle(healthy)
+        return self._result(method, path, response)
+
+    # ------------------------------------------------------------------
+    # Async
+    # ------------------------------------------------------------------
+
+    async def arpc(self, function: str, params: Optional[Dict[str, Any]] = None,
+                   timeout: Optional[float] = None, token: Optional[str] = None) -> Any:
+        """Async `rpc`, sharing the breaker with the sync client."""
+        return await self._asend("POST", f"/rpc/{function}", json=params or {}, timeout=timeout,
+                                 token=token)
+
+    async def aselect(self, table: str, columns: str = "*", eq: Optional[Dict[str, Any]] = None,
+                      limit: Optional[int] = None, timeout: Optional[float] = None,
+                      token: Optional[str] = None, order: Optional[str] = None,
+                      offset: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Async `select`."""
+        return await self._asend("GET", f"/{table}",
+                                 params=_select_params(columns, eq, limit, order, offset),
+                                 timeout=timeout, token=token)
+
+    async def _asend(self, method: str, path: str, timeout: Optional[float] = None,
+                     token: Optional[str] = None, **kwargs) -> Any:
+        import httpx
+
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Supabase circuit open; skipped {method} {path}")
+        if token:
+            kwargs["headers"] = {"Authorization": f"Bearer {token}"}
+        if self._async_http is None:
+            # Same headers, pool limits and timeouts as the sync client
+            self._async_http = httpx.AsyncClient(base_url=self.base_url, headers=self._headers,
+                                                 limits=self._limits, timeout=self._timeout,
+                                                 transport=self._transport)
+        healthy = False
+        try:
+            response = await self._async_http.request(method, path, timeout=self._call_timeout(timeout),
+                                                      **kwargs)
+            healthy = _healthy(response)
+        except httpx.HTTPError as e:
+            raise SupabaseError(f"{method} {path} failed: {e!r}") from e
+        finally:
+            # Cancellation included: a half-open trial is settled either way
+            self._settle(healthy)
+        return self._result(method, path, response)
+
+    # ------------------------------------------------------------------
+
+    def _settle(self, healthy: bool):
+        if healthy:
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+
+    def _call_timeout(self, timeout: Optional[float]) -> "httpx.Timeout":
+        if timeout is None:
+            return self._timeout
+        import httpx
+
+        return httpx.Timeout(timeout, connect=min(timeout, self.config.supabase_connect_timeout))
+
+    def _result(self, method: str, path: str, response: "httpx.Response") -> Any:
+        if response.status_code >= 500 or response.status_code == 429:
+            raise SupabaseError(f"{method} {path} returned {response.status_code}", response.status_code)
+        if response.status_code >= 400:
+            raise SupabaseError(f"{method} {path} returned {response.status_code}: {response.text[:200]}",
+                                response.status_code)
+        if not response.content:
+            return None
+        try:
+            return response.json()
+        except ValueError as e:
+            raise SupabaseError(f"{method} {path} returned invalid JSON") from e
+
+    def warm(self) -> int:
+        """Open a pooled keep-alive connection with a one-row select; rows returned."""
+        return len(self.select("recipes", "id", limit=1, timeout=self.config.warmup_timeout) or [])
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"breaker": self.breaker.snapshot(), "timeout_s": self.config.supabase_timeout,
+                "max_connections": self.config.supabase_max_connections}
+
+    def close(self):
+        self._http.close()
+
+    async def aclose(self):
+        self.close()
+        if self._async_http is not None:
+            await self._async_http.aclose()
+
+
+def create_supabase_client(config: Config) -> Optional[SupabaseClient]:
+    """A SupabaseClient if the URL and key are configured, else None."""
+    if not config.supabase_url or not config.supabase_key:
+        return None
+    return SupabaseClient(config)
+
+
+def _healthy(response: "httpx.Response") -> bool:
+    """5xx and 429 mean an unhealthy upstream; other 4xx are the caller's mistake."""
+    return response.status_code < 500 and response.status_code != 429
+
+
+def jwt_subject(token: Optional[str]) -> Optional[str]:
+    """
+    The `sub` claim (user id) of a Supabase JWT, or None. The signature is not
+    checked here: the token is forwarded to PostgREST, which verifies it, so
+    the subject only picks the caller's own row and is never trusted alone.
+    """
+    if not token or token.count(".") != 2:
+        return None
+    payload = token.split(".")[1]
+    try:
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+    except (ValueError, TypeError):
+        return None
+    subject = claims.get("sub") if isinstance(claims, dict) else None
+    return subject if isinstance(subject, str) and subject else None
+
+
+def _select_params(columns: str, eq: Optional[Dict[str, Any]], limit: Optional[int],
+                   order: Optional[str] = None, offset: Optional[int] = None) -> Dict[str, str]:
+    params = {"select": columns}
+    for column, value in (eq or {}).items():
+        params[column] = f"eq.{value}"
+    if order is not None:
+        params["order"] = order
+    if limit is not None:
+        params["limit"] = str(limit)
+    if offset:
+        params["offset"] = str(offset)
+    return params
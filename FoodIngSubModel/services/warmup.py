@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Startup Warmup for Recipe Suggestion System
+
+Runs once per worker, from the FastAPI lifespan, on a background thread so
+/live answers throughout. The steps build the services, parse the dataset,
+build the indexes and automata, open keep-alive connections to the LLM
+providers and Supabase, and replay hot queries (`Config.warmup_queries_path`)
+into the response caches. /ready answers 503 until every step has run. A
+failed step is logged and reported but does not hold readiness back: the
+worker serves that path cold, as it did without warmup.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+PENDING, RUNNING, READY = "pending", "running", "ready"
+
+
+def load_warmup_queries(path: Optional[str]) -> List[Dict[str, Any]]:
+    """UnifiedRequest bodies from a JSON list file; [] if the file is missing or invalid."""
+    if not path or not os.path.exists(path):
+        return []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            queries = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning("Could not read warmup queries %s: %s", path, e)
+        return []
+    return [q for q in queries if isinstance(q, dict) and q.get("classification")]
+
+
+class Warmup:
+    """Ordered warmup steps, their timings, and the readiness they gate."""
+
+    def __init__(self, config: Config):
+        self.config = config
+        self.enabled = config.warmup_enabled
+        self.state = PENDING if self.enabled else READY
+        self.steps: Dict[str, Dict[str, Any]] = {}
+        self.started_at: Optional[float] = None
+        self.duration_ms: Optional[float] = None
+        self._done = threading.Event()
+        if not self.enabled:
+            self._done.set()
+
+    @property
+    def ready(self) -> bool:
+        return self.state == READY
+
+    def start(self, steps: List[Tuple[str, Callable[[], Any]]], background: bool = True):
+        """Run the steps (once) on a daemon thread, or inline with background=False."""
+        if self.state != PENDING:
+            return
+        self.state = RUNNING
+        self.started_at = time.monotonic()
+        if background:
+            threading.Thread(target=self.run, args=(steps,), name="warmup", daemon=True).start()
+        else:
+            self.run(steps)
+
+    def run(self, steps: List[Tuple[str, Callable[[], Any]]]):
+        for name, step in steps:
+            started = time.perf_counter()
+            try:
+                detail = step()
+                self.steps[name] = {"ok": True}
+                # Counts and summaries are reported; built objects (indexes, automata) are not
+                if isinstance(detail, (bool, int, float, str, dict)):
+                    self.steps[name]["detail"] = detail
+            except Exception as e:
+                logger.warning("Warmup step %s failed: %s", name, e)
+                self.steps[name] = {"ok": False, "error": str(e)}
+            self.steps[name]["ms"] = round((time.perf_counter() - started) * 1000, 1)
+        self.duration_ms = round((time.monotonic() - (self.started_at or time.monotonic())) * 1000, 1)
+        self.state = READY
+        self._done.set()
+        logger.info("Warmup finished in %.0fms (%s steps failed)", self.duration_ms,
+                    sum(1 for step in self.steps.values() if not step["ok"]))
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until warmup is finished; False on timeout."""
+        return self._done.wait(timeout)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "state": self.state,
+            "duration_ms": self.duration_ms,
+            "steps": {name: dict(step) for name, step in self.steps.items()},
+        }
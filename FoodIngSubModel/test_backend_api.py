@@ -9,15 +9,36 @@ Tests cover:
 5. /rewrite - recipe rewriting with ingredient replacement
 6. /similar - similar recipe suggestions
 7. /recipe_custom - custom recipe building with substitutes
-8. /health - health check with service availability
+8. /health, /live, /ready - service availability, liveness and warmup-gated readiness
+9. /metrics - per-route LLM metrics
+10. session_id - follow-up turns reuse earlier results
+11. /recommend - personalized home-page recipes
+12. /recipes/search - filtered, faceted, cursor-paginated recipe search
+13. /ingredients/search - dataset facets and filters
+14. /classify - local intent classification with GPT fallback
+15. Admission control - 503 shedding and degraded dataset/cache answers
 """
 
+import base64
+import json
+
 import pytest
+import backend_api
 from unittest.mock import patch, MagicMock
 from fastapi.testclient import TestClient
 
 from backend_api import app
+from config import Config
 from models import RecipeSuggestion, SuggestionResult
+from precompute.train_intent import write_model
+from services.intent_classifier import IntentClassifier, LinearIntentModel, load_examples
+from services.lazy import LazyService
+from services.recipe_search import RecipeSearchIndex
+from services.recommendation_service import RecommendationService
+from services.response_cache import CACHE_ONLY
+from services.response_store import LOOKUP, ResponseStore
+from services.session_store import SessionStore
+from services.warmup import Warmup
 
 
 client = TestClient(app)
@@ -48,6 +69,29 @@ def mock_openai_service():
         yield mock
 
 
+@pytest.fixture(autouse=True)
+def response_store(tmp_path):
+    """Empty precomputed-response store, so local precompute output never leaks in."""
+    store = ResponseStore(Config(), path=str(tmp_path / "responses.jsonl"), alias_index={})
+    with patch("backend_api.response_store", store):
+        yield store
+
+
+@pytest.fixture(autouse=True)
+def session_store():
+    """Fresh session store per test."""
+    store = SessionStore(Config())
+    with patch("backend_api.session_store", store):
+        yield store
+
+
+@pytest.fixture(autouse=True)
+def mock_prefetcher():
+    """Mock prefetcher so endpoint tests never start speculative calls."""
+    with patch("backend_api.prefetcher") as mock:
+        yield mock
+
+
 # =============================================================================
 # /substitute Endpoint Tests
 # =============================================================================
@@ -141,6 +185,25 @@ class TestSubstituteEndpoint:
         assert data["source"] is not None
         assert data["source"] in ["dataset", "gpt", "dataset+gpt", "none"]
 
+    def test_substitute_with_constraints(self, mock_ingredient_service):
+        """Constraint spellings are normalized, passed on and echoed; unknown ones are dropped."""
+        mock_ingredient_service.get_substitutes.return_value = SuggestionResult(
+            items=["coconut oil", "margarine"],
+            source="gpt"
+        )
+
+        response = client.post("/substitute", json={
+            "classification": "substitute",
+            "entities": {"ingredient": "butter", "recipe": "cookies",
+                         "constraints": ["No Dairy", "nut free", "keto"]},
+            "confidence": 0.9
+        })
+
+        data = response.json()
+        assert data["data"]["constraints"] == ["dairy-free", "nut-free"]
+        kwargs = mock_ingredient_service.get_substitutes.call_args.kwargs
+        assert kwargs["constraints"] == ["dairy-free", "nut-free"]
+
 
 # =============================================================================
 # /context Endpoint Tests
@@ -254,6 +317,23 @@ class TestSuggestEndpoint:
             assert "name" in recipe
             assert "ingredients" in recipe
 
+    def test_suggest_rendered(self, mock_recipe_service):
+        """render=true adds chat-ready English and Thai markdown next to the data."""
+        mock_recipe_service.get_suggestions.return_value = (
+            [RecipeSuggestion(name="Chicken Stir Fry", ingredients="chicken, rice, garlic")], "dataset")
+
+        plain = client.post("/suggest", json={
+            "classification": "suggest", "entities": {"ingredients": ["chicken", "rice"]},
+            "confidence": 0.9}).json()
+        data = client.post("/suggest", json={
+            "classification": "suggest", "entities": {"ingredients": ["chicken", "rice"]},
+            "confidence": 0.9, "render": True}).json()
+
+        assert plain["rendered"] is None
+        assert data["data"] == plain["data"]
+        assert "1. **Chicken Stir Fry** — chicken, rice, garlic" in data["rendered"]["en"]
+        assert "chicken และ rice" in data["rendered"]["th"]
+
     def test_suggest_missing_ingredients(self):
         """Test /suggest fails when ingredients array is missing."""
         response = client.post("/suggest", json={
@@ -325,6 +405,24 @@ class TestLookupEndpoint:
         assert isinstance(data["data"]["ingredients"], list)
         assert isinstance(data["data"]["cooking_method"], str)
 
+    def test_lookup_precomputed(self, mock_openai_service, response_store):
+        """Test /lookup serves precomputed details without calling GPT."""
+        response_store.put(LOOKUP, "Pad Thai", {
+            "ingredients": "rice noodles, shrimp, tamarind",
+            "cooking_method": "1. Soak noodles\n2. Stir-fry",
+        })
+
+        response = client.post("/lookup", json={
+            "classification": "lookup",
+            "entities": {"recipe": "pad thai"},
+            "confidence": 0.95
+        })
+
+        data = response.json()
+        assert data["source"] == "precomputed"
+        assert data["data"]["ingredients"] == "rice noodles, shrimp, tamarind"
+        mock_openai_service.get_recipe_details.assert_not_called()
+
     def test_lookup_missing_recipe(self):
         """Test /lookup fails when recipe field is missing."""
         response = client.post("/lookup", json={
@@ -420,6 +518,36 @@ class TestRewriteEndpoint:
         assert data["error"] is not None
         assert "recipe" in data["error"].lower() or "ingredient" in data["error"].lower() or "replacement" in data["error"].lower()
 
+    def test_rewrite_multiple_swaps_diff_only(self, mock_openai_service):
+        """swaps[] are applied in one generation; output=diff returns only the changed lines."""
+        mock_openai_service.get_updated_recipe_with_substitutions.return_value = {
+            "changed_ingredients": [{"from": "200g butter", "to": "200g coconut oil"},
+                                    {"from": "2 eggs", "to": "2 flax eggs"}],
+            "changed_steps": [{"step": 3, "text": "Whisk the flax eggs into the oil."}],
+        }
+
+        response = client.post("/rewrite", json={
+            "classification": "rewrite",
+            "entities": {
+                "recipe": "brownies",
+                "swaps": [{"ingredient": "butter", "replacement": "coconut oil"}, ["eggs", "flax eggs"]],
+                "original_ingredients": "200g butter, 2 eggs, 100g cocoa",
+                "output": "diff",
+            },
+            "confidence": 0.9,
+            "render": True,
+        })
+
+        data = response.json()
+        kwargs = mock_openai_service.get_updated_recipe_with_substitutions.call_args.kwargs
+        assert kwargs["swaps"] == [("butter", "coconut oil"), ("eggs", "flax eggs")]
+        assert kwargs["diff_only"] is True
+        mock_openai_service.get_updated_recipe_with_substitution.assert_not_called()
+        assert data["data"]["changed_steps"][0]["step"] == 3
+        assert "cooking_method" not in data["data"]
+        assert "- ~~2 eggs~~ → 2 flax eggs" in data["rendered"]["en"]
+        assert "**coconut oil** instead of **butter** and **flax eggs** instead of **eggs**" in data["rendered"]["en"]
+
     def test_rewrite_response_structure(self, mock_openai_service):
         """Verify data.ingredients and data.cooking_method are present."""
         mock_openai_service.get_updated_recipe_with_substitution.return_value = {
@@ -452,10 +580,10 @@ class TestSimilarEndpoint:
 
     def test_similar_success(self, mock_recipe_service):
         """Test successful similar recipe lookup."""
-        mock_recipe_service.get_similar_recipes.return_value = [
+        mock_recipe_service.get_similar_recipes.return_value = ([
             RecipeSuggestion(name="Carbonara Variation", ingredients="pasta, eggs, bacon, cheese"),
             RecipeSuggestion(name="Creamy Pasta", ingredients="pasta, cream, bacon, parmesan"),
-        ]
+        ], "gpt")
         
         response = client.post("/similar", json={
             "classification": "similar",
@@ -479,9 +607,9 @@ class TestSimilarEndpoint:
 
     def test_similar_source_is_gpt(self, mock_recipe_service):
         """Verify source field is 'gpt' for similar endpoint."""
-        mock_recipe_service.get_similar_recipes.return_value = [
+        mock_recipe_service.get_similar_recipes.return_value = ([
             RecipeSuggestion(name="Similar Recipe", ingredients="ingredients")
-        ]
+        ], "gpt")
         
         response = client.post("/similar", json={
             "classification": "similar",
@@ -492,6 +620,24 @@ class TestSimilarEndpoint:
         data = response.json()
         assert data["source"] == "gpt"
 
+    def test_similar_from_recipe_index(self, mock_recipe_service):
+        """Corpus recipes come back with their Supabase id and image."""
+        mock_recipe_service.get_similar_recipes.return_value = ([
+            RecipeSuggestion(name="Spaghetti alla Gricia", ingredients="spaghetti, guanciale, pecorino",
+                             id=42, image="https://images.example.com/42.jpg")
+        ], "dataset")
+
+        response = client.post("/similar", json={
+            "classification": "similar",
+            "entities": {"recipe": "Carbonara"},
+            "confidence": 0.9
+        })
+
+        data = response.json()
+        assert data["source"] == "dataset"
+        assert data["data"]["recipes"][0]["id"] == 42
+        assert data["data"]["recipes"][0]["image"] == "https://images.example.com/42.jpg"
+
 
 # =============================================================================
 # /recipe_custom Endpoint Tests
@@ -623,6 +769,267 @@ class TestSpecificEndpoint:
         assert "required_ingredients" in data["error"].lower()
 
 
+# =============================================================================
+# /recommend Endpoint Tests
+# =============================================================================
+
+class TestRecommendEndpoint:
+    """Test suite for /recommend endpoint."""
+
+    @pytest.fixture
+    def recommendation_service(self, tmp_path):
+        rows = [
+            {"id": 1, "recipe_name": "Pad Thai", "img_src": "https://img/1.jpg",
+             "ingredients": "rice noodles, shrimp, peanuts", "cuisine_path": "/World Cuisine/Asian/Thai/",
+             "rating": 4.2},
+            {"id": 2, "recipe_name": "Lasagna", "img_src": None,
+             "ingredients": "pasta, beef, ricotta", "cuisine_path": "/Main Dishes/Pasta/", "rating": 4.9},
+        ]
+        path = tmp_path / "recipes.jsonl"
+        path.write_text("\n".join(json.dumps(row) for row in rows), encoding="utf-8")
+        supabase = MagicMock()
+        supabase.select.return_value = [{"cuisine_preferences": ["Thai"], "skill_level": None,
+                                         "avoid_ingredients": []}]
+        service = RecommendationService(Config(), supabase, path=str(path))
+        with patch("backend_api.recommendation_service", service):
+            yield service
+
+    @staticmethod
+    def _auth(sub):
+        payload = base64.urlsafe_b64encode(json.dumps({"sub": sub}).encode()).rstrip(b"=").decode()
+        return {"Authorization": f"Bearer e30.{payload}.sig"}
+
+    def test_recommend_uses_profile(self, recommendation_service):
+        """A Thai preference outranks a higher-rated recipe; rows use the frontend format."""
+        response = client.post("/recommend", json={
+            "classification": "recommend",
+            "entities": {"limit": 2},
+            "confidence": 1.0
+        }, headers=self._auth("user-1"))
+
+        data = response.json()
+        assert data["source"] == "dataset"
+        recipes = data["data"]["recipes"]
+        assert [r["id"] for r in recipes] == [1, 2]
+        assert recipes[0]["tags"] == ["World Cuisine", "Asian", "Thai"]
+        assert recipes[1]["image"] == "/placeholder.svg"
+        select = recommendation_service._supabase.select.call_args.kwargs
+        assert select["eq"] == {"user_id": "user-1"}
+        assert f"Bearer {select['token']}" == self._auth("user-1")["Authorization"]
+
+    def test_recommend_ignores_user_id_entity(self, recommendation_service):
+        """Without a token the request is anonymous, whatever user_id the body names."""
+        response = client.post("/recommend", json={
+            "classification": "recommend", "entities": {"user_id": "user-1"}, "confidence": 1.0})
+
+        assert response.json()["source"] == "dataset"
+        assert recommendation_service._supabase.select.call_count == 0
+
+    def test_recommend_limit_is_bounded(self, recommendation_service):
+        """Out-of-range limits are clamped to 1-50; a non-integer limit is a 400."""
+        with patch.object(recommendation_service, "recommend", return_value=([], "dataset")) as recommend:
+            for limit, clamped in ((10_000_000, 50), (-3, 1)):
+                response = client.post("/recommend", json={
+                    "classification": "recommend", "entities": {"limit": limit}, "confidence": 1.0})
+                assert response.status_code == 200
+                assert recommend.call_args.kwargs["limit"] == clamped
+
+            response = client.post("/recommend", json={
+                "classification": "recommend", "entities": {"limit": "lots"}, "confidence": 1.0})
+        assert response.status_code == 400
+        assert response.json()["error"] == "limit must be an integer"
+        assert recommend.call_count == 2
+
+    def test_recommend_cached_per_user(self, recommendation_service):
+        """A second request from the same user is served from the cache."""
+        body = {"classification": "recommend", "entities": {}, "confidence": 1.0}
+
+        first = client.post("/recommend", json=body, headers=self._auth("user-1")).json()
+        second = client.post("/recommend", json=body, headers=self._auth("user-1")).json()
+
+        assert second["source"] == "cache"
+        assert second["data"] == first["data"]
+        assert recommendation_service._supabase.select.call_count == 1
+
+
+# =============================================================================
+# /recipes/search Endpoint Tests
+# =============================================================================
+
+class TestRecipeSearchEndpoint:
+    """Test suite for /recipes/search endpoint."""
+
+    @pytest.fixture(autouse=True)
+    def search_index(self, tmp_path):
+        cuisines = ["/World Cuisine/Asian/Thai/", "/World Cuisine/Asian/Japanese/", "/Main Dishes/Pasta/"]
+        rows = [{"id": i, "recipe_name": f"Garlic Dish {i}", "img_src": f"https://img/{i}.jpg",
+                 "ingredients": "garlic, chicken" if i % 2 else "garlic, tofu",
+                 "cuisine_path": cuisines[i % 3], "rating": 5 - i / 10,
+                 "directions": "Stir-fry everything." if i % 3 == 0 else "Bake for 20 minutes."}
+                for i in range(25)]
+        path = tmp_path / "recipes.jsonl"
+        path.write_text("\n".join(json.dumps(row) for row in rows), encoding="utf-8")
+        index = RecipeSearchIndex(Config(), path=str(path))
+        with patch("backend_api.recipe_service.search_index", index):
+            yield index
+
+    def test_filters_and_facets(self):
+        """Categories are ANDed, values within one are ORed; facets count the alternatives."""
+        response = client.get("/recipes/search", params={
+            "q": "garlic", "cuisine": ["Thai", "Japanese"], "ingredient": "Chicken", "limit": 50})
+
+        data = response.json()
+        assert response.status_code == 200
+        assert data["total"] == len(data["recipes"]) == 8
+        assert all(r["cuisine_path"].endswith(("/Thai/", "/Japanese/")) for r in data["recipes"])
+        assert data["facets"]["cuisine"]["Italian"] == 0
+        assert data["facets"]["cuisine"]["Thai"] + data["facets"]["cuisine"]["Japanese"] == 8
+        assert data["facets"]["method"]["Stir-fry"] == 4
+        assert data["next_cursor"] is None
+
+    def test_cursor_pages_through_results(self):
+        """next_cursor walks every match once, in rating order."""
+        seen, cursor = [], None
+        while True:
+            params = {"q": "garlic", "limit": 10, **({"cursor": cursor} if cursor else {})}
+            data = client.get("/recipes/search", params=params).json()
+            seen += [r["id"] for r in data["recipes"]]
+            cursor = data["next_cursor"]
+            if not cursor:
+                break
+
+        assert seen == list(range(25))
+        assert client.get("/recipes/search", params={"cursor": "not-a-cursor"}).status_code == 400
+
+    def test_etag_and_gzip(self):
+        """Repeat requests revalidate with a 304; large pages are gzip-compressed."""
+        first = client.get("/recipes/search", params={"q": "garlic", "limit": 25},
+                           headers={"Accept-Encoding": "gzip"})
+        second = client.get("/recipes/search", params={"q": "garlic", "limit": 25},
+                            headers={"If-None-Match": first.headers["etag"]})
+
+        assert first.headers["content-encoding"] == "gzip"
+        assert second.status_code == 304
+
+
+# =============================================================================
+# /ingredients/search Endpoint Tests
+# =============================================================================
+
+class TestIngredientSearchEndpoint:
+    """Test suite for /ingredients/search endpoint."""
+
+    def test_facets_and_filters(self):
+        """Counts follow the filters; every returned entry carries all selected values."""
+        everything = client.get("/ingredients/search", params={"limit": 1}).json()
+        response = client.get("/ingredients/search", params={
+            "category": "Fruit", "flavor": "Sweet", "color": "Red", "limit": 200})
+
+        data = response.json()
+        assert response.status_code == 200
+        assert sum(everything["facets"]["category"].values()) == everything["total"]
+        assert 0 < data["total"] < everything["total"]
+        assert data["facets"]["category"] == {**{k: 0 for k in everything["facets"]["category"]},
+                                              "Fruit": data["total"]}
+        for entry in data["ingredients"]:
+            assert entry["category"] == "Fruit"
+            assert "Sweet" in entry["flavors"] and "Red" in entry["colors"]
+
+    def test_name_query_and_pagination(self):
+        """Other names (Thai) match too; offsets page through the total."""
+        first = client.get("/ingredients/search", params={"q": "ไข่", "limit": 2}).json()
+        second = client.get("/ingredients/search",
+                            params={"q": "ไข่", "limit": 2, "offset": first["next_offset"]}).json()
+
+        assert first["total"] > 2
+        assert {e["canonical_name"] for e in first["ingredients"]}.isdisjoint(
+            e["canonical_name"] for e in second["ingredients"])
+
+    def test_etag_keyed_on_dataset_version(self):
+        """Same query and dataset version revalidates; a new dataset version changes the ETag."""
+        params = {"flavor": "Sour"}
+        etag = client.get("/ingredients/search", params=params).headers["etag"]
+
+        assert client.get("/ingredients/search", params=params,
+                          headers={"If-None-Match": etag}).status_code == 304
+        with patch("backend_api.ingredient_search.version", return_value="v2"):
+            assert client.get("/ingredients/search", params=params).headers["etag"] != etag
+
+    def test_unknown_value_matches_nothing(self):
+        """A value no entry carries filters everything out instead of erroring."""
+        response = client.get("/ingredients/search", params={"texture": "Glassy"})
+
+        assert response.status_code == 200
+        assert response.json()["total"] == 0
+
+
+# =============================================================================
+# /classify Endpoint Tests
+# =============================================================================
+
+@pytest.fixture(scope="module")
+def intent_model_path(tmp_path_factory):
+    """Intent model trained once from the seed examples."""
+    config = Config()
+    path = str(tmp_path_factory.mktemp("intent") / "intent_model.json")
+    write_model(LinearIntentModel(num_features=config.intent_num_features)
+                .fit(load_examples([config.intent_seed_path])), path)
+    return path
+
+
+@pytest.fixture
+def intent_classifier(intent_model_path, tmp_path):
+    """Classifier on the trained model, logging to a temp file, with a mock GPT fallback."""
+    config = Config()
+    config.intent_model_path = intent_model_path
+    config.intent_log_enabled = True
+    config.intent_log_path = str(tmp_path / "intent_log.jsonl")
+    classifier = IntentClassifier(config, openai_service=MagicMock())
+    with patch("backend_api.intent_classifier", classifier):
+        yield classifier
+
+
+class TestClassifyEndpoint:
+    """Test suite for /classify endpoint."""
+
+    def test_classify_local(self, intent_classifier):
+        """A clear message gets the n8n agent's schema without calling GPT."""
+        response = client.post("/classify", json={
+            "message": "What can I use instead of butter in my banana bread and why?"})
+
+        data = response.json()
+        assert response.status_code == 200
+        assert data["classification"] == "substitute"
+        assert data["source"] == "local"
+        assert data["entities"]["ingredient"] == "butter"
+        assert data["entities"]["recipe"] == "banana bread"
+        assert data["entities"]["include_reasoning"] is True
+        assert data["entities"]["attributes"] is None
+        intent_classifier.openai_service.classify_message.assert_not_called()
+
+    def test_classify_low_confidence_uses_gpt(self, intent_classifier):
+        """A missing required entity sends the message to GPT; its answer is logged for training."""
+        intent_classifier.openai_service.classify_message.return_value = {
+            "classification": "lookup", "confidence": 0.9, "entities": {"recipe": "Pad Gaprao"}}
+
+        data = client.post("/classify", json={"message": "วิธีทำผัดกะเพรา"}).json()
+
+        assert data["source"] == "gpt"
+        assert data["entities"]["recipe"] == "Pad Gaprao"
+        intent_classifier.intent_log.flush()
+        with open(intent_classifier.config.intent_log_path, encoding="utf-8") as f:
+            assert json.loads(f.readline())["source"] == "gpt"
+
+    def test_classify_gpt_unavailable(self, intent_classifier):
+        """Without a GPT answer the local result is returned with its low confidence."""
+        intent_classifier.openai_service.classify_message.return_value = None
+
+        data = client.post("/classify", json={"message": "วิธีทำผัดกะเพรา"}).json()
+
+        assert data["source"] == "local"
+        assert data["confidence"] < intent_classifier.config.intent_min_confidence
+
+
 # =============================================================================
 # /health Endpoint Tests
 # =============================================================================
@@ -649,6 +1056,222 @@ class TestHealthEndpoint:
         assert isinstance(data["openai_available"], bool)
         assert isinstance(data["supabase_available"], bool)
 
+    def test_live_and_ready_after_warmup(self):
+        """/live always answers; /ready answers once the lifespan warmup has finished."""
+        with TestClient(app) as started:
+            assert started.get("/live").json() == {"status": "alive"}
+            assert backend_api.warmup.wait(timeout=30)
+
+            response = started.get("/ready")
+
+        assert response.status_code == 200
+        assert response.json()["status"] == "ready"
+        steps = backend_api.warmup.snapshot()["steps"]
+        assert steps["dataset"]["ok"] and steps["dataset"]["detail"] > 0
+        assert steps["hot_queries"]["detail"]["replayed"] > 0
+
+    def test_log_pipeline_installed_by_lifespan_only(self):
+        """Importing the app leaves logging alone; the server's lifespan installs the pipeline."""
+        assert not backend_api.log_pipeline.started
+
+        with TestClient(app):
+            assert backend_api.log_pipeline.started
+            backend_api.warmup.wait(timeout=30)
+
+        assert not backend_api.log_pipeline.started
+
+    def test_ready_waits_for_warmup(self):
+        """A worker whose warmup has not run yet is not ready."""
+        with patch("backend_api.warmup", Warmup(Config())):
+            response = client.get("/ready")
+
+        assert response.status_code == 503
+        assert response.json()["status"] == "warming_up"
+
+    def test_ready_reports_failed_construction(self):
+        """A service that cannot be built makes /ready answer 503."""
+        warmed = Warmup(Config(warmup_enabled=False))
+        broken = LazyService("broken", lambda: 1 / 0)
+        with patch("backend_api.warmup", warmed), patch("backend_api.LAZY_SERVICES", (broken,)):
+            response = client.get("/ready")
+
+        assert response.status_code == 503
+        assert response.json()["status"] == "not_ready"
+
+    def test_request_id_echoed(self):
+        """A client's X-Request-ID comes back on the response; otherwise one is generated."""
+        given = client.get("/health", headers={"X-Request-ID": "chat-42"})
+        generated = client.get("/health")
+
+        assert given.headers["x-request-id"] == "chat-42"
+        assert len(generated.headers["x-request-id"]) == 16
+
+    def test_health_reports_supabase_breaker(self):
+        """The breaker state is 'disabled' without Supabase, else the breaker's state."""
+        data = client.get("/health").json()
+
+        expected = {"disabled"} if not data["supabase_available"] else {"closed", "open", "half_open"}
+        assert data["supabase_breaker"] in expected
+
+
+# =============================================================================
+# /metrics Endpoint Tests
+# =============================================================================
+
+class TestMetricsEndpoint:
+    """Test suite for /metrics endpoint."""
+
+    def test_metrics_reports_routes(self, mock_openai_service):
+        """Verify route metrics come from the shared model router."""
+        mock_openai_service.router.snapshot.return_value = {
+            "get_recipe_details": {"default": {"gpt-4o-mini": {"calls": 3}}}
+        }
+        mock_openai_service.cache.snapshot.return_value = {"size": 0, "routes": {}, "recent_near_hits": []}
+        mock_openai_service.providers.snapshot.return_value = {"providers": {}, "failovers": 0}
+
+        response = client.get("/metrics")
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["routes"]["get_recipe_details"]["default"]["gpt-4o-mini"]["calls"] == 3
+        assert data["cache"]["size"] == 0
+
+
+# =============================================================================
+# Admission Control Tests
+# =============================================================================
+
+class TestAdmission:
+    """Test suite for per-classification admission control."""
+
+    def test_full_lane_sheds_with_retry_after(self, monkeypatch, mock_recipe_service):
+        """A lane with no free slot and no queue room answers 503 at once."""
+        monkeypatch.setattr(backend_api.admission.lanes["suggest"], "limit", 0)
+        monkeypatch.setattr(backend_api.admission.lanes["suggest"], "queue_size", 0)
+
+        response = client.post("/suggest", json={
+            "classification": "suggest",
+            "entities": {"ingredients": ["rice"]},
+            "confidence": 0.9
+        })
+
+        assert response.status_code == 503
+        assert int(response.headers["retry-after"]) >= 1
+        assert response.json()["error"]
+        mock_recipe_service.get_suggestions.assert_not_called()
+        assert backend_api.admission.snapshot()["lanes"]["suggest"]["shed"] >= 1
+
+    def test_degradable_lane_answers_cache_only(self, monkeypatch, mock_ingredient_service):
+        """/substitute is still answered when saturated, with LLM calls switched off."""
+        monkeypatch.setattr(backend_api.admission.lanes["substitute"], "limit", 0)
+        monkeypatch.setattr(backend_api.admission.lanes["substitute"], "queue_size", 0)
+        seen = []
+
+        def substitutes(**kwargs):
+            seen.append(CACHE_ONLY.get())
+            return SuggestionResult(["Hen Egg"], "dataset")
+        mock_ingredient_service.get_substitutes.side_effect = substitutes
+
+        response = client.post("/substitute", json={
+            "classification": "substitute",
+            "entities": {"ingredient": "duck egg"},
+            "confidence": 0.9
+        })
+
+        assert response.status_code == 200
+        assert response.headers["x-degraded"] == "1"
+        assert response.json()["data"]["substitutes"] == ["Hen Egg"]
+        assert seen == [True]
+
+
+# =============================================================================
+# Session Tests
+# =============================================================================
+
+class TestSessions:
+    """Test suite for session-scoped reuse of earlier results."""
+
+    def test_rewrite_reuses_lookup_details(self, mock_openai_service):
+        """/rewrite after /lookup in the same session skips the details call."""
+        mock_openai_service.get_recipe_details.return_value = {
+            "ingredients": "noodles, shrimp, tamarind",
+            "cooking_method": "1. Stir-fry",
+        }
+        mock_openai_service.get_updated_recipe_with_substitution.return_value = {
+            "ingredients": "noodles, tofu, tamarind",
+            "cooking_method": "1. Stir-fry",
+        }
+
+        client.post("/lookup", json={
+            "classification": "lookup", "entities": {"recipe": "Pad Thai"},
+            "confidence": 0.9, "session_id": "s1",
+        })
+        response = client.post("/rewrite", json={
+            "classification": "rewrite",
+            "entities": {"ingredient": "shrimp", "replacement": "tofu"},
+            "confidence": 0.9, "session_id": "s1",
+        })
+
+        assert response.json()["data"]["name"] == "Pad Thai"
+        assert mock_openai_service.get_recipe_details.call_count == 1
+        kwargs = mock_openai_service.get_updated_recipe_with_substitution.call_args.kwargs
+        assert kwargs["original_ingredients"] == "noodles, shrimp, tamarind"
+
+    def test_repeat_substitute_served_from_session(self, mock_ingredient_service):
+        """The same /substitute twice in a session calls the service once."""
+        mock_ingredient_service.get_substitutes.return_value = SuggestionResult(
+            items=["margarine"], source="gpt")
+        body = {"classification": "substitute", "entities": {"ingredient": "butter"},
+                "confidence": 0.9, "session_id": "s2"}
+
+        client.post("/substitute", json=body)
+        response = client.post("/substitute", json=body)
+
+        assert response.json()["source"] == "session"
+        assert mock_ingredient_service.get_substitutes.call_count == 1
+
+    def test_sessions_are_isolated(self, mock_ingredient_service):
+        """Results never leak between sessions or into session-less calls."""
+        mock_ingredient_service.get_substitutes.return_value = SuggestionResult(
+            items=["margarine"], source="gpt")
+        for session_id in ("a", "b", None):
+            client.post("/substitute", json={
+                "classification": "substitute", "entities": {"ingredient": "butter"},
+                "confidence": 0.9, "session_id": session_id,
+            })
+
+        assert mock_ingredient_service.get_substitutes.call_count == 3
+
+    def test_substitute_schedules_rewrite_prefetch(self, mock_ingredient_service, mock_prefetcher):
+        """/substitute hands the session's top substitutes to the prefetcher."""
+        mock_ingredient_service.get_substitutes.return_value = SuggestionResult(
+            items=["tofu", "tempeh"], source="gpt")
+
+        client.post("/substitute", json={
+            "classification": "substitute",
+            "entities": {"ingredient": "shrimp", "recipe": "Pad Thai"},
+            "confidence": 0.9, "session_id": "s3",
+        })
+
+        mock_prefetcher.after_substitute.assert_called_once_with(
+            "s3", "shrimp", "Pad Thai", ["tofu", "tempeh"])
+
+    def test_degraded_results_not_kept_in_session(self, monkeypatch, mock_ingredient_service):
+        """A cache-only answer is not stored, so the next turn in the session recomputes it."""
+        mock_ingredient_service.get_substitutes.return_value = SuggestionResult(["Hen Egg"], "dataset")
+        body = {"classification": "substitute", "entities": {"ingredient": "duck egg"},
+                "confidence": 0.9, "session_id": "s4"}
+        monkeypatch.setattr(backend_api.admission.lanes["substitute"], "limit", 0)
+        monkeypatch.setattr(backend_api.admission.lanes["substitute"], "queue_size", 0)
+        assert client.post("/substitute", json=body).headers["x-degraded"] == "1"
+
+        monkeypatch.undo()
+        response = client.post("/substitute", json=body)
+
+        assert "x-degraded" not in response.headers
+        assert response.json()["source"] == "dataset"
+        assert mock_ingredient_service.get_substitutes.call_count == 2
+
 
 # =============================================================================
 # Integration Tests
@@ -0,0 +1,1546 @@
+"""
+Pytest tests for FoodIngSubModel service-layer components.
+
+Tests cover:
+1. ModelRouter - per-route model settings, hot reload and metrics
+2. ContextParser - local Aho-Corasick attribute extraction
+3. ResponseCache - canonical exact hits and semantic near-hits
+4. Bulk precompute - Batch API pipeline into the response store
+5. Prefetcher - speculative next-call warm-up, budgets and yielding
+6. Benchmark replay - cassettes drive the real services end to end
+7. Load-test fakes - fake OpenAI / Supabase servers and fault injection
+8. RecipeIndex - MinHash/LSH similar recipes from a recipe snapshot
+9. RecommendationService - server-side personalized recommendation scoring
+10. IntentClassifier - local /classify model, entity extraction and LLM fallback
+11. ResponseRenderer - templated English/Thai chat replies
+12. ProviderRouter - fastest-healthy LLM provider routing, failover and hedging
+13. Prompt registry - static versioned prefixes with variable parts last
+14. Retrieval-augmented supplementation - GPT picks dataset candidates by id
+15. DietaryFilter - category and alias masks for dietary constraints
+16. Admission lanes - concurrency limits, bounded queues and cache-only mode
+17. SupabaseClient - timeouts, circuit breaker and the async variant
+18. Log pipeline - lazy queued records, sampling, rate limits and request ids
+19. Cold start - lazy service proxies, startup warmup and the import-time benchmark
+"""
+
+import asyncio
+import base64
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from benchmarks.import_time import compare_to_baseline, measure, parse_importtime
+from benchmarks.replay import ReplayOpenAIClient
+from benchmarks.run_benchmarks import percentile, run_benchmarks
+from config import Config
+from loadtest import fake_openai, fake_supabase
+from loadtest.faults import FaultProfile, LatencyDistribution
+from models import RecipeSuggestion
+from precompute.bulk_precompute import BatchPrecompute, Job
+from precompute.recipe_snapshot import fetch_recipes, write_snapshot
+from precompute.train_intent import write_model
+from services.admission import ADMITTED, DEGRADED, SHED, Lane
+from services.context_parser import AhoCorasick, ContextParser
+from services.dataset_service import DatasetService
+from services.dietary_filter import DietaryFilter
+from services.ingredient_service import IngredientService
+from services.intent_classifier import (ENTITY_FIELDS, IntentClassifier, LinearIntentModel,
+                                        load_examples)
+from services.lazy import LazyService, resolve
+from services.llm_providers import (CallCancelled, FakeProvider, OpenAIProvider, ProviderRouter,
+                                   build_providers)
+from services.log_pipeline import REQUEST_ID, JsonFormatter, LazyQueueHandler, SamplingFilter
+from services.model_router import ModelRouter
+from services.openai_service import OpenAIService
+from services.prompt_registry import PROMPTS
+from services.prompt_registry import snapshot as prompt_snapshot
+from services.prefetcher import Prefetcher
+from services.recipe_index import RecipeIndex
+from services.recipe_service import RecipeService
+from services.recommendation_service import RecommendationService, fnv1a32
+from services.response_cache import CACHE_ONLY
+from services.response_renderer import ResponseRenderer
+from services.response_store import LOOKUP, SUBSTITUTE, ResponseStore
+from services.supabase_client import (CLOSED, OPEN, CircuitOpenError, SupabaseClient, SupabaseError,
+                                      jwt_subject)
+from services.warmup import READY, Warmup, load_warmup_queries
+
+
+# =============================================================================
+# Fixtures & Test Data
+# =============================================================================
+
+@pytest.fixture
+def routes_file(tmp_path):
+    """Write a routing table to a temp file and return a writer for updates."""
+    path = tmp_path / "model_routes.json"
+
+    def write(data, mtime=None):
+        path.write_text(json.dumps(data), encoding="utf-8")
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+        return str(path)
+
+    return write
+
+
+@pytest.fixture
+def router_config(routes_file):
+    """Config pointing at a temp routing table with reload throttling disabled."""
+    config = Config()
+    config.model_routes_path = routes_file({"routes": {}})
+    config.model_routes_reload_interval = 0.0
+    return config
+
+
+# =============================================================================
+# ModelRouter Tests
+# =============================================================================
+
+class TestModelRouter:
+    """Test suite for per-route model routing."""
+
+    def test_resolve_falls_back_to_config(self, router_config):
+        """Unknown routes use the config model/temperature and caller max_tokens."""
+        router = ModelRouter(router_config)
+        settings = router.resolve("get_recipe_details", 500)
+
+        assert settings.model == router_config.openai_model
+        assert settings.max_tokens == 500
+        assert settings.temperature == router_config.temperature
+        assert settings.variant == "default"
+
+    def test_classification_key_matches_method(self, router_config, routes_file):
+        """A classification entry applies to every method serving it."""
+        routes_file({"routes": {"context": {"model": "small-model", "max_tokens": 64}}}, mtime=1_000)
+        router = ModelRouter(router_config)
+
+        settings = router.resolve("parse_natural_language_context", 150)
+        assert settings.model == "small-model"
+        assert settings.max_tokens == 64
+
+    def test_reload_on_file_change(self, router_config, routes_file):
+        """Editing the routing table takes effect without a new router."""
+        routes_file({"routes": {"lookup": {"model": "model-a"}}}, mtime=1_000)
+        router = ModelRouter(router_config)
+        assert router.resolve("get_recipe_details", 500).model == "model-a"
+
+        routes_file({"routes": {"lookup": {"model": "model-b"}}}, mtime=2_000)
+        assert router.resolve("get_recipe_details", 500).model == "model-b"
+
+    def test_ab_split_skips_zero_weight(self, router_config, routes_file):
+        """Variants with zero weight never receive traffic."""
+        routes_file({"routes": {"substitute": {"variants": [
+            {"name": "control", "weight": 1},
+            {"name": "fast", "model": "fast-model", "weight": 0},
+        ]}}}, mtime=1_000)
+        router = ModelRouter(router_config)
+
+        variants = {router.resolve("get_substitute_ingredients", 200).variant for _ in range(20)}
+        assert variants == {"control"}
+
+    def test_record_and_snapshot(self, router_config):
+        """Recorded calls are reported per route and variant."""
+        router = ModelRouter(router_config)
+        settings = router.resolve("get_recipe_details", 500)
+
+        class Usage:
+            prompt_tokens = 40
+            completion_tokens = 120
+            prompt_tokens_details = MagicMock(cached_tokens=30)
+
+        router.record(settings, 0.5, Usage())
+        router.record(settings, 1.5, error=True)
+
+        entry = router.snapshot()["get_recipe_details"]["default"][settings.model]
+        assert entry["calls"] == 2
+        assert entry["errors"] == 1
+        assert entry["avg_latency_ms"] == 1000.0
+        assert entry["completion_tokens"] == 120
+        assert (entry["cached_tokens"], entry["cached_share"]) == (30, 0.75)
+
+    def test_reloaded_model_keeps_its_own_stats(self, router_config, routes_file):
+        """A variant moved to another model reports both models instead of overwriting one."""
+        router = ModelRouter(router_config)
+        router.record(router.resolve("get_recipe_details", 500), 0.5)
+
+        routes_file({"routes": {"get_recipe_details": {"model": "gpt-4.1-nano"}}}, mtime=time.time() + 10)
+        assert router.reload()
+        router.record(router.resolve("get_recipe_details", 500), 0.1)
+
+        variant = router.snapshot()["get_recipe_details"]["default"]
+        assert {model: entry["calls"] for model, entry in variant.items()} == {
+            router_config.openai_model: 1, "gpt-4.1-nano": 1}
+
+
+# =============================================================================
+# ContextParser Tests
+# =============================================================================
+
+@pytest.fixture(scope="module")
+def context_parser():
+    """Context parser built from the bundled dataset."""
+    return ContextParser(DatasetService(Config()))
+
+
+class TestContextParser:
+    """Test suite for the local natural-description parser."""
+
+    def test_automaton_whole_word_matches(self):
+        """Patterns only match on word boundaries, overlapping ones all reported."""
+        automaton = AhoCorasick()
+        automaton.add("fried", "fried")
+        automaton.add("stir fried", "stir fried")
+        automaton.add("red", "red")
+
+        found = sorted(payload for _, _, payload in automaton.iter_matches("stir fried and red"))
+        assert found == ["fried", "red", "stir fried"]
+
+    def test_multi_value_extraction(self, context_parser):
+        """Every mentioned attribute value is returned, mapped to dataset values."""
+        parsed = context_parser.parse("something sweet and tangy, crunchy and stir-fried")
+
+        assert parsed.attributes["taste"] == ["Sweet", "Sour"]
+        assert parsed.attributes["texture"] == ["Crunchy"]
+        assert parsed.attributes["cooking_method"] == ["Stir-Fried"]
+        assert parsed.confidence >= 0.9
+
+    def test_negation(self, context_parser):
+        """Negated values are excluded rather than requested."""
+        parsed = context_parser.parse("not spicy but sour, spice-free and red")
+
+        assert parsed.excluded["taste"] == ["Spicy"]
+        assert parsed.attributes["taste"] == ["Sour"]
+        assert parsed.attributes["color"] == ["Red"]
+
+    def test_no_match_has_zero_confidence(self, context_parser):
+        """Descriptions without known vocabulary are low confidence."""
+        parsed = context_parser.parse("what my grandmother used to make")
+        assert parsed.attributes == {}
+        assert parsed.confidence == 0.0
+
+    def test_llm_only_called_below_threshold(self):
+        """IngredientService skips the LLM parse when the local parse is confident."""
+        openai_service = MagicMock()
+        openai_service.is_available = True
+        openai_service.parse_natural_language_context.return_value = {
+            "taste": "sweet", "texture": None, "color": None, "cooking_method": None,
+        }
+        service = IngredientService(Config(), openai_service)
+
+        local = service.parse_description("crispy and salty")
+        assert local.source == "local"
+        openai_service.parse_natural_language_context.assert_not_called()
+
+        fallback = service.parse_description("like my grandmother's dessert")
+        assert fallback.source == "gpt"
+        assert fallback.attributes == {"taste": ["sweet"]}
+
+
+
+# =============================================================================
+# ResponseCache Tests
+# =============================================================================
+
+def _fake_openai_service(reply: str) -> OpenAIService:
+    """OpenAIService whose client always answers `reply`."""
+    service = OpenAIService(Config())
+    client = MagicMock()
+    message = MagicMock(content=reply)
+    client.chat.completions.create.return_value = MagicMock(
+        choices=[MagicMock(message=message)], usage=None)
+    service._client = client
+    return service
+
+
+class TestResponseCache:
+    """Test suite for the exact and semantic LLM response cache."""
+
+    def test_canonical_exact_hit(self):
+        """Case, plurals and filler words share one cache entry."""
+        service = _fake_openai_service("1. Flaxseed\n2. Applesauce")
+
+        first = service.get_substitute_ingredients("Eggs", "Chocolate Cake Recipe", 5)
+        second = service.get_substitute_ingredients("egg", "chocolate cake", 5)
+
+        assert second.items == first.items == ["Flaxseed", "Applesauce"]
+        assert service._client.chat.completions.create.call_count == 1
+        assert service.cache.snapshot()["routes"]["get_substitute_ingredients"]["exact_hits"] == 1
+
+    def test_semantic_near_hit_is_audited(self):
+        """A near-duplicate ingredient list above the threshold reuses the answer."""
+        service = _fake_openai_service("1. Recipe: Fried Rice | Ingredients: rice, egg")
+
+        service.get_recipe_suggestions(["chicken", "garlic", "rice", "onion", "ginger"], 5)
+        service.get_recipe_suggestions(["chicken", "garlic", "rice", "onion", "ginger", "basil"], 5)
+
+        assert service._client.chat.completions.create.call_count == 1
+        near_hit = service.cache.near_hits[-1]
+        assert near_hit["route"] == "get_recipe_suggestions"
+        assert near_hit["similarity"] >= Config().semantic_cache_thresholds["suggest"]
+
+    def test_exact_args_and_disabled_routes_miss(self):
+        """Different exact arguments or a 1.0 threshold never share entries."""
+        service = _fake_openai_service(
+            "Updated Ingredients: tofu, rice | Updated Cooking Method: 1. Cook.")
+
+        service.get_substitute_ingredients("egg", "cake", 5)
+        service.get_substitute_ingredients("egg", "cake", 3)
+        service.get_updated_recipe_with_substitution("Pad Thai", "shrimp, rice noodles", "shrimp", "tofu")
+        service.get_updated_recipe_with_substitution("Pad Thai", "shrimp, rice noodles", "shrimp", "tempeh")
+
+        assert service._client.chat.completions.create.call_count == 4
+
+    def test_empty_results_not_cached(self):
+        """Failed or empty answers are retried rather than cached."""
+        service = _fake_openai_service("")
+
+        service.get_substitute_ingredients("saffron", "paella", 5)
+        service.get_substitute_ingredients("saffron", "paella", 5)
+
+        assert service._client.chat.completions.create.call_count == 2
+
+
+
+# =============================================================================
+# Bulk Precompute Tests
+# =============================================================================
+
+@pytest.fixture
+def batch_client():
+    """OpenAI SDK client talking to the fake Batch API in-process."""
+    from openai import OpenAI
+
+    http_client = TestClient(fake_openai.create_app(FaultProfile(seed=3)), base_url="http://fake")
+    return OpenAI(api_key="fake", base_url="http://fake/v1", http_client=http_client)
+
+
+@pytest.fixture
+def store(tmp_path):
+    """Empty response store in a temp directory."""
+    return ResponseStore(Config(), path=str(tmp_path / "responses.jsonl"))
+
+
+class TestBulkPrecompute:
+    """Test suite for the offline Batch API precompute pipeline."""
+
+    def test_batches_fill_the_store(self, batch_client, store, tmp_path):
+        """Substitute and lookup jobs are batched, parsed and stored."""
+        runner = BatchPrecompute(batch_client, store, Config(), str(tmp_path / "state.json"),
+                                 batch_size=2, poll_interval=0)
+        jobs = [Job(SUBSTITUTE, "Butter"), Job(SUBSTITUTE, "Milk"), Job(LOOKUP, "Pad Thai")]
+
+        summary = runner.run(jobs)
+
+        assert summary == {"submitted": 3, "stored": 3, "failed": 0, "in_flight": 0}
+        assert store.get_substitutes("butter", include_reasoning=True).reasons
+        assert store.get_recipe_details("pad thai")["cooking_method"]
+
+    def test_resume_collects_in_flight_batches(self, batch_client, store, tmp_path):
+        """A rerun collects batches an interrupted run submitted instead of resubmitting."""
+        state_path = str(tmp_path / "state.json")
+        jobs = [Job(SUBSTITUTE, "Butter"), Job(SUBSTITUTE, "Milk")]
+        BatchPrecompute(batch_client, store, Config(), state_path).submit(jobs)
+
+        resumed = BatchPrecompute(batch_client, store, Config(), state_path, poll_interval=0)
+        summary = resumed.run(jobs + [Job(SUBSTITUTE, "butters")])
+
+        assert summary["submitted"] == 0
+        assert summary["stored"] == 2
+        assert not json.loads((tmp_path / "state.json").read_text())["batches"]
+
+    def test_get_substitutes_reads_store_first(self, store):
+        """Stored substitutes are served without calling OpenAI, for their own recipe."""
+        store.put(SUBSTITUTE, "Butter", {"items": ["Ghee"], "reasons": []}, recipe="Banana Bread")
+        openai_service = MagicMock()
+        service = IngredientService(Config(), openai_service, store)
+
+        result = service.get_substitutes("butter", "banana bread", max_results=1)
+
+        assert result.items == ["Ghee"]
+        assert result.source == "precomputed"
+        openai_service.get_substitute_ingredients.assert_not_called()
+
+    def test_generic_substitutes_only_without_a_recipe(self, store):
+        """Recipe-independent entries answer recipe-less requests, not a specific recipe, unless opted in."""
+        store.put(SUBSTITUTE, "Butter", {"items": ["Margarine", "Coconut oil"], "reasons": []})
+
+        assert store.get_substitutes("butter").items == ["Margarine", "Coconut oil"]
+        assert store.get_substitutes("butter", "General Recipe").items == ["Margarine", "Coconut oil"]
+        assert store.get_substitutes("butter", "banana bread") is None
+
+        store.config = Config(precomputed_substitutes_any_recipe=True)
+        assert store.get_substitutes("butter", "banana bread").items == ["Margarine", "Coconut oil"]
+
+    def test_missing_file_is_checked_once_per_interval(self, tmp_path, monkeypatch):
+        """Lookups on a store with no file yet stat it once per reload interval, then pick it up."""
+        path = tmp_path / "responses.jsonl"
+        store = ResponseStore(Config(response_store_reload_interval=60.0), path=str(path))
+        stats = []
+        getmtime = os.path.getmtime
+        monkeypatch.setattr(os.path, "getmtime", lambda p: stats.append(p) or getmtime(p))
+
+        for _ in range(5):
+            assert store.get_substitutes("butter") is None
+        path.write_text(json.dumps({"kind": SUBSTITUTE, "key": "butter", "items": ["Ghee"]}) + "\n")
+        assert store.get_substitutes("butter") is None
+        assert len(stats) == 1
+
+        store._checked_at -= 60.0
+        assert store.get_substitutes("butter").items == ["Ghee"]
+
+
+
+# =============================================================================
+# Prefetcher Tests
+# =============================================================================
+
+@pytest.fixture
+def prefetch_config():
+    """Config with the prefetch queue drained manually."""
+    config = Config()
+    config.prefetch_enabled = True
+    config.prefetch_background = False
+    config.prefetch_session_budget = 2
+    return config
+
+
+class TestPrefetcher:
+    """Test suite for the background next-call prefetcher."""
+
+    def test_rewrite_prefetch_is_hit_by_interactive_call(self, prefetch_config):
+        """A prefetched rewrite answers the user's rewrite and counts as a hit."""
+        service = _fake_openai_service(
+            "Updated Ingredients: tofu, noodles | Updated Cooking Method: 1. Stir-fry.")
+        details = {"ingredients": "shrimp, noodles", "cooking_method": "1. Stir-fry."}
+        prefetcher = Prefetcher(prefetch_config, service, lambda session_id, recipe: details)
+
+        prefetcher.after_substitute("s1", "shrimp", "Pad Thai", ["tofu", "tempeh"])
+        assert prefetcher.run_pending() == 1
+
+        service.get_updated_recipe_with_substitution("Pad Thai", "shrimp, noodles", "shrimp", "tofu")
+
+        assert service._client.chat.completions.create.call_count == 1
+        snapshot = prefetcher.snapshot()
+        assert snapshot["hits"] == 1
+        assert snapshot["hit_rate"] == 1.0
+
+    def test_per_session_budget(self, prefetch_config):
+        """Each session gets a fixed number of prefetches; no session, no prefetch."""
+        prefetcher = Prefetcher(prefetch_config, _fake_openai_service("1. x"), lambda s, r: None)
+
+        assert [prefetcher.submit("s1", f"t{i}", lambda: None) for i in range(3)] == [True, True, False]
+        assert prefetcher.submit(None, "anon", lambda: None) is False
+        assert prefetcher.snapshot()["dropped_budget"] == 1
+
+    def test_degraded_answers_queue_nothing(self, prefetch_config):
+        """A trigger from a cache-only (degraded) answer does not queue a prefetch."""
+        prefetcher = Prefetcher(prefetch_config, _fake_openai_service("1. x"), lambda s, r: None)
+
+        token = CACHE_ONLY.set(True)
+        try:
+            prefetcher.after_substitute("s1", "duck egg", "Omelette", ["Hen Egg"])
+        finally:
+            CACHE_ONLY.reset(token)
+
+        assert prefetcher.snapshot()["dropped_degraded"] == 1
+        assert prefetcher.run_pending() == 0
+
+    def test_yields_to_interactive_traffic(self, prefetch_config):
+        """Nothing runs while user calls are in flight; tasks are skipped after a 429."""
+        import time
+
+        service = _fake_openai_service("1. x")
+        prefetcher = Prefetcher(prefetch_config, service, lambda s, r: None)
+        prefetcher.submit("s1", "similar", lambda: None)
+
+        service._in_flight = 1
+        assert prefetcher.run_pending() == 0
+
+        service._in_flight = 0
+        service.rate_limited_at = time.monotonic()
+        assert prefetcher.run_pending() == 0
+        assert prefetcher.snapshot()["skipped_rate_limited"] == 1
+
+
+# =============================================================================
+# Benchmark Replay Tests
+# =============================================================================
+
+class TestBenchmarkReplay:
+    """Test suite for the cassette-driven benchmark harness."""
+
+    def test_percentile_interpolates(self):
+        """Percentiles interpolate between ranks."""
+        assert percentile([1, 2, 3, 4], 50) == 2.5
+        assert percentile([5], 99) == 5
+
+    def test_every_scenario_replays_without_errors(self):
+        """Cassettes cover every scenario through the real service code path."""
+        results = run_benchmarks(iterations=1, warmup=0)
+
+        assert results
+        for name, result in results.items():
+            assert result["errors"] == 0, name
+
+    def test_replay_client_streams_for_cancellable_calls(self):
+        """Hedge-eligible calls stream; the replay client answers them as chunks with usage last."""
+        client = ReplayOpenAIClient({"interactions": [
+            {"match": "egg", "response": "1. Flaxseed", "usage": {"prompt_tokens": 9, "completion_tokens": 3}}]})
+        provider = OpenAIProvider(client)
+
+        text, usage = provider.complete("m", "s", "egg", 50, 0.0, 1.0, threading.Event())
+
+        assert (text, usage.completion_tokens) == ("1. Flaxseed", 3)
+
+
+
+# =============================================================================
+# Load-Test Fake Tests
+# =============================================================================
+
+class TestLoadTestFakes:
+    """Test suite for the local fake upstream servers."""
+
+    def test_latency_spec_parsing(self):
+        """Latency specs parse into distributions that sample sensibly."""
+        import random
+
+        dist = LatencyDistribution.parse("uniform:10,20")
+        assert dist.kind == "uniform"
+        assert 10 <= dist.sample_ms(random.Random(0)) <= 20
+        with pytest.raises(ValueError):
+            LatencyDistribution.parse("bogus:1")
+
+    def test_fake_openai_answers_in_requested_format(self):
+        """Unmatched prompts get a canned reply the service parser accepts."""
+        client = TestClient(fake_openai.create_app(FaultProfile(seed=1)))
+        response = client.post("/v1/chat/completions", json={
+            "model": "fake",
+            "messages": [
+                {"role": "system", "content": "Format as: Recipe: <name> | Ingredients: <list>"},
+                {"role": "user", "content": "Available ingredients: rice"},
+            ],
+        })
+
+        assert response.status_code == 200
+        body = response.json()
+        assert "Recipe: Fake Recipe 1 | Ingredients:" in body["choices"][0]["message"]["content"]
+        assert body["usage"]["completion_tokens"] > 0
+
+    def test_fake_openai_streams(self):
+        """stream=true returns SSE chunks terminated by [DONE]."""
+        client = TestClient(fake_openai.create_app(FaultProfile(seed=1)))
+        response = client.post("/v1/chat/completions", json={
+            "model": "fake", "stream": True, "stream_options": {"include_usage": True},
+            "messages": [{"role": "user", "content": "hi"}],
+        })
+
+        assert response.headers["content-type"].startswith("text/event-stream")
+        assert response.text.rstrip().endswith("data: [DONE]")
+        events = [json.loads(line[6:]) for line in response.text.splitlines()
+                  if line.startswith("data: {")]
+        assert events[-1]["choices"] == [] and events[-1]["usage"]["completion_tokens"] > 0
+
+    def test_rate_limit_injection(self):
+        """A 100% 429 rate answers every call with Retry-After."""
+        client = TestClient(fake_openai.create_app(FaultProfile(rate_limit_rate=1.0, retry_after=2)))
+        response = client.post("/v1/chat/completions", json={"model": "fake", "messages": []})
+
+        assert response.status_code == 429
+        assert response.headers["retry-after"] == "2"
+
+    def test_fake_supabase_rpc(self):
+        """The PostgREST RPC route returns deterministic recipe rows."""
+        client = TestClient(fake_supabase.create_app(FaultProfile(seed=1)))
+        response = client.post("/rest/v1/rpc/search_recipes_by_ingredients",
+                               json={"search_terms": ["tofu"], "result_limit": 2})
+
+        assert response.status_code == 200
+        rows = response.json()
+        assert len(rows) == 2
+        assert rows == client.post("/rpc/search_recipes_by_ingredients",
+                                   json={"search_terms": ["tofu"], "result_limit": 2}).json()
+
+
+
+
+# =============================================================================
+# RecipeIndex Tests
+# =============================================================================
+
+SNAPSHOT_ROWS = [
+    {"id": 1, "recipe_name": "Spaghetti Carbonara", "img_src": "https://img/1.jpg",
+     "ingredients": "1 pound spaghetti, 4 large eggs, 1 cup grated pecorino cheese, 8 ounces guanciale, salt",
+     "cuisine_path": "/Main Dishes/Pasta/", "rating": 4.8},
+    {"id": 2, "recipe_name": "Pasta alla Gricia", "img_src": "https://img/2.jpg",
+     "ingredients": "1 pound spaghetti, 1 cup pecorino cheese, 8 ounces guanciale, black pepper",
+     "cuisine_path": "/Main Dishes/Pasta/", "rating": 4.5},
+    {"id": 3, "recipe_name": "Cacio e Pepe", "img_src": "https://img/3.jpg",
+     "ingredients": "spaghetti, pecorino cheese, black pepper",
+     "cuisine_path": "/Main Dishes/Pasta/", "rating": 4.6,
+     "directions": "A quick Roman pasta: toss hot spaghetti with cheese and pepper."},
+    {"id": 4, "recipe_name": "Banana Bread", "img_src": "https://img/4.jpg",
+     "ingredients": "3 ripe bananas, 2 cups flour, 1 cup sugar, 2 eggs, butter",
+     "cuisine_path": "/Desserts/Quick Bread/", "rating": 4.7},
+]
+
+
+@pytest.fixture
+def recipe_index(tmp_path):
+    path = tmp_path / "recipes.jsonl"
+    path.write_text("\n".join(json.dumps(row) for row in SNAPSHOT_ROWS) + "\n", encoding="utf-8")
+    return RecipeIndex(Config(), path=str(path), alias_index={})
+
+
+class TestRecipeIndex:
+    """Test suite for the local similar-recipe index."""
+
+    def test_similar_ranked_by_shared_ingredients(self, recipe_index):
+        """Neighbours come from the corpus, most shared ingredients first."""
+        similar = recipe_index.similar("spaghetti carbonara", 3)
+
+        assert [r.id for r in similar][:2] == [2, 3]
+        assert 4 not in [r.id for r in similar[:2]]
+        assert recipe_index.snapshot()["hits"] == 1
+
+    def test_missing_recipe_falls_back_to_gpt(self, recipe_index):
+        """Recipes outside the corpus are answered by GPT."""
+        service = _fake_openai_service("1. Recipe: Tom Kha Gai | Ingredients: chicken, coconut milk")
+        recipe_service = RecipeService(Config(), service, recipe_index)
+
+        local, local_source = recipe_service.get_similar_recipes("Cacio e Pepe", 2)
+        remote, remote_source = recipe_service.get_similar_recipes("Tom Yum Goong", 2)
+
+        assert local_source == "dataset" and local[0].image.startswith("https://img/")
+        assert remote_source == "gpt" and remote[0].id is None
+        assert service._client.chat.completions.create.call_count == 1
+
+    def test_snapshot_pages_supabase(self, tmp_path):
+        """The snapshot job pages the recipes table and the index reads the result."""
+        pages = []
+
+        def handler(request):
+            params = request.url.params
+            pages.append((params["order"], params["limit"], params.get("offset")))
+            start, size = int(params.get("offset", 0)), int(params["limit"])
+            return httpx.Response(200, json=SNAPSHOT_ROWS[start:start + size])
+
+        client = SupabaseClient(Config(), url="http://supabase.test", key="key",
+                                transport=httpx.MockTransport(handler))
+        path = str(tmp_path / "recipes.jsonl")
+
+        assert write_snapshot(fetch_recipes(client, page_size=3), path) == 4
+        assert pages == [("id", "3", None), ("id", "3", "3")]
+        assert RecipeIndex(Config(), path=path, alias_index={}).find("banana bread").id == 4
+
+
+
+
+# =============================================================================
+# RecommendationService Tests
+# =============================================================================
+
+def _jwt(sub: str) -> str:
+    """An unsigned token with a `sub` claim; only PostgREST checks signatures."""
+    payload = base64.urlsafe_b64encode(json.dumps({"sub": sub}).encode()).rstrip(b"=").decode()
+    return f"e30.{payload}.sig"
+
+
+class TestRecommendationService:
+    """Test suite for the in-process port of usePersonalizedRecommendations."""
+
+    def _service(self, recipe_index, profile):
+        supabase = MagicMock()
+        supabase.select.return_value = [profile] if profile else []
+        return RecommendationService(Config(), supabase, path=recipe_index.path)
+
+    def test_fnv1a_matches_reference_vectors(self):
+        """Jitter hashing agrees with the frontend's 32-bit FNV-1a."""
+        assert fnv1a32("") == 0x811C9DC5
+        assert fnv1a32("a") == 0xE40C292C
+        assert fnv1a32("foobar") == 0xBF9CF968
+
+    def test_skill_and_avoid_ingredients(self, recipe_index):
+        """Avoided ingredients are filtered out; a skill keyword outweighs rating and jitter."""
+        service = self._service(recipe_index, {"cuisine_preferences": [], "skill_level": "beginner",
+                                               "avoid_ingredients": ["Guanciale"]})
+
+        recipes, source = service.recommend(_jwt("user-1"), limit=4, now=0)
+
+        assert source == "dataset"
+        assert service._supabase.select.call_args.kwargs["eq"] == {"user_id": "user-1"}
+        assert service._supabase.select.call_args.kwargs["token"] == _jwt("user-1")
+        # Cacio e Pepe's directions say "quick"; both guanciale recipes are gone
+        assert [r["id"] for r in recipes] == [3, 4]
+
+    def test_anonymous_jitter_is_deterministic(self, recipe_index):
+        """Without a profile nothing is fetched and the daily order is stable across processes."""
+        first = self._service(recipe_index, None)
+        second = self._service(recipe_index, None)
+
+        recipes, _ = first.recommend(None, limit=4, now=0)
+
+        assert len(recipes) == 4
+        assert recipes == second.recommend(None, limit=4, now=3600)[0]
+        assert first._supabase.select.call_count == 0
+
+    def test_cache_is_keyed_on_the_token(self, recipe_index):
+        """Two tokens with the same subject never share cached rows; a malformed token is anonymous."""
+        service = self._service(recipe_index, {"cuisine_preferences": [], "skill_level": "beginner",
+                                               "avoid_ingredients": []})
+
+        service.recommend(_jwt("user-1"), limit=4, now=0)
+        _, source = service.recommend(_jwt("user-1")[:-3] + "forged", limit=4, now=0)
+        service.recommend("not-a-jwt", limit=4, now=0)
+
+        assert source == "dataset"
+        assert service._supabase.select.call_count == 2
+
+
+
+
+# =============================================================================
+# IntentClassifier Tests
+# =============================================================================
+
+@pytest.fixture(scope="module")
+def intent_model_path(tmp_path_factory):
+    """Model trained once from the shipped seed examples."""
+    config = Config()
+    path = str(tmp_path_factory.mktemp("intent") / "intent_model.json")
+    write_model(LinearIntentModel(num_features=config.intent_num_features)
+                .fit(load_examples([config.intent_seed_path])), path)
+    return path
+
+
+@pytest.fixture
+def intent_config(intent_model_path, tmp_path):
+    config = Config()
+    config.intent_model_path = intent_model_path
+    config.intent_log_enabled = True
+    config.intent_log_path = str(tmp_path / "intent_log.jsonl")
+    return config
+
+
+class TestIntentClassifier:
+    """Test suite for the local replacement of the n8n Classify AI Agent."""
+
+    @pytest.mark.parametrize("message, classification, entities", [
+        ("What can I use instead of milk in my pancakes and why?", "substitute",
+         {"ingredient": "milk", "recipe": "pancakes", "include_reasoning": True}),
+        ("I have pork, rice and eggs. Give me 2 recipe ideas.", "suggest",
+         {"ingredients": ["pork", "rice", "eggs"], "max_results": 2}),
+        ("In my carbonara, can I replace the bacon with mushrooms?", "rewrite",
+         {"recipe": "carbonara", "ingredient": "bacon", "replacement": "mushrooms"}),
+        ("Something sour and crunchy to go with my noodle soup", "context",
+         {"attributes": {"taste": "sour", "texture": "crunchy", "color": None, "cooking_method": None},
+          "recipe_title": "noodle soup"}),
+        ("hello there", "out_of_scope", {}),
+    ])
+    def test_classified_locally(self, intent_config, message, classification, entities):
+        """Clear messages are answered locally, in the agent's full entity schema."""
+        openai_service = MagicMock()
+        classifier = IntentClassifier(intent_config, openai_service=openai_service)
+
+        result = classifier.classify(message)
+
+        assert (result.classification, result.source) == (classification, "local")
+        assert result.confidence >= intent_config.intent_min_confidence
+        assert set(result.entities) == set(ENTITY_FIELDS)
+        assert {k: result.entities[k] for k in entities} == entities
+        openai_service.classify_message.assert_not_called()
+
+    def test_thai_alias_and_llm_fallback(self, intent_config):
+        """Thai dataset names become English; untranslatable entities go to the LLM and are logged."""
+        openai_service = MagicMock()
+        openai_service.classify_message.return_value = {
+            "classification": "substitute", "confidence": 0.95,
+            "entities": {"ingredient": "butter", "ingredients": ["ignored"], "include_reasoning": False}}
+        classifier = IntentClassifier(intent_config, openai_service=openai_service)
+
+        local = classifier.classify_local("วัตถุดิบทดแทนไข่ไก่ในเค้ก")
+        result = classifier.classify("ใช้อะไรแทนเนยได้บ้าง")
+
+        assert local.entities["ingredient"] == "hen egg"
+        assert (result.source, result.entities["ingredient"]) == ("gpt", "butter")
+        assert result.entities["ingredients"] is None
+        classifier.intent_log.flush()
+        assert load_examples([intent_config.intent_log_path], sources=("gpt",)) == [
+            ("ใช้อะไรแทนเนยได้บ้าง", "substitute")]
+
+    def test_request_log_is_opt_in_and_rotated(self, intent_config, tmp_path):
+        """Nothing is logged by default; when enabled the log rolls over at its size cap."""
+        assert IntentClassifier(Config()).intent_log is None
+
+        intent_config.intent_log_max_bytes = 200
+        intent_config.intent_log_backups = 1
+        classifier = IntentClassifier(intent_config)
+        for _ in range(6):
+            classifier.classify("hello there")
+        classifier.intent_log.flush()
+        classifier.intent_log.close()
+
+        assert sorted(os.listdir(tmp_path)) == ["intent_log.jsonl", "intent_log.jsonl.1"]
+        kept = [line for name in os.listdir(tmp_path)
+                for line in (tmp_path / name).read_text(encoding="utf-8").splitlines()]
+        assert 0 < len(kept) < 6  # the oldest lines were rotated away
+
+    def test_model_round_trip(self, intent_model_path):
+        """Saved weights predict exactly like the trained model."""
+        with open(intent_model_path, encoding="utf-8") as f:
+            model = LinearIntentModel.from_dict(json.load(f))
+        reloaded = LinearIntentModel.from_dict(json.loads(json.dumps(model.to_dict())))
+
+        assert reloaded.predict("recipes similar to pad thai") == model.predict("recipes similar to pad thai")
+
+
+
+# =============================================================================
+# ResponseRenderer
+# =============================================================================
+
+class TestResponseRenderer:
+    """Test suite for the templated replacement of the n8n Formatting AI Agent."""
+
+    def test_substitute_list(self):
+        """Substitutes become a numbered list with their reasons, in both languages."""
+        rendered = ResponseRenderer().render(
+            "substitute", {"substitutes": ["yogurt", "sour cream"], "reasons": ["tangy", ""]},
+            {"ingredient": "buttermilk", "recipe": "pancakes"})
+
+        assert rendered["en"].splitlines()[:4] == [
+            "Here are some substitutes for **buttermilk** in **pancakes**:", "",
+            "1. **yogurt** — tangy", "2. **sour cream**"]
+        assert "**buttermilk**" in rendered["th"] and "1. **yogurt** — tangy" in rendered["th"]
+
+    def test_recipe_details(self):
+        """Ingredient strings become bullets (commas in parentheses kept) and steps are numbered."""
+        rendered = ResponseRenderer().render("lookup", {
+            "name": "Pad Thai",
+            "ingredients": "200g rice noodles, 2 eggs (beaten, cold)",
+            "cooking_method": "1. Soak the noodles. 2. Fry the eggs.",
+        }, {"recipe": "Pad Thai"}, languages=("en",))
+
+        lines = rendered["en"].splitlines()
+        assert "- 2 eggs (beaten, cold)" in lines
+        assert lines[lines.index("**Method**") + 1:][:2] == ["1. Soak the noodles.", "2. Fry the eggs."]
+
+    def test_empty_and_unknown(self):
+        """Empty data gets the clarification reply; classifications without templates get None."""
+        renderer = ResponseRenderer()
+
+        assert renderer.render("suggest", {"recipes": []}, {})["en"].startswith("Sorry")
+        assert renderer.render("recommend", {"recipes": []}, {}) is None
+
+
+
+# =============================================================================
+# ProviderRouter
+# =============================================================================
+
+@pytest.fixture
+def provider_config():
+    config = Config()
+    config.provider_min_samples = 2
+    return config
+
+
+class TestProviderRouter:
+    """Test suite for routing LLM calls across providers."""
+
+    def test_fastest_healthy_provider_wins(self, provider_config):
+        """Once measured, calls go to the provider with the lowest rolling latency."""
+        slow = FakeProvider(lambda system, user: "slow", latency=0.02, name="slow")
+        fast = FakeProvider(lambda system, user: "fast", name="fast")
+        router = ProviderRouter(provider_config, [slow, fast])
+
+        replies = [router.complete("gpt-4o-mini", "system", "user", 50, 0.0) for _ in range(4)]
+
+        assert replies[0] == "slow"  # unmeasured providers are probed in configured order
+        assert replies[1:] == ["fast"] * 3
+        assert [p.name for p in router.order()] == ["fast", "slow"]
+
+    def test_failover_and_unhealthy_last(self, provider_config):
+        """A failing provider fails over within the call and drops to the back at once."""
+        provider_config.provider_min_samples = 1
+        down = FakeProvider(error=503, name="down")
+        up = FakeProvider(lambda system, user: "ok", name="up")
+        router = ProviderRouter(provider_config, [down, up])
+
+        assert [router.complete("m", "s", "u", 50, 0.0) for _ in range(3)] == ["ok"] * 3
+        snapshot = router.snapshot()
+        assert snapshot["failovers"] == 1
+        assert snapshot["providers"]["down"]["healthy"] is False
+        assert router.order()[-1] is down
+
+    def test_always_failing_provider_never_ranks_fastest(self, provider_config):
+        """A provider with failures and no successes ranks behind a measured one, even while healthy."""
+        provider_config.provider_min_samples = 10
+        flaky = FakeProvider(error=500, name="flaky")
+        slow = FakeProvider(lambda system, user: "ok", latency=0.01, name="slow")
+        router = ProviderRouter(provider_config, [flaky, slow])
+
+        assert router.complete("m", "s", "u", 50, 0.0) == "ok"
+
+        assert [p.name for p in router.order()] == ["slow", "flaky"]
+        assert router.snapshot()["providers"]["flaky"]["rolling_latency_ms"] is None
+
+    def test_deadline_covers_failover(self, provider_config):
+        """No provider is tried once the single deadline is spent."""
+        provider_config.llm_deadline = 0.05
+        router = ProviderRouter(provider_config, [FakeProvider(latency=0.2, name="hung"),
+                                                  FakeProvider(lambda system, user: "late", name="next")])
+
+        with pytest.raises(Exception):
+            router.complete("m", "s", "u", 50, 0.0)
+        assert router.snapshot()["providers"]["next"]["calls"] == 0
+
+    def test_sdk_client_gives_up_within_the_deadline(self, provider_config):
+        """Built clients do not retry inside an attempt, so a timing-out provider fails over in time."""
+        provider_config.llm_providers = ["openai"]
+        provider_config.openai_base_url = "http://fake/v1"
+        provider_config.llm_deadline = 0.5
+        requests = []
+
+        def handler(request):
+            requests.append(request)
+            raise httpx.ReadTimeout("slow", request=request)
+
+        [provider] = build_providers(provider_config, {"openai": "fake"})
+        provider.client = provider.client.with_options(
+            http_client=httpx.Client(transport=httpx.MockTransport(handler)))
+        router = ProviderRouter(provider_config, [provider])
+
+        started = time.monotonic()
+        with pytest.raises(Exception):
+            router.complete("gpt-4o-mini", "s", "u", 50, 0.0, hedge=False)
+
+        assert provider.client.max_retries == 0 and len(requests) == 1
+        assert time.monotonic() - started < provider_config.llm_deadline
+
+    @pytest.mark.parametrize("budget, hedged", [(5.0, True), (0.0, False)])
+    def test_slow_call_hedged_within_budget(self, provider_config, budget, hedged):
+        """A call past the route's p90 gets one duplicate, unless the hedge budget is spent."""
+        provider_config.hedge_min_samples = 3
+        provider_config.hedge_burst = budget
+        calls = []
+
+        def reply(system, user):
+            calls.append(user)
+            if len(calls) == 4:
+                time.sleep(0.3)
+                return "slow"
+            return "fast"
+
+        router = ProviderRouter(provider_config, [FakeProvider(reply, name="only")])
+        for _ in range(3):
+            router.complete("m", "s", "u", 50, 0.0, route="get_substitute_ingredients")
+
+        answer = router.complete("m", "s", "u", 50, 0.0, route="get_substitute_ingredients")
+
+        hedging = router.snapshot()["hedging"]
+        assert answer == ("fast" if hedged else "slow")
+        assert (hedging["hedges"], hedging["wins"], hedging["denied"]) == ((1, 1, 0) if hedged else (0, 0, 1))
+        assert hedging["hedge_after_ms"]["get_substitute_ingredients"] is not None
+
+    def test_hedge_delay_starts_when_the_call_runs(self, provider_config):
+        """The pool fits every admitted call, and time queued for a thread does not trigger a hedge."""
+        router = ProviderRouter(provider_config, [FakeProvider(lambda system, user: "ok", name="only")])
+        router.hedge_delay = lambda route: 0.1
+        assert router._hedge_pool_size() >= 2 * sum(provider_config.admission_limits.values())
+
+        router._executor = ThreadPoolExecutor(max_workers=1)
+        blocker = router._executor.submit(time.sleep, 0.2)
+        answer = router.complete("m", "s", "u", 50, 0.0, route="r")
+
+        assert blocker.done() and answer == "ok"
+        assert router.snapshot()["hedging"]["hedges"] == 0
+        router._executor.shutdown()
+
+    def test_hedge_loser_is_cancelled(self, provider_config):
+        """When the hedge wins, the primary hangs up instead of running to the deadline."""
+        finished = []
+
+        class Slow(FakeProvider):
+            def complete(self, *args, **kwargs):
+                try:
+                    return super().complete(*args, **kwargs)
+                finally:
+                    finished.append(time.monotonic())
+
+        slow = Slow(lambda system, user: "slow", latency=5.0, name="slow")
+        router = ProviderRouter(provider_config, [slow, FakeProvider(lambda system, user: "fast", name="fast")])
+        router.hedge_delay = lambda route: 0.05
+
+        started = time.monotonic()
+        answer = router.complete("m", "s", "u", 50, 0.0, route="r")
+        time.sleep(0.1)
+
+        assert answer == "fast" and router.snapshot()["hedging"]["wins"] == 1
+        assert finished and finished[0] - started < 1.0
+        assert router._stats["slow"].calls == 0
+
+    def test_cancellable_openai_call_streams(self, provider_config):
+        """With a cancel event the OpenAI call is streamed; a set event stops it with CallCancelled."""
+        chunk = {"id": "c", "object": "chat.completion.chunk", "created": 0, "model": "m"}
+        events = [{**chunk, "choices": [{"index": 0, "delta": {"content": part}}]} for part in ("Hel", "lo ")]
+        events.append({**chunk, "choices": [],
+                       "usage": {"prompt_tokens": 3, "completion_tokens": 2, "total_tokens": 5}})
+        body = "".join(f"data: {json.dumps(event)}\n\n" for event in events) + "data: [DONE]\n\n"
+        sent = []
+
+        def handler(request):
+            sent.append(json.loads(request.content))
+            return httpx.Response(200, headers={"content-type": "text/event-stream"}, content=body.encode())
+
+        provider_config.llm_providers = ["openai"]
+        provider_config.openai_base_url = "http://fake/v1"
+        [provider] = build_providers(provider_config, {"openai": "fake"})
+        provider.client = provider.client.with_options(
+            http_client=httpx.Client(transport=httpx.MockTransport(handler)))
+
+        text, usage = provider.complete("m", "s", "u", 50, 0.0, 1.0, threading.Event())
+        cancel = threading.Event()
+        cancel.set()
+
+        assert (text, usage.total_tokens) == ("Hello", 5)
+        assert sent[0]["stream"] is True and sent[0]["stream_options"] == {"include_usage": True}
+        with pytest.raises(CallCancelled):
+            provider.complete("m", "s", "u", 50, 0.0, 1.0, cancel)
+        assert len(sent) == 1
+
+    def test_openai_service_shares_prompts_and_parsing(self, provider_config):
+        """Any provider's reply goes through the same prompt and parser; metrics record its model."""
+        provider_config.gemini_model = "gemini-test"
+        service = OpenAIService(provider_config)
+        seen = []
+        fake = FakeProvider(lambda system, user: seen.append((system, user)) or "1. Flaxseed\n2. Applesauce")
+        service.providers = ProviderRouter(provider_config, [FakeProvider(error=500, name="broken"), fake])
+
+        result = service.get_substitute_ingredients("egg", "brownies", 5)
+
+        assert result.items == ["Flaxseed", "Applesauce"]
+        assert seen[0] == service.substitute_prompt("egg", "brownies", 5)
+        [entry] = service.router.snapshot()["get_substitute_ingredients"]["default"].values()
+        assert entry["calls"] == 2
+
+
+
+# =============================================================================
+# Prompt Registry
+# =============================================================================
+
+class TestPromptRegistry:
+    """Test suite for the cache-friendly prompt templates."""
+
+    def test_variable_parts_come_last(self):
+        """Calls differing only in counts or ingredients share the system message and user prefix."""
+        five = OpenAIService.substitute_prompt("egg", "cake", 5)
+        three = OpenAIService.substitute_prompt("egg", "cake", 3)
+
+        assert five[0] == three[0]
+        assert five[1].startswith("Ingredient: egg\nRecipe: cake\n")
+        for template in PROMPTS.values():
+            assert "{" not in template.system or template.name == "classify"
+
+    def test_multi_swap_diff(self):
+        """All swaps go into one prompt and a diff-only reply parses into changed lines and steps."""
+        service = _fake_openai_service(
+            "Changed Ingredients:\n- 200g butter => 200g coconut oil\n- 2 eggs -> 2 flax eggs\n"
+            "Changed Steps:\n3. Whisk the flax eggs into the oil.")
+
+        diff = service.get_updated_recipe_with_substitutions(
+            "Brownies", "200g butter, 2 eggs", [("butter", "coconut oil"), ("eggs", "flax eggs")],
+            diff_only=True)
+
+        messages = service._client.chat.completions.create.call_args.kwargs["messages"]
+        assert messages[1]["content"].endswith(
+            "Swaps:\n- Replace 'butter' with 'coconut oil'\n- Replace 'eggs' with 'flax eggs'")
+        assert diff == {
+            "changed_ingredients": [{"from": "200g butter", "to": "200g coconut oil"},
+                                    {"from": "2 eggs", "to": "2 flax eggs"}],
+            "changed_steps": [{"step": 3, "text": "Whisk the flax eggs into the oil."}],
+        }
+
+    def test_snapshot_estimates_tokens(self):
+        """Every template reports its version and static-prefix token estimate."""
+        described = prompt_snapshot()
+
+        assert set(described) == set(PROMPTS)
+        assert described["classify"]["prefix_tokens"] > described["substitutes"]["prefix_tokens"] > 0
+        assert described["specific_recipes"]["variables"] == ["required", "context", "max_results"]
+
+
+
+
+# =============================================================================
+# Retrieval-Augmented Supplementation
+# =============================================================================
+
+def _rag_service(reply: str) -> IngredientService:
+    """IngredientService with an empty response store over a fake OpenAI client."""
+    config = Config()
+    config.response_store_path = ""
+    return IngredientService(config, openai_service=_fake_openai_service(reply))
+
+
+class TestRetrievalAugmented:
+    """Test suite for GPT picking among dataset candidates instead of naming its own."""
+
+    def test_substitutes_picked_by_id(self):
+        """A known ingredient sends similar dataset entries; the reply's ids map back to them."""
+        service = _rag_service("3, 1, 99")
+        candidates = service.dataset_service.similar_entries(
+            service.dataset_service.find_entry("cherry tomatoes"), service.config.rag_candidates)
+
+        result = service.get_substitutes("cherry tomatoes", "som tam", 5)
+
+        user = service.openai_service._client.chat.completions.create.call_args.kwargs["messages"][1]["content"]
+        assert "Candidates:\n1: " in user
+        assert result.items == [candidates[2].canonical_name, candidates[0].canonical_name]
+        assert result.source == "dataset+gpt"
+
+    def test_unknown_ingredient_generates_freely(self):
+        """Ingredients missing from the dataset keep the free-text substitute prompt."""
+        service = _rag_service("1. Safflower\n2. Turmeric")
+
+        result = service.get_substitutes("saffron", "paella", 5)
+
+        assert result.items == ["Safflower", "Turmeric"]
+        assert result.source == "gpt"
+
+    def test_context_picks_keep_exact_matches(self):
+        """Partial matches widen the pool; exact dataset matches come before GPT's picks."""
+        service = _rag_service("2,5")
+        candidates = service.dataset_service.context_candidates(texture="crisp")
+
+        result = service.get_context_suggestions(texture="crisp", recipe_title="salad", max_results=3)
+
+        assert result.items == ["Java Apple", candidates[1].canonical_name, candidates[4].canonical_name]
+        assert result.source == "dataset+gpt"
+
+        reasons = OpenAIService.parse_picks("2 - same crunch\n1 - sweeter", candidates, 5,
+                                            include_reasoning=True)
+        assert reasons.reasons == ["same crunch", "sweeter"]
+
+    def test_picks_parse_id_tokens_and_cache_by_names(self):
+        """Only comma-separated id tokens count, once each; reordered candidates hit the same cache entry."""
+        service = _rag_service("2, 2, 7, 1")
+        openai_service = service.openai_service
+        candidates = service.dataset_service.context_candidates(texture="crisp")[:3]
+
+        picked = OpenAIService.parse_picks("Here are 2 picks:\n3,1", candidates, 5)
+        first = openai_service.pick_substitutes("lime", "som tam", candidates, 5)
+        again = openai_service.pick_substitutes("lime", "som tam", candidates[::-1], 5)
+
+        assert picked.items == [candidates[2].canonical_name, candidates[0].canonical_name]
+        assert first.items == [candidates[1].canonical_name, candidates[0].canonical_name]
+        assert again.items == first.items
+        assert openai_service._client.chat.completions.create.call_count == 1
+
+
+
+
+# =============================================================================
+# Dietary Filter
+# =============================================================================
+
+@pytest.fixture(scope="module")
+def dietary_filter():
+    return DietaryFilter(DatasetService(Config()))
+
+
+class TestDietaryFilter:
+    """Test suite for local dietary and allergen constraint filtering."""
+
+    def test_masks_cover_categories_and_aliases(self, dietary_filter):
+        """Dataset names, their Thai aliases and unknown keyword matches are all excluded."""
+        items = ["Salted Butter", "เนยชนิดเค็ม", "Greek yogurt", "Coconut milk", "Olive oil"]
+
+        kept, _ = dietary_filter.filter_items(items, ["dairy-free"])
+
+        assert kept == ["Coconut milk", "Olive oil"]
+        assert not dietary_filter.allows("Peanut butter", ["nut-free"])
+        assert dietary_filter.allows("Eggplant", ["egg-free", "vegan"])
+
+    def test_overfetched_substitutes_filtered_once(self):
+        """One over-fetched GPT call is filtered down; reasons stay aligned."""
+        service = _rag_service("1. Greek yogurt - tang\n2. Coconut oil - fat\n3. Ghee - flavour\n"
+                               "4. Margarine - spreads\n5. Olive oil - moist")
+
+        result = service.get_substitutes("butter", "cookies", 2, include_reasoning=True,
+                                         constraints=["dairy-free"])
+
+        assert result.items == ["Coconut oil", "Margarine"]
+        assert result.reasons == ["fat", "spreads"]
+        assert service.openai_service._client.chat.completions.create.call_count == 1
+        user = service.openai_service._client.chat.completions.create.call_args.kwargs["messages"][1]["content"]
+        assert user.endswith("up to 4")
+
+    def test_recipes_checked_by_name_and_ingredients(self, dietary_filter):
+        """A recipe is dropped when its name or any listed ingredient breaks a constraint."""
+        curry = RecipeSuggestion(name="Green Curry", ingredients="2 cups coconut milk, tofu, 1 tbsp fish sauce")
+        salad = RecipeSuggestion(name="Peanut Noodle Salad", ingredients="rice noodles, cucumber")
+
+        assert not dietary_filter.allows_recipe(curry, ["vegan"])
+        assert dietary_filter.allows_recipe(curry, ["dairy-free"])
+        assert not dietary_filter.allows_recipe(salad, ["nut-free"])
+        assert dietary_filter.allows_recipe(salad, ["dairy-free", "egg-free"])
+
+    def test_supabase_rows_without_snapshot_fail_closed(self, dietary_filter, tmp_path):
+        """With no snapshot, Supabase rows have no known ingredients and GPT answers instead."""
+        openai = _fake_openai_service("1. Recipe: Garlic Rice | Ingredients: rice, garlic, oil")
+        config = Config(recipe_snapshot_path=str(tmp_path / "missing.jsonl"))
+        service = RecipeService(config, openai, RecipeIndex(config, alias_index={}), dietary_filter)
+        service.supabase = MagicMock()
+        service.supabase.rpc.return_value = [{"id": 7, "recipe_name": "Chicken Alfredo"}]
+
+        recipes, source = service.get_suggestions(["chicken", "rice"], 3, constraints=["dairy-free"])
+
+        assert source == "gpt"
+        assert [r.name for r in recipes] == ["Garlic Rice"]
+
+    def test_dataset_edits_reload_and_failures_are_not_cached(self, tmp_path):
+        """A broken dataset yields nothing until fixed; masks follow the current file."""
+        path = tmp_path / "ingredients.json"
+        path.write_text("{not json", encoding="utf-8")
+        dataset = DatasetService(Config(dataset_path=str(path)))
+        dietary = DietaryFilter(dataset)
+        assert dataset.entries() == [] and dataset.find_entry("zorb") is None
+
+        path.write_text(json.dumps({"Milk": {"Zorb": {"hasOtherNames": ["ซอร์บ"]}}}), encoding="utf-8")
+        os.utime(path, (1_000, 1_000))
+        assert [e.canonical_name for e in dataset.entries()] == ["Zorb"]
+        assert dataset.find_entry("ซอร์บ").canonical_name == "Zorb"
+        assert not dietary.allows("zorb", ["dairy-free"])
+
+        path.write_text(json.dumps({"Vegetable": {"Zorb": {}}}), encoding="utf-8")
+        os.utime(path, (2_000, 2_000))
+        assert dietary.allows("zorb", ["dairy-free"])
+
+
+
+
+# =============================================================================
+# Admission Lanes
+# =============================================================================
+
+class TestAdmissionLane:
+    """Test suite for per-classification concurrency limits and wait queues."""
+
+    def test_queue_hands_slots_over_in_order(self):
+        """Waiters get freed slots first-in first-out; a full queue sheds at once."""
+        async def scenario():
+            lane = Lane("suggest", limit=1, queue_size=1, deadline=5.0)
+            first = await lane.acquire()
+            waiter = asyncio.ensure_future(lane.acquire())
+            await asyncio.sleep(0)
+            overflow = await lane.acquire()
+            lane.release(0.5)
+            return lane, first, await waiter, overflow
+
+        lane, first, second, overflow = asyncio.run(scenario())
+
+        assert (first, second, overflow) == (ADMITTED, ADMITTED, SHED)
+        assert lane.active == 1 and lane.queue_depth == 0
+        assert lane.stats["max_queue_depth"] == 1 and lane.stats["shed"] == 1
+
+    def test_cancelled_waiter_returns_a_handed_over_slot(self):
+        """A waiter cancelled right after release() handed it the slot passes the slot on."""
+        async def scenario():
+            lane = Lane("suggest", limit=1, queue_size=2, deadline=5.0)
+            await lane.acquire()
+            cancelled = asyncio.ensure_future(lane.acquire())
+            behind = asyncio.ensure_future(lane.acquire())
+            await asyncio.sleep(0)
+            lane.release(0.5)
+            cancelled.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await cancelled
+            return lane, await behind
+
+        lane, behind = asyncio.run(scenario())
+
+        assert behind == ADMITTED
+        assert lane.active == 1 and lane.queue_depth == 0
+
+    def test_expected_wait_beyond_deadline_is_rejected_early(self):
+        """A request that would outwait the deadline is not queued; degradable lanes degrade."""
+        async def scenario(lane):
+            await lane.acquire()
+            return await lane.acquire()
+
+        shed = Lane("rewrite", limit=1, queue_size=10, deadline=0.5, initial_service_time=2.0)
+        degraded = Lane("context", limit=1, queue_size=10, deadline=0.5, degradable=True,
+                        initial_service_time=2.0)
+
+        assert asyncio.run(scenario(shed)) == SHED
+        assert asyncio.run(scenario(degraded)) == DEGRADED
+        assert shed.stats["queued"] == 0 and shed.retry_after() == 2
+
+    def test_cache_only_skips_llm_calls(self):
+        """Cached answers are still served in cache-only mode; misses make no call."""
+        service = _fake_openai_service("1. Flaxseed\n2. Applesauce")
+        service.get_substitute_ingredients("egg", "cake", 5)
+
+        token = CACHE_ONLY.set(True)
+        try:
+            cached = service.get_substitute_ingredients("eggs", "cake", 5)
+            missed = service.get_substitute_ingredients("butter", "cake", 5)
+        finally:
+            CACHE_ONLY.reset(token)
+
+        assert cached.items == ["Flaxseed", "Applesauce"]
+        assert missed.items == []
+        assert service._client.chat.completions.create.call_count == 1
+
+
+
+
+# =============================================================================
+# SupabaseClient
+# =============================================================================
+
+class TestSupabaseClient:
+    """Test suite for the pooled Supabase client and its circuit breaker."""
+
+    def _client(self, handler, failures=2, reset=30.0):
+        config = Config(supabase_breaker_failures=failures, supabase_breaker_reset=reset)
+        return SupabaseClient(config, url="http://supabase.test", key="key",
+                              transport=httpx.MockTransport(handler))
+
+    def test_breaker_opens_then_closes_after_trial(self):
+        """Repeated 5xx open the breaker, which skips calls until one trial succeeds."""
+        calls = []
+
+        def handler(request):
+            calls.append(request.url.path)
+            return httpx.Response(503 if len(calls) <= 2 else 200, json=[{"id": 1}])
+
+        supabase = self._client(handler)
+        for _ in range(2):
+            with pytest.raises(SupabaseError):
+                supabase.rpc("search_recipes_by_ingredients", {"search_terms": ["egg"]})
+        with pytest.raises(CircuitOpenError):
+            supabase.rpc("search_recipes_by_ingredients", {"search_terms": ["egg"]})
+
+        assert supabase.breaker.state == OPEN and len(calls) == 2
+        supabase.breaker.reset_timeout = 0.0
+        assert supabase.rpc("search_recipes_by_ingredients", {}) == [{"id": 1}]
+        assert supabase.breaker.state == CLOSED
+        assert calls[0] == "/rest/v1/rpc/search_recipes_by_ingredients"
+
+    def test_user_token_is_forwarded(self):
+        """A caller's JWT replaces the anon key as the bearer; the apikey header stays."""
+        seen = []
+
+        def handler(request):
+            seen.append((request.headers["apikey"], request.headers["authorization"]))
+            return httpx.Response(200, json=[])
+
+        supabase = self._client(handler)
+        supabase.select("profiles", "skill_level", token=_jwt("u1"))
+        supabase.select("recipes", "id")
+
+        assert seen == [("key", f"Bearer {_jwt('u1')}"), ("key", "Bearer key")]
+        assert jwt_subject(_jwt("u1")) == "u1"
+        assert jwt_subject("a.!!!.c") is None and jwt_subject(None) is None
+
+    def test_client_errors_and_timeouts(self):
+        """A 404 raises without counting against the breaker; a timeout counts."""
+        def handler(request):
+            if request.url.path.endswith("/profiles"):
+                assert request.url.params["user_id"] == "eq.u1"
+                return httpx.Response(404, json={"message": "missing"})
+            raise httpx.ReadTimeout("slow", request=request)
+
+        supabase = self._client(handler, failures=1)
+        with pytest.raises(SupabaseError) as missing:
+            supabase.select("profiles", "skill_level", eq={"user_id": "u1"}, limit=1)
+        assert missing.value.status_code == 404 and supabase.breaker.state == CLOSED
+
+        with pytest.raises(SupabaseError):
+            supabase.rpc("search_recipes_by_ingredients", timeout=0.1)
+        assert supabase.breaker.state == OPEN
+
+    def test_async_variant_shares_the_breaker(self):
+        """aselect/arpc use the same breaker, timeouts and token handling as the sync calls."""
+        seen = []
+
+        async def handler(request):
+            seen.append(request.headers["authorization"])
+            if request.url.path.endswith("/profiles"):
+                return httpx.Response(200, json=[{"skill_level": "beginner"}])
+            raise httpx.ReadTimeout("slow", request=request)
+
+        supabase = self._client(handler, failures=1)
+
+        async def calls():
+            rows = await supabase.aselect("profiles", "skill_level", eq={"user_id": "u1"}, token=_jwt("u1"))
+            with pytest.raises(SupabaseError):
+                await supabase.arpc("search_recipes_by_ingredients", {}, timeout=0.1)
+            await supabase.aclose()
+            return rows
+
+        assert asyncio.run(calls()) == [{"skill_level": "beginner"}]
+        assert seen == [f"Bearer {_jwt('u1')}", "Bearer key"]
+        assert supabase.breaker.state == OPEN
+        with pytest.raises(CircuitOpenError):
+            supabase.rpc("search_recipes_by_ingredients", {})
+
+    def test_malformed_rpc_payload_falls_back(self):
+        """A non-list payload or non-object rows are ignored instead of raising."""
+        payloads = iter([{"message": "proxy error"}, ["oops", {"id": 7, "recipe_name": "Omelette"}]])
+        supabase = self._client(lambda request: httpx.Response(200, json=next(payloads)))
+        service = RecipeService(Config(), _fake_openai_service(""))
+        service.supabase = supabase
+
+        assert service._get_supabase_suggestions(["egg"], 5) == []
+        assert [r.id for r in service._get_supabase_suggestions(["egg"], 5)] == [7]
+
+    def test_failed_trial_reopens_and_recipe_fallback(self):
+        """A trial call failing any way re-opens the breaker; while open, /suggest skips Supabase silently."""
+        def handler(request):
+            raise RuntimeError("transport bug")
+
+        supabase = self._client(handler, failures=1, reset=0.0)
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                supabase.rpc("search_recipes_by_ingredients", {})
+        assert supabase.breaker.stats["failures"] == 2
+
+        supabase.breaker.reset_timeout = 30.0
+
+        service = RecipeService(Config(), _fake_openai_service(""))
+        service.supabase = supabase
+        assert service._get_supabase_suggestions(["egg"], 5) == []
+        assert supabase.breaker.stats["rejected"] == 1
+
+
+
+
+# =============================================================================
+# Log Pipeline
+# =============================================================================
+
+class TestLogPipeline:
+    """Test suite for the queued, sampled and rate-limited logging pipeline."""
+
+    def _record(self, name, level, msg="stem %s", args=("egg",)):
+        return logging.LogRecord(name, level, __file__, 1, msg, args, None)
+
+    def test_sampling_and_rate_limit(self):
+        """DEBUG is sampled per logger prefix; a burst past the limit is counted on the next record."""
+        sampler = SamplingFilter({"services.recipe_service": 0.0}, rate=0.0, burst=1, seed=1)
+
+        assert sampler.sample_rate("services.recipe_service.child") == 0.0
+        assert not sampler.filter(self._record("services.recipe_service", logging.DEBUG))
+        assert sampler.filter(self._record("services.recipe_service", logging.INFO))
+        assert sampler.filter(self._record("services.openai_service", logging.DEBUG))
+        assert not sampler.filter(self._record("services.openai_service", logging.WARNING))
+
+        error = self._record("services.openai_service", logging.ERROR)
+        assert sampler.filter(error) and error.suppressed == 1
+        assert sampler.stats == {"sampled_out": 1, "rate_limited": 1}
+
+    def test_records_are_queued_unformatted_with_request_id(self):
+        """The handler enqueues msg and args as-is; the writer's JSON has the request id."""
+        handler = LazyQueueHandler(queue.Queue(maxsize=1))
+        token = REQUEST_ID.set("req-1")
+        try:
+            handler.emit(self._record("services.recipe_service", logging.INFO))
+            handler.emit(self._record("services.recipe_service", logging.INFO))
+        finally:
+            REQUEST_ID.reset(token)
+
+        record = handler.queue.get_nowait()
+        assert (record.msg, record.args) == ("stem %s", ("egg",))
+        assert handler.dropped == 1
+        line = json.loads(JsonFormatter().format(record))
+        assert line["msg"] == "stem egg" and line["request_id"] == "req-1"
+        assert line["logger"] == "services.recipe_service" and line["level"] == "INFO"
+
+
+
+
+# =============================================================================
+# Cold Start
+# =============================================================================
+
+class TestColdStart:
+    """Test suite for lazy service construction, warmup and the import-time benchmark."""
+
+    def test_lazy_service_builds_once_on_first_use(self):
+        """Nothing is built until an attribute is used; writes go to the built service."""
+        built = []
+
+        def factory():
+            built.append(1)
+            return MagicMock(version="v1")
+
+        service = LazyService("search", factory)
+        assert not service.built and built == []
+
+        assert service.version == "v1"
+        service.version = "v2"
+        assert resolve(service).version == "v2" and service.version == "v2"
+        assert built == [1] and service.built
+        assert resolve("plain") == "plain"
+
+    def test_warmup_runs_every_step_and_reports_failures(self):
+        """A failing step is recorded without stopping the rest; the worker then becomes ready."""
+        warmup = Warmup(Config(warmup_enabled=True))
+        assert not warmup.ready
+
+        warmup.start([("dataset", lambda: 3), ("supabase_connection", lambda: 1 / 0),
+                      ("automaton", lambda: object())], background=False)
+
+        steps = warmup.snapshot()["steps"]
+        assert warmup.state == READY and warmup.wait(0)
+        assert steps["dataset"]["detail"] == 3 and not steps["supabase_connection"]["ok"]
+        assert steps["automaton"]["ok"] and "detail" not in steps["automaton"]
+        assert Warmup(Config(warmup_enabled=False)).ready
+
+    def test_warmup_queries_file(self, tmp_path):
+        """The shipped hot queries parse; entries without a classification are skipped."""
+        path = tmp_path / "queries.json"
+        path.write_text(json.dumps([{"classification": "substitute", "entities": {}}, {"entities": {}}]),
+                        encoding="utf-8")
+
+        assert len(load_warmup_queries(str(path))) == 1
+        assert load_warmup_queries(str(tmp_path / "missing.json")) == []
+        assert all(q["classification"] for q in load_warmup_queries(Config().warmup_queries_path))
+
+    def test_importtime_parsing_and_regressions(self):
+        """Importtime rows parse; slow imports and eager SDK imports are regressions."""
+        stderr = ("import time: self [us] | cumulative | imported package\n"
+                  "import time:       120 |        120 |   utils\n"
+                  "import time:     40000 |     300000 | backend_api\n")
+        assert parse_importtime(stderr) == {"utils": (120, 120), "backend_api": (40000, 300000)}
+
+        result = {"module": "backend_api", "cumulative_ms": 500.0, "lazy_modules_imported": ["openai"]}
+        regressions = compare_to_baseline(result, {"cumulative_ms": 300.0}, tolerance=0.3, min_delta_ms=30)
+        assert len(regressions) == 2 and "openai" in regressions[1]
+        assert compare_to_baseline(dict(result, lazy_modules_imported=[]),
+                                   {"cumulative_ms": 450.0}, tolerance=0.3, min_delta_ms=30) == []
+
+    def test_importing_the_app_keeps_sdks_lazy(self):
+        """A fresh `import backend_api` pulls in neither the OpenAI SDK nor httpx."""
+        result = measure("backend_api", runs=1)
+
+        assert result["cumulative_ms"] > 0
+        assert result["lazy_modules_imported"] == []
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -6,13 +6,7 @@ Common utility functions used throughout the application.
 """
 
 import re
-import logging
-from typing import List, Any
-
-
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-logger = logging.getLogger(__name__)
+from typing import Any, List, Optional, Sequence
 
 
 def normalize_text(text: str) -> str:
@@ -20,6 +14,20 @@ def normalize_text(text: str) -> str:
     return re.sub(r"\s+", " ", (text or "").strip()).lower()
 
 
+def stem_word(word: str) -> str:
+    """Light plural stemmer for cache keys and lookups (eggs -> egg, berries -> berry)."""
+    w = word.lower()
+    if len(w) <= 3:
+        return w
+    if w.endswith("ies"):
+        return w[:-3] + "y"
+    if w.endswith("oes") or re.search(r"(ss|x|ch|sh)es$", w):
+        return w[:-2]
+    if w.endswith("s") and not w.endswith(("ss", "us", "is")):
+        return w[:-1]
+    return w
+
+
 def to_casefold_set(values: Any) -> List[str]:
     """Convert various value types to a normalized string list."""
     if not values:
@@ -38,3 +46,20 @@ def parse_numbered_list(text: str) -> List[str]:
         # Fallback to comma-separated
         items = [p.strip() for p in text.split(",") if p.strip()]
     return items
+
+
+def set_bit_positions(bits: int, start: int = 0, limit: Optional[int] = None) -> List[int]:
+    """Positions of the set bits of an int bitset at or after `start`, lowest first."""
+    positions = []
+    remaining, offset = bits >> start, start
+    while remaining and (limit is None or len(positions) < limit):
+        low = (remaining & -remaining).bit_length() - 1
+        positions.append(offset + low)
+        remaining >>= low + 1
+        offset += low + 1
+    return positions
+
+
+def bits_from_flags(flags: Sequence[bool]) -> int:
+    """Int bitset with bit i set where flags[i] is true."""
+    return int("".join("1" if flag else "0" for flag in reversed(flags)) or "0", 2)